@@ -0,0 +1,29 @@
+"""Add analysis job progress
+
+Revision ID: 3b8e1f2a9d40
+Revises: c7209f9431e5
+Create Date: 2026-10-17 09:12:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8e1f2a9d40'
+down_revision: Union[str, None] = 'c7209f9431e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('analyses', sa.Column('progress', sa.JSON(), nullable=True))
+    op.add_column('analyses', sa.Column('started_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('analyses') as batch_op:
+        batch_op.drop_column('started_at')
+        batch_op.drop_column('progress')
@@ -0,0 +1,97 @@
+"""Add analysis summary columns
+
+Revision ID: 5e7a0c93d2f8
+Revises: 9d2c47e6b1a3
+Create Date: 2026-10-17 13:42:09.551637
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7a0c93d2f8'
+down_revision: Union[str, None] = '9d2c47e6b1a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH = 1000
+
+
+def _load(value):
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return {}
+    return value or {}
+
+
+def _float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def upgrade() -> None:
+    op.add_column('analyses', sa.Column('score', sa.Float(), nullable=True))
+    op.add_column('analyses', sa.Column('grade', sa.String(), nullable=True))
+    op.add_column('analyses', sa.Column('total_risks', sa.Integer(), nullable=True))
+    op.add_column('analyses', sa.Column('win_rate', sa.Float(), nullable=True))
+    op.add_column('analyses', sa.Column('net_profit', sa.Float(), nullable=True))
+    op.create_index('ix_analyses_score', 'analyses', ['score'])
+    op.create_index('ix_analyses_grade', 'analyses', ['grade'])
+    op.create_index('ix_analyses_user_created_id', 'analyses', ['user_id', 'created_at', 'id'])
+
+    # Backfill from the JSON results in batches
+    bind = op.get_bind()
+    analyses = sa.table(
+        'analyses',
+        sa.column('id', sa.String()),
+        sa.column('metrics', sa.JSON()),
+        sa.column('score_result', sa.JSON()),
+        sa.column('score', sa.Float()),
+        sa.column('grade', sa.String()),
+        sa.column('total_risks', sa.Integer()),
+        sa.column('win_rate', sa.Float()),
+        sa.column('net_profit', sa.Float()),
+    )
+    last_id = ''
+    while True:
+        rows = bind.execute(
+            sa.select(analyses.c.id, analyses.c.metrics, analyses.c.score_result)
+            .where(analyses.c.id > last_id)
+            .order_by(analyses.c.id)
+            .limit(BACKFILL_BATCH)
+        ).fetchall()
+        if not rows:
+            break
+        for row_id, metrics, score_result in rows:
+            metrics, score_result = _load(metrics), _load(score_result)
+            total_risks = score_result.get('total_risks')
+            bind.execute(
+                analyses.update().where(analyses.c.id == row_id).values(
+                    score=_float(score_result.get('score')),
+                    grade=score_result.get('grade'),
+                    total_risks=int(total_risks) if total_risks is not None else None,
+                    win_rate=_float(metrics.get('win_rate')),
+                    net_profit=_float(metrics.get('net_profit')),
+                )
+            )
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    op.drop_index('ix_analyses_user_created_id', table_name='analyses')
+    op.drop_index('ix_analyses_grade', table_name='analyses')
+    op.drop_index('ix_analyses_score', table_name='analyses')
+    with op.batch_alter_table('analyses') as batch_op:
+        batch_op.drop_column('net_profit')
+        batch_op.drop_column('win_rate')
+        batch_op.drop_column('total_risks')
+        batch_op.drop_column('grade')
+        batch_op.drop_column('score')
@@ -0,0 +1,27 @@
+"""Index deriv trades by connection and purchase time
+
+Revision ID: 6c1e4b8a2d97
+Revises: f3a80c6d5b21
+Create Date: 2026-10-17 23:41:09.218447
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6c1e4b8a2d97'
+down_revision: Union[str, None] = 'f3a80c6d5b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_deriv_trades_connection_purchase', 'deriv_trades',
+                    ['connection_id', 'purchase_time'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_deriv_trades_connection_purchase', table_name='deriv_trades')
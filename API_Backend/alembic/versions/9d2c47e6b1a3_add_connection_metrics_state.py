@@ -0,0 +1,27 @@
+"""Add connection metrics state
+
+Revision ID: 9d2c47e6b1a3
+Revises: 3b8e1f2a9d40
+Create Date: 2026-10-17 11:05:27.402913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d2c47e6b1a3'
+down_revision: Union[str, None] = '3b8e1f2a9d40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('deriv_connections', sa.Column('metrics_state', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('deriv_connections') as batch_op:
+        batch_op.drop_column('metrics_state')
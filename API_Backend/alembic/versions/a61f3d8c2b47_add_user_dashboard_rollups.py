@@ -0,0 +1,116 @@
+"""Add user dashboard rollups
+
+Revision ID: a61f3d8c2b47
+Revises: 5e7a0c93d2f8
+Create Date: 2026-10-17 15:08:31.204518
+
+"""
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a61f3d8c2b47'
+down_revision: Union[str, None] = '5e7a0c93d2f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RISK_LEVELS = ('low', 'medium', 'high')
+
+
+def _load(value):
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return {}
+    return value or {}
+
+
+def _empty():
+    return {
+        'analysis_count': 0, 'score_count': 0, 'score_sum': 0.0,
+        'score_min': None, 'score_max': None,
+        'win_rate_count': 0, 'win_rate_sum': 0.0,
+        'trade_count_sum': 0, 'total_risks_sum': 0,
+        'risk_low': 0, 'risk_medium': 0, 'risk_high': 0,
+    }
+
+
+def upgrade() -> None:
+    rollups = op.create_table(
+        'user_dashboard_rollups',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=False),
+        sa.Column('period', sa.String(), nullable=False),
+        sa.Column('bucket_start', sa.Date(), nullable=False),
+        sa.Column('analysis_count', sa.Integer(), nullable=False),
+        sa.Column('score_count', sa.Integer(), nullable=False),
+        sa.Column('score_sum', sa.Float(), nullable=False),
+        sa.Column('score_min', sa.Float(), nullable=True),
+        sa.Column('score_max', sa.Float(), nullable=True),
+        sa.Column('win_rate_count', sa.Integer(), nullable=False),
+        sa.Column('win_rate_sum', sa.Float(), nullable=False),
+        sa.Column('trade_count_sum', sa.Integer(), nullable=False),
+        sa.Column('total_risks_sum', sa.Integer(), nullable=False),
+        sa.Column('risk_low', sa.Integer(), nullable=False),
+        sa.Column('risk_medium', sa.Integer(), nullable=False),
+        sa.Column('risk_high', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'period', 'bucket_start', name='uq_dashboard_rollup_bucket')
+    )
+
+    # Backfill daily and weekly buckets from the existing analyses
+    bind = op.get_bind()
+    analyses = sa.table(
+        'analyses',
+        sa.column('user_id', sa.String()),
+        sa.column('created_at', sa.DateTime()),
+        sa.column('score', sa.Float()),
+        sa.column('win_rate', sa.Float()),
+        sa.column('trade_count', sa.Integer()),
+        sa.column('total_risks', sa.Integer()),
+        sa.column('score_result', sa.JSON()),
+    )
+    buckets = {}
+    rows = bind.execute(
+        sa.select(analyses).where(analyses.c.user_id.isnot(None), analyses.c.created_at.isnot(None))
+    )
+    for row in rows:
+        day = row.created_at.date()
+        breakdown = _load(row.score_result).get('risk_breakdown') or {}
+        for period, start in (('day', day), ('week', day - timedelta(days=day.weekday()))):
+            stats = buckets.setdefault((row.user_id, period, start), _empty())
+            stats['analysis_count'] += 1
+            if row.score is None:
+                continue
+            stats['score_count'] += 1
+            stats['score_sum'] += row.score
+            stats['score_min'] = row.score if stats['score_min'] is None else min(stats['score_min'], row.score)
+            stats['score_max'] = row.score if stats['score_max'] is None else max(stats['score_max'], row.score)
+            if row.win_rate is not None:
+                stats['win_rate_count'] += 1
+                stats['win_rate_sum'] += row.win_rate
+            stats['trade_count_sum'] += row.trade_count or 0
+            stats['total_risks_sum'] += row.total_risks or 0
+            for level in RISK_LEVELS:
+                stats[f'risk_{level}'] += int(breakdown.get(level) or 0)
+
+    if buckets:
+        now = datetime.utcnow()
+        op.bulk_insert(rollups, [
+            dict(stats, id=str(uuid.uuid4()), user_id=user_id, period=period,
+                 bucket_start=start, updated_at=now)
+            for (user_id, period, start), stats in buckets.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_table('user_dashboard_rollups')
@@ -0,0 +1,33 @@
+"""Unique deriv trade per connection
+
+Revision ID: b83d5e0f7c19
+Revises: a61f3d8c2b47
+Create Date: 2026-10-17 18:22:40.917364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83d5e0f7c19'
+down_revision: Union[str, None] = 'a61f3d8c2b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Earlier syncs could store a trade twice; keep the first copy
+    op.execute(
+        "DELETE FROM deriv_trades WHERE id NOT IN ("
+        " SELECT keep_id FROM (SELECT min(id) AS keep_id FROM deriv_trades"
+        " GROUP BY connection_id, deriv_trade_id) AS keep)"
+    )
+    op.create_index('uq_deriv_trades_connection_trade', 'deriv_trades',
+                    ['connection_id', 'deriv_trade_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_deriv_trades_connection_trade', table_name='deriv_trades')
@@ -0,0 +1,40 @@
+"""Add connection sync cursor
+
+Revision ID: d52a9e1c4f06
+Revises: b83d5e0f7c19
+Create Date: 2026-10-17 19:47:12.530861
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd52a9e1c4f06'
+down_revision: Union[str, None] = 'b83d5e0f7c19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('deriv_connections', sa.Column('last_trade_sell_time', sa.DateTime(), nullable=True))
+    op.add_column('deriv_connections', sa.Column('last_trade_transaction_id', sa.String(), nullable=True))
+
+    # Start incremental syncs from the latest trade already stored
+    latest = (
+        "SELECT {} FROM deriv_trades t WHERE t.connection_id = deriv_connections.id"
+        " AND t.sell_time IS NOT NULL"
+        " ORDER BY t.sell_time DESC, CAST(t.transaction_id AS BIGINT) DESC LIMIT 1"
+    )
+    op.execute(
+        f"UPDATE deriv_connections SET last_trade_sell_time = ({latest.format('sell_time')}),"
+        f" last_trade_transaction_id = ({latest.format('transaction_id')})"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('deriv_connections') as batch_op:
+        batch_op.drop_column('last_trade_transaction_id')
+        batch_op.drop_column('last_trade_sell_time')
@@ -0,0 +1,27 @@
+"""Add analysis trades path
+
+Revision ID: f3a80c6d5b21
+Revises: e917c3b05a28
+Create Date: 2026-10-17 22:14:37.086215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a80c6d5b21'
+down_revision: Union[str, None] = 'e917c3b05a28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('analyses', sa.Column('trades_path', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('analyses') as batch_op:
+        batch_op.drop_column('trades_path')
@@ -3,14 +3,15 @@ Authentication with robust password hashing (bcrypt safe)
 """
 from datetime import datetime, timedelta
 from typing import Optional
+import uuid
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.database import get_db
-from api import models
+from api.database import get_async_db
+from api.utils.principal_cache import Principal, load_principal
 
 # Secret settings (use .env in production)
 SECRET_KEY = "your-secret-key-change-in-production"
@@ -52,6 +53,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    # Token id: principals are cached per token
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -68,7 +71,7 @@ def decode_access_token(token: str):
 # --------------------------
 async def get_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if credentials is None:
         return None
@@ -86,19 +89,19 @@ async def get_current_user(
     if user_id is None:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await load_principal(db, user_id, payload.get("jti"), payload.get("exp"))
     if user is None:
         raise credentials_exception
     return user
 
-async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 async def get_optional_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if credentials is None:
         return None
@@ -110,7 +113,6 @@ async def get_optional_user(
         user_id: str = payload.get("sub")
         if user_id is None:
             return None
-        user = db.query(models.User).filter(models.User.id == user_id).first()
-        return user
+        return await load_principal(db, user_id, payload.get("jti"), payload.get("exp"))
     except Exception:
         return None
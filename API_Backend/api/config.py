@@ -4,6 +4,7 @@ Configuration settings for the API
 from pydantic_settings import BaseSettings
 from typing import List, Optional
 import os
+import tempfile
 
 class Settings(BaseSettings):
     # API Settings
@@ -23,6 +24,11 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./tradeguard.db"
     ENCRYPTION_SECRET: str
+    # Fernet key pre-derived from ENCRYPTION_SECRET (python -m api.utils.encryption);
+    # skips PBKDF2 at startup
+    ENCRYPTION_KEY: Optional[str] = None
+    SECRET_CACHE_TTL_SECONDS: int = 300  # Decrypted tokens/keys kept in memory; 0 disables
+    SECRET_CACHE_MAX_ENTRIES: int = 1024
 
 # Deriv API settings (optional, for testing)
     DERIV_API_URL: str="https://deriv-api.crypto.com"
@@ -32,13 +38,74 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
     # File Upload
-    MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB; MT5 HTML parsing still holds the whole report in memory
+    MAX_CSV_UPLOAD_SIZE: int = 50 * 1024 * 1024  # 50MB; CSVs are parsed in chunks into a compact frame (peak under the file size)
+    CSV_CHUNK_ROWS: int = 100_000  # Rows parsed per chunk when reading trade CSVs
     ALLOWED_EXTENSIONS: List[str] = [".csv"]
     
     # OpenAI
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL: str = "gpt-4o-mini"
     
+    # Analysis worker pool
+    ANALYSIS_WORKERS: Optional[int] = None  # None = one per CPU, 0 = run in the threadpool
+    ANALYSIS_MAX_QUEUE: int = 8  # Jobs allowed to wait behind busy workers before 429
+    ANALYSIS_JOB_TIMEOUT: int = 300  # Seconds
+    ANALYSIS_MAX_JOBS_PER_WORKER: Optional[int] = 50  # Recycle worker processes after N jobs
+    ANALYSIS_RETRY_AFTER_SECONDS: int = 5
+    
+    # Asynchronous analysis jobs (?async_mode=true)
+    ANALYSIS_JOB_CONCURRENCY: int = 2  # Jobs advanced at the same time per API process
+    ANALYSIS_UPLOAD_DIR: str = os.path.join(tempfile.gettempdir(), "tradeguard_uploads")
+    
+    # Normalized trade frame of each analysis (api/utils/trade_store.py), for
+    # alerts and re-scoring; point this at persistent storage in production
+    TRADE_STORE_DIR: str = os.path.join(tempfile.gettempdir(), "tradeguard_trades")
+    TRADE_STORE_COMPRESSION: Optional[str] = "zstd"  # "lz4", or "" to map files without decompressing
+    
+    # Analysis result cache (keyed by trade data + thresholds + AI model)
+    ANALYSIS_CACHE_ENABLED: bool = True
+    ANALYSIS_CACHE_PATH: str = os.path.join(tempfile.gettempdir(), "tradeguard_analysis_cache.db")  # "" = memory only
+    ANALYSIS_CACHE_MEMORY_ENTRIES: int = 128
+    ANALYSIS_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    ANALYSIS_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    
+    # Authenticated user + settings snapshots, per process (api/utils/principal_cache.py)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60  # 0 disables the cache
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Automatic Deriv syncs (api/utils/sync_scheduler.py); one API process at a
+    # time holds the scheduler lease and starts them
+    SYNC_SCHEDULER_ENABLED: bool = True
+    SYNC_MAX_CONCURRENT: int = 8  # Syncs at once per process, scheduled and manual
+    SYNC_MAX_CONCURRENT_PER_APP: int = 2  # ... and per Deriv app_id
+    SYNC_JITTER_FRACTION: float = 0.1  # Start times spread over this share of the interval
+    SYNC_BACKOFF_BASE_SECONDS: int = 300  # Retry delay after one failure, doubled per failure
+    SYNC_BACKOFF_MAX_SECONDS: int = 86400
+    SYNC_LEASE_TTL_SECONDS: int = 60
+    SYNC_REFRESH_SECONDS: int = 60  # How often due times are reloaded from the database
+    # Syncs fold new trades into the connection's analysis state; patterns and
+    # the stored trade frame are recomputed from every trade this often
+    SYNC_FULL_ANALYSIS_HOURS: int = 24
+    
+    # Deriv call rate governor (api/utils/deriv_governor.py), per process.
+    # Rates halve on a rate-limit error and climb back while calls succeed
+    DERIV_APP_RATE_PER_SECOND: float = 20  # All calls of one Deriv app_id
+    DERIV_APP_BURST: int = 40
+    DERIV_ACCOUNT_RATE_PER_SECOND: float = 5  # Calls for one account/token
+    DERIV_ACCOUNT_BURST: int = 10
+    DERIV_RATE_LIMIT_COOLDOWN_SECONDS: int = 10  # Pause after a rate-limit error
+
+    # Deriv webhook ingestion (api/utils/webhook_ingest.py): trade events are
+    # batched over a short window and folded into the connection's analysis
+    WEBHOOK_BATCH_WINDOW_SECONDS: float = 0.5
+    WEBHOOK_MAX_BATCH: int = 500
+    DERIV_WEBHOOK_SECRET: Optional[str] = None  # HMAC-SHA256 key for event signatures; events are rejected while unset
+
+    # Economic calendar (CSV/JSON of time, currency, impact, title) used for
+    # news event checks; passed to the analysis pipeline by api.utils.analysis_cache
+    ECONOMIC_CALENDAR_PATH: Optional[str] = None
+    
     # Redis (for caching, optional)
     REDIS_URL: Optional[str] = None
     
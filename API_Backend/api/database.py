@@ -3,7 +3,6 @@ Database setup with AsyncIO support
 """
 from sqlalchemy import create_engine, inspect
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 import os
 import sys
@@ -23,12 +22,14 @@ else:
 # =====================================================
 # SYNCHRONOUS SETUP (LEGACY)
 # =====================================================
+# Only used to create and migrate the schema (init_db, apply_migrations,
+# scripts/). Request handlers use the async engine below so database I/O
+# never blocks the event loop.
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
     echo=False
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # =====================================================
 # ASYNCHRONOUS SETUP (NEW)
@@ -85,14 +86,6 @@ async def init_async_db():
         print(f"❌ Error initializing async database: {e}")
         return False
 
-# Dependency for Sync routes
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Dependency for Async routes
 async def get_async_db():
     async with AsyncSessionLocal() as session:
@@ -1,6 +1,7 @@
 from .user_models import User, UserSettings, Analysis, Report
 from .alert_models import PredictiveAlert, AlertSettings, AlertHistory
-from .integration_models import DerivConnection, DerivTrade, SyncLog, WebhookEvent
+from .integration_models import DerivConnection, DerivTrade, SyncLog, WebhookEvent, SchedulerLease
+from .dashboard_models import UserDashboardRollup
 
 __all__ = [
     "User",
@@ -14,4 +15,6 @@ __all__ = [
     "DerivTrade",
     "SyncLog",
     "WebhookEvent",
+    "SchedulerLease",
+    "UserDashboardRollup",
 ]
@@ -0,0 +1,284 @@
+"""
+Per-user dashboard rollups of analysis results.
+
+Analyses are aggregated into daily and weekly buckets (weeks start on
+Monday, UTC) so the dashboard and trend endpoints read a handful of rows
+instead of every analysis. The rollups are maintained in the same
+transaction that saves the analysis: an ``after_flush`` hook adds each new
+or newly scored analysis to its buckets with an atomic upsert, and
+recomputes a bucket from its analyses when a scored analysis changes or is
+deleted.
+"""
+from sqlalchemy import (
+    Column, Integer, String, Float, Date, DateTime, ForeignKey, UniqueConstraint,
+    case, delete, event, func, inspect, select
+)
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+import uuid
+from api.database import Base
+from .user_models import Analysis
+
+ROLLUP_PERIODS = ("day", "week")
+RISK_LEVELS = ("low", "medium", "high")
+
+def generate_uuid():
+    return str(uuid.uuid4())
+
+class UserDashboardRollup(Base):
+    __tablename__ = "user_dashboard_rollups"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    period = Column(String, nullable=False)  # "day", "week"
+    bucket_start = Column(Date, nullable=False)  # UTC day, or the Monday of the week
+
+    # Every analysis saved in the bucket
+    analysis_count = Column(Integer, nullable=False, default=0)
+
+    # Analyses with a score
+    score_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    score_min = Column(Float, nullable=True)
+    score_max = Column(Float, nullable=True)
+    win_rate_count = Column(Integer, nullable=False, default=0)
+    win_rate_sum = Column(Float, nullable=False, default=0.0)
+    trade_count_sum = Column(Integer, nullable=False, default=0)
+    total_risks_sum = Column(Integer, nullable=False, default=0)
+
+    # Detected risks by severity (sum of score_result["risk_breakdown"])
+    risk_low = Column(Integer, nullable=False, default=0)
+    risk_medium = Column(Integer, nullable=False, default=0)
+    risk_high = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "period", "bucket_start", name="uq_dashboard_rollup_bucket"),
+    )
+
+    @property
+    def average_score(self):
+        return self.score_sum / self.score_count if self.score_count else None
+
+    @property
+    def average_win_rate(self):
+        return self.win_rate_sum / self.win_rate_count if self.win_rate_count else None
+
+
+def bucket_start(period: str, moment: datetime):
+    """First day of the ``period`` bucket containing ``moment``"""
+    day = moment.date()
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def bucket_bounds(period: str, start):
+    """``created_at`` range [start, end) covered by a bucket"""
+    begin = datetime(start.year, start.month, start.day)
+    return begin, begin + timedelta(days=7 if period == "week" else 1)
+
+
+def empty_stats():
+    return {
+        "analysis_count": 0, "score_count": 0, "score_sum": 0.0,
+        "score_min": None, "score_max": None,
+        "win_rate_count": 0, "win_rate_sum": 0.0,
+        "trade_count_sum": 0, "total_risks_sum": 0,
+        "risk_low": 0, "risk_medium": 0, "risk_high": 0,
+    }
+
+
+def add_analysis(stats, score, win_rate, trade_count, total_risks, score_result, counted=True):
+    """Fold one analysis into ``stats``; ``counted=False`` adds only its results"""
+    if counted:
+        stats["analysis_count"] += 1
+    if score is None:
+        return stats
+    stats["score_count"] += 1
+    stats["score_sum"] += score
+    stats["score_min"] = score if stats["score_min"] is None else min(stats["score_min"], score)
+    stats["score_max"] = score if stats["score_max"] is None else max(stats["score_max"], score)
+    if win_rate is not None:
+        stats["win_rate_count"] += 1
+        stats["win_rate_sum"] += win_rate
+    stats["trade_count_sum"] += trade_count or 0
+    stats["total_risks_sum"] += total_risks or 0
+    breakdown = (score_result or {}).get("risk_breakdown") or {}
+    for level in RISK_LEVELS:
+        try:
+            stats[f"risk_{level}"] += int(breakdown.get(level) or 0)
+        except (TypeError, ValueError):
+            pass
+    return stats
+
+
+def _upsert_delta(connection, user_id, period, start, delta):
+    """Add ``delta`` to a bucket, creating it if needed, in one statement"""
+    table = UserDashboardRollup.__table__
+    values = dict(delta, id=generate_uuid(), user_id=user_id, period=period,
+                  bucket_start=start, updated_at=datetime.utcnow())
+    dialect = connection.dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(**values)
+        new = stmt.excluded
+        additive = [name for name in delta if name not in ("score_min", "score_max")]
+        updates = {name: table.c[name] + new[name] for name in additive}
+        updates["score_min"] = case(
+            (table.c.score_min.is_(None), new.score_min),
+            (new.score_min < table.c.score_min, new.score_min),
+            else_=table.c.score_min
+        )
+        updates["score_max"] = case(
+            (table.c.score_max.is_(None), new.score_max),
+            (new.score_max > table.c.score_max, new.score_max),
+            else_=table.c.score_max
+        )
+        updates["updated_at"] = new.updated_at
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "period", "bucket_start"], set_=updates
+        ))
+        return
+
+    # Other dialects: read-modify-write
+    key = (table.c.user_id == user_id) & (table.c.period == period) & (table.c.bucket_start == start)
+    row = connection.execute(select(table).where(key)).mappings().first()
+    if row is None:
+        connection.execute(table.insert().values(**values))
+        return
+    merged = {name: row[name] + value for name, value in delta.items()
+              if name not in ("score_min", "score_max")}
+    for name, pick in (("score_min", min), ("score_max", max)):
+        candidates = [v for v in (row[name], delta[name]) if v is not None]
+        merged[name] = pick(candidates) if candidates else None
+    merged["updated_at"] = values["updated_at"]
+    connection.execute(table.update().where(key).values(**merged))
+
+
+def recompute_bucket(connection, user_id, period, start):
+    """Rebuild one bucket from the analyses it covers"""
+    table = UserDashboardRollup.__table__
+    analyses = Analysis.__table__
+    begin, end = bucket_bounds(period, start)
+    rows = connection.execute(
+        select(analyses.c.score, analyses.c.win_rate, analyses.c.trade_count,
+               analyses.c.total_risks, analyses.c.score_result)
+        .where(analyses.c.user_id == user_id,
+               analyses.c.created_at >= begin,
+               analyses.c.created_at < end)
+    )
+    stats = empty_stats()
+    for row in rows:
+        add_analysis(stats, row.score, row.win_rate, row.trade_count, row.total_risks, row.score_result)
+
+    connection.execute(delete(table).where(
+        table.c.user_id == user_id, table.c.period == period, table.c.bucket_start == start
+    ))
+    if stats["analysis_count"]:
+        connection.execute(table.insert().values(
+            id=generate_uuid(), user_id=user_id, period=period, bucket_start=start,
+            updated_at=datetime.utcnow(), **stats
+        ))
+
+
+def rebuild_user_rollups(connection, user_id=None):
+    """Recompute every bucket of one user (or of all users) from their analyses"""
+    table = UserDashboardRollup.__table__
+    analyses = Analysis.__table__
+    query = select(
+        analyses.c.user_id, analyses.c.created_at, analyses.c.score, analyses.c.win_rate,
+        analyses.c.trade_count, analyses.c.total_risks, analyses.c.score_result
+    ).where(analyses.c.user_id.isnot(None), analyses.c.created_at.isnot(None))
+    clear = delete(table)
+    if user_id is not None:
+        query = query.where(analyses.c.user_id == user_id)
+        clear = clear.where(table.c.user_id == user_id)
+
+    buckets = {}
+    for row in connection.execute(query):
+        for period in ROLLUP_PERIODS:
+            key = (row.user_id, period, bucket_start(period, row.created_at))
+            stats = buckets.setdefault(key, empty_stats())
+            add_analysis(stats, row.score, row.win_rate, row.trade_count, row.total_risks, row.score_result)
+
+    connection.execute(clear)
+    if buckets:
+        now = datetime.utcnow()
+        connection.execute(table.insert(), [
+            dict(stats, id=generate_uuid(), user_id=key[0], period=key[1],
+                 bucket_start=key[2], updated_at=now)
+            for key, stats in buckets.items()
+        ])
+    return len(buckets)
+
+
+_TRACKED = ("user_id", "created_at", "score", "win_rate", "trade_count", "total_risks", "score_result")
+
+
+def _old_value(state, name):
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None if history.added else state.dict.get(name)
+
+
+@event.listens_for(Session, "after_flush")
+def _update_dashboard_rollups(session, flush_context):
+    """Keep the rollups in step with the analyses written by this flush"""
+    deltas = {}
+    stale = set()
+
+    def add(analysis, counted):
+        if analysis.user_id is None or analysis.created_at is None:
+            return
+        for period in ROLLUP_PERIODS:
+            key = (analysis.user_id, period, bucket_start(period, analysis.created_at))
+            add_analysis(deltas.setdefault(key, empty_stats()), analysis.score, analysis.win_rate,
+                         analysis.trade_count, analysis.total_risks,
+                         inspect(analysis).dict.get("score_result"), counted=counted)
+
+    def mark_stale(user_id, created_at):
+        if user_id is not None and created_at is not None:
+            stale.update((user_id, period, bucket_start(period, created_at)) for period in ROLLUP_PERIODS)
+
+    for obj in session.new:
+        if isinstance(obj, Analysis):
+            add(obj, counted=True)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Analysis):
+            continue
+        state = inspect(obj)
+        changed = [name for name in _TRACKED if state.attrs[name].history.has_changes()]
+        if not changed:
+            continue
+        old_user, old_created = _old_value(state, "user_id"), _old_value(state, "created_at")
+        moved = old_user != obj.user_id or old_created != obj.created_at
+        if (not moved and "score" in state.dict and _old_value(state, "score") is None
+                and "score_result" in state.dict):
+            # Scored for the first time (e.g. a finished analysis job)
+            add(obj, counted=False)
+        else:
+            mark_stale(old_user, old_created)
+            mark_stale(obj.user_id, obj.created_at)
+
+    for obj in session.deleted:
+        if isinstance(obj, Analysis):
+            mark_stale(_old_value(inspect(obj), "user_id"), _old_value(inspect(obj), "created_at"))
+
+    if not deltas and not stale:
+        return
+    connection = session.connection()
+    for key, delta in deltas.items():
+        if key not in stale and (delta["analysis_count"] or delta["score_count"]):
+            _upsert_delta(connection, *key, delta)
+    for key in stale:
+        recompute_bucket(connection, *key)
@@ -1,7 +1,7 @@
 """
 Database models for Deriv/MT5 integration
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Boolean, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -41,6 +41,16 @@ class DerivConnection(Base):
     total_syncs = Column(Integer, default=0)
     total_trades_synced = Column(Integer, default=0)
     
+    # High-water mark of the synced trades (latest sell time, then transaction
+    # id). Incremental syncs only ask Deriv for contracts sold after it.
+    last_trade_sell_time = Column(DateTime, nullable=True)
+    last_trade_transaction_id = Column(String, nullable=True)
+    
+    # Running TradeAnalysisAccumulator state of the synced trades, folded
+    # forward on each sync, with the last full analysis's patterns and trade
+    # frame (None means rebuild from the full history)
+    metrics_state = Column(JSON, nullable=True)
+    
     # Error tracking
     last_error = Column(Text, nullable=True)
     error_count = Column(Integer, default=0)
@@ -84,6 +94,12 @@ class DerivConnection(Base):
 
 class DerivTrade(Base):
     __tablename__ = "deriv_trades"
+    __table_args__ = (
+        # One row per Deriv trade per connection; the conflict target of the sync upsert
+        Index("uq_deriv_trades_connection_trade", "connection_id", "deriv_trade_id", unique=True),
+        # Trades of a connection in analysis order; syncs read the ones past the last analysed
+        Index("ix_deriv_trades_connection_purchase", "connection_id", "purchase_time"),
+    )
     
     id = Column(String, primary_key=True, default=generate_uuid)
     connection_id = Column(String, ForeignKey("deriv_connections.id"), nullable=False)
@@ -242,4 +258,13 @@ class WebhookEvent(Base):
             "processed_at": self.processed_at.isoformat() if self.processed_at else None,
             "analysis_triggered": self.analysis_triggered,
             "trade_id": self.trade_id
-        }
\ No newline at end of file
+        }
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"
+    
+    # One row per singleton job (e.g. "deriv_auto_sync"); the API process
+    # holding an unexpired lease is the only one that runs it
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,9 +1,9 @@
 """
 Database models for storing analyses and user data
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Boolean, ForeignKey, Index, event, inspect
 
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 import uuid
 from api.database import Base
@@ -69,23 +69,71 @@ class Analysis(Base):
     original_filename = Column(String)
     file_size = Column(Integer)  # in bytes
     trade_count = Column(Integer)
-    
-    # Analysis results (stored as JSON for flexibility)
-    metrics = Column(JSON, nullable=True)
-    risk_results = Column(JSON, nullable=True)
-    score_result = Column(JSON, nullable=True)
-    ai_explanations = Column(JSON, nullable=True)
+    trades_path = Column(String, nullable=True)  # Stored trade frame in TRADE_STORE_DIR (api/utils/trade_store.py)
+    
+    # Analysis results (stored as JSON for flexibility). These blobs are
+    # deferred: queries load them only with .options(undefer_group("results"))
+    # or when an attribute is first accessed.
+    metrics = deferred(Column(JSON, nullable=True), group="results")
+    risk_results = deferred(Column(JSON, nullable=True), group="results")
+    score_result = deferred(Column(JSON, nullable=True), group="results")
+    ai_explanations = deferred(Column(JSON, nullable=True), group="results")
+    
+    # Summary copied out of the JSON results on save, for SQL filtering and sorting
+    score = Column(Float, nullable=True, index=True)
+    grade = Column(String, nullable=True, index=True)
+    total_risks = Column(Integer, nullable=True)
+    win_rate = Column(Float, nullable=True)
+    net_profit = Column(Float, nullable=True)
     
     # Metadata
     status = Column(String, default="completed")  # pending, processing, completed, failed
     error_message = Column(String, nullable=True)
+    progress = Column(JSON, nullable=True)  # Job mode: current stage and per-stage timings
     
     created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     
     # Relationships
     user = relationship("User", back_populates="analyses")
     reports = relationship("Report", back_populates="analysis")
+    
+    # Keyset pagination of a user's history: (user_id, created_at, id)
+    __table_args__ = (
+        Index("ix_analyses_user_created_id", "user_id", "created_at", "id"),
+    )
+    
+    def refresh_summary(self):
+        """Copy score, grade, risk count, win rate and net profit out of the JSON results"""
+        score_result = self.score_result or {}
+        metrics = self.metrics or {}
+        self.score = _as_float(score_result.get("score"))
+        self.grade = score_result.get("grade")
+        total_risks = score_result.get("total_risks")
+        self.total_risks = int(total_risks) if total_risks is not None else None
+        self.win_rate = _as_float(metrics.get("win_rate"))
+        self.net_profit = _as_float(metrics.get("net_profit"))
+
+
+def _as_float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+@event.listens_for(Analysis, "before_insert")
+def _fill_analysis_summary(mapper, connection, target):
+    target.refresh_summary()
+
+
+@event.listens_for(Analysis, "before_update")
+def _refresh_analysis_summary(mapper, connection, target):
+    # Progress-only updates shouldn't load the deferred JSON results
+    attrs = inspect(target).attrs
+    if attrs.score_result.history.has_changes() or attrs.metrics.history.has_changes():
+        target.refresh_summary()
 
 class Report(Base):
     __tablename__ = "reports"
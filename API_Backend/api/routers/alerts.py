@@ -2,17 +2,21 @@
 API endpoints for predictive alerts
 """
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import undefer_group
 from sqlalchemy import desc, and_, or_, func
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 
 from api import schemas
-from api.database import get_db
+from api.database import get_async_db
 from api.auth import get_current_active_user
 from api.models.alert_models import PredictiveAlert, AlertSettings, AlertHistory
 from api.models import User, Analysis
 from api.utils.prediction_engine import PredictionEngine
+from api.utils.trade_store import load_trade_frame
 from api.schemas.alerts import (
     GenerateAlertsRequest, AlertResponse, GenerateAlertsResponse,
     AcknowledgeAlertRequest, SnoozeAlertRequest, AlertSettingsUpdate,
@@ -22,17 +26,18 @@ from api.schemas.alerts import (
 router = APIRouter()
 
 # Helper functions
-def get_or_create_alert_settings(db: Session, user_id: str) -> AlertSettings:
+async def get_or_create_alert_settings(db: AsyncSession, user_id: str) -> AlertSettings:
     """Get or create alert settings for user"""
-    settings = db.query(AlertSettings).filter(AlertSettings.user_id == user_id).first()
+    result = await db.execute(select(AlertSettings).where(AlertSettings.user_id == user_id))
+    settings = result.scalars().first()
     if not settings:
         settings = AlertSettings(user_id=user_id)
         db.add(settings)
-        db.commit()
-        db.refresh(settings)
+        await db.commit()
+        await db.refresh(settings)
     return settings
 
-def create_alert_history(db: Session, alert_id: str, user_id: str, action: str, details: Dict = None):
+async def create_alert_history(db: AsyncSession, alert_id: str, user_id: str, action: str, details: Dict = None):
     """Create alert history entry"""
     history = AlertHistory(
         alert_id=alert_id,
@@ -41,25 +46,32 @@ def create_alert_history(db: Session, alert_id: str, user_id: str, action: str,
         action_details=details
     )
     db.add(history)
-    db.commit()
+    await db.commit()
 
-def calculate_alert_stats(db: Session, user_id: str) -> AlertStats:
+async def count_alerts(db: AsyncSession, *conditions) -> int:
+    """Number of alerts matching all conditions"""
+    result = await db.execute(select(func.count(PredictiveAlert.id)).where(*conditions))
+    return result.scalar_one()
+
+async def calculate_alert_stats(db: AsyncSession, user_id: str) -> AlertStats:
     """Calculate alert statistics for user"""
     now = datetime.utcnow()
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
     
     # Total active alerts (not acknowledged or expired)
-    active_alerts = db.query(PredictiveAlert).filter(
+    active_alerts = await count_alerts(
+        db,
         PredictiveAlert.user_id == user_id,
         PredictiveAlert.status.in_(["active", "snoozed"]),
         or_(
             PredictiveAlert.expires_at.is_(None),
             PredictiveAlert.expires_at > now
         )
-    ).count()
+    )
     
     # High priority alerts (high or critical severity)
-    high_priority = db.query(PredictiveAlert).filter(
+    high_priority = await count_alerts(
+        db,
         PredictiveAlert.user_id == user_id,
         PredictiveAlert.severity.in_(["high", "critical"]),
         PredictiveAlert.status.in_(["active", "snoozed"]),
@@ -67,29 +79,32 @@ def calculate_alert_stats(db: Session, user_id: str) -> AlertStats:
             PredictiveAlert.expires_at.is_(None),
             PredictiveAlert.expires_at > now
         )
-    ).count()
+    )
     
     # Unacknowledged alerts
-    unacknowledged = db.query(PredictiveAlert).filter(
+    unacknowledged = await count_alerts(
+        db,
         PredictiveAlert.user_id == user_id,
         PredictiveAlert.status == "active",
         or_(
             PredictiveAlert.expires_at.is_(None),
             PredictiveAlert.expires_at > now
         )
-    ).count()
+    )
     
     # Today's generated alerts
-    today_generated = db.query(PredictiveAlert).filter(
+    today_generated = await count_alerts(
+        db,
         PredictiveAlert.user_id == user_id,
         PredictiveAlert.created_at >= today_start
-    ).count()
+    )
     
     # Today's acknowledged alerts
-    acknowledged_today = db.query(PredictiveAlert).filter(
+    acknowledged_today = await count_alerts(
+        db,
         PredictiveAlert.user_id == user_id,
         PredictiveAlert.acknowledged_at >= today_start
-    ).count()
+    )
     
     return AlertStats(
         active=active_alerts,
@@ -104,7 +119,7 @@ def calculate_alert_stats(db: Session, user_id: str) -> AlertStats:
 async def generate_predictive_alerts(
     request: GenerateAlertsRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Generate predictive alerts based on user's trading patterns
@@ -117,7 +132,7 @@ async def generate_predictive_alerts(
         )
     try:
         # Check if user has settings
-        settings = get_or_create_alert_settings(db, current_user.id)
+        settings = await get_or_create_alert_settings(db, current_user.id)
         if not settings.enabled:
             return schemas.APIResponse.success_response(
                 message="Alerts are disabled in settings",
@@ -126,10 +141,13 @@ async def generate_predictive_alerts(
         
         # Get latest analysis or specific analysis
         if request.analysis_id:
-            analysis = db.query(Analysis).filter(
-                Analysis.id == request.analysis_id,
-                Analysis.user_id == current_user.id
-            ).first()
+            result = await db.execute(
+                select(Analysis).options(undefer_group("results")).where(
+                    Analysis.id == request.analysis_id,
+                    Analysis.user_id == current_user.id
+                )
+            )
+            analysis = result.scalars().first()
             if not analysis:
                 raise HTTPException(
                     status_code=404,
@@ -137,9 +155,12 @@ async def generate_predictive_alerts(
                 )
         else:
             # Get latest analysis
-            analysis = db.query(Analysis).filter(
-                Analysis.user_id == current_user.id
-            ).order_by(desc(Analysis.created_at)).first()
+            result = await db.execute(
+                select(Analysis).options(undefer_group("results")).where(
+                    Analysis.user_id == current_user.id
+                ).order_by(desc(Analysis.created_at)).limit(1)
+            )
+            analysis = result.scalars().first()
         
         if not analysis:
             raise HTTPException(
@@ -149,20 +170,17 @@ async def generate_predictive_alerts(
         
         # Check if we should regenerate (if force or no recent alerts)
         if not request.force_regenerate:
-            recent_alerts = db.query(PredictiveAlert).filter(
-                PredictiveAlert.user_id == current_user.id,
-                PredictiveAlert.analysis_id == analysis.id,
-                PredictiveAlert.created_at >= datetime.utcnow() - timedelta(hours=24)
-            ).first()
-            
-            if recent_alerts:
-                # Return existing recent alerts
-                alerts = db.query(PredictiveAlert).filter(
+            result = await db.execute(
+                select(PredictiveAlert).where(
                     PredictiveAlert.user_id == current_user.id,
                     PredictiveAlert.analysis_id == analysis.id,
                     PredictiveAlert.created_at >= datetime.utcnow() - timedelta(hours=24)
-                ).all()
-                
+                )
+            )
+            alerts = result.scalars().all()
+            
+            if alerts:
+                # Return existing recent alerts
                 return schemas.APIResponse.success_response(
                     data={
                         "alerts": [alert.to_dict() for alert in alerts],
@@ -179,14 +197,14 @@ async def generate_predictive_alerts(
                     message="Using recent alerts (generated within 24 hours)"
                 )
         
-        # Generate new alerts
-        # TODO: We need trades data - for now, use metrics from analysis
-        # In future, we'll need to store trades separately
+        # Generate new alerts from the analysis's stored trades (analyses
+        # made before trades were kept get the metric-based alerts only)
+        trades = await run_in_threadpool(load_trade_frame, analysis.trades_path)
         
         # Create prediction engine with available data
         prediction_engine = PredictionEngine(
             metrics=analysis.metrics or {},
-            trades_data=[],  # Empty for now - we need to store trades
+            trades_data=trades if trades is not None else [],
             risk_results=analysis.risk_results or {}
         )
         
@@ -240,9 +258,11 @@ async def generate_predictive_alerts(
             
             db.add(alert)
             saved_alerts.append(alert)
+            # The history entry needs the alert's id
+            await db.flush()
             
             # Create history entry
-            create_alert_history(
+            await create_alert_history(
                 db=db,
                 alert_id=alert.id,
                 user_id=current_user.id,
@@ -250,11 +270,11 @@ async def generate_predictive_alerts(
                 details={"source": "prediction_engine"}
             )
         
-        db.commit()
+        await db.commit()
         
         # Refresh to get IDs
         for alert in saved_alerts:
-            db.refresh(alert)
+            await db.refresh(alert)
         
         # Calculate summary
         alert_summary = {
@@ -297,7 +317,7 @@ async def get_user_alerts(
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get alerts for the current user with filtering options
@@ -310,7 +330,7 @@ async def get_user_alerts(
         )
     try:
         # Base query
-        query = db.query(PredictiveAlert).filter(
+        query = select(PredictiveAlert).where(
             PredictiveAlert.user_id == current_user.id
         )
         
@@ -319,7 +339,7 @@ async def get_user_alerts(
             if status == "active":
                 # Active includes non-expired active or snoozed alerts
                 now = datetime.utcnow()
-                query = query.filter(
+                query = query.where(
                     PredictiveAlert.status.in_(["active", "snoozed"]),
                     or_(
                         PredictiveAlert.expires_at.is_(None),
@@ -327,23 +347,26 @@ async def get_user_alerts(
                     )
                 )
             else:
-                query = query.filter(PredictiveAlert.status == status)
+                query = query.where(PredictiveAlert.status == status)
         
         # Apply severity filter
         if severity:
-            query = query.filter(PredictiveAlert.severity == severity)
+            query = query.where(PredictiveAlert.severity == severity)
         
         # Order by creation date (newest first)
         query = query.order_by(desc(PredictiveAlert.created_at))
         
         # Get total count before pagination
-        total_count = query.count()
+        total_count = (await db.execute(
+            select(func.count()).select_from(query.order_by(None).subquery())
+        )).scalar_one()
         
         # Apply pagination
-        alerts = query.offset(offset).limit(limit).all()
+        result = await db.execute(query.offset(offset).limit(limit))
+        alerts = result.scalars().all()
         
         # Calculate stats
-        stats = calculate_alert_stats(db, current_user.id)
+        stats = await calculate_alert_stats(db, current_user.id)
         
         # Prepare response
         response_data = {
@@ -370,7 +393,7 @@ async def acknowledge_alert(
     alert_id: str,
     request: AcknowledgeAlertRequest = None,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Acknowledge an alert
@@ -382,10 +405,13 @@ async def acknowledge_alert(
             headers={"WWW-Authenticate": "Bearer"},
         )
     try:
-        alert = db.query(PredictiveAlert).filter(
-            PredictiveAlert.id == alert_id,
-            PredictiveAlert.user_id == current_user.id
-        ).first()
+        result = await db.execute(
+            select(PredictiveAlert).where(
+                PredictiveAlert.id == alert_id,
+                PredictiveAlert.user_id == current_user.id
+            )
+        )
+        alert = result.scalars().first()
         
         if not alert:
             raise HTTPException(
@@ -398,7 +424,7 @@ async def acknowledge_alert(
         alert.acknowledged_at = datetime.utcnow()
         
         # Create history entry
-        create_alert_history(
+        await create_alert_history(
             db=db,
             alert_id=alert.id,
             user_id=current_user.id,
@@ -406,7 +432,7 @@ async def acknowledge_alert(
             details={"notes": request.notes if request else None}
         )
         
-        db.commit()
+        await db.commit()
         
         return schemas.APIResponse.success_response(
             data=alert.to_dict(),
@@ -426,7 +452,7 @@ async def snooze_alert(
     alert_id: str,
     request: SnoozeAlertRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Snooze an alert for specified duration
@@ -438,10 +464,13 @@ async def snooze_alert(
             headers={"WWW-Authenticate": "Bearer"},
         )
     try:
-        alert = db.query(PredictiveAlert).filter(
-            PredictiveAlert.id == alert_id,
-            PredictiveAlert.user_id == current_user.id
-        ).first()
+        result = await db.execute(
+            select(PredictiveAlert).where(
+                PredictiveAlert.id == alert_id,
+                PredictiveAlert.user_id == current_user.id
+            )
+        )
+        alert = result.scalars().first()
         
         if not alert:
             raise HTTPException(
@@ -457,7 +486,7 @@ async def snooze_alert(
         alert.snoozed_until = snooze_until
         
         # Create history entry
-        create_alert_history(
+        await create_alert_history(
             db=db,
             alert_id=alert.id,
             user_id=current_user.id,
@@ -469,7 +498,7 @@ async def snooze_alert(
             }
         )
         
-        db.commit()
+        await db.commit()
         
         return schemas.APIResponse.success_response(
             data=alert.to_dict(),
@@ -487,7 +516,7 @@ async def snooze_alert(
 @router.get("/settings", response_model=schemas.APIResponse)
 async def get_alert_settings(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get alert settings for current user
@@ -499,7 +528,7 @@ async def get_alert_settings(
             headers={"WWW-Authenticate": "Bearer"},
         )
     try:
-        settings = get_or_create_alert_settings(db, current_user.id)
+        settings = await get_or_create_alert_settings(db, current_user.id)
         
         response_data = AlertSettingsResponse(
             user_id=settings.user_id,
@@ -532,7 +561,7 @@ async def get_alert_settings(
 async def update_alert_settings(
     settings_update: AlertSettingsUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update alert settings for current user
@@ -544,7 +573,7 @@ async def update_alert_settings(
             headers={"WWW-Authenticate": "Bearer"},
         )
     try:
-        settings = get_or_create_alert_settings(db, current_user.id)
+        settings = await get_or_create_alert_settings(db, current_user.id)
         
         # Update only provided fields
         update_data = settings_update.dict(exclude_unset=True)
@@ -552,8 +581,8 @@ async def update_alert_settings(
             setattr(settings, field, value)
         
         settings.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(settings)
+        await db.commit()
+        await db.refresh(settings)
         
         response_data = AlertSettingsResponse(
             user_id=settings.user_id,
@@ -588,7 +617,7 @@ async def update_alert_settings(
 @router.get("/stats", response_model=schemas.APIResponse)
 async def get_alert_statistics(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get alert statistics for current user
@@ -600,26 +629,30 @@ async def get_alert_statistics(
             headers={"WWW-Authenticate": "Bearer"},
         )
     try:
-        stats = calculate_alert_stats(db, current_user.id)
+        stats = await calculate_alert_stats(db, current_user.id)
         
         # Additional stats
         now = datetime.utcnow()
         thirty_days_ago = now - timedelta(days=30)
         
         # Alerts generated in last 30 days
-        recent_alerts = db.query(PredictiveAlert).filter(
+        recent_alerts = await count_alerts(
+            db,
             PredictiveAlert.user_id == current_user.id,
             PredictiveAlert.created_at >= thirty_days_ago
-        ).count()
+        )
         
         # Most common alert type
-        common_type = db.query(
-            PredictiveAlert.alert_type,
-            func.count(PredictiveAlert.id).label('count')
-        ).filter(
-            PredictiveAlert.user_id == current_user.id,
-            PredictiveAlert.created_at >= thirty_days_ago
-        ).group_by(PredictiveAlert.alert_type).order_by(func.count(PredictiveAlert.id).desc()).first()
+        result = await db.execute(
+            select(
+                PredictiveAlert.alert_type,
+                func.count(PredictiveAlert.id).label('count')
+            ).where(
+                PredictiveAlert.user_id == current_user.id,
+                PredictiveAlert.created_at >= thirty_days_ago
+            ).group_by(PredictiveAlert.alert_type).order_by(func.count(PredictiveAlert.id).desc()).limit(1)
+        )
+        common_type = result.first()
         
         response_data = {
             "current": stats,
@@ -642,7 +675,7 @@ async def get_alert_statistics(
 async def delete_alert(
     alert_id: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Delete an alert (soft delete by marking as expired)
@@ -654,10 +687,13 @@ async def delete_alert(
             headers={"WWW-Authenticate": "Bearer"},
         )
     try:
-        alert = db.query(PredictiveAlert).filter(
-            PredictiveAlert.id == alert_id,
-            PredictiveAlert.user_id == current_user.id
-        ).first()
+        result = await db.execute(
+            select(PredictiveAlert).where(
+                PredictiveAlert.id == alert_id,
+                PredictiveAlert.user_id == current_user.id
+            )
+        )
+        alert = result.scalars().first()
         
         if not alert:
             raise HTTPException(
@@ -669,7 +705,7 @@ async def delete_alert(
         alert.status = "expired"
         
         # Create history entry
-        create_alert_history(
+        await create_alert_history(
             db=db,
             alert_id=alert.id,
             user_id=current_user.id,
@@ -677,7 +713,7 @@ async def delete_alert(
             details={"source": "user_deleted"}
         )
         
-        db.commit()
+        await db.commit()
         
         return schemas.APIResponse.success_response(
             message="Alert deleted successfully"
@@ -2,22 +2,30 @@
 API endpoints for trade analysis (Async Optimized)
 """
 import pandas as pd
-import io
 import json
+import base64
 import numpy as np
 from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, BackgroundTasks
 from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import update, func, and_, or_
 from sqlalchemy.future import select
-from typing import Optional
-from datetime import datetime
+from sqlalchemy.orm import undefer_group
+from typing import Any, Dict, Optional
+from datetime import datetime, timedelta
 
 from api import schemas, models, auth
-from api.database import get_async_db  # Updated dependency
-from core.metrics_calculator import TradeMetricsCalculator
-from core.risk_rules import RiskRuleEngine
-from core.risk_scorer import RiskScorer
-from core.ai_explainer import AIRiskExplainer
+from api.models.user_models import generate_uuid
+from api.database import get_async_db, AsyncSessionLocal  # Updated dependency
+from api.config import settings
+from api.utils.analysis_executor import AnalysisQueueFull, AnalysisTimeout
+from api.utils.analysis_cache import cached_analysis
+from api.utils.analysis_jobs import analysis_job_queue
+from api.utils.principal_cache import load_principal
+from api.utils.trade_files import (
+    UploadTooLarge, is_supported_file, spool_upload, store_upload, load_stored_upload, remove_stored_upload
+)
+from api.utils.trade_store import save_trade_frame, load_trade_frame
 
 router = APIRouter()
 
@@ -44,82 +52,52 @@ def make_json_safe(obj):
         return obj
 
 
-from core.pattern_recognition import PatternDetector
-from core.news_service import NewsService
-
 # =====================================================
 # CORE PROCESSING (CPU-BOUND)
 # =====================================================
 
-def process_trade_data(df: pd.DataFrame, openai_api_key: Optional[str] = None):
-    """Process trade data and return analysis results (CPU Bound)"""
+async def run_analysis(
+    df: pd.DataFrame,
+    openai_api_key: Optional[str] = None,
+    metrics: Optional[Dict[str, Any]] = None
+):
+    """
+    Run process_trade_data on the shared analysis executor, or return the
+    cached result for identical data. Returns ``(results, cache_hit)``.
+    ``metrics`` already folded while parsing are not recomputed.
+    """
+    try:
+        results, _, cache_hit = await cached_analysis(df, openai_api_key, metrics=metrics)
+        return results, cache_hit
+    except AnalysisQueueFull:
+        raise HTTPException(
+            status_code=429,
+            detail="Analysis queue is full, please retry shortly",
+            headers={"Retry-After": str(settings.ANALYSIS_RETRY_AFTER_SECONDS)}
+        )
+    except AnalysisTimeout:
+        raise HTTPException(
+            status_code=504,
+            detail="Analysis timed out"
+        )
 
-    # Calculate metrics
-    calculator = TradeMetricsCalculator(df)
-    metrics = calculator.compute_all_metrics()
 
-    # Detect risks (Rules)
-    risk_engine = RiskRuleEngine(metrics, df)
-    risk_results = risk_engine.detect_all_risks()
-    
-    # Detect Event Trading Risks (Phase 3)
-    try:
-        news_service = NewsService()
-        event_risks = []
-        if 'entry_time' in df.columns:
-            # Ensure safe datetime conversion
-            times = pd.to_datetime(df['entry_time'], errors='coerce').dropna()
-            for t in times:
-                # t might be Timestamp, convert to python datetime if needed, or use as is (NewsService handles properties)
-                # Pandas Timestamp has .hour, .minute
-                risk = news_service.check_event_trading_risk(t)
-                if risk:
-                    event_risks.append(risk)
-        
-        if event_risks:
-            # Add to risk_details
-            if "risk_details" not in risk_results:
-                risk_results["risk_details"] = {}
-                
-            risk_results["risk_details"]["event_trading"] = {
-                "name": "News Event Trading",
-                "severity": 85,
-                "description": f"Detected {len(event_risks)} trades executed during high-impact news events (e.g. FOMC, NFP).",
-                "occurrences": len(event_risks)
-            }
-            # Also append to the main list if structure differs, but risk_details is consistent
-            
-    except Exception as e:
-        print(f"News risk detection failed: {e}")
-            
-    # Detect patterns (ML + Heuristics)
-    try:
-        pattern_detector = PatternDetector(df)
-        patterns = pattern_detector.detect_all_patterns()
-        # Merge patterns into risk_results so they are persisted in the same JSON column
-        risk_results["patterns"] = patterns
-    except Exception as e:
-        print(f"Pattern detection failed: {e}")
-        risk_results["patterns"] = []
-
-    # Calculate score
-    scorer = RiskScorer()
-    score_result = scorer.calculate_score(risk_results["risk_details"])
-
-    # Generate AI explanations using User's Key if provided
-    ai_explainer = AIRiskExplainer(openai_api_key=openai_api_key)
-    ai_explanations = ai_explainer.generate_explanation(
-        metrics,
-        risk_results,
-        score_result
-    )
+async def get_user_openai_key(db: AsyncSession, user_id: Optional[str]) -> Optional[str]:
+    """Decrypt the user's own OpenAI key, if they configured one"""
+    if not user_id:
+        return None
+
+    # Settings come with the (usually cached) principal
+    principal = await load_principal(db, user_id)
+    user_settings = principal.settings if principal else None
 
-    return {
-        "metrics": metrics,
-        "risk_results": risk_results,
-        "score_result": score_result,
-        "ai_explanations": ai_explanations
-    }
+    if user_settings and user_settings.openai_api_key_encrypted:
+        try:
+            from api.utils.encryption import encryption_service
+            return encryption_service.decrypt(user_settings.openai_api_key_encrypted)
+        except Exception as e:
+            print(f"Failed to decrypt user OpenAI key: {e}")
+    return None
 
 
 async def save_analysis_to_db(
@@ -129,18 +107,27 @@ async def save_analysis_to_db(
     original_filename: str,
     file_size: int,
     trade_count: int,
-    results: dict
+    results: dict,
+    df: Optional[pd.DataFrame] = None
 ):
-    """Save analysis results to database (Async)"""
+    """Save analysis results (and the analysed trades, if given) to database (Async)"""
 
     safe_results = make_json_safe(results)
 
+    # Keep the trades for alerts and re-scoring; the file is named after the analysis
+    analysis_id = generate_uuid()
+    trades_path = None
+    if df is not None:
+        trades_path = await run_in_threadpool(save_trade_frame, analysis_id, df)
+
     analysis = models.Analysis(
+        id=analysis_id,
         user_id=user.id if user else None,
         filename=filename,
         original_filename=original_filename,
         file_size=file_size,
         trade_count=trade_count,
+        trades_path=trades_path,
         metrics=safe_results.get("metrics"),
         risk_results=safe_results.get("risk_results"),
         score_result=safe_results.get("score_result"),
@@ -156,21 +143,177 @@ async def save_analysis_to_db(
 
 
 # =====================================================
-# ANALYZE CSV OR SAMPLE
+# ANALYSIS JOBS (ASYNC MODE)
 # =====================================================
 
-from api.utils.mt5_parser import parse_mt5_html
+# Stage -> percent complete when the stage starts
+JOB_STAGES = {
+    "queued": 0,
+    "parsing": 10,
+    "analyzing": 30,
+    "saving": 90,
+    "completed": 100
+}
+
+
+def advance_job_stage(analysis: models.Analysis, stage: str, **details):
+    """
+    Move a job row to ``stage``, recording how long the previous stage took.
+    Extra keyword arguments are stored in the progress dict as-is.
+    """
+    now = datetime.utcnow()
+    progress = dict(analysis.progress or {})
+    stage_timings = dict(progress.get("stage_timings") or {})
+
+    current = progress.get("stage")
+    stage_started_at = progress.get("stage_started_at")
+    if current and stage_started_at:
+        elapsed = now - datetime.fromisoformat(stage_started_at)
+        stage_timings[current] = round(elapsed.total_seconds(), 4)
+
+    progress.update({
+        "stage": stage,
+        "percent": JOB_STAGES.get(stage, progress.get("percent", 0)),
+        "stage_started_at": now.isoformat(),
+        "stage_timings": stage_timings
+    })
+    progress.update(details)
+
+    # Reassign so SQLAlchemy sees the JSON change
+    analysis.progress = progress
+
+
+async def create_analysis_job(
+    db: AsyncSession,
+    user: Optional[models.User],
+    stored_path: str,
+    original_filename: str,
+    file_size: int
+) -> models.Analysis:
+    """Insert a pending Analysis row for a stored upload and queue it"""
+    analysis = models.Analysis(
+        user_id=user.id if user else None,
+        filename=stored_path,
+        original_filename=original_filename,
+        file_size=file_size,
+        status="pending"
+    )
+    advance_job_stage(analysis, "queued")
+
+    db.add(analysis)
+    await db.commit()
+    await db.refresh(analysis)
+
+    analysis_job_queue.enqueue(analysis.id)
+    return analysis
+
+
+async def run_analysis_job(analysis_id: str):
+    """Advance one pending job through parsing, analysis and saving"""
+    async with AsyncSessionLocal() as db:
+        # Claim the job; another API process may have picked it up already
+        claimed = await db.execute(
+            update(models.Analysis)
+            .where(models.Analysis.id == analysis_id, models.Analysis.status == "pending")
+            .values(status="processing", started_at=datetime.utcnow())
+        )
+        await db.commit()
+        if claimed.rowcount != 1:
+            return
+
+        analysis = await db.get(models.Analysis, analysis_id)
+        stored_path = analysis.filename
+
+        try:
+            advance_job_stage(analysis, "parsing")
+            await db.commit()
+            df, metrics = await run_in_threadpool(load_stored_upload, stored_path)
+            analysis.trade_count = len(df)
+
+            advance_job_stage(analysis, "analyzing")
+            await db.commit()
+            openai_api_key = await get_user_openai_key(db, analysis.user_id)
+            results, pipeline_timings, cache_hit = await cached_analysis(
+                df, openai_api_key, reject_when_full=False, metrics=metrics
+            )
+
+            advance_job_stage(analysis, "saving", pipeline_timings=pipeline_timings, cache_hit=cache_hit)
+            await db.commit()
+            safe_results = make_json_safe(results)
+            analysis.metrics = safe_results.get("metrics")
+            analysis.risk_results = safe_results.get("risk_results")
+            analysis.score_result = safe_results.get("score_result")
+            analysis.ai_explanations = safe_results.get("ai_explanations")
+            analysis.trades_path = await run_in_threadpool(save_trade_frame, analysis.id, df)
+            analysis.status = "completed"
+            analysis.completed_at = datetime.utcnow()
+            advance_job_stage(analysis, "completed")
+            await db.commit()
+
+        except Exception as e:
+            await db.rollback()
+            analysis = await db.get(models.Analysis, analysis_id)
+            print(f"Analysis job {analysis_id} failed: {e}")
+            analysis.status = "failed"
+            analysis.error_message = str(e)
+            analysis.completed_at = datetime.utcnow()
+            advance_job_stage(analysis, "failed")
+            await db.commit()
+
+        finally:
+            await run_in_threadpool(remove_stored_upload, stored_path)
+
+
+async def resume_analysis_jobs():
+    """
+    Re-queue jobs left behind by a previous run: all pending jobs, plus
+    processing jobs that have clearly outlived the job timeout.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=2 * settings.ANALYSIS_JOB_TIMEOUT)
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.Analysis)
+            .where(
+                models.Analysis.status == "processing",
+                models.Analysis.started_at < stale_before
+            )
+            .values(status="pending")
+        )
+        await db.commit()
+
+        result = await db.execute(
+            select(models.Analysis.id)
+            .where(models.Analysis.status == "pending")
+            .order_by(models.Analysis.created_at.asc())
+        )
+        analysis_ids = result.scalars().all()
+
+    for analysis_id in analysis_ids:
+        analysis_job_queue.enqueue(analysis_id)
+    if analysis_ids:
+        print(f"Resumed {len(analysis_ids)} pending analysis jobs")
+
+
+# =====================================================
+# ANALYZE CSV OR SAMPLE
+# =====================================================
 
 @router.post("/trades", response_model=schemas.APIResponse)
 async def analyze_trades(
     file: Optional[UploadFile] = File(None),
     use_sample: bool = False,
+    async_mode: bool = False,
     background_tasks: BackgroundTasks = None,
     current_user: Optional[schemas.UserResponse] = Depends(auth.get_optional_user),
     db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Analyze trading data from uploaded CSV or MT5 HTML Report
+    Analyze trading data from uploaded CSV or MT5 HTML Report.
+    
+    With ``async_mode=true`` the upload is stored and queued, and the
+    response returns the pending analysis id immediately; poll
+    ``GET /api/analyze/{analysis_id}`` for progress and results.
     """
     try:
         if use_sample:
@@ -184,60 +327,71 @@ async def analyze_trades(
                 "exit_time": ["2024-01-01 11:00:00", "2024-01-01 11:30:00", "2024-01-01 13:00:00", "2024-01-01 12:45:00"]
             }
             df = pd.DataFrame(sample_data)
+            stored_path = None
             filename = "sample_data.csv"
             original_filename = "sample_data.csv"
             file_size = 1024
-            trade_count = len(df)
 
         else:
             if not file:
                 raise HTTPException(status_code=400, detail="No file uploaded")
 
-            filename = file.filename.lower()
-            if not (filename.endswith(".csv") or filename.endswith(".html") or filename.endswith(".htm")):
+            if not is_supported_file(file.filename):
                 raise HTTPException(status_code=400, detail="Only CSV and MT5 HTML files are supported")
 
-            # Async read
-            contents = await file.read()
-            
-            # Determine processing method
-            if filename.endswith(".csv"):
-                # Offload CSV parsing to threadpool
-                def parse_csv(content_bytes):
-                    return pd.read_csv(io.StringIO(content_bytes.decode("utf-8")))
-                
-                df = await run_in_threadpool(parse_csv, contents)
-            else:
-                # MT5 HTML Parsing
-                def parse_html_wrapper(content_bytes):
-                    return parse_mt5_html(content_bytes)
-                
-                df = await run_in_threadpool(parse_html_wrapper, contents)
-            
+            # Spool the upload to disk in chunks rather than reading it into memory
+            try:
+                stored_path, file_size = await spool_upload(file)
+            except UploadTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
             filename = file.filename
             original_filename = file.filename
-            file_size = len(contents)
-            trade_count = len(df)
+            df = None
+        metrics = None
+
+        if async_mode:
+            if stored_path is None:
+                stored_path = await run_in_threadpool(
+                    store_upload, df.to_csv(index=False).encode("utf-8"), filename
+                )
+
+            try:
+                if not analysis_job_queue.running:
+                    raise HTTPException(status_code=503, detail="Analysis job queue is not running")
+
+                analysis = await create_analysis_job(
+                    db=db,
+                    user=current_user,
+                    stored_path=stored_path,
+                    original_filename=original_filename,
+                    file_size=file_size
+                )
+            except Exception:
+                await run_in_threadpool(remove_stored_upload, stored_path)
+                raise
+
+            return schemas.APIResponse.success_response(
+                data=make_json_safe({
+                    "analysis_id": analysis.id,
+                    "status": analysis.status,
+                    "progress": analysis.progress
+                }),
+                message="Analysis queued"
+            )
+
+        if df is None:
+            # Offload CSV / MT5 HTML parsing to threadpool
+            try:
+                df, metrics = await run_in_threadpool(load_stored_upload, stored_path)
+            finally:
+                await run_in_threadpool(remove_stored_upload, stored_path)
+        trade_count = len(df)
 
         # Prepare OpenAI key if available
-        openai_api_key = None
-        if current_user:
-            # We need to fetch the full user settings + decrypted key
-            # Since current_user is from a token dependency, it might not have the settings relation loaded or refreshed
-            # Let's fetch settings explicitly
-            query = select(models.UserSettings).where(models.UserSettings.user_id == current_user.id)
-            settings_res = await db.execute(query)
-            user_settings = settings_res.scalars().first()
-            
-            if user_settings and user_settings.openai_api_key_encrypted:
-                try:
-                    from api.utils.encryption import encryption_service
-                    openai_api_key = encryption_service.decrypt(user_settings.openai_api_key_encrypted)
-                except Exception as e:
-                    print(f"Failed to decrypt user OpenAI key: {e}")
-
-        # Offload heavy calculation to threadpool
-        results = await run_in_threadpool(process_trade_data, df, openai_api_key)
+        openai_api_key = await get_user_openai_key(db, current_user.id if current_user else None)
+
+        # Offload heavy calculation to the analysis worker pool
+        results, cache_hit = await run_analysis(df, openai_api_key, metrics)
 
         # Async save
         analysis = await save_analysis_to_db(
@@ -247,11 +401,13 @@ async def analyze_trades(
             original_filename=original_filename,
             file_size=file_size,
             trade_count=trade_count,
-            results=results
+            results=results,
+            df=df
         )
 
         response_data = make_json_safe({
             "analysis_id": analysis.id,
+            "cache_hit": cache_hit,
             **results
         })
 
@@ -279,7 +435,8 @@ async def get_analysis(
     current_user: Optional[schemas.UserResponse] = Depends(auth.get_optional_user),
     db: AsyncSession = Depends(get_async_db)
 ):
-    query = select(models.Analysis).where(models.Analysis.id == analysis_id)
+    query = select(models.Analysis).where(models.Analysis.id == analysis_id)\
+        .options(undefer_group("results"))
     result = await db.execute(query)
     analysis = result.scalars().first()
 
@@ -292,11 +449,14 @@ async def get_analysis(
     response_data = make_json_safe({
         "id": analysis.id,
         "status": analysis.status,
+        "progress": analysis.progress,
+        "error_message": analysis.error_message,
         "metrics": analysis.metrics,
         "risk_results": analysis.risk_results,
         "score_result": analysis.score_result,
         "ai_explanations": analysis.ai_explanations,
         "created_at": analysis.created_at,
+        "started_at": analysis.started_at,
         "completed_at": analysis.completed_at,
         "filename": analysis.original_filename,
         "trade_count": analysis.trade_count
@@ -305,10 +465,84 @@ async def get_analysis(
     return schemas.APIResponse.success_response(data=response_data)
 
 
+@router.post("/{analysis_id}/rescore", response_model=schemas.APIResponse)
+async def rescore_analysis(
+    analysis_id: str,
+    current_user: Optional[schemas.UserResponse] = Depends(auth.get_optional_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Re-run the analysis on its stored trades (e.g. after the risk rules
+    changed) and update its results in place, without a re-upload
+    """
+    try:
+        # Re-scoring overwrites results and spends the owner's OpenAI key
+        if current_user is None:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+
+        analysis = await db.get(models.Analysis, analysis_id)
+
+        if not analysis:
+            raise HTTPException(status_code=404, detail="Analysis not found")
+
+        if analysis.user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized")
+
+        df = await run_in_threadpool(load_trade_frame, analysis.trades_path)
+        if df is None:
+            raise HTTPException(
+                status_code=409,
+                detail="The trades of this analysis were not stored; upload the file again"
+            )
+
+        openai_api_key = await get_user_openai_key(db, analysis.user_id)
+        results, cache_hit = await run_analysis(df, openai_api_key)
+
+        safe_results = make_json_safe(results)
+        analysis.metrics = safe_results.get("metrics")
+        analysis.risk_results = safe_results.get("risk_results")
+        analysis.score_result = safe_results.get("score_result")
+        analysis.ai_explanations = safe_results.get("ai_explanations")
+        analysis.completed_at = datetime.utcnow()
+        await db.commit()
+
+        return schemas.APIResponse.success_response(
+            data=make_json_safe({
+                "analysis_id": analysis.id,
+                "cache_hit": cache_hit,
+                **results
+            }),
+            message="Analysis re-scored successfully"
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error re-scoring analysis: {str(e)}"
+        )
+
+
 # =====================================================
 # LIST ANALYSES
 # =====================================================
 
+def encode_cursor(created_at: datetime, analysis_id: str) -> str:
+    """Opaque keyset cursor for the row at (created_at, id)"""
+    raw = json.dumps([created_at.isoformat(), analysis_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; 400 for anything that isn't a cursor we issued"""
+    try:
+        created_at, analysis_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), str(analysis_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/", response_model=schemas.APIResponse)
 async def list_analyses(
     skip: int = 0,
@@ -316,46 +550,65 @@ async def list_analyses(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     min_score: Optional[float] = None,
+    grade: Optional[str] = None,
+    cursor: Optional[str] = None,
     current_user: Optional[schemas.UserResponse] = Depends(auth.get_optional_user),
     db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    List the user's analyses, newest first.
+    
+    Filtering, counting and ordering run in SQL on the indexed summary
+    columns. Pass the returned ``next_cursor`` as ``cursor`` to fetch the
+    next page by keyset on (created_at, id); ``skip`` is still honoured
+    when no cursor is given.
+    """
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
 
-    # Async Query with Filters
-    query = select(models.Analysis).where(models.Analysis.user_id == current_user.id)
-
+    filters = [models.Analysis.user_id == current_user.id]
     if start_date:
-        query = query.where(models.Analysis.created_at >= start_date)
+        filters.append(models.Analysis.created_at >= start_date)
     if end_date:
-        query = query.where(models.Analysis.created_at <= end_date)
-    # Check score within JSON column requires casting or simple python filtering.
-    # SQL filtering on JSON is dialect specific (Postgres vs SQLite).
-    # For SQLite, we might fetch and filter in Python if volume is low, or use specific JSON operators.
-    # Given we are using SQLite + aiosqlite, let's filter in python for complex JSON fields if needed,
-    # BUT `score_result` is JSON. Extraction is messy in generic SQLAlchemy.
-    # Recommendation: Add a `score` float column to Analysis model for simpler indexing/querying.
-    # For now, we will FILTER IN PYTHON for min_score or ignore it if efficient paging is needed.
-    
-    query = query.order_by(models.Analysis.created_at.desc())
-    
-    # Execution
+        filters.append(models.Analysis.created_at <= end_date)
+    if min_score is not None:
+        filters.append(models.Analysis.score >= min_score)
+    if grade:
+        filters.append(models.Analysis.grade == grade)
+
+    total = (await db.execute(
+        select(func.count()).select_from(models.Analysis).where(*filters)
+    )).scalar_one()
+
+    # Only the summary columns; the JSON results stay in the database
+    query = select(
+        models.Analysis.id,
+        models.Analysis.original_filename,
+        models.Analysis.trade_count,
+        models.Analysis.score,
+        models.Analysis.grade,
+        models.Analysis.total_risks,
+        models.Analysis.win_rate,
+        models.Analysis.net_profit,
+        models.Analysis.created_at,
+        models.Analysis.status
+    ).where(*filters)
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(or_(
+            models.Analysis.created_at < cursor_created_at,
+            and_(models.Analysis.created_at == cursor_created_at, models.Analysis.id < cursor_id)
+        ))
+    else:
+        query = query.offset(skip)
+    query = query.order_by(models.Analysis.created_at.desc(), models.Analysis.id.desc()).limit(limit)
+
     result = await db.execute(query)
-    all_analyses = result.scalars().all()  # Fetch all for python filtering (warn: scaling issue)
-
-    # In-memory filtering for JSON field score
-    filtered_analyses = []
-    for a in all_analyses:
-        if min_score is not None:
-             score = a.score_result.get("score", 0) if a.score_result else 0
-             if score < min_score:
-                 continue
-        filtered_analyses.append(a)
-
-    total = len(filtered_analyses)
-    
-    # Pagination in Python (post-filter)
-    paginated = filtered_analyses[skip : skip + limit]
+    page = result.all()
+
+    next_cursor = None
+    if len(page) == limit and page:
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
 
     response_data = make_json_safe({
         "analyses": [
@@ -363,16 +616,20 @@ async def list_analyses(
                 "id": a.id,
                 "filename": a.original_filename,
                 "trade_count": a.trade_count,
-                "score": a.score_result.get("score") if a.score_result else None,
-                "grade": a.score_result.get("grade") if a.score_result else None,
+                "score": a.score,
+                "grade": a.grade,
+                "total_risks": a.total_risks,
+                "win_rate": a.win_rate,
+                "net_profit": a.net_profit,
                 "created_at": a.created_at,
                 "status": a.status
             }
-            for a in paginated
+            for a in page
         ],
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": next_cursor
     })
 
     return schemas.APIResponse.success_response(data=response_data)
@@ -392,34 +649,36 @@ async def get_analysis_trends(
     
     cutoff_date = datetime.utcnow() - timedelta(days=days)
     
-    query = select(models.Analysis).where(
-        models.Analysis.user_id == current_user.id,
-        models.Analysis.created_at >= cutoff_date,
-        models.Analysis.status == "completed"
-    ).order_by(models.Analysis.created_at.asc())
+    # One point per day from the daily rollups
+    Rollup = models.UserDashboardRollup
+    query = select(Rollup).where(
+        Rollup.user_id == current_user.id,
+        Rollup.period == "day",
+        Rollup.bucket_start >= cutoff_date.date(),
+        Rollup.score_count > 0
+    ).order_by(Rollup.bucket_start.asc())
     
-    result = await db.execute(query)
-    analyses = result.scalars().all()
+    buckets = (await db.execute(query)).scalars().all()
     
     # Aggregate data
-    trend_data = []
-    
-    for a in analyses:
-        if not a.score_result:
-            continue
-            
-        trend_data.append({
-            "date": a.created_at.isoformat(),
-            "score": a.score_result.get("score"),
-            "trade_count": a.trade_count,
-            "win_rate": a.metrics.get("win_rate") if a.metrics else 0
-        })
+    trend_data = [
+        {
+            "date": bucket.bucket_start.isoformat(),
+            "score": round(bucket.average_score, 2),
+            "best_score": bucket.score_max,
+            "worst_score": bucket.score_min,
+            "trade_count": bucket.trade_count_sum,
+            "win_rate": round(bucket.average_win_rate, 2) if bucket.win_rate_count else 0,
+            "analysis_count": bucket.score_count
+        }
+        for bucket in buckets
+    ]
     
     return schemas.APIResponse.success_response(
         data={
             "trends": trend_data,
             "period_days": days,
-            "analysis_count": len(trend_data)
+            "analysis_count": sum(point["analysis_count"] for point in trend_data)
         }
     )
 
@@ -444,7 +703,7 @@ async def quick_analyze(
             raise HTTPException(status_code=400, detail="No trade data provided")
 
         # Offload calculation
-        results = await run_in_threadpool(process_trade_data, df)
+        results, cache_hit = await run_analysis(df)
 
         # Async save
         analysis = await save_analysis_to_db(
@@ -454,11 +713,13 @@ async def quick_analyze(
             original_filename="quick_analysis.json",
             file_size=len(json.dumps(make_json_safe(request))),
             trade_count=len(df),
-            results=results
+            results=results,
+            df=df
         )
 
         response_data = make_json_safe({
             "analysis_id": analysis.id,
+            "cache_hit": cache_hit,
             **results
         })
 
@@ -467,6 +728,8 @@ async def quick_analyze(
             message="Quick analysis completed successfully"
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
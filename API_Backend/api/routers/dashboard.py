@@ -1,22 +1,24 @@
 """
 API endpoints for dashboard data
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import load_only, undefer_group
 from sqlalchemy import func, desc
 from datetime import datetime, timedelta
 from typing import Optional
-import statistics
 
 from api import schemas, models, auth
-from api.database import get_db
+from api.database import get_async_db
+from api.models.dashboard_models import bucket_start
 
 router = APIRouter()
 
 @router.get("/summary", response_model=schemas.APIResponse)
 async def get_dashboard_summary(
     current_user: schemas.UserResponse = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get dashboard summary data
@@ -27,13 +29,21 @@ async def get_dashboard_summary(
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    # Get user's analyses
-    analyses = db.query(models.Analysis)\
-        .filter(models.Analysis.user_id == current_user.id)\
-        .order_by(desc(models.Analysis.created_at))\
-        .all()
+    Rollup = models.UserDashboardRollup
+    # Totals and risk distribution over the user's daily buckets
+    totals = (await db.execute(
+        select(
+            func.coalesce(func.sum(Rollup.analysis_count), 0),
+            func.coalesce(func.sum(Rollup.score_count), 0),
+            func.coalesce(func.sum(Rollup.score_sum), 0.0),
+            func.coalesce(func.sum(Rollup.risk_low), 0),
+            func.coalesce(func.sum(Rollup.risk_medium), 0),
+            func.coalesce(func.sum(Rollup.risk_high), 0)
+        ).where(Rollup.user_id == current_user.id, Rollup.period == "day")
+    )).one()
+    total_analyses, score_count, score_sum, risk_low, risk_medium, risk_high = totals
     
-    if not analyses:
+    if not total_analyses:
         response_data = schemas.DashboardSummary(
             total_analyses=0,
             average_score=0,
@@ -43,17 +53,17 @@ async def get_dashboard_summary(
         )
         return schemas.APIResponse.success_response(data=response_data)
     
-    # Calculate statistics
-    total_analyses = len(analyses)
-    
     # Average score (only from completed analyses with scores)
-    completed_analyses = [a for a in analyses if a.score_result and a.score_result.get("score")]
-    if completed_analyses:
-        average_score = statistics.mean([a.score_result["score"] for a in completed_analyses])
-    else:
-        average_score = 0
+    average_score = score_sum / score_count if score_count else 0
     
-    # Recent analyses (last 5)
+    # Recent analyses (last 5), loaded in full
+    recent = (await db.execute(
+        select(models.Analysis)
+        .options(undefer_group("results"))
+        .where(models.Analysis.user_id == current_user.id)
+        .order_by(desc(models.Analysis.created_at), desc(models.Analysis.id))
+        .limit(5)
+    )).scalars().all()
     recent_analyses = [
         schemas.AnalysisResponse(
             id=a.id,
@@ -65,40 +75,33 @@ async def get_dashboard_summary(
             created_at=a.created_at,
             completed_at=a.completed_at
         )
-        for a in analyses[:5]
+        for a in recent
     ]
     
     # Risk distribution
-    risk_distribution = {"low": 0, "medium": 0, "high": 0}
-    for a in completed_analyses:
-        breakdown = a.score_result.get("risk_breakdown", {})
-        for risk_level, count in breakdown.items():
-            if risk_level in risk_distribution:
-                risk_distribution[risk_level] += count
+    risk_distribution = {"low": risk_low, "medium": risk_medium, "high": risk_high}
     
-    # Improvement trend (last 30 days)
+    # Improvement trend (weeks of the last 30 days)
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_analyses_30d = [
-        a for a in completed_analyses 
-        if a.created_at >= thirty_days_ago
-    ]
+    weeks = (await db.execute(
+        select(Rollup)
+        .where(
+            Rollup.user_id == current_user.id,
+            Rollup.period == "week",
+            Rollup.bucket_start >= bucket_start("week", thirty_days_ago),
+            Rollup.score_count > 0
+        )
+        .order_by(Rollup.bucket_start)
+    )).scalars().all()
     
     improvement_trend = []
-    if len(recent_analyses_30d) > 1:
-        # Group by week
-        weekly_scores = {}
-        for a in recent_analyses_30d:
-            week = a.created_at.isocalendar()[1]  # Week number
-            if week not in weekly_scores:
-                weekly_scores[week] = []
-            weekly_scores[week].append(a.score_result["score"])
-        
-        for week, scores in sorted(weekly_scores.items()):
-            avg_score = statistics.mean(scores)
+    if sum(w.score_count for w in weeks) > 1:
+        for w in weeks:
             improvement_trend.append({
-                "week": week,
-                "average_score": avg_score,
-                "analysis_count": len(scores)
+                "week": w.bucket_start.isocalendar()[1],  # Week number
+                "week_start": w.bucket_start.isoformat(),
+                "average_score": w.average_score,
+                "analysis_count": w.score_count
             })
     
     response_data = schemas.DashboardSummary(
@@ -115,10 +118,10 @@ async def get_dashboard_summary(
 async def get_performance_metrics(
     period: str = "month",  # day, week, month, year
     current_user: schemas.UserResponse = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get performance metrics over time
+    Get performance metrics over time, one point per day (per week for a year)
     """
     if current_user is None:
         raise HTTPException(
@@ -136,30 +139,33 @@ async def get_performance_metrics(
         start_date = now - timedelta(days=30)
     else:  # year
         start_date = now - timedelta(days=365)
+    bucket_period = "week" if period == "year" else "day"
     
-    # Get analyses in period
-    analyses = db.query(models.Analysis)\
-        .filter(
-            models.Analysis.user_id == current_user.id,
-            models.Analysis.created_at >= start_date,
-            models.Analysis.score_result.isnot(None)
-        )\
-        .order_by(models.Analysis.created_at)\
-        .all()
+    # Get the scored buckets in the period
+    Rollup = models.UserDashboardRollup
+    buckets = (await db.execute(
+        select(Rollup)
+        .where(
+            Rollup.user_id == current_user.id,
+            Rollup.period == bucket_period,
+            Rollup.bucket_start >= bucket_start(bucket_period, start_date),
+            Rollup.score_count > 0
+        )
+        .order_by(Rollup.bucket_start)
+    )).scalars().all()
     
     # Format response
     metrics_data = []
-    for analysis in analyses:
-        if analysis.metrics and analysis.score_result:
-            metrics_data.append({
-                "date": analysis.created_at.isoformat(),
-                "score": analysis.score_result.get("score"),
-                "grade": analysis.score_result.get("grade"),
-                "win_rate": analysis.metrics.get("win_rate"),
-                "profit_factor": analysis.metrics.get("profit_factor"),
-                "max_drawdown": analysis.metrics.get("max_drawdown_pct"),
-                "risk_count": analysis.score_result.get("total_risks", 0)
-            })
+    for bucket in buckets:
+        metrics_data.append({
+            "date": bucket.bucket_start.isoformat(),
+            "score": round(bucket.average_score, 2),
+            "best_score": bucket.score_max,
+            "worst_score": bucket.score_min,
+            "win_rate": round(bucket.average_win_rate, 2) if bucket.win_rate_count else 0,
+            "risk_count": round(bucket.total_risks_sum / bucket.score_count, 2),
+            "analysis_count": bucket.score_count
+        })
     
     # Calculate trends
     trends = {}
@@ -170,18 +176,20 @@ async def get_performance_metrics(
         trends = {
             "score_change": round(last["score"] - first["score"], 2),
             "win_rate_change": round(last.get("win_rate", 0) - first.get("win_rate", 0), 2),
-            "risk_count_change": last.get("risk_count", 0) - first.get("risk_count", 0)
+            "risk_count_change": round(last.get("risk_count", 0) - first.get("risk_count", 0), 2)
         }
     
+    analyses_count = sum(b.score_count for b in buckets)
     response_data = {
         "period": period,
-        "analyses_count": len(metrics_data),
+        "bucket": bucket_period,
+        "analyses_count": analyses_count,
         "metrics": metrics_data,
         "trends": trends,
         "summary": {
-            "average_score": round(statistics.mean([m["score"] for m in metrics_data]), 2) if metrics_data else 0,
-            "best_score": max([m["score"] for m in metrics_data]) if metrics_data else 0,
-            "worst_score": min([m["score"] for m in metrics_data]) if metrics_data else 0
+            "average_score": round(sum(b.score_sum for b in buckets) / analyses_count, 2) if analyses_count else 0,
+            "best_score": max(b.score_max for b in buckets) if buckets else 0,
+            "worst_score": min(b.score_min for b in buckets) if buckets else 0
         }
     }
     
@@ -191,7 +199,7 @@ async def get_performance_metrics(
 async def get_insights(
     limit: int = 3,
     current_user: schemas.UserResponse = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get personalized insights based on user's trading history
@@ -202,15 +210,17 @@ async def get_insights(
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    # Get recent analyses
-    analyses = db.query(models.Analysis)\
-        .filter(
+    # Get recent analyses (only the JSON the insights read)
+    analyses = (await db.execute(
+        select(models.Analysis)
+        .options(load_only(models.Analysis.risk_results, models.Analysis.score_result))
+        .where(
             models.Analysis.user_id == current_user.id,
             models.Analysis.score_result.isnot(None)
-        )\
-        .order_by(desc(models.Analysis.created_at))\
-        .limit(10)\
-        .all()
+        )
+        .order_by(desc(models.Analysis.created_at))
+        .limit(10)
+    )).scalars().all()
     
     if not analyses:
         return schemas.APIResponse.success_response(
@@ -2,34 +2,72 @@
 API endpoints for Deriv/MT5 integration (Async Optimized)
 """
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import desc, and_, or_, func, update, delete
+from sqlalchemy import desc, and_, or_, func, update, delete, bindparam
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import asyncio
+import hashlib
+import hmac
+import json
 
 from api import schemas
+from api.config import settings
 from api.database import get_async_db, AsyncSessionLocal
 from api.auth import get_current_active_user
 from api.models import User, Analysis
-from api.models.integration_models import DerivConnection, DerivTrade, SyncLog, WebhookEvent
+from api.models.integration_models import DerivConnection, DerivTrade, SyncLog, WebhookEvent, generate_uuid
 from api.utils.encryption import encryption_service
 from api.utils.deriv_client import DerivAPIClient
+from api.utils.deriv_governor import deriv_governor, is_rate_limited
+from api.utils.sync_scheduler import sync_scheduler
+from api.utils.webhook_ingest import webhook_ingest_queue
+from api.utils.trade_store import save_trade_frame
 from api.schemas.integrations import (
     DerivConnectRequest, ConnectionStatusResponse, SyncResultResponse,
     ConnectionResponse, SyncTradesRequest, UpdateConnectionRequest,
     WebhookEventRequest, WebhookResponse, ConnectionStats
 )
-from core.metrics_calculator import TradeMetricsCalculator
-from core.risk_rules import RiskRuleEngine
-from core.risk_scorer import RiskScorer
-from core.ai_explainer import AIRiskExplainer
-from core.pattern_recognition import PatternDetector
-from core.news_service import NewsService
+from api.utils.analysis_cache import cached_analysis
+from core.analysis_pipeline import TradeAnalysisAccumulator, process_folded_trades
+from core.metrics_accumulator import OutOfOrderTrades
 
 router = APIRouter()
 
+# DerivTrade fields the metrics are computed from; changing any of them on an
+# already-synced trade invalidates the connection's metrics accumulator
+METRIC_TRADE_FIELDS = ("profit", "stake", "purchase_time", "sell_time", "expiry_time", "symbol")
+
+# DerivTrade columns a synced analysis reads (not whole rows with their raw
+# Deriv payloads)
+SYNCED_TRADE_COLUMNS = (
+    DerivTrade.id, DerivTrade.symbol, DerivTrade.profit, DerivTrade.stake,
+    DerivTrade.purchase_time, DerivTrade.sell_time, DerivTrade.expiry_time
+)
+
+# DerivTrade columns written by the sync upsert, with their insert defaults
+# (keys, links and commission are left alone on existing rows)
+UPSERT_TRADE_FIELDS = {
+    "transaction_id": None, "contract_id": None, "symbol": "", "contract_type": "",
+    "currency": "USD", "buy_price": 0, "sell_price": None, "barrier": None, "barrier2": None,
+    "stake": 0, "payout": None, "profit": 0, "purchase_time": None, "expiry_time": None,
+    "sell_time": None, "duration": None, "status": "unknown", "exit_spot": None, "raw_data": None
+}
+
+# Incremental syncs re-read this much before the high-water mark, in case
+# Deriv's sell times and ours disagree slightly; re-read trades are skipped
+INCREMENTAL_SYNC_OVERLAP = timedelta(minutes=5)
+
+# Key prefix of webhook trades whose buy transaction id isn't known yet
+# ("contract:<contract_id>"); the upsert swaps it for the synced trade's key
+PROVISIONAL_TRADE_KEY = "contract:"
+
+# Trades per upsert statement (~24 bound parameters each, well under
+# SQLite's limit of 32766 per statement)
+UPSERT_BATCH_SIZE = 500
+
 # Helper functions
 async def get_deriv_connection(db: AsyncSession, connection_id: str, user_id: str) -> DerivConnection:
     """Get Deriv connection with authorization check"""
@@ -90,118 +128,275 @@ async def update_sync_log(db: AsyncSession, sync_log_id: str, status: str, stats
         
         await db.commit()
 
-async def analyze_synced_trades(db: AsyncSession, connection: DerivConnection, sync_log: SyncLog) -> Optional[Dict[str, Any]]:
-    """Analyze synced trades and create analysis"""
+async def upsert_deriv_trades(
+    db: AsyncSession,
+    connection: DerivConnection,
+    trades: List[Dict[str, Any]]
+) -> Tuple[int, int]:
+    """
+    Insert or update transformed trades of ``connection`` in batches.
+    
+    Each batch costs one IN query for the trades already stored and one
+    multi-row INSERT ... ON CONFLICT (connection_id, deriv_trade_id) DO
+    UPDATE on SQLite and PostgreSQL (other databases get an executemany
+    insert and update). Trades with a provisional key (see
+    ``webhook_trade``) are matched on their contract. Clears the
+    connection's metrics state when a metric field of a stored trade
+    changed. Returns ``(new_trades, updated_trades)``.
+    """
+    table = DerivTrade.__table__
+    dialect = db.bind.dialect.name
+    now = datetime.utcnow()
+    new_trades = updated_trades = 0
+    
+    for start in range(0, len(trades), UPSERT_BATCH_SIZE):
+        # Later copies of a trade win (a statement can't update a row twice)
+        batch = {trade["deriv_trade_id"]: trade for trade in trades[start:start + UPSERT_BATCH_SIZE]}
+        contracts = {}
+        for deriv_trade_id, trade in list(batch.items()):
+            contract_id = trade.get("contract_id")
+            if contract_id in (None, "None"):
+                continue
+            other = contracts.setdefault(str(contract_id), deriv_trade_id)
+            if other != deriv_trade_id:
+                # Both keys of one contract: the provisional one goes
+                provisional = deriv_trade_id if deriv_trade_id.startswith(PROVISIONAL_TRADE_KEY) else other
+                batch.pop(provisional)
+                contracts[str(contract_id)] = deriv_trade_id if provisional == other else other
+        result = await db.execute(
+            select(table.c.id, table.c.deriv_trade_id, table.c.contract_id, *(table.c[key] for key in METRIC_TRADE_FIELDS))
+            .where(
+                table.c.connection_id == connection.id,
+                or_(table.c.deriv_trade_id.in_(list(batch)), table.c.contract_id.in_(list(contracts)))
+            )
+        )
+        stored = result.all()
+        stored_keys = {row.deriv_trade_id for row in stored}
+        existing = {row.deriv_trade_id: row for row in stored if row.deriv_trade_id in batch}
+        for row in stored:
+            deriv_trade_id = contracts.get(row.contract_id)
+            if row.deriv_trade_id in batch or deriv_trade_id not in batch:
+                continue
+            # The same contract stored under another key
+            if deriv_trade_id.startswith(PROVISIONAL_TRADE_KEY):
+                # A webhook trade of a synced contract takes the synced key
+                trade = batch.pop(deriv_trade_id)
+                batch[row.deriv_trade_id] = {**trade, "deriv_trade_id": row.deriv_trade_id}
+                existing[row.deriv_trade_id] = row
+            elif row.deriv_trade_id.startswith(PROVISIONAL_TRADE_KEY):
+                if deriv_trade_id in stored_keys:
+                    # Already synced as well: drop the webhook's copy
+                    await db.execute(table.delete().where(table.c.id == row.id))
+                    connection.metrics_state = None
+                else:
+                    # A synced trade the webhook stored first: re-key the stored row
+                    await db.execute(table.update().where(table.c.id == row.id).values(deriv_trade_id=deriv_trade_id))
+                    existing[deriv_trade_id] = row
+        existing = {key: row for key, row in existing.items() if key in batch}
+        
+        for deriv_trade_id, row in existing.items():
+            trade_data = batch[deriv_trade_id]
+            if any(key in trade_data and row._mapping[key] != trade_data[key] for key in METRIC_TRADE_FIELDS):
+                connection.metrics_state = None
+                break
+        
+        rows = [
+            {
+                "id": generate_uuid(),
+                "connection_id": connection.id,
+                "deriv_trade_id": deriv_trade_id,
+                **{key: trade_data.get(key, default) for key, default in UPSERT_TRADE_FIELDS.items()},
+                "created_at": now,
+                "updated_at": now
+            }
+            for deriv_trade_id, trade_data in batch.items()
+        ]
+        
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(table).values(rows)
+            await db.execute(stmt.on_conflict_do_update(
+                index_elements=["connection_id", "deriv_trade_id"],
+                set_={key: stmt.excluded[key] for key in (*UPSERT_TRADE_FIELDS, "updated_at")}
+            ))
+        else:
+            new_rows = [row for row in rows if row["deriv_trade_id"] not in existing]
+            if new_rows:
+                await db.execute(table.insert(), new_rows)
+            changed = [
+                {key: row[key] for key in (*UPSERT_TRADE_FIELDS, "updated_at")}
+                | {"stored_id": existing[row["deriv_trade_id"]].id}
+                for row in rows if row["deriv_trade_id"] in existing
+            ]
+            if changed:
+                await db.execute(table.update().where(table.c.id == bindparam("stored_id")), changed)
+        
+        new_trades += len(batch) - len(existing)
+        updated_trades += len(existing)
+    
+    return new_trades, updated_trades
+
+def sync_cursor(sell_time: Optional[datetime], transaction_id: Optional[str]) -> Tuple[datetime, int]:
+    """Sort key of a trade in sync order (Deriv transaction ids only grow)"""
+    transaction_id = str(transaction_id or "")
+    return (sell_time or datetime.min, int(transaction_id) if transaction_id.isdigit() else -1)
+
+def synced_trade_frame(trades) -> "pd.DataFrame":
+    """Analysis frame of DerivTrade rows (``SYNCED_TRADE_COLUMNS``, in purchase order)"""
+    import pandas as pd
+    return pd.DataFrame([
+        {
+            "trade_id": trade.id,
+            "symbol": trade.symbol,
+            "profit_loss": trade.profit,
+            "lot_size": trade.stake / 100,  # Approximate lot size
+            "account_balance_before": 10000,  # Default, should be calculated
+            "stop_loss": None,  # Deriv doesn't have stop loss in same way
+            "entry_time": trade.purchase_time,
+            "exit_time": trade.sell_time or trade.expiry_time or trade.purchase_time,
+            "trade_type": "BUY" if trade.profit >= 0 else "SELL"  # Simplified
+        }
+        for trade in trades
+    ])
+
+def fold_synced_trades(folded: Optional[TradeAnalysisAccumulator], df) -> Optional[TradeAnalysisAccumulator]:
+    """``folded`` with ``df`` appended, or None if ``df`` can't follow the trades already in it"""
     try:
-        # Get recent trades from this connection
-        query = select(DerivTrade).where(
-            DerivTrade.connection_id == connection.id
-        ).order_by(DerivTrade.purchase_time)
-        
-        result = await db.execute(query)
-        trades = result.scalars().all()
-        
-        if not trades:
-            return None
-        
-        # Convert to DataFrame-like format for analysis
-        trades_data = []
-        for trade in trades:
-            trades_data.append({
-                "trade_id": trade.id,
-                "symbol": trade.symbol,
-                "profit_loss": trade.profit,
-                "lot_size": trade.stake / 100,  # Approximate lot size
-                "account_balance_before": 10000,  # Default, should be calculated
-                "stop_loss": None,  # Deriv doesn't have stop loss in same way
-                "entry_time": trade.purchase_time,
-                "exit_time": trade.sell_time or trade.expiry_time or trade.purchase_time,
-                "trade_type": "BUY" if trade.profit >= 0 else "SELL"  # Simplified
-            })
-        
-        # Import pandas locally
-        import pandas as pd
-        df = pd.DataFrame(trades_data)
-        
-        # Calculate metrics
-        calculator = TradeMetricsCalculator(df)
-        metrics = calculator.compute_all_metrics()
-        
-        # Detect risks
-        risk_engine = RiskRuleEngine(metrics, df)
-        risk_results = risk_engine.detect_all_risks()
-        
-        # Detect Event Trading Risks (Phase 3)
-        try:
-            news_service = NewsService()
-            event_risks = []
-            if 'entry_time' in df.columns:
-                # Ensure safe datetime conversion
-                times = pd.to_datetime(df['entry_time'], errors='coerce').dropna()
-                for t in times:
-                    risk = news_service.check_event_trading_risk(t)
-                    if risk:
-                        event_risks.append(risk)
-            
-            if event_risks:
-                if "risk_details" not in risk_results:
-                    risk_results["risk_details"] = {}
-                    
-                risk_results["risk_details"]["event_trading"] = {
-                    "name": "News Event Trading",
-                    "severity": 85,
-                    "description": f"Detected {len(event_risks)} trades executed during high-impact news events.",
-                    "occurrences": len(event_risks)
-                }
-        except Exception as e:
-            print(f"News risk detection failed for sync: {e}")
+        return folded.update(df)
+    except OutOfOrderTrades:
+        return None
 
-        # Detect patterns (Phase 2)
-        try:
-            pattern_detector = PatternDetector(df)
-            patterns = pattern_detector.detect_all_patterns()
-            risk_results["patterns"] = patterns
-        except Exception as e:
-            print(f"Pattern detection failed for sync: {e}")
-            risk_results["patterns"] = []
-        
-        # Calculate score
-        scorer = RiskScorer()
-        score_result = scorer.calculate_score(risk_results['risk_details'])
-        
-        # Generate AI explanations
-        ai_explainer = AIRiskExplainer()
-        ai_explanations = ai_explainer.generate_explanation(
-            metrics, 
-            risk_results, 
-            score_result
-        )
+async def analyze_synced_trades(
+    db: AsyncSession,
+    connection: DerivConnection,
+    sync_log: Optional[SyncLog] = None,
+    analysis: Optional[Analysis] = None,
+    full: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Analyze synced trades and create analysis (or refresh ``analysis`` in place).
+    
+    Normally only the trades stored since the connection's ``metrics_state``
+    was saved are loaded. They are folded into its TradeAnalysisAccumulator
+    and the results come from that, so a refresh costs O(new trades). The
+    patterns and stored trade frame of the last full analysis are kept, and
+    older trades stay linked to the analysis they were first analysed in.
+    
+    A full analysis loads every trade, detects patterns and stores the trade
+    frame. It runs when ``full`` is asked for (a forced full sync), when the
+    state is missing or was invalidated, when trades were stored before the
+    folded ones, and once the last one is SYNC_FULL_ANALYSIS_HOURS old.
+    """
+    try:
+        calendar_path = settings.ECONOMIC_CALENDAR_PATH
+        state = connection.metrics_state or {}
+        table = DerivTrade.__table__
+        linked = table.c.connection_id == connection.id
+        now = datetime.utcnow()
+        
+        results = None
+        folded = None
+        if not full and state.get("analyzed_at") and (
+            now - datetime.fromisoformat(state["analyzed_at"]) < timedelta(hours=settings.SYNC_FULL_ANALYSIS_HOURS)
+        ):
+            folded = await run_in_threadpool(
+                TradeAnalysisAccumulator.from_state, state.get("accumulator"), calendar_path
+            )
+        if folded is not None:
+            # Trades after the last folded one in (purchase_time, id) order
+            last_time = datetime.fromisoformat(state["last_purchase_time"])
+            after_folded = or_(
+                table.c.purchase_time > last_time,
+                and_(table.c.purchase_time == last_time, table.c.id > state["last_trade_id"])
+            )
+            result = await db.execute(
+                select(*SYNCED_TRADE_COLUMNS).where(linked, after_folded)
+                .order_by(table.c.purchase_time, table.c.id)
+            )
+            trades = result.all()
+            trade_count = await db.scalar(select(func.count()).select_from(table).where(linked))
+            # Any other new trade went in before the folded ones
+            if trade_count == state["trade_count"] + len(trades):
+                if trades:
+                    folded = await run_in_threadpool(fold_synced_trades, folded, synced_trade_frame(trades))
+                if folded is not None:
+                    results = await run_in_threadpool(process_folded_trades, folded, state.get("patterns") or [])
+                    linked = and_(linked, after_folded)
+                    state = {**state, "trade_count": trade_count, "accumulator": folded.to_state()}
+                    if trades:
+                        state["last_trade_id"] = trades[-1].id
+                        state["last_purchase_time"] = trades[-1].purchase_time.isoformat()
+        
+        df = None
+        if results is None:
+            # Full analysis of all the connection's trades
+            result = await db.execute(
+                select(*SYNCED_TRADE_COLUMNS).where(linked).order_by(table.c.purchase_time, table.c.id)
+            )
+            trades = result.all()
+            if not trades:
+                return None
+            df = synced_trade_frame(trades)
+            folded = await run_in_threadpool(TradeAnalysisAccumulator(calendar_path).update, df)
+            
+            # Run the shared analysis pipeline on the worker pool. Background syncs
+            # wait for a free slot instead of being rejected.
+            results, _, _ = await cached_analysis(df, reject_when_full=False, metrics=folded.metrics.metrics())
+            trade_count = len(trades)
+            state = {
+                "trade_count": trade_count,
+                "last_trade_id": trades[-1].id,
+                "last_purchase_time": trades[-1].purchase_time.isoformat(),
+                "accumulator": folded.to_state(),
+                "patterns": (results["risk_results"] or {}).get("patterns") or [],
+                "trades_path": None,
+                "analyzed_at": now.isoformat()
+            }
         
-        # Create analysis record
-        analysis = Analysis(
-            user_id=connection.user_id,
-            filename=f"deriv_sync_{connection.id}",
-            original_filename=f"Deriv Account {connection.account_id}",
-            file_size=len(trades_data) * 100,  # Approximate
-            trade_count=len(trades),
-            metrics=metrics,
-            risk_results=risk_results,
-            score_result=score_result,
-            ai_explanations=ai_explanations,
-            status="completed",
-            completed_at=datetime.utcnow()
+        metrics = results["metrics"]
+        risk_results = results["risk_results"]
+        score_result = results["score_result"]
+        ai_explanations = results["ai_explanations"]
+        
+        if analysis is None:
+            # Create analysis record
+            analysis = Analysis(
+                id=generate_uuid(),
+                user_id=connection.user_id,
+                filename=f"deriv_sync_{connection.id}",
+                original_filename=f"Deriv Account {connection.account_id}",
+                status="completed"
+            )
+            db.add(analysis)
+        
+        if df is not None:
+            state["trades_path"] = await run_in_threadpool(save_trade_frame, analysis.id, df)
+        connection.metrics_state = state
+        
+        analysis.file_size = trade_count * 100  # Approximate
+        analysis.trade_count = trade_count
+        analysis.metrics = metrics
+        analysis.risk_results = risk_results
+        analysis.score_result = score_result
+        analysis.ai_explanations = ai_explanations
+        analysis.trades_path = state["trades_path"]
+        analysis.completed_at = datetime.utcnow()
+        await db.flush()
+        
+        # Link trades to analysis; only trades new since the last refresh change
+        await db.execute(
+            update(DerivTrade)
+            .where(linked, or_(DerivTrade.analysis_id.is_(None), DerivTrade.analysis_id != analysis.id))
+            .values(analysis_id=analysis.id)
+            .execution_options(synchronize_session=False)
         )
         
-        db.add(analysis)
-        await db.commit()
-        await db.refresh(analysis)
-        
-        # Link trades to analysis (Bulk Update would be better but simple loop is fine for <1000 items)
-        for trade in trades:
-            trade.analysis_id = analysis.id
-        
         # Link sync log to analysis
-        sync_log.analysis_id = analysis.id
+        if sync_log is not None:
+            sync_log.analysis_id = analysis.id
         
         await db.commit()
         
@@ -209,7 +404,7 @@ async def analyze_synced_trades(db: AsyncSession, connection: DerivConnection, s
             "analysis_id": analysis.id,
             "score": score_result.get("score"),
             "grade": score_result.get("grade"),
-            "trade_count": len(trades)
+            "trade_count": trade_count
         }
         
     except Exception as e:
@@ -234,7 +429,13 @@ async def sync_trades_background_task(
             print(f"Connection {connection_id} not found in background task")
             return
 
-        sync_log = await create_sync_log(db, connection.id, "manual" if force_full_sync else "incremental")
+        # Only fetch trades past the high-water mark unless a full sync is asked for
+        incremental = not force_full_sync and connection.last_trade_sell_time is not None
+        if incremental:
+            sync_type = "incremental"
+        else:
+            sync_type = "manual" if force_full_sync else "initial"
+        sync_log = await create_sync_log(db, connection.id, sync_type)
         
         try:
             # Decrypt API token
@@ -249,66 +450,48 @@ async def sync_trades_background_task(
                 account_id=connection.account_id
             )
             
-            # Test connection first (Async)
-            test_result = await client.test_connection() 
-            if not test_result.get("success"):
-                raise Exception(f"Connection test failed: {test_result.get('error')}")
-            
-            # Get account info
-            account_info = test_result.get("account_info", {})
-            connection.account_info = account_info
-            connection.connection_status = "connected"
-            
-            # Get trades from Deriv (Async)
-            trades = await client.get_trades(days_back)
+            since = None
+            cursor = sync_cursor(connection.last_trade_sell_time, connection.last_trade_transaction_id)
+            if incremental:
+                # The profit_table request authorizes the token anyway, so
+                # skip the test_connection + mt5_login_list round trips
+                since = connection.last_trade_sell_time - INCREMENTAL_SYNC_OVERLAP
+            else:
+                # Test connection first (Async)
+                test_result = await client.test_connection() 
+                if not test_result.get("success"):
+                    raise Exception(f"Connection test failed: {test_result.get('error')}")
+                
+                # Get account info
+                account_info = test_result.get("account_info", {})
+                connection.account_info = account_info
             
-            # Process trades
+            # Process trades page by page while later pages are in transit
+            fetched_trades = 0
             new_trades = 0
             updated_trades = 0
             skipped_trades = 0
+            high_water = cursor
             
-            for trade_data in trades:
-                # Check if trade already exists
-                existing_query = select(DerivTrade).where(
-                    DerivTrade.deriv_trade_id == trade_data["deriv_trade_id"],
-                    DerivTrade.connection_id == connection.id
-                )
-                existing_result = await db.execute(existing_query)
-                existing_trade = existing_result.scalars().first()
-                
-                if existing_trade:
-                    # Update existing trade
-                    for key, value in trade_data.items():
-                        if hasattr(existing_trade, key) and key not in ["id", "created_at"]:
-                            setattr(existing_trade, key, value)
-                    updated_trades += 1
-                else:
-                    # Create new trade
-                    trade = DerivTrade(
-                        connection_id=connection.id,
-                        deriv_trade_id=trade_data["deriv_trade_id"],
-                        transaction_id=trade_data.get("transaction_id"),
-                        contract_id=trade_data.get("contract_id"),
-                        symbol=trade_data.get("symbol", ""),
-                        contract_type=trade_data.get("contract_type", ""),
-                        currency=trade_data.get("currency", "USD"),
-                        buy_price=trade_data.get("buy_price", 0),
-                        sell_price=trade_data.get("sell_price"),
-                        barrier=trade_data.get("barrier"),
-                        barrier2=trade_data.get("barrier2"),
-                        stake=trade_data.get("stake", 0),
-                        payout=trade_data.get("payout"),
-                        profit=trade_data.get("profit", 0),
-                        purchase_time=trade_data.get("purchase_time"),
-                        expiry_time=trade_data.get("expiry_time"),
-                        sell_time=trade_data.get("sell_time"),
-                        duration=trade_data.get("duration"),
-                        status=trade_data.get("status", "unknown"),
-                        exit_spot=trade_data.get("exit_spot"),
-                        raw_data=trade_data.get("raw_data")
-                    )
-                    db.add(trade)
-                    new_trades += 1
+            async for page in client.iter_trade_pages(days_back, since=since):
+                fetched_trades += len(page)
+                keys = [sync_cursor(trade.get("sell_time"), trade.get("transaction_id")) for trade in page]
+                if incremental:
+                    # Trades in the overlap were stored by an earlier sync
+                    newer = [trade for trade, key in zip(page, keys) if key > cursor]
+                    skipped_trades += len(page) - len(newer)
+                    page = newer
+                if not page:
+                    continue
+                page_new, page_updated = await upsert_deriv_trades(db, connection, page)
+                new_trades += page_new
+                updated_trades += page_updated
+                high_water = max(high_water, *keys)
+            
+            connection.connection_status = "connected"
+            if high_water > cursor:
+                connection.last_trade_sell_time, last_transaction_id = high_water
+                connection.last_trade_transaction_id = str(last_transaction_id)
             
             await db.commit()
             
@@ -327,7 +510,7 @@ async def sync_trades_background_task(
             analysis_id = None
             
             if analyze_after_sync and (new_trades > 0 or updated_trades > 0):
-                analysis_result = await analyze_synced_trades(db, connection, sync_log)
+                analysis_result = await analyze_synced_trades(db, connection, sync_log, full=force_full_sync)
                 if analysis_result:
                     analysis_id = analysis_result.get("analysis_id")
             
@@ -337,20 +520,30 @@ async def sync_trades_background_task(
                 sync_log_id=sync_log.id,
                 status="success",
                 stats={
-                    "trades_fetched": len(trades),
+                    "trades_fetched": fetched_trades,
                     "trades_new": new_trades,
                     "trades_updated": updated_trades,
                     "trades_skipped": skipped_trades,
+                    "start_date": since,
                     "analysis_id": analysis_id
                 }
             )
             
         except Exception as e:
-            # Update connection with error
-            connection.connection_status = "error"
-            connection.last_sync_status = "failed"
+            # Update connection with error (last_sync_at is the attempt the
+            # scheduler's backoff counts from)
+            connection.last_sync_at = datetime.utcnow()
             connection.last_error = str(e)
-            connection.error_count += 1
+            if is_rate_limited(e):
+                # Deriv is throttling the app or account, not a broken
+                # connection: hold off until the governor expects capacity
+                wait = max(deriv_governor.wait_time(connection.app_id), deriv_governor.cooldown_seconds)
+                connection.disabled_until = datetime.utcnow() + timedelta(seconds=wait)
+                connection.last_sync_status = "rate_limited"
+            else:
+                connection.connection_status = "error"
+                connection.last_sync_status = "failed"
+                connection.error_count += 1
             
             # Update sync log with failure
             await update_sync_log(
@@ -364,6 +557,187 @@ async def sync_trades_background_task(
             
             await db.commit()
 
+def webhook_signature(payload: Dict[str, Any], secret: str) -> str:
+    """HMAC-SHA256 of a webhook event's canonical JSON, without the signature itself"""
+    body = json.dumps(
+        {key: value for key, value in payload.items() if key != "signature"},
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+
+def webhook_signed(payload: Dict[str, Any], signature: Optional[str]) -> bool:
+    """Whether ``signature`` is the configured secret's signature of ``payload``"""
+    if not settings.DERIV_WEBHOOK_SECRET:
+        return False
+    return hmac.compare_digest(signature or "", webhook_signature(payload, settings.DERIV_WEBHOOK_SECRET))
+
+def webhook_loginid(payload: Dict[str, Any]) -> Optional[str]:
+    """Deriv account a webhook event is about"""
+    account = payload.get("account") or {}
+    transaction = payload.get("transaction") or {}
+    loginid = account.get("loginid") or account.get("account_id") or transaction.get("loginid")
+    return str(loginid) if loginid else None
+
+def webhook_trade(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Closed trade of a ``transaction`` webhook event, transformed like synced
+    profit_table rows, or None while the contract is still open. The
+    contract fields (as in proposal_open_contract) are overlaid with the
+    transaction's. Synced trades are keyed on their buy transaction, so the
+    trade is too when the contract lists it in ``transaction_ids``; without
+    it the trade gets a provisional key that the upsert matches on contract.
+    """
+    transaction = payload.get("transaction") or {}
+    contract = payload.get("contract") or {}
+    tx = {**contract, **transaction}
+    if transaction.get("action") == "sell":
+        tx.setdefault("sell_time", transaction.get("transaction_time"))
+        tx.setdefault("sell_price", transaction.get("amount"))
+    if not tx.get("transaction_id") or not tx.get("sell_time"):
+        return None
+    tx.setdefault("purchase_time", tx["sell_time"])
+    if tx.get("profit") is None and tx.get("sell_price") is not None and tx.get("buy_price") is not None:
+        tx["profit"] = float(tx["sell_price"]) - float(tx["buy_price"])
+    buy_transaction_id = (contract.get("transaction_ids") or {}).get("buy")
+    if buy_transaction_id:
+        tx["transaction_id"] = buy_transaction_id
+    trade = DerivAPIClient.transform_transaction_to_trade(tx)
+    if trade is not None and not buy_transaction_id and tx.get("contract_id"):
+        trade["deriv_trade_id"] = f"{PROVISIONAL_TRADE_KEY}{tx['contract_id']}"
+    return trade
+
+async def ingest_connection_trades(
+    db: AsyncSession,
+    connection: DerivConnection,
+    trades: List[Dict[str, Any]]
+) -> Tuple[Optional[str], bool]:
+    """
+    Upsert webhook ``trades`` of ``connection`` and fold them into its
+    latest synced analysis. Only a new trade or a changed metric field
+    refreshes the analysis, so redelivered events are no-ops. The sync
+    high-water mark is left alone: trades a webhook missed must still be
+    fetched by the next incremental sync. Returns ``(analysis_id, refreshed)``.
+    """
+    state_before = connection.metrics_state
+    new_trades, _ = await upsert_deriv_trades(db, connection, trades)
+    connection.total_trades_synced += new_trades
+    await db.commit()
+    
+    result = await db.execute(
+        select(Analysis).where(
+            Analysis.user_id == connection.user_id,
+            Analysis.filename == f"deriv_sync_{connection.id}"
+        ).order_by(desc(Analysis.created_at)).limit(1)
+    )
+    latest = result.scalars().first()
+    if new_trades == 0 and (state_before is None or connection.metrics_state is not None):
+        return (latest.id if latest else None), False
+    
+    # Only the new trades are loaded and folded into metrics_state
+    analysis_result = await analyze_synced_trades(db, connection, analysis=latest)
+    return (analysis_result or {}).get("analysis_id"), analysis_result is not None
+
+async def ingest_webhook_events(event_ids: List[str]):
+    """
+    Process a batch of stored webhook events (the webhook ingest queue's
+    handler). Closed trades are grouped per connection, deduplicated on
+    their trade key (the buy transaction, as for synced trades) and
+    ingested with one upsert and one analysis refresh per connection. Events are marked processed with the trade and
+    analysis they touched; a failed connection keeps its events unprocessed
+    with the error.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(WebhookEvent).where(WebhookEvent.id.in_(event_ids), WebhookEvent.processed == False)
+        )
+        events = result.scalars().all()
+        if not events:
+            return
+        
+        # Events that didn't name a connection are matched on the account loginid
+        loginids = {webhook_loginid(event.raw_payload) for event in events if event.connection_id is None}
+        loginids.discard(None)
+        connection_for = {}
+        if loginids:
+            account_loginid = DerivConnection.account_info["loginid"].as_string()
+            result = await db.execute(
+                select(DerivConnection.id, DerivConnection.account_id, account_loginid.label("loginid"))
+                .where(or_(DerivConnection.account_id.in_(loginids), account_loginid.in_(loginids)))
+                .order_by(DerivConnection.created_at)
+            )
+            for row in result:
+                for loginid in (row.account_id, row.loginid):
+                    if loginid in loginids:
+                        connection_for.setdefault(loginid, row.id)
+        
+        now = datetime.utcnow()
+        trades_by_connection: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        events_by_connection: Dict[str, List[WebhookEvent]] = {}
+        for event in events:
+            if not webhook_signed(event.raw_payload, event.signature):
+                # Stored before signatures were required, or since the secret changed
+                event.processed = True
+                event.processed_at = now
+                event.processing_error = "Webhook event is not signed"
+                continue
+            if event.connection_id is None:
+                event.connection_id = connection_for.get(webhook_loginid(event.raw_payload))
+            trade = webhook_trade(event.raw_payload)
+            if event.connection_id is None or trade is None:
+                # Nothing to ingest: an unknown account or a contract still open
+                event.processed = True
+                event.processed_at = now
+                if event.connection_id is None:
+                    event.processing_error = "No Deriv connection for this account"
+                continue
+            event.trade_id = trade["deriv_trade_id"]
+            # Later deliveries of a transaction win
+            trades_by_connection.setdefault(event.connection_id, {})[trade["deriv_trade_id"]] = trade
+            events_by_connection.setdefault(event.connection_id, []).append(event)
+        await db.commit()
+        
+        for connection_id, trades in trades_by_connection.items():
+            connection_events = events_by_connection[connection_id]
+            connection_event_ids = [event.id for event in connection_events]
+            try:
+                connection = await db.get(DerivConnection, connection_id)
+                if connection is None:
+                    raise Exception("Deriv connection not found")
+                analysis_id, refreshed = await ingest_connection_trades(db, connection, list(trades.values()))
+                for event in connection_events:
+                    event.processed = True
+                    event.processed_at = datetime.utcnow()
+                    event.processing_error = None
+                    event.analysis_triggered = refreshed
+                    event.analysis_id = analysis_id
+                await db.commit()
+            except Exception as e:
+                print(f"Error ingesting webhook trades for connection {connection_id}: {e}")
+                await db.rollback()
+                # Rolled-back instances are expired, so record the error with a plain UPDATE
+                await db.execute(
+                    update(WebhookEvent)
+                    .where(WebhookEvent.id.in_(connection_event_ids))
+                    .values(processing_error=str(e))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+
+async def resume_webhook_events():
+    """Queue the transaction events left unprocessed by the last run"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(WebhookEvent.id).where(
+                WebhookEvent.event_type == "transaction",
+                WebhookEvent.processed == False
+            ).order_by(WebhookEvent.received_at)
+        )
+        event_ids = result.scalars().all()
+    for event_id in event_ids:
+        webhook_ingest_queue.enqueue(event_id)
+    if event_ids:
+        print(f"Resumed {len(event_ids)} unprocessed webhook events")
+
 # API Endpoints
 @router.post("/deriv/connect", response_model=schemas.APIResponse)
 async def connect_deriv_account(
@@ -440,8 +814,9 @@ async def connect_deriv_account(
         # Start initial sync in background
         if request.auto_sync:
             background_tasks.add_task(
-                sync_trades_background_task,
-                connection_id=connection.id,
+                sync_scheduler.run_sync,
+                connection.id,
+                connection.app_id,
                 days_back=request.sync_days_back,
                 force_full_sync=True,
                 analyze_after_sync=True
@@ -501,8 +876,9 @@ async def sync_deriv_trades(
             days_back = request.days_back or connection.sync_days_back
             
             background_tasks.add_task(
-                sync_trades_background_task,
-                connection_id=connection.id,
+                sync_scheduler.run_sync,
+                connection.id,
+                connection.app_id,
                 days_back=days_back,
                 force_full_sync=request.force_full_sync,
                 analyze_after_sync=request.analyze_after_sync
@@ -546,19 +922,12 @@ async def get_deriv_status(
         
         status_data = []
         for connection in connections:
-            next_sync = None
-            if connection.auto_sync and connection.last_sync_at:
-                if connection.sync_frequency == "hourly":
-                    next_sync = connection.last_sync_at + timedelta(hours=1)
-                elif connection.sync_frequency == "daily":
-                    next_sync = connection.last_sync_at + timedelta(days=1)
-                elif connection.sync_frequency == "weekly":
-                    next_sync = connection.last_sync_at + timedelta(weeks=1)
+            next_sync = sync_scheduler.next_sync_at(connection)
             
             status_data.append({
                 "connection": connection.to_dict(),
                 "next_sync": next_sync.isoformat() if next_sync else None,
-                "is_syncing": False, 
+                "is_syncing": sync_scheduler.is_syncing(connection.id), 
                 "can_sync": connection.connection_status == "connected"
             })
         
@@ -598,17 +967,14 @@ async def list_deriv_connections(
         
         print(f"DEBUG: User {current_user.id} has {len(connections)} Deriv connections")
 
+        # Decrypt tokens for owner (requested by user for persistence)
+        tokens = encryption_service.decrypt_many(c.api_token_encrypted for c in connections)
+        
         connections_data = []
-        for connection in connections:
+        for connection, decrypted_token in zip(connections, tokens):
             data = connection.to_dict()
-            # Decrypt token for owner (requested by user for persistence)
             if connection.api_token_encrypted:
-                try:
-                    decrypted_token = encryption_service.decrypt(connection.api_token_encrypted)
-                    data["api_token"] = decrypted_token
-                    print(f"DEBUG: Decrypted token for connection {connection.id}")
-                except Exception as e:
-                    print(f"Failed to decrypt token for connection {connection.id}: {e}")
+                data["api_token"] = decrypted_token
             connections_data.append(data)
 
         return schemas.APIResponse.success_response(
@@ -764,40 +1130,72 @@ async def disconnect_deriv_account(
 @router.post("/deriv/webhook", response_model=schemas.APIResponse)
 async def deriv_webhook(
     request: WebhookEventRequest,
+    connection_id: Optional[str] = Query(None, description="Connection the event belongs to (optional, else matched on the account loginid)"),
     db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Webhook endpoint for Deriv real-time updates
+    Webhook endpoint for Deriv real-time updates. Transaction events are
+    queued and ingested in batches (see ``ingest_webhook_events``).
     """
     try:
+        payload = request.dict()
+        # Events write trades into user accounts, so only signed ones are taken
+        if not settings.DERIV_WEBHOOK_SECRET:
+            raise HTTPException(
+                status_code=401,
+                detail="Webhook signing secret is not configured"
+            )
+        if not webhook_signed(payload, request.signature):
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid webhook signature"
+            )
+        
+        if connection_id is not None:
+            result = await db.execute(select(DerivConnection.id).where(DerivConnection.id == connection_id))
+            if result.scalar() is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Deriv connection not found"
+                )
+        
         webhook_event = WebhookEvent(
+            connection_id=connection_id,
             event_type=request.event,
             event_source="deriv",
-            raw_payload=request.dict(),
+            raw_payload=payload,
             signature=request.signature,
             received_at=datetime.utcnow()
         )
         
         db.add(webhook_event)
         await db.commit()
-        await db.refresh(webhook_event)
         
+        queued = False
         if request.event == "transaction" and request.transaction:
-            # Handle new trade (placeholder)
-            webhook_event.processed = True
-            webhook_event.processed_at = datetime.utcnow()
-            webhook_event.trade_id = request.transaction.get("transaction_id")
-            await db.commit()
-        
+            if webhook_ingest_queue.running:
+                webhook_ingest_queue.enqueue(webhook_event.id)
+                queued = True
+            else:
+                # No ingest worker (e.g. outside the app lifespan): ingest right away
+                await ingest_webhook_events([webhook_event.id])
+                await db.refresh(webhook_event)
+        
+        response = WebhookResponse(
+            received=True,
+            event_id=webhook_event.id,
+            processed=bool(webhook_event.processed),
+            trade_updated=bool(webhook_event.processed) and webhook_event.trade_id is not None,
+            analysis_triggered=bool(webhook_event.analysis_triggered),
+            analysis_id=webhook_event.analysis_id
+        )
         return schemas.APIResponse.success_response(
-            data={
-                "event_id": webhook_event.id,
-                "received": True,
-                "processed": webhook_event.processed
-            },
+            data={**response.dict(), "queued": queued},
             message="Webhook received"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
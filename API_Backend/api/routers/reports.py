@@ -3,14 +3,16 @@ API endpoints for report generation
 """
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import FileResponse, StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import undefer_group
 from typing import Optional
 import io
 import tempfile
 import os
 
 from api import schemas, models, auth
-from api.database import get_db
+from api.database import get_async_db
 from core.report_generator import ReportGenerator
 
 router = APIRouter()
@@ -19,16 +21,19 @@ router = APIRouter()
 async def generate_report(
     request: schemas.ReportGenerateRequest,
     current_user: Optional[schemas.UserResponse] = Depends(auth.get_optional_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Generate a report for an analysis
     """
     try:
         # Get analysis
-        analysis = db.query(models.Analysis)\
-            .filter(models.Analysis.id == request.analysis_id)\
-            .first()
+        result = await db.execute(
+            select(models.Analysis)
+            .options(undefer_group("results"))
+            .where(models.Analysis.id == request.analysis_id)
+        )
+        analysis = result.scalars().first()
         
         if not analysis:
             raise HTTPException(
@@ -99,8 +104,8 @@ async def generate_report(
             )
         
         db.add(report)
-        db.commit()
-        db.refresh(report)
+        await db.commit()
+        await db.refresh(report)
         
         response_data = schemas.ReportResponse(
             id=report.id,
@@ -127,12 +132,12 @@ async def download_report(
     report_id: str,
     format: Optional[str] = None,
     current_user: Optional[schemas.UserResponse] = Depends(auth.get_optional_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Download a generated report
     """
-    report = db.query(models.Report).filter(models.Report.id == report_id).first()
+    report = await db.get(models.Report, report_id)
     
     if not report:
         raise HTTPException(
@@ -141,9 +146,7 @@ async def download_report(
         )
     
     # Get associated analysis for authorization check
-    analysis = db.query(models.Analysis)\
-        .filter(models.Analysis.id == report.analysis_id)\
-        .first()
+    analysis = await db.get(models.Analysis, report.analysis_id)
     
     if current_user and analysis.user_id and analysis.user_id != current_user.id:
         raise HTTPException(
@@ -153,7 +156,7 @@ async def download_report(
     
     # Update download count
     report.download_count = (report.download_count or 0) + 1
-    db.commit()
+    await db.commit()
     
     # Return appropriate response
     if format == "file" and report.content:
@@ -187,14 +190,12 @@ async def download_report(
 async def list_reports(
     analysis_id: str,
     current_user: Optional[schemas.UserResponse] = Depends(auth.get_optional_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     List all reports for an analysis
     """
-    analysis = db.query(models.Analysis)\
-        .filter(models.Analysis.id == analysis_id)\
-        .first()
+    analysis = await db.get(models.Analysis, analysis_id)
     
     if not analysis:
         raise HTTPException(
@@ -208,10 +209,12 @@ async def list_reports(
             detail="Not authorized to view reports for this analysis"
         )
     
-    reports = db.query(models.Report)\
-        .filter(models.Report.analysis_id == analysis_id)\
-        .order_by(models.Report.generated_at.desc())\
-        .all()
+    result = await db.execute(
+        select(models.Report)
+        .where(models.Report.analysis_id == analysis_id)
+        .order_by(models.Report.generated_at.desc())
+    )
+    reports = result.scalars().all()
     
     response_data = [
         {
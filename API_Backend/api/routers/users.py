@@ -1,32 +1,35 @@
 """
 API endpoints for user management
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
 from datetime import timedelta
 from typing import Optional
 
 from api import schemas, models, auth
 from api.config import settings
-from api.database import get_db
+from api.database import get_async_db
+from api.utils.principal_cache import principal_cache
 
 router = APIRouter()
 
 @router.post("/register", response_model=schemas.APIResponse)
 async def register_user(
     user_data: schemas.UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Register a new user
     """
     # Check if user already exists
-    existing_user = db.query(models.User)\
-        .filter(
+    result = await db.execute(
+        select(models.User).where(
             (models.User.email == user_data.email) | 
             (models.User.username == user_data.username)
-        )\
-        .first()
+        )
+    )
+    existing_user = result.scalars().first()
     
     if existing_user:
         raise HTTPException(
@@ -44,13 +47,13 @@ async def register_user(
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     # Create default settings for user (avoid overwriting 'settings')
     user_settings = models.UserSettings(user_id=user.id)
     db.add(user_settings)
-    db.commit()
+    await db.commit()
     
     # Create access token using constant from auth.py
     access_token = auth.create_access_token(
@@ -77,14 +80,13 @@ async def register_user(
 @router.post("/login", response_model=schemas.APIResponse)
 async def login_user(
     login_data: schemas.UserLogin,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Login user and return access token
     """
-    user = db.query(models.User)\
-        .filter(models.User.email == login_data.email)\
-        .first()
+    result = await db.execute(select(models.User).where(models.User.email == login_data.email))
+    user = result.scalars().first()
     
     if not user or not auth.verify_password(login_data.password, user.hashed_password):
         raise HTTPException(
@@ -123,7 +125,7 @@ async def login_user(
 @router.get("/profile", response_model=schemas.APIResponse)
 async def get_user_profile(
     current_user: schemas.UserResponse = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get current user's profile
@@ -148,7 +150,7 @@ async def get_user_profile(
 @router.get("/settings", response_model=schemas.APIResponse)
 async def get_user_settings(
     current_user: schemas.UserResponse = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get user settings
@@ -159,16 +161,15 @@ async def get_user_settings(
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    settings = db.query(models.UserSettings)\
-        .filter(models.UserSettings.user_id == current_user.id)\
-        .first()
+    # Snapshot loaded with the principal; no query unless it's missing
+    settings = current_user.settings
     
     if not settings:
         # Create default settings if not exists
         settings = models.UserSettings(user_id=current_user.id)
         db.add(settings)
-        db.commit()
-        db.refresh(settings)
+        await db.commit()
+        await db.refresh(settings)
     
     response_data = schemas.UserSettingsResponse(
         user_id=settings.user_id,
@@ -190,7 +191,7 @@ async def get_user_settings(
 async def update_user_settings(
     settings_update: schemas.UserSettingsUpdate,
     current_user: schemas.UserResponse = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update user settings
@@ -201,9 +202,10 @@ async def update_user_settings(
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    settings = db.query(models.UserSettings)\
-        .filter(models.UserSettings.user_id == current_user.id)\
-        .first()
+    result = await db.execute(
+        select(models.UserSettings).where(models.UserSettings.user_id == current_user.id)
+    )
+    settings = result.scalars().first()
     
     if not settings:
         settings = models.UserSettings(user_id=current_user.id)
@@ -225,8 +227,9 @@ async def update_user_settings(
         if hasattr(settings, field):
             setattr(settings, field, value)
     
-    db.commit()
-    db.refresh(settings)
+    await db.commit()
+    await db.refresh(settings)
+    principal_cache.invalidate_user(current_user.id)
     
     response_data = schemas.UserSettingsResponse(
         user_id=settings.user_id,
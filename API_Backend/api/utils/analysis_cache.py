@@ -0,0 +1,317 @@
+"""
+Content-addressed cache of analysis results.
+
+Results are keyed by a hash of the normalized trade frame, the risk rule
+thresholds and the AI explainer model, so re-uploading the same report
+skips metrics, pattern detection and the OpenAI call entirely.
+
+Two tiers: a small in-process LRU and a SQLite file shared by all API
+processes on the host. Both tiers expire entries after a TTL; the SQLite
+tier is also capped in total bytes (least recently used go first).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi.concurrency import run_in_threadpool
+
+from api.config import settings
+from api.utils.analysis_executor import analysis_executor
+from api.utils.trade_files import TRADE_CSV_DTYPES, TRADE_CSV_TIME_COLUMNS
+from core.ai_explainer import OFFLINE_MODEL, resolve_explainer_model
+from core.economic_calendar import load_calendar
+from core.analysis_pipeline import process_trade_data_timed
+from core.risk_rules import RiskRuleEngine
+
+# Bump when a pipeline change makes previously cached results stale
+CACHE_VERSION = 2
+
+
+def _json_default(obj):
+    """json.dumps fallback for NumPy / pandas / datetime values"""
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime, date, pd.Timestamp)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Hash of the columns the pipeline reads, independent of how they were
+    parsed: times are hashed as nanosecond timestamps, numbers as float64
+    and everything else as strings. Row order is part of the hash.
+    """
+    digest = hashlib.sha256()
+    digest.update(str(len(df)).encode())
+    for column in sorted(c for c in df.columns if c in TRADE_CSV_DTYPES):
+        values = df[column]
+        if column in TRADE_CSV_TIME_COLUMNS:
+            times = pd.DatetimeIndex(pd.to_datetime(values, errors="coerce")).as_unit("ns")
+            normalized = pd.Series(times.asi8)
+        elif pd.api.types.is_numeric_dtype(values):
+            normalized = values.astype(np.float64)
+        else:
+            normalized = values.astype(str)
+        digest.update(column.encode())
+        digest.update(pd.util.hash_pandas_object(normalized, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def analysis_cache_key(
+    df: pd.DataFrame,
+    openai_api_key: Optional[str] = None,
+    calendar_path: Optional[str] = None
+) -> str:
+    """Cache key for analysing ``df`` with the given OpenAI key and calendar"""
+    calendar = load_calendar(calendar_path)
+    context = {
+        "version": CACHE_VERSION,
+        "thresholds": RiskRuleEngine({}).thresholds,
+        "explainer_model": resolve_explainer_model(openai_api_key),
+        "calendar": calendar.fingerprint if calendar is not None else None,
+    }
+    digest = hashlib.sha256(json.dumps(context, sort_keys=True).encode())
+    digest.update(frame_fingerprint(df).encode())
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Two-tier (memory LRU + SQLite) store of analysis results as JSON"""
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        memory_entries: int = 128,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl_seconds: int = 7 * 24 * 3600,
+        enabled: bool = True
+    ):
+        self.db_path = db_path or None
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._counters = {
+            "memory_hits": 0,
+            "sqlite_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0
+        }
+
+    # -------------------------------------------------
+    # SQLite tier
+    # -------------------------------------------------
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self.db_path is None:
+            return None
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.db_path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_analysis_cache_accessed_at"
+                " ON analysis_cache (accessed_at)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _db_get(self, key: str, now: float) -> Optional[str]:
+        conn = self._db()
+        if conn is None:
+            return None
+        row = conn.execute(
+            "SELECT value, created_at FROM analysis_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if now - created_at > self.ttl_seconds:
+            conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+            conn.commit()
+            self._counters["expired"] += 1
+            return None
+        conn.execute("UPDATE analysis_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return value
+
+    def _db_put(self, key: str, value: str, now: float):
+        conn = self._db()
+        if conn is None:
+            return
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO analysis_cache (key, value, size, created_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, value, size, now, now)
+        )
+        # Expire old entries, then evict least recently used until under the cap
+        expired = conn.execute(
+            "DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self._counters["expired"] += max(expired, 0)
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM analysis_cache").fetchone()[0]
+        if total > self.max_bytes:
+            victims = conn.execute(
+                "SELECT key, size FROM analysis_cache WHERE key != ? ORDER BY accessed_at ASC", (key,)
+            ).fetchall()
+            doomed = []
+            for victim_key, victim_size in victims:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((victim_key,))
+                total -= victim_size
+            conn.executemany("DELETE FROM analysis_cache WHERE key = ?", doomed)
+            self._counters["evictions"] += len(doomed)
+        conn.commit()
+
+    # -------------------------------------------------
+    # Public API (blocking; call through a threadpool from async code)
+    # -------------------------------------------------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached results for ``key``, or None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return json.loads(value)
+                del self._memory[key]
+                self._counters["expired"] += 1
+
+            value = self._db_get(key, now)
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["sqlite_hits"] += 1
+            self._remember(key, value, now)
+        return json.loads(value)
+
+    def put(self, key: str, results: Dict[str, Any]):
+        """Store results under ``key`` in both tiers"""
+        if not self.enabled:
+            return
+        value = json.dumps(results, default=_json_default)
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._db_put(key, value, now)
+            self._counters["stores"] += 1
+
+    def _remember(self, key: str, value: str, now: float):
+        self._memory[key] = (now, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            conn = self._db()
+            if conn is not None:
+                conn.execute("DELETE FROM analysis_cache")
+                conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            conn = self._db()
+            if conn is not None:
+                count, size = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analysis_cache"
+                ).fetchone()
+                stats["sqlite_entries"] = count
+                stats["sqlite_bytes"] = size
+        lookups = stats["memory_hits"] + stats["sqlite_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            (stats["memory_hits"] + stats["sqlite_hits"]) / lookups if lookups else 0.0
+        )
+        stats["enabled"] = self.enabled
+        return stats
+
+
+async def cached_analysis(
+    df: pd.DataFrame,
+    openai_api_key: Optional[str] = None,
+    reject_when_full: bool = True,
+    metrics: Optional[Dict[str, Any]] = None
+) -> Tuple[Dict[str, Any], Dict[str, float], bool]:
+    """
+    Analyse ``df`` on the analysis executor unless the result is cached.
+    Precomputed ``metrics`` are passed through to the pipeline.
+
+    Returns ``(results, pipeline_timings, cache_hit)``. Results whose AI
+    explanation fell back to offline mode although a key was available
+    are not cached, so a transient OpenAI failure isn't pinned.
+    """
+    key = None
+    if analysis_cache.enabled:
+        key = await run_in_threadpool(
+            analysis_cache_key, df, openai_api_key, settings.ECONOMIC_CALENDAR_PATH
+        )
+        cached = await run_in_threadpool(analysis_cache.get, key)
+        if cached is not None:
+            return cached, {}, True
+
+    results, timings = await analysis_executor.submit(
+        process_trade_data_timed, df, openai_api_key, metrics, settings.ECONOMIC_CALENDAR_PATH,
+        reject_when_full=reject_when_full
+    )
+
+    if key is not None:
+        expected_model = resolve_explainer_model(openai_api_key)
+        ai_model = (results.get("ai_explanations") or {}).get("ai_model")
+        if expected_model == OFFLINE_MODEL or ai_model == expected_model:
+            await run_in_threadpool(analysis_cache.put, key, results)
+
+    return results, timings, False
+
+
+# Singleton instance shared by the analyze and integrations routers
+analysis_cache = AnalysisCache(
+    db_path=settings.ANALYSIS_CACHE_PATH,
+    memory_entries=settings.ANALYSIS_CACHE_MEMORY_ENTRIES,
+    max_bytes=settings.ANALYSIS_CACHE_MAX_BYTES,
+    ttl_seconds=settings.ANALYSIS_CACHE_TTL_SECONDS,
+    enabled=settings.ANALYSIS_CACHE_ENABLED
+)
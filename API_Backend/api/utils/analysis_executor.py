@@ -0,0 +1,208 @@
+"""
+Process-pool executor for CPU-bound trade analysis.
+
+pandas/sklearn work is run in warm worker processes so concurrent uploads
+use separate cores instead of queueing behind one GIL.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from api.config import settings
+
+
+class AnalysisQueueFull(Exception):
+    """Raised when the executor is at capacity and rejects a new job"""
+
+
+class AnalysisTimeout(Exception):
+    """Raised when a job does not finish within the configured timeout"""
+
+
+def _warm_worker():
+    """Worker initializer: pay the heavy imports once per process, not per job"""
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    import sklearn.cluster  # noqa: F401
+    import sklearn.preprocessing  # noqa: F401
+    import core.analysis_pipeline  # noqa: F401
+
+
+def _noop():
+    return os.getpid()
+
+
+class AnalysisExecutor:
+    """
+    Bounded ProcessPoolExecutor wrapper.
+    
+    - Workers are spawned with the heavy imports done up front (warm).
+    - At most ``max_workers + max_queue`` jobs are in flight; further jobs
+      raise ``AnalysisQueueFull`` so the API can answer 429.
+    - Each job is bounded by ``job_timeout`` seconds. A job that overruns
+      after it started is stopped by terminating the pool's workers, which
+      also fails the other jobs running in that pool.
+    - Workers are replaced after ``max_jobs_per_worker`` jobs, and the pool
+      is rebuilt if a worker dies.
+    
+    With ``max_workers == 0`` jobs run in the FastAPI threadpool instead;
+    threads can't be stopped, so there the timeout only bounds the wait.
+    """
+    
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: int = 8,
+        job_timeout: float = 300,
+        max_jobs_per_worker: Optional[int] = None
+    ):
+        self.max_workers = (os.cpu_count() or 1) if max_workers is None else max_workers
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._failed = 0
+    
+    @property
+    def capacity(self) -> int:
+        return max(self.max_workers, 1) + self.max_queue
+    
+    def start(self, warm: bool = True):
+        """Create the pool and optionally spin every worker up immediately"""
+        if self.max_workers == 0:
+            return
+        pool = self._get_pool()
+        if warm:
+            for _ in range(self.max_workers):
+                pool.submit(_noop)
+    
+    def shutdown(self, wait: bool = False):
+        """Stop the pool, cancelling jobs that have not started"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn keeps workers independent of the server's threads/sockets
+                # and is required for max_tasks_per_child
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker,
+                    max_tasks_per_child=self.max_jobs_per_worker
+                )
+            return self._pool
+    
+    def _reset_broken_pool(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    def _terminate_pool(self, pool: ProcessPoolExecutor):
+        """Kill the pool's workers and replace the pool on next use"""
+        # ProcessPoolExecutor has no public way to stop a running call
+        for process in list((pool._processes or {}).values()):
+            process.terminate()
+        self._reset_broken_pool(pool)
+    
+    def _release(self, _future=None):
+        with self._lock:
+            self._in_flight -= 1
+    
+    async def submit(self, fn: Callable, *args, reject_when_full: bool = True) -> Any:
+        """
+        Run ``fn(*args)`` in a worker and await its result.
+        
+        ``fn`` and its arguments must be picklable (module-level function).
+        Background callers that should wait instead of being rejected can
+        pass ``reject_when_full=False``.
+        """
+        with self._lock:
+            if reject_when_full and self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise AnalysisQueueFull(
+                    f"{self._in_flight} analysis jobs in flight (capacity {self.capacity})"
+                )
+            self._in_flight += 1
+        
+        if self.max_workers == 0:
+            try:
+                result = await asyncio.wait_for(run_in_threadpool(fn, *args), timeout=self.job_timeout)
+            except asyncio.TimeoutError:
+                self._timed_out += 1
+                raise AnalysisTimeout(f"Analysis exceeded {self.job_timeout}s")
+            finally:
+                self._release()
+            self._completed += 1
+            return result
+        
+        pool = self._get_pool()
+        try:
+            try:
+                future = pool.submit(fn, *args)
+            except BrokenProcessPool:
+                self._reset_broken_pool(pool)
+                pool = self._get_pool()
+                future = pool.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is held until the worker is actually done, even if the
+        # awaiting request gives up earlier
+        future.add_done_callback(self._release)
+        
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.job_timeout)
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            # A job that has not started yet is cancelled; one that is already
+            # running is killed with its workers, which fails its future and
+            # gives the slot back
+            if not future.cancel() and not future.done():
+                self._terminate_pool(pool)
+            raise AnalysisTimeout(f"Analysis exceeded {self.job_timeout}s")
+        except BrokenProcessPool:
+            self._failed += 1
+            self._reset_broken_pool(pool)
+            raise
+        
+        self._completed += 1
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        """Current load and counters"""
+        return {
+            "mode": "threadpool" if self.max_workers == 0 else "process_pool",
+            "workers": self.max_workers,
+            "in_flight": self._in_flight,
+            "capacity": self.capacity,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "timed_out": self._timed_out,
+            "failed": self._failed
+        }
+
+
+# Singleton instance shared by the analyze and integrations routers
+analysis_executor = AnalysisExecutor(
+    max_workers=settings.ANALYSIS_WORKERS,
+    max_queue=settings.ANALYSIS_MAX_QUEUE,
+    job_timeout=settings.ANALYSIS_JOB_TIMEOUT,
+    max_jobs_per_worker=settings.ANALYSIS_MAX_JOBS_PER_WORKER
+)
@@ -0,0 +1,88 @@
+"""
+In-process queue for asynchronous analysis jobs.
+
+The API inserts an ``Analysis`` row in ``pending`` and enqueues its id; a
+fixed number of worker tasks pick ids off the queue and hand them to the
+job handler, which advances the row through its stages.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from api.config import settings
+
+
+class AnalysisJobQueue:
+    """
+    Bounded-concurrency runner for analysis jobs.
+
+    Jobs are identified by analysis id only; all job state lives in the
+    database so progress survives a restart and can be polled from any
+    API process.
+    """
+
+    def __init__(self, concurrency: int = 2):
+        self.concurrency = max(concurrency, 1)
+        self._handler: Optional[Callable[[str], Awaitable[Any]]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self, handler: Callable[[str], Awaitable[Any]]):
+        """Start the worker tasks on the running event loop"""
+        if self._workers:
+            return
+        self._handler = handler
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"analysis-job-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def shutdown(self):
+        """Cancel the workers; unfinished jobs stay pending in the database"""
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._queue = None
+
+    def enqueue(self, analysis_id: str):
+        if self._queue is None:
+            raise RuntimeError("Analysis job queue is not running")
+        self._queue.put_nowait(analysis_id)
+
+    async def _worker(self):
+        while True:
+            analysis_id = await self._queue.get()
+            self._active += 1
+            try:
+                await self._handler(analysis_id)
+                self._completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The handler records failures on the row; this only guards the worker
+                self._failed += 1
+                print(f"Analysis job {analysis_id} crashed: {e}")
+            finally:
+                self._active -= 1
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "active": self._active,
+            "completed": self._completed,
+            "failed": self._failed
+        }
+
+
+# Singleton instance, started from the app lifespan
+analysis_job_queue = AnalysisJobQueue(concurrency=settings.ANALYSIS_JOB_CONCURRENCY)
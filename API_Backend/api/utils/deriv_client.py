@@ -1,11 +1,29 @@
 """
 Deriv WebSocket API Client
+
+Calls go through the shared connection pool (api/utils/deriv_pool.py): one
+authorized socket per token, reused by every call and every client. Each
+call first waits for the rate governor (api/utils/deriv_governor.py).
 """
 import asyncio
-import json
-import websockets
+from collections import deque
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
+
+from api.utils.deriv_governor import account_key, deriv_governor, is_rate_limited
+from api.utils.deriv_pool import DerivAPIError, deriv_pool
+
+DERIV_WS_URL = "wss://ws.binaryws.com/websockets/v3?app_id={app_id}"
+
+PROFIT_TABLE_PAGE_SIZE = 500  # Largest 'limit' profit_table accepts
+PROFIT_TABLE_PAGES_IN_FLIGHT = 4
+RATE_LIMIT_RETRIES = 3  # Retries of a call Deriv rejected as over the rate limit
+
+
+def _consume_result(future: asyncio.Future):
+    # Mark an abandoned page request's outcome as retrieved
+    if not future.cancelled():
+        future.exception()
 
 class DerivAPIClient:
     """
@@ -13,59 +31,63 @@ class DerivAPIClient:
     Reference: https://api.deriv.com/
     """
     
-    def __init__(self, api_token: str, app_id: str = "1089", account_id: Optional[str] = None):
+    def __init__(self, api_token: str, app_id: str = "1089", account_id: Optional[str] = None,
+                 websocket_url: Optional[str] = None, pool=None, governor=None):
         self.api_token = api_token
         self.app_id = app_id
         self.account_id = account_id
         # Production WebSocket URL
-        self.websocket_url = f"wss://ws.binaryws.com/websockets/v3?app_id={app_id}"
+        self.websocket_url = websocket_url or DERIV_WS_URL.format(app_id=app_id)
+        self.pool = pool or deriv_pool
+        self.governor = governor or deriv_governor
+        self._account = account_key(api_token)
     
-    async def _call_api(self, request: Dict[str, Any]) -> Dict[str, Any]:
+    async def _request(self, request: Dict[str, Any], token: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Send a request through the rate governor on the token's pooled socket.
+        Rate-limit errors are retried once the governor's cooldown is over;
+        other errors raise DerivAPIError or DerivConnectionLost.
         """
-        Generic method to send a request and wait for a response.
-        Note: This is a simplified one-shot connection. For streaming, we'd keep the socket open.
+        token = token or self.api_token
+        account = self._account if token == self.api_token else account_key(token)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            try:
+                async with self.governor.slot(self.app_id, account):
+                    return await self.pool.request(self.websocket_url, token, request)
+            except DerivAPIError as e:
+                if not is_rate_limited(e) or attempt == RATE_LIMIT_RETRIES:
+                    raise
+        raise AssertionError("unreachable")  # pragma: no cover
+    
+    async def _call_api(self, request: Dict[str, Any], token: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Send a request on the token's pooled (already authorized) socket and
+        wait for its response.
         """
         try:
-            async with websockets.connect(self.websocket_url) as websocket:
-                # 1. Send Request
-                await websocket.send(json.dumps(request))
-                
-                # 2. Await Response
-                response = await websocket.recv()
-                data = json.loads(response)
-                
-                if "error" in data:
-                    print(f"Deriv API Error ({request.get('req_id')}): {data['error']['message']}")
-                    return {"success": False, "error": data['error']['message'], "code": data['error']['code']}
-                
-                return {"success": True, "data": data}
-                
+            data = await self._request(request, token)
+            return {"success": True, "data": data}
+        except DerivAPIError as e:
+            print(f"Deriv API Error ({next(iter(request), '?')}): {e.message}")
+            return {"success": False, "error": e.message, "code": e.code}
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return {"success": False, "error": str(e) or type(e).__name__}
 
     async def test_connection(self) -> Dict[str, Any]:
         """Test API connection and Authorize to get account info"""
         try:
-            # We must AUTHORIZE to test if the token is valid
-            print(f"DEBUG: Testing connection with token length: {len(self.api_token)}")
-            print(f"DEBUG: Token prefix: {self.api_token[:4]}...")
-            
-            request = {
-                "authorize": self.api_token,
-                "req_id": 1
-            }
-            
-            result = await self._call_api(request)
-            
-            if not result.get("success"):
-                err_msg = result.get("error", "Unknown error")
-                debug_info = f"TokenLen={len(self.api_token)} Type={type(self.api_token).__name__} ValErr={err_msg}"
+            # We must AUTHORIZE to test if the token is valid; the pooled
+            # socket authorizes once and keeps the response
+            try:
+                async with self.governor.slot(self.app_id, self._account):
+                    auth_data = await self.pool.authorize(self.websocket_url, self.api_token)
+            except DerivAPIError as e:
+                debug_info = f"TokenLen={len(self.api_token)} Type={type(self.api_token).__name__} ValErr={e.message}"
                 print(f"DEBUG: {debug_info}")
                 # Return this debug info so user can see it
                 return {"success": False, "error": debug_info}
             
             # Extract relevant account info
-            auth_data = result["data"].get("authorize", {})
             account_info = {
                 "loginid": auth_data.get("loginid"),
                 "fullname": auth_data.get("fullname"),
@@ -74,8 +96,8 @@ class DerivAPIClient:
                 "is_virtual": auth_data.get("is_virtual") == 1
             }
             
-            # Get MT5 accounts
-            mt5_accounts = await self.get_mt5_accounts(request["authorize"])
+            # Get MT5 accounts (same socket)
+            mt5_accounts = await self.get_mt5_accounts()
             
             return {
                 "success": True,
@@ -85,100 +107,113 @@ class DerivAPIClient:
             }
             
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return {"success": False, "error": str(e) or type(e).__name__}
 
-    async def get_mt5_accounts(self, token: str) -> List[Dict[str, Any]]:
+    async def get_mt5_accounts(self, token: Optional[str] = None) -> List[Dict[str, Any]]:
         """Fetch list of MT5 accounts linked to this Deriv account"""
-        try:
-             # We need a new connection or reuse one, but for simplicity via _call_api which creates one:
-             # Wait, _call_api connects fresh. We need to AUTH first.
-             # So let's do it cleanly here.
-            async with websockets.connect(self.websocket_url) as websocket:
-                await websocket.send(json.dumps({"authorize": token}))
-                auth_res = json.loads(await websocket.recv())
-                
-                if "error" in auth_res:
-                    print(f"MT5 List Auth Error: {auth_res['error']['message']}")
-                    return []
-                
-                # Request MT5 accounts
-                await websocket.send(json.dumps({"mt5_login_list": 1}))
-                res_str = await websocket.recv()
-                res = json.loads(res_str)
-                
-                if "error" in res:
-                    print(f"MT5 List Fetch Error: {res['error']['message']}")
-                    return []
-                
-                accounts = res.get("mt5_login_list", [])
-                
-                # Transform/Filter if needed
-                result = []
-                for acc in accounts:
-                    result.append({
-                        "login": acc.get("login"),
-                        "group": acc.get("group"),
-                        "balance": acc.get("balance"),
-                        "currency": acc.get("currency"),
-                        "leverage": acc.get("leverage"),
-                        "name": acc.get("name") # Sometimes available
-                    })
-                return result
-                
-        except Exception as e:
-            print(f"MT5 Account Fetch Error: {e}")
+        res = await self._call_api({"mt5_login_list": 1}, token)
+        if not res.get("success"):
+            print(f"MT5 List Fetch Error: {res.get('error')}")
             return []
+        
+        accounts = res["data"].get("mt5_login_list", [])
+        
+        # Transform/Filter if needed
+        result = []
+        for acc in accounts:
+            result.append({
+                "login": acc.get("login"),
+                "group": acc.get("group"),
+                "balance": acc.get("balance"),
+                "currency": acc.get("currency"),
+                "leverage": acc.get("leverage"),
+                "name": acc.get("name") # Sometimes available
+            })
+        return result
 
-    async def get_trades(self, days_back: int = 30) -> List[Dict[str, Any]]:
+    async def iter_trade_pages(
+        self,
+        days_back: int = 30,
+        page_size: int = PROFIT_TABLE_PAGE_SIZE,
+        max_in_flight: int = PROFIT_TABLE_PAGES_IN_FLIGHT,
+        since: Optional[datetime] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
         """
-        Get closed trades using the 'profit_table' endpoint.
+        Closed trades of the last ``days_back`` days from 'profit_table', one
+        transformed page at a time, oldest first. ``since`` narrows the
+        window to contracts sold from then on (incremental syncs).
+        
+        Pages are requested by ``offset``. The first page goes alone (an
+        incremental sync usually needs no more); once a full page comes back,
+        up to ``max_in_flight`` requests are kept outstanding on the pooled
+        socket, so the caller can persist one page while the next ones are
+        in transit. The window is pinned (``date_to``
+        = now) and sorted ascending so offsets stay stable while new
+        contracts close. Raises DerivAPIError or DerivConnectionLost.
         """
+        date_to = int(datetime.now().timestamp())
+        # date_from is "Epoch value of the starting date of the search."
+        date_from = date_to - days_back * 86400
+        if since is not None:
+            date_from = max(date_from, int(since.timestamp()))
+        request = {
+            "profit_table": 1,
+            "description": 1,
+            "limit": page_size,
+            "date_from": date_from,
+            "date_to": date_to,
+            "sort": "ASC"
+        }
+        
+        def fetch(offset: int) -> asyncio.Future:
+            return asyncio.ensure_future(self._request({**request, "offset": offset}))
+        
+        in_flight = deque([fetch(0)])
+        next_offset = page_size
+        seen = set()
         try:
-            # 1. Authorize First (Required for private data)
-            async with websockets.connect(self.websocket_url) as websocket:
-                # Auth
-                await websocket.send(json.dumps({"authorize": self.api_token}))
-                auth_res = json.loads(await websocket.recv())
-                
-                if "error" in auth_res:
-                    raise Exception(f"Auth failed: {auth_res['error']['message']}")
-                
-                # 2. Fetch Profit Table
-                # limit=3000 is a safe upper bound; for full history ensure paging if needed.
-                # date_from is "Epoch value of the starting date of the search."
-                date_from = int((datetime.now().timestamp()) - (days_back * 86400))
+            while in_flight:
+                response = await in_flight.popleft()
+                transactions = response.get("profit_table", {}).get("transactions", [])
+                last_page = len(transactions) < page_size
+                while not last_page and len(in_flight) < max(1, max_in_flight):
+                    in_flight.append(fetch(next_offset))
+                    next_offset += page_size
                 
-                req = {
-                    "profit_table": 1,
-                    "description": 1, 
-                    "limit": 100, # Start small for safety, or increase
-                    "date_from": date_from,
-                    "sort": "DESC" # Newest first
-                }
-                
-                await websocket.send(json.dumps(req))
-                res_str = await websocket.recv()
-                res = json.loads(res_str)
-                
-                if "error" in res:
-                    raise Exception(f"Fetch failed: {res['error']['message']}")
-                
-                transactions = res.get("profit_table", {}).get("transactions", [])
-                
-                # 3. Transform basic ProfitTable data to our schema
-                trades = []
+                # Transform basic ProfitTable data to our schema
+                page = []
                 for tx in transactions:
                     trade = self.transform_transaction_to_trade(tx)
-                    if trade:
-                        trades.append(trade)
-                
-                return trades
+                    if trade and trade["deriv_trade_id"] not in seen:
+                        seen.add(trade["deriv_trade_id"])
+                        page.append(trade)
+                if page:
+                    yield page
+                if last_page:
+                    break
+        finally:
+            # Requests past the last page (or after an error) aren't needed
+            for future in in_flight:
+                future.cancel()
+                future.add_done_callback(_consume_result)
 
+    async def get_trades(self, days_back: int = 30) -> List[Dict[str, Any]]:
+        """
+        Get all closed trades of the last ``days_back`` days using the
+        'profit_table' endpoint.
+        """
+        try:
+            trades = []
+            async for page in self.iter_trade_pages(days_back):
+                trades.extend(page)
+            return trades
+        
         except Exception as e:
             print(f"Detail Fetch Error: {e}")
             return []
 
-    def transform_transaction_to_trade(self, tx: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    @staticmethod
+    def transform_transaction_to_trade(tx: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Transform Deriv 'profit_table' transaction to internal Trade format.
         """
@@ -201,7 +236,7 @@ class DerivAPIClient:
                 "deriv_trade_id": str(tx.get("transaction_id")),
                 "transaction_id": str(tx.get("transaction_id")),
                 "contract_id": str(tx.get("contract_id")),
-                "symbol": self._parse_symbol(tx.get("display_name"), tx.get("shortcode")),
+                "symbol": DerivAPIClient._parse_symbol(tx.get("display_name"), tx.get("shortcode")),
                 "contract_type": tx.get("shortcode", "").split("_")[0] if tx.get("shortcode") else "UNKNOWN",
                 "currency": "USD", # Usually implicit or part of auth; assume USD or modify to fetch from account
                 
@@ -227,7 +262,8 @@ class DerivAPIClient:
              # print(f"Transformation Error: {e}")
              return None
 
-    def _parse_symbol(self, display_name, shortcode):
+    @staticmethod
+    def _parse_symbol(display_name, shortcode):
         """Attempts to return a clean symbol like 'R_100' or 'EURUSD'"""
         # Shortcode ex: CALL_R_100_10_... -> R_100 is inside
         # Display Name ex: Bear Market Index
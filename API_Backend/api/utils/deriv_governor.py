@@ -0,0 +1,184 @@
+"""
+Rate governor for Deriv API calls.
+
+Every call takes a token from two buckets: one per ``app_id`` (Deriv
+counts all of an application's traffic together) and one per account.
+Callers reserve their token up front and sleep until it is due, so
+waiting calls are served in arrival order without a lock.
+
+When Deriv answers with a rate-limit error, the buckets involved halve
+their rate, drain, and stop handing out tokens for ``cooldown_seconds``.
+Each ``recovery_seconds`` without another rate-limit error gives back a
+tenth of the configured rate, so throughput climbs back to the ceiling.
+"""
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.config import settings
+from api.utils.deriv_pool import DerivAPIError
+
+# Error codes Deriv uses when a client goes over its call limits
+RATE_LIMIT_CODES = frozenset({"RateLimit", "TooManyRequests"})
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return isinstance(error, DerivAPIError) and error.code in RATE_LIMIT_CODES
+
+
+def account_key(api_token: str) -> str:
+    """Bucket key of the account behind a token (the token itself is never kept)"""
+    return hashlib.sha256(api_token.encode()).hexdigest()[:16]
+
+
+class TokenBucket:
+    """Token bucket whose rate backs off on rate-limit errors and then recovers"""
+
+    def __init__(self, rate: float, burst: float, min_rate: float, recovery_seconds: float):
+        self.ceiling = rate
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.min_rate = min(min_rate, rate)
+        self.recovery_seconds = max(recovery_seconds, 0.001)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.last_change = self.updated
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        if self.rate < self.ceiling:
+            steps = int((now - self.last_change) // self.recovery_seconds)
+            if steps > 0:
+                self.rate = min(self.ceiling, self.rate + steps * self.ceiling / 10)
+                self.last_change += steps * self.recovery_seconds
+
+    def reserve(self, now: float) -> float:
+        """Take a token; returns the seconds until it is due"""
+        self._refill(now)
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate) + max(0.0, self.updated - now)
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a call could take a token without waiting"""
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate) + max(0.0, self.updated - now)
+
+    def throttle(self, now: float, cooldown: float):
+        self._refill(now)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.last_change = now
+        # Nothing is handed out until the cooldown is over
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = max(self.updated, now + cooldown)
+
+
+class DerivRateGovernor:
+    """Token buckets per app_id and per account, shared by every DerivAPIClient"""
+
+    def __init__(
+        self,
+        app_rate: float = 20,
+        app_burst: float = 40,
+        account_rate: float = 5,
+        account_burst: float = 10,
+        min_rate: float = 0.2,
+        cooldown_seconds: float = 10,
+        recovery_seconds: float = 30
+    ):
+        self.app_rate = app_rate
+        self.app_burst = app_burst
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.min_rate = min_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.recovery_seconds = recovery_seconds
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.queued = 0
+        self._metrics = {"calls": 0, "delayed": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+                         "rate_limited": 0}
+
+    def _bucket(self, kind: str, key: str) -> TokenBucket:
+        bucket = self._buckets.get((kind, key))
+        if bucket is None:
+            if kind == "app":
+                rate, burst = self.app_rate, self.app_burst
+            else:
+                rate, burst = self.account_rate, self.account_burst
+            bucket = TokenBucket(rate, burst, self.min_rate, self.recovery_seconds)
+            self._buckets[(kind, key)] = bucket
+        return bucket
+
+    def _buckets_for(self, app_id: str, account: Optional[str]) -> List[TokenBucket]:
+        buckets = [self._bucket("app", app_id)]
+        if account is not None:
+            buckets.append(self._bucket("account", account))
+        return buckets
+
+    async def acquire(self, app_id: str, account: Optional[str] = None):
+        """Wait until a call for this app_id (and account) is within the limits"""
+        buckets = self._buckets_for(app_id, account)
+        now = time.monotonic()
+        wait = max(bucket.reserve(now) for bucket in buckets)
+        self._metrics["calls"] += 1
+        if wait <= 0:
+            return
+        self._metrics["delayed"] += 1
+        self._metrics["wait_seconds"] += wait
+        self._metrics["max_wait_seconds"] = max(self._metrics["max_wait_seconds"], wait)
+        self.queued += 1
+        try:
+            await asyncio.sleep(wait)
+        finally:
+            self.queued -= 1
+
+    @asynccontextmanager
+    async def slot(self, app_id: str, account: Optional[str] = None):
+        """``acquire`` the call, and back off if Deriv still says it was over the limit"""
+        await self.acquire(app_id, account)
+        try:
+            yield
+        except DerivAPIError as e:
+            if is_rate_limited(e):
+                self.report_rate_limited(app_id, account)
+            raise
+
+    def report_rate_limited(self, app_id: str, account: Optional[str] = None):
+        buckets = self._buckets_for(app_id, account)
+        now = time.monotonic()
+        self._metrics["rate_limited"] += 1
+        for bucket in buckets:
+            bucket.throttle(now, self.cooldown_seconds)
+
+    def wait_time(self, app_id: str, account: Optional[str] = None) -> float:
+        """Seconds before the next call for this app_id (and account) would go out"""
+        buckets = self._buckets_for(app_id, account)
+        now = time.monotonic()
+        return max(bucket.wait_time(now) for bucket in buckets)
+
+    def stats(self) -> Dict[str, Any]:
+        throttled = {
+            f"{kind}:{key}": round(bucket.rate, 3)
+            for (kind, key), bucket in self._buckets.items() if bucket.rate < bucket.ceiling
+        }
+        return {
+            **self._metrics,
+            "wait_seconds": round(self._metrics["wait_seconds"], 3),
+            "max_wait_seconds": round(self._metrics["max_wait_seconds"], 3),
+            "queued": self.queued,
+            "buckets": len(self._buckets),
+            "throttled_rates": throttled
+        }
+
+
+# Singleton instance shared by every DerivAPIClient in this process
+deriv_governor = DerivRateGovernor(
+    app_rate=settings.DERIV_APP_RATE_PER_SECOND,
+    app_burst=settings.DERIV_APP_BURST,
+    account_rate=settings.DERIV_ACCOUNT_RATE_PER_SECOND,
+    account_burst=settings.DERIV_ACCOUNT_BURST,
+    cooldown_seconds=settings.DERIV_RATE_LIMIT_COOLDOWN_SECONDS
+)
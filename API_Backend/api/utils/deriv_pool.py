@@ -0,0 +1,291 @@
+"""
+Pooled, multiplexed connections to the Deriv WebSocket API.
+
+One socket is kept per (endpoint, API token). It is authorized once when
+it connects, and every request sent on it carries a unique ``req_id``. A
+reader task routes each response to the waiting request by that id, so
+any number of calls can share the socket concurrently.
+
+Each socket also has a keepalive task. It sends ``ping`` while the
+socket is quiet (Deriv drops idle connections after two minutes) and
+closes the socket once it has gone unused for ``idle_timeout``. Lost
+connections are re-opened with exponential backoff on the next request;
+requests cut off by the drop are retried once on the new connection.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import websockets
+
+
+class DerivAPIError(Exception):
+    """Error response from the Deriv API (``{"error": {"code", "message"}}``)"""
+
+    def __init__(self, message: str, code: Optional[str] = None, response: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+        self.response = response or {}
+
+
+class DerivConnectionLost(ConnectionError):
+    """The socket closed before the response to a request arrived"""
+
+
+class DerivSocket:
+    """One authorized WebSocket, shared by concurrent requests"""
+
+    def __init__(self, url: str, api_token: str, pool: "DerivConnectionPool"):
+        self.url = url
+        self.api_token = api_token
+        self.pool = pool
+        self.authorization: Optional[Dict[str, Any]] = None
+        self.last_used = time.monotonic()
+        self.connects = 0
+        self._ws = None
+        self._reader: Optional[asyncio.Task] = None
+        self._keepalive: Optional[asyncio.Task] = None
+        # req_id -> (socket the request went out on, future for its response)
+        self._pending: Dict[int, Tuple[Any, asyncio.Future]] = {}
+        self._req_ids = itertools.count(1)
+        self._connect_lock = asyncio.Lock()
+        self._last_sent = 0.0
+        self._closed = False
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None and self._reader is not None and not self._reader.done()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def request(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send ``payload`` and return its response; raises DerivAPIError on API errors"""
+        self.last_used = time.monotonic()
+        for attempt in range(2):
+            await self._ensure_connected()
+            try:
+                return await self._send(payload, timeout)
+            except DerivConnectionLost:
+                if attempt == 1:
+                    raise
+        raise DerivConnectionLost("unreachable")  # pragma: no cover
+
+    async def close(self):
+        self._closed = True
+        for task in (self._keepalive, self._reader):
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+        if self._ws is not None:
+            try:
+                await self._ws.close()
+            except Exception:
+                pass
+            self._ws = None
+        self._fail_pending(DerivConnectionLost("Socket closed"))
+
+    async def _ensure_connected(self):
+        if self.connected:
+            return
+        async with self._connect_lock:
+            if self.connected:
+                return
+            if self._closed:
+                raise DerivConnectionLost("Socket was closed by the pool")
+            await self._connect_with_backoff()
+
+    async def _connect_with_backoff(self):
+        pool = self.pool
+        for attempt in range(pool.max_retries + 1):
+            try:
+                self._ws = await websockets.connect(
+                    self.url,
+                    open_timeout=pool.connect_timeout,
+                    ping_interval=None,  # Deriv expects application-level pings
+                    max_size=pool.max_message_bytes
+                )
+                break
+            except Exception as e:
+                if attempt == pool.max_retries:
+                    raise DerivConnectionLost(f"Could not connect to Deriv: {e}") from e
+                delay = min(pool.backoff_max, pool.backoff_base * (2 ** attempt))
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+        self.connects += 1
+        pool.stats["connects"] += 1
+        self._reader = asyncio.create_task(self._read_loop(self._ws))
+        if self._keepalive is None or self._keepalive.done():
+            self._keepalive = asyncio.create_task(self._keepalive_loop())
+
+        # Authorize once per connection
+        try:
+            response = await self._send({"authorize": self.api_token}, pool.request_timeout)
+        except Exception:
+            await self._drop_connection()
+            raise
+        pool.stats["authorizations"] += 1
+        self.authorization = response.get("authorize", {})
+
+    async def _send(self, payload: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+        ws = self._ws
+        if ws is None:
+            raise DerivConnectionLost("Not connected")
+        req_id = next(self._req_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[req_id] = (ws, future)
+        try:
+            await ws.send(json.dumps({**payload, "req_id": req_id}))
+            self._last_sent = time.monotonic()
+            self.pool.stats["requests"] += 1
+            response = await asyncio.wait_for(future, timeout or self.pool.request_timeout)
+        except websockets.ConnectionClosed as e:
+            raise DerivConnectionLost(str(e)) from e
+        finally:
+            self._pending.pop(req_id, None)
+
+        if "error" in response:
+            error = response["error"]
+            raise DerivAPIError(error.get("message", "Unknown error"), error.get("code"), response)
+        return response
+
+    async def _read_loop(self, ws):
+        try:
+            async for message in ws:
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    continue
+                entry = self._pending.get(data.get("req_id"))
+                if entry is not None and entry[0] is ws and not entry[1].done():
+                    entry[1].set_result(data)
+        except websockets.ConnectionClosed:
+            pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Deriv socket reader error: {e}")
+        finally:
+            if self._ws is ws:
+                self._ws = None
+            self._fail_pending(DerivConnectionLost("Deriv connection closed"), ws)
+
+    async def _keepalive_loop(self):
+        pool = self.pool
+        try:
+            while not self._closed:
+                await asyncio.sleep(pool.keepalive_interval)
+                now = time.monotonic()
+                if now - self.last_used >= pool.idle_timeout and not self._pending:
+                    pool.stats["idle_evictions"] += 1
+                    await pool.evict(self)
+                    return
+                if self.connected and now - self._last_sent >= pool.keepalive_interval:
+                    try:
+                        await self._send({"ping": 1}, pool.request_timeout)
+                        pool.stats["pings"] += 1
+                    except Exception:
+                        # The next request reconnects
+                        await self._drop_connection()
+        except asyncio.CancelledError:
+            pass
+
+    async def _drop_connection(self):
+        ws, self._ws = self._ws, None
+        if ws is not None:
+            try:
+                await ws.close()
+            except Exception:
+                pass
+
+    def _fail_pending(self, error: Exception, ws=None):
+        """Fail requests waiting on ``ws`` (default: on any connection)"""
+        for sent_on, future in list(self._pending.values()):
+            if (ws is None or sent_on is ws) and not future.done():
+                future.set_exception(error)
+
+
+class DerivConnectionPool:
+    """Authorized sockets keyed by (endpoint URL, API token)"""
+
+    def __init__(
+        self,
+        max_sockets: int = 1000,
+        keepalive_interval: float = 30,
+        idle_timeout: float = 300,
+        request_timeout: float = 30,
+        connect_timeout: float = 10,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 10,
+        max_message_bytes: int = 16 * 1024 * 1024
+    ):
+        self.max_sockets = max_sockets
+        self.keepalive_interval = keepalive_interval
+        self.idle_timeout = idle_timeout
+        self.request_timeout = request_timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_message_bytes = max_message_bytes
+        self._sockets: "OrderedDict[Tuple[str, str], DerivSocket]" = OrderedDict()
+        self.stats = {"connects": 0, "authorizations": 0, "requests": 0, "pings": 0,
+                      "idle_evictions": 0, "lru_evictions": 0}
+
+    def socket(self, url: str, api_token: str) -> DerivSocket:
+        """The pooled socket for this token (connected lazily on first request)"""
+        key = (url, api_token)
+        sock = self._sockets.get(key)
+        if sock is None:
+            sock = DerivSocket(url, api_token, self)
+            self._sockets[key] = sock
+            self._evict_over_capacity()
+        self._sockets.move_to_end(key)
+        return sock
+
+    async def request(self, url: str, api_token: str, payload: Dict[str, Any],
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await self.socket(url, api_token).request(payload, timeout)
+
+    async def authorize(self, url: str, api_token: str) -> Dict[str, Any]:
+        """``authorize`` response of the token's socket, connecting if needed"""
+        sock = self.socket(url, api_token)
+        sock.last_used = time.monotonic()
+        await sock._ensure_connected()
+        return sock.authorization or {}
+
+    async def evict(self, sock: DerivSocket):
+        key = (sock.url, sock.api_token)
+        if self._sockets.get(key) is sock:
+            del self._sockets[key]
+        await sock.close()
+
+    async def close_all(self):
+        sockets = list(self._sockets.values())
+        self._sockets.clear()
+        await asyncio.gather(*(sock.close() for sock in sockets), return_exceptions=True)
+
+    def __len__(self) -> int:
+        return len(self._sockets)
+
+    def _evict_over_capacity(self):
+        # Least recently used sockets without requests in flight go first
+        for key in list(self._sockets):
+            if len(self._sockets) <= self.max_sockets:
+                break
+            sock = self._sockets[key]
+            if sock.in_flight:
+                continue
+            del self._sockets[key]
+            self.stats["lru_evictions"] += 1
+            asyncio.ensure_future(sock.close())
+
+
+# Singleton instance shared by every DerivAPIClient in this process
+deriv_pool = DerivConnectionPool()
@@ -1,50 +1,183 @@
 """
 Encryption utility for API keys and sensitive data
+
+The Fernet key is derived from ENCRYPTION_SECRET with PBKDF2 (100,000
+iterations) on first use. Setting ENCRYPTION_KEY to the derived key
+(print it with ``python -m api.utils.encryption``) skips the KDF so
+workers start without it.
+
+Decrypted secrets are kept in a small TTL cache keyed by a hash of the
+ciphertext. The plaintext is held in a bytearray that is overwritten
+with zeros when the entry expires or is evicted. Strings handed to
+callers are ordinary immutable copies and can't be wiped.
 """
 import os
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
+import hashlib
 import json
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from api.config import settings
+
+SALT = b"tradeguard_deriv_salt"  # Should be random and stored securely in production
+KDF_ITERATIONS = 100000
+
+def derive_key(secret: str, salt: bytes = SALT) -> bytes:
+    """Fernet key for ``secret`` (the slow part of startup)"""
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=KDF_ITERATIONS,
+    )
+    return base64.urlsafe_b64encode(kdf.derive(secret.encode()))
+
+
+class SecretCache:
+    """TTL + LRU cache of decrypted secrets, zeroized on eviction"""
+
+    def __init__(self, ttl_seconds: float = 300, max_entries: int = 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[float, bytearray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    @staticmethod
+    def key(encrypted_data: str) -> bytes:
+        return hashlib.sha256(encrypted_data.encode()).digest()
+
+    def get(self, encrypted_data: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        key = self.key(encrypted_data)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1].decode()
+
+    def put(self, encrypted_data: str, plaintext: str):
+        if not self.enabled:
+            return
+        key = self.key(encrypted_data)
+        with self._lock:
+            if key in self._entries:
+                self._evict(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, bytearray(plaintext.encode()))
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def purge_expired(self) -> int:
+        """Zeroize and drop expired entries; returns how many were dropped"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (expires, _) in self._entries.items() if expires <= now]
+            for key in expired:
+                self._evict(key)
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self, key: bytes):
+        _, plaintext = self._entries.pop(key)
+        plaintext[:] = bytes(len(plaintext))
+
 
 class EncryptionService:
     """Service for encrypting/decrypting sensitive data"""
-    
-    def __init__(self):
-        # Use environment variable for encryption key
+
+    def __init__(self, secret_key: Optional[str] = None, derived_key: Optional[str] = None,
+                 cache_ttl_seconds: float = 300, cache_max_entries: int = 1024):
+        # Use environment variables for the key
         # In production, use a secure key management system
-        self.secret_key = os.getenv("ENCRYPTION_SECRET", "default-secret-key-change-in-production")
-        self.salt = b"tradeguard_deriv_salt"  # Should be random and stored securely in production
-        
-        # Derive key from secret
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=self.salt,
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(self.secret_key.encode()))
-        self.cipher = Fernet(key)
-    
+        self.secret_key = secret_key or os.getenv("ENCRYPTION_SECRET", "default-secret-key-change-in-production")
+        self.salt = SALT
+        self._derived_key = derived_key or None
+        self._cipher: Optional[Fernet] = None
+        self._cipher_lock = threading.Lock()
+
+        self.cache = SecretCache(cache_ttl_seconds, cache_max_entries)
+
+        if self._derived_key:
+            # Fail at startup, not on first decrypt, if the key is malformed
+            self._cipher = Fernet(self._derived_key.encode())
+
+    @property
+    def cipher(self) -> Fernet:
+        """Fernet cipher, deriving the key from the secret on first use"""
+        if self._cipher is None:
+            with self._cipher_lock:
+                if self._cipher is None:
+                    self._cipher = Fernet(derive_key(self.secret_key, self.salt))
+        return self._cipher
+
     def encrypt(self, data: str) -> str:
         """Encrypt a string"""
         return self.cipher.encrypt(data.encode()).decode()
-    
+
     def decrypt(self, encrypted_data: str) -> Optional[str]:
-        """Decrypt an encrypted string"""
+        """Decrypt an encrypted string (None when there is nothing to decrypt or it fails)"""
+        if not encrypted_data or not isinstance(encrypted_data, str):
+            return None
+        cached = self.cache.get(encrypted_data)
+        if cached is not None:
+            return cached
         try:
-            return self.cipher.decrypt(encrypted_data.encode()).decode()
+            plaintext = self.cipher.decrypt(encrypted_data.encode()).decode()
         except Exception as e:
             print(f"Decryption error: {e}")
             return None
-    
+        self.cache.put(encrypted_data, plaintext)
+        return plaintext
+
+    def decrypt_many(self, encrypted_values: Iterable[Optional[str]]) -> List[Optional[str]]:
+        """
+        Decrypt a batch (e.g. every connection token due for sync).
+        Duplicates are decrypted once; None or undecryptable values give None.
+        """
+        encrypted_values = list(encrypted_values)
+        plaintexts: Dict[str, Optional[str]] = {}
+        failures = 0
+        for encrypted_data in encrypted_values:
+            if not isinstance(encrypted_data, str) or encrypted_data in plaintexts:
+                continue
+            plaintext = self.cache.get(encrypted_data)
+            if plaintext is None:
+                try:
+                    plaintext = self.cipher.decrypt(encrypted_data.encode()).decode()
+                    self.cache.put(encrypted_data, plaintext)
+                except (InvalidToken, ValueError, UnicodeDecodeError):
+                    failures += 1
+            plaintexts[encrypted_data] = plaintext
+        if failures:
+            print(f"Decryption error: {failures} of {len(plaintexts)} values could not be decrypted")
+        return [plaintexts.get(value) if isinstance(value, str) else None for value in encrypted_values]
+
     def encrypt_dict(self, data: dict) -> str:
         """Encrypt a dictionary"""
         json_str = json.dumps(data)
         return self.encrypt(json_str)
-    
+
     def decrypt_dict(self, encrypted_data: str) -> Optional[dict]:
         """Decrypt to dictionary"""
         decrypted = self.decrypt(encrypted_data)
@@ -53,4 +186,13 @@ class EncryptionService:
         return None
 
 # Singleton instance
-encryption_service = EncryptionService()
\ No newline at end of file
+encryption_service = EncryptionService(
+    secret_key=settings.ENCRYPTION_SECRET,
+    derived_key=settings.ENCRYPTION_KEY,
+    cache_ttl_seconds=settings.SECRET_CACHE_TTL_SECONDS,
+    cache_max_entries=settings.SECRET_CACHE_MAX_ENTRIES
+)
+
+if __name__ == "__main__":
+    # Print the key to export as ENCRYPTION_KEY for the current ENCRYPTION_SECRET
+    print(derive_key(encryption_service.secret_key).decode())
@@ -1,9 +1,14 @@
 import pandas as pd
+import numpy as np
 from bs4 import BeautifulSoup
+from lxml import etree
 import io
 import re
 from datetime import datetime
 
+# Rows per table that are searched for a header signature
+HEADER_SCAN_ROWS = 50
+
 def _clean_number(text):
     """Clean currency string to float"""
     if not text:
@@ -28,61 +33,20 @@ def _clean_date(text):
     # Replace dots with dashes (2025.11.01 -> 2025-11-01)
     return text.replace('.', '-')
 
-def parse_mt5_html(content_bytes: bytes) -> pd.DataFrame:
-    """
-    Robustly parses an MT5 HTML Report.
-    Handles duplicate columns (Time, Price) for Entry/Exit.
-    """
-    print("DEBUG: Starting MT5 Parse (v2)")
-    soup = BeautifulSoup(content_bytes, 'html.parser')
-    tables = soup.find_all('table')
-    
-    target_table = None
-    headers = []
-    
-    # 1. Look for known table signatures
-    candidate_tables = []
-    
-    for idx, table in enumerate(tables):
-        rows = table.find_all('tr')
-        if not rows: 
-            continue
-            
-        # Check first 50 rows for header candidates (MT5 reports can have long preambles)
-        for r_idx, r in enumerate(rows[:50]):
-            cells = [c.get_text(strip=True) for c in r.find_all(['th', 'td'])]
-            
-            # Debug: what are we seeing?
-            # print(f"DEBUG: Scanned Row {idx}:{r_idx} -> {cells}")
-            
-            # Simple signature check
-            score = 0
-            # Convert to set for O(1) lookup and case insensitivity logic if needed
-            cell_set = set(cells)
-            
-            if "Time" in cell_set or "Open Time" in cell_set: score += 1
-            if "Profit" in cell_set: score += 1
-            if "Symbol" in cell_set: score += 1
-            if "Type" in cell_set: score += 1
-            if "Volume" in cell_set or "Size" in cell_set: score += 1
-            
-            # Also catch "Positions" or "Orders" single headers if we want to be smarter? 
-            # No, looking for the column headers is safest.
-            
-            if score >= 3:
-                # Store candidate: (Score, TableIndex, TableObj, HeaderRow, HeaderRowIndex)
-                candidate_tables.append((score, idx, table, cells, r_idx))
-                
-    if not candidate_tables:
-        print("DEBUG: No table matched enough MT5 headers.")
-        raise ValueError("Could not visually identify an MT5 History table.")
-        
-    # Pick best table
-    candidate_tables.sort(key=lambda x: x[0], reverse=True)
-    best_score, best_idx, target_table, header_row, header_row_idx = candidate_tables[0]
-    print(f"DEBUG: Found best table (Score {best_score}) with headers: {header_row}")
+def _header_score(cells):
+    """How many MT5 column names a row contains (>= 3 marks a header row)"""
+    cell_set = set(cells)
+    score = 0
+    if "Time" in cell_set or "Open Time" in cell_set: score += 1
+    if "Profit" in cell_set: score += 1
+    if "Symbol" in cell_set: score += 1
+    if "Type" in cell_set: score += 1
+    if "Volume" in cell_set or "Size" in cell_set: score += 1
+    return score
 
-    # 2. Dynamic Column Mapping (Handling Duplicates)
+
+def _map_columns(header_row):
+    """Map trade fields to cell indices of the header row (-1 when absent)"""
     col_map = {
         'entry_time': -1,
         'exit_time': -1,
@@ -96,7 +60,6 @@ def parse_mt5_html(content_bytes: bytes) -> pd.DataFrame:
     
     lower_headers = [h.lower() for h in header_row]
     
-    # helper to find index (optionally skipping used indices, not needed for unique)
     def find_all_indices(keywords):
         indices = []
         for i, h in enumerate(lower_headers):
@@ -106,7 +69,6 @@ def parse_mt5_html(content_bytes: bytes) -> pd.DataFrame:
                     break
         return sorted(list(set(indices)))
 
-    # Map Symbol, Type, Profit (usually unique)
     sym_idxs = find_all_indices(['symbol', 'item'])
     if sym_idxs: col_map['symbol'] = sym_idxs[0]
     
@@ -114,29 +76,254 @@ def parse_mt5_html(content_bytes: bytes) -> pd.DataFrame:
     if type_idxs: col_map['type'] = type_idxs[0]
     
     profit_idxs = find_all_indices(['profit'])
-    if profit_idxs: col_map['profit'] = profit_idxs[-1] # Use last profit if multiple (e.g. swap/profit) - though usually "Profit" is last
+    if profit_idxs: col_map['profit'] = profit_idxs[-1]
     
     vol_idxs = find_all_indices(['volume', 'size', 'quantity'])
     if vol_idxs: col_map['volume'] = vol_idxs[0]
     
-    # Map Time (Entry vs Exit)
+    # First time column is the entry, the second the exit
     time_idxs = find_all_indices(['time', 'date'])
     if len(time_idxs) >= 2:
         col_map['entry_time'] = time_idxs[0]
-        col_map['exit_time'] = time_idxs[1] # Second time column is Exit
+        col_map['exit_time'] = time_idxs[1]
     elif len(time_idxs) == 1:
         col_map['entry_time'] = time_idxs[0]
-        col_map['exit_time'] = time_idxs[0] # Fallback
+        col_map['exit_time'] = time_idxs[0]
         
-    # Map Price (Entry vs Exit)
     price_idxs = find_all_indices(['price'])
-    # Filter out "price" that might be a subheading? Usually "Price" occurs twice.
     if len(price_idxs) >= 2:
         col_map['entry_price'] = price_idxs[0]
         col_map['exit_price'] = price_idxs[1]
     elif len(price_idxs) == 1:
         col_map['entry_price'] = price_idxs[0]
         
+    return col_map
+
+
+class _FastPathUnsupported(Exception):
+    """Report layout the streaming parser does not handle; use BeautifulSoup"""
+
+
+class MT5ParseError(ValueError):
+    """The report has an MT5 table but no usable trades"""
+
+
+def _cell_text(cell):
+    """Equivalent of BeautifulSoup get_text(strip=True)"""
+    if len(cell) == 0:
+        # Plain text cell, the common case
+        text = cell.text
+        return text.strip() if text else ""
+    return "".join(t.strip() for t in cell.itertext())
+
+
+def _clean_numbers(values: pd.Series) -> np.ndarray:
+    """Vectorized _clean_number"""
+    values = values.fillna("")
+    bracketed = values.str.contains("(", regex=False) & values.str.contains(")", regex=False)
+    values = values.where(~bracketed, "-" + values.str.replace(r"[()]", "", regex=True))
+    cleaned = values.str.replace(r"[^\d\.\-]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+
+
+def _clean_dates(values: pd.Series) -> pd.Series:
+    """Vectorized _clean_date + pd.to_datetime(errors='coerce')"""
+    values = values.str.replace(".", "-", regex=False)
+    # One format inferred for the whole column is the fast path; cells it
+    # can't handle get the per-value parser
+    parsed = pd.to_datetime(values, errors="coerce")
+    retry = parsed.isna() & values.fillna("").ne("")
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return parsed
+
+
+def _parse_mt5_html_lxml(source) -> pd.DataFrame:
+    """
+    Streaming MT5 report parser.
+    
+    Rows are read with lxml iterparse and dropped from the tree once their
+    cell text is taken, so the document is never held as a full tree. The
+    header is located with the same signature as the BeautifulSoup parser,
+    the mapped columns are collected as lists and every column is then
+    converted in one vectorized step.
+    """
+    table_stack = []   # open tables: [table_index, row_count, best_candidate, rows]
+    finished = []
+    table_count = 0
+    
+    for event, elem in etree.iterparse(source, events=("start", "end"), tag=("table", "tr"),
+                                       html=True, recover=True, huge_tree=True):
+        if elem.tag == "table":
+            if event == "start":
+                if table_stack:
+                    raise _FastPathUnsupported("nested tables")
+                table_stack.append([table_count, 0, None, []])
+                table_count += 1
+            else:
+                finished.append(table_stack.pop())
+                elem.clear()
+            continue
+        
+        if event != "end" or not table_stack:
+            continue
+        
+        table = table_stack[-1]
+        row_idx = table[1]
+        table[1] += 1
+        
+        if row_idx < HEADER_SCAN_ROWS:
+            header_cells = [_cell_text(c) for c in elem if c.tag in ("th", "td")]
+            score = _header_score(header_cells)
+            if score >= 3 and (table[2] is None or score > table[2][0]):
+                table[2] = (score, row_idx, header_cells)
+        
+        # Only rows after a candidate header can be data rows
+        if table[2] is not None:
+            table[3].append((row_idx, [_cell_text(c) for c in elem if c.tag == "td"]))
+        
+        # Drop the row (and anything before it) from the partial tree
+        elem.clear()
+        parent = elem.getparent()
+        while elem.getprevious() is not None:
+            del parent[0]
+    
+    candidates = [t for t in finished if t[2] is not None]
+    if not candidates:
+        # Could also be an encoding lxml didn't detect; let BeautifulSoup decide
+        raise _FastPathUnsupported("no table matched enough MT5 headers")
+    
+    # Highest score wins; the first table wins ties
+    best = max(sorted(candidates, key=lambda t: t[0]), key=lambda t: t[2][0])
+    best_score, header_row_idx, header_row = best[2]
+    print(f"DEBUG: Found best table (Score {best_score}) with headers: {header_row}")
+    
+    col_map = _map_columns(header_row)
+    print(f"DEBUG: Column Map: {col_map}")
+    if col_map['profit'] == -1:
+        raise MT5ParseError("Could not find 'Profit' column.")
+    
+    required_idx = max(col_map.values())
+    rows = [cells for r_idx, cells in best[3]
+            if r_idx > header_row_idx and cells and len(cells) > required_idx]
+    
+    # Gather the mapped cells into column lists
+    columns = {
+        field: pd.Series([cells[idx] for cells in rows], dtype=object)
+        for field, idx in col_map.items() if idx != -1 or field == 'symbol'
+    }
+    symbol = columns['symbol']
+    trade_type = columns['type'] if 'type' in columns else pd.Series("Unknown", index=symbol.index, dtype=object)
+    
+    keep = (symbol.ne("") & trade_type.ne("")
+            & ~trade_type.str.lower().isin(['balance', 'credit', 'total'])).to_numpy()
+    if not keep.any():
+        raise MT5ParseError("No valid trades found. Parser failed on 0 candidate rows.")
+    columns = {field: values[keep].reset_index(drop=True) for field, values in columns.items()}
+    n = int(keep.sum())
+    
+    def numbers(field):
+        return _clean_numbers(columns[field]) if field in columns else np.zeros(n)
+    
+    if 'entry_time' in columns:
+        entry_time = _clean_dates(columns['entry_time'])
+    else:
+        entry_time = pd.Series(pd.NaT, index=range(n), dtype="datetime64[ns]")
+    exit_time = _clean_dates(columns['exit_time']) if 'exit_time' in columns else entry_time.copy()
+    
+    # Unparseable entry times fall back to now, exit times to the entry time
+    entry_time = entry_time.fillna(pd.Timestamp(datetime.now()))
+    exit_time = exit_time.fillna(entry_time)
+    
+    df = pd.DataFrame({
+        "trade_id": [f"mt5_{i}" for i in range(1, n + 1)],
+        "symbol": columns['symbol'],
+        "trade_type": columns['type'] if 'type' in columns else "Unknown",
+        "lot_size": numbers('volume'),
+        "profit_loss": numbers('profit'),
+        "entry_time": entry_time,
+        "exit_time": exit_time,
+        "entry_price": numbers('entry_price'),
+        "exit_price": numbers('exit_price')
+    })
+    
+    print(f"DEBUG: Success. Extracted {len(df)} trades.")
+    return df
+
+
+def parse_mt5_html(source) -> pd.DataFrame:
+    """
+    Parse an MT5 HTML Report given as bytes or a file path.
+    
+    Uses the streaming lxml parser and falls back to the BeautifulSoup
+    parser for layouts it does not handle (or if it fails outright).
+    """
+    stream = io.BytesIO(source) if isinstance(source, bytes) else source
+    try:
+        return _parse_mt5_html_lxml(stream)
+    except MT5ParseError:
+        # The table was found but holds no trades; BeautifulSoup would agree
+        raise
+    except Exception as e:
+        print(f"DEBUG: Fast MT5 parse unavailable ({e}), using BeautifulSoup")
+    
+    if isinstance(source, bytes):
+        content_bytes = source
+    else:
+        with open(source, 'rb') as f:
+            content_bytes = f.read()
+    return _parse_mt5_html_soup(content_bytes)
+
+
+def _parse_mt5_html_soup(content_bytes: bytes) -> pd.DataFrame:
+    """
+    Robustly parses an MT5 HTML Report.
+    Handles duplicate columns (Time, Price) for Entry/Exit.
+    """
+    print("DEBUG: Starting MT5 Parse (v2)")
+    soup = BeautifulSoup(content_bytes, 'html.parser')
+    tables = soup.find_all('table')
+    
+    target_table = None
+    headers = []
+    
+    # 1. Look for known table signatures
+    candidate_tables = []
+    
+    for idx, table in enumerate(tables):
+        rows = table.find_all('tr')
+        if not rows: 
+            continue
+            
+        # Check first 50 rows for header candidates (MT5 reports can have long preambles)
+        for r_idx, r in enumerate(rows[:HEADER_SCAN_ROWS]):
+            cells = [c.get_text(strip=True) for c in r.find_all(['th', 'td'])]
+            
+            # Debug: what are we seeing?
+            # print(f"DEBUG: Scanned Row {idx}:{r_idx} -> {cells}")
+            
+            # Simple signature check
+            score = _header_score(cells)
+            
+            # Also catch "Positions" or "Orders" single headers if we want to be smarter? 
+            # No, looking for the column headers is safest.
+            
+            if score >= 3:
+                # Store candidate: (Score, TableIndex, TableObj, HeaderRow, HeaderRowIndex)
+                candidate_tables.append((score, idx, table, cells, r_idx))
+                
+    if not candidate_tables:
+        print("DEBUG: No table matched enough MT5 headers.")
+        raise ValueError("Could not visually identify an MT5 History table.")
+        
+    # Pick best table
+    candidate_tables.sort(key=lambda x: x[0], reverse=True)
+    best_score, best_idx, target_table, header_row, header_row_idx = candidate_tables[0]
+    print(f"DEBUG: Found best table (Score {best_score}) with headers: {header_row}")
+
+    # 2. Dynamic Column Mapping (Handling Duplicates)
+    col_map = _map_columns(header_row)
+        
     print(f"DEBUG: Column Map: {col_map}")
     
     # 3. Parse Data
@@ -4,22 +4,35 @@ Prediction engine for generating risk alerts
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 import statistics
 from collections import Counter
 
+# Days checked by the day-of-week alert, numbered as in Series.dt.dayofweek
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
 class PredictionEngine:
     """Engine for generating predictive risk alerts"""
     
-    def __init__(self, metrics: Dict[str, Any], trades_data: List[Dict], risk_results: Dict[str, Any]):
+    def __init__(self, metrics: Dict[str, Any], trades_data: Union[List[Dict], pd.DataFrame], risk_results: Dict[str, Any]):
         self.metrics = metrics
         self.trades_data = trades_data
         self.risk_results = risk_results
-        self.df = pd.DataFrame(trades_data) if trades_data else pd.DataFrame()
-        
+        if isinstance(trades_data, pd.DataFrame):
+            # A stored trade frame: a shallow copy shares its (mapped) data
+            # while the column conversions below only touch this frame
+            self.df = trades_data.copy(deep=False)
+        else:
+            self.df = pd.DataFrame(trades_data) if trades_data else pd.DataFrame()
+        # Parsed entry times in trade order, set by _prepare()
+        self.times: Optional[pd.Series] = None
+        self._prepared = False
+        self._time_error: Optional[Exception] = None
+    
     def generate_all_alerts(self, timeframe: str = "next_week") -> List[Dict[str, Any]]:
         """Generate all predictive alerts"""
         alerts = []
+        self._prepare()
         
         # Generate alerts based on different detection methods
         alerts.extend(self._detect_pattern_alerts(timeframe))
@@ -32,6 +45,26 @@ class PredictionEngine:
         
         return alerts
     
+    def _prepare(self):
+        """
+        Parse entry times once and sort the trades by them (ties keep their
+        order); the detectors then work on whole columns of the sorted frame
+        """
+        if self._prepared:
+            return
+        self._prepared = True
+        if self.df.empty or 'entry_time' not in self.df.columns:
+            return
+        try:
+            entry_time = pd.to_datetime(self.df['entry_time'])
+        except Exception as e:
+            # No time order to go by, so none of the detectors can run
+            self._time_error = e
+            print(f"Error parsing trade entry times: {e}")
+            return
+        self.df = self.df.assign(entry_time=entry_time).sort_values('entry_time', kind='stable')
+        self.times = self.df['entry_time']
+    
     def _severity_to_score(self, severity: str) -> int:
         """Convert severity string to numeric score for sorting"""
         scores = {"low": 1, "medium": 2, "high": 3, "critical": 4}
@@ -40,16 +73,12 @@ class PredictionEngine:
     def _detect_pattern_alerts(self, timeframe: str) -> List[Dict[str, Any]]:
         """Detect pattern-based alerts"""
         alerts = []
+        self._prepare()
         
-        if self.df.empty or len(self.df) < 5:
+        if self.df.empty or len(self.df) < 5 or self._time_error is not None:
             return alerts
         
         try:
-            # Convert timestamps if needed
-            if 'entry_time' in self.df.columns:
-                self.df['entry_time'] = pd.to_datetime(self.df['entry_time'])
-                self.df = self.df.sort_values('entry_time')
-            
             # Check for consecutive losses pattern
             if 'profit_loss' in self.df.columns:
                 profit_series = self.df['profit_loss']
@@ -103,36 +132,34 @@ class PredictionEngine:
             
             # Pattern: Position size escalation
             if 'lot_size' in self.df.columns and len(self.df) >= 10:
-                recent_trades = self.df.tail(5)
-                earlier_trades = self.df.iloc[-10:-5] if len(self.df) >= 10 else self.df.iloc[:-5]
+                lot_sizes = self.df['lot_size']
+                avg_recent_size = lot_sizes.iloc[-5:].mean()
+                avg_earlier_size = lot_sizes.iloc[-10:-5].mean()
                 
-                if not earlier_trades.empty and not recent_trades.empty:
-                    avg_recent_size = recent_trades['lot_size'].mean()
-                    avg_earlier_size = earlier_trades['lot_size'].mean()
-                    
-                    if avg_recent_size > avg_earlier_size * 1.5:  # 50% increase
-                        alerts.append({
-                            "alert_type": "pattern",
-                            "severity": "high",
-                            "title": "Position Size Escalation",
-                            "description": f"Your average position size increased by "
-                                         f"{(avg_recent_size/avg_earlier_size - 1)*100:.0f}%. "
-                                         f"This could indicate overtrading or emotional trading.",
-                            "confidence": 0.75,
-                            "timeframe": "next_week",
-                            "suggested_actions": [
-                                "Return to your standard position sizing",
-                                "Review why position sizes increased",
-                                "Set hard limits on maximum position size"
-                            ],
-                            "trigger_conditions": {
-                                "pattern": "position_size_increase",
-                                "increase_percent": (avg_recent_size/avg_earlier_size - 1) * 100,
-                                "recent_avg": avg_recent_size,
-                                "previous_avg": avg_earlier_size
-                            }
-                        })
-            
+                if avg_recent_size > avg_earlier_size * 1.5:  # 50% increase
+                    increase_percent = float((avg_recent_size/avg_earlier_size - 1) * 100)
+                    alerts.append({
+                        "alert_type": "pattern",
+                        "severity": "high",
+                        "title": "Position Size Escalation",
+                        "description": f"Your average position size increased by "
+                                     f"{increase_percent:.0f}%. "
+                                     f"This could indicate overtrading or emotional trading.",
+                        "confidence": 0.75,
+                        "timeframe": "next_week",
+                        "suggested_actions": [
+                            "Return to your standard position sizing",
+                            "Review why position sizes increased",
+                            "Set hard limits on maximum position size"
+                        ],
+                        "trigger_conditions": {
+                            "pattern": "position_size_increase",
+                            "increase_percent": increase_percent,
+                            "recent_avg": float(avg_recent_size),
+                            "previous_avg": float(avg_earlier_size)
+                        }
+                    })
+        
         except Exception as e:
             print(f"Error in pattern detection: {e}")
         
@@ -141,52 +168,46 @@ class PredictionEngine:
     def _detect_behavioral_alerts(self, timeframe: str) -> List[Dict[str, Any]]:
         """Detect behavioral pattern alerts"""
         alerts = []
+        self._prepare()
         
-        if self.df.empty or len(self.df) < 10:
+        if self.df.empty or len(self.df) < 10 or self._time_error is not None:
             return alerts
         
         try:
             # Behavioral: Trading frequency changes
-            if 'entry_time' in self.df.columns:
-                self.df['entry_time'] = pd.to_datetime(self.df['entry_time'])
-                self.df['date'] = self.df['entry_time'].dt.date
-                
-                trades_by_date = self.df.groupby('date').size()
-                if len(trades_by_date) >= 5:
-                    recent_dates = sorted(trades_by_date.index)[-3:]
-                    earlier_dates = sorted(trades_by_date.index)[-6:-3] if len(trades_by_date) >= 6 else []
+            if self.times is not None:
+                trades_by_date = self.times.groupby(self.times.dt.normalize()).size().to_numpy()
+                if len(trades_by_date) >= 6:
+                    recent_avg = trades_by_date[-3:].mean()
+                    earlier_avg = trades_by_date[-6:-3].mean()
                     
-                    if earlier_dates:
-                        recent_avg = trades_by_date[recent_dates].mean()
-                        earlier_avg = trades_by_date[earlier_dates].mean()
-                        
-                        if recent_avg > earlier_avg * 2:  # Doubled trading frequency
-                            alerts.append({
-                                "alert_type": "behavioral",
-                                "severity": "high",
-                                "title": "Increased Trading Frequency",
-                                "description": f"Your trading frequency increased from "
-                                             f"{earlier_avg:.1f} to {recent_avg:.1f} trades per day. "
-                                             f"This could indicate overtrading.",
-                                "confidence": 0.8,
-                                "timeframe": "next_week",
-                                "suggested_actions": [
-                                    "Set a daily trade limit",
-                                    "Take a trading break",
-                                    "Review your trading strategy"
-                                ],
-                                "trigger_conditions": {
-                                    "pattern": "increased_frequency",
-                                    "increase_percent": (recent_avg/earlier_avg - 1) * 100,
-                                    "recent_avg": recent_avg,
-                                    "previous_avg": earlier_avg
-                                }
-                            })
+                    if recent_avg > earlier_avg * 2:  # Doubled trading frequency
+                        alerts.append({
+                            "alert_type": "behavioral",
+                            "severity": "high",
+                            "title": "Increased Trading Frequency",
+                            "description": f"Your trading frequency increased from "
+                                         f"{earlier_avg:.1f} to {recent_avg:.1f} trades per day. "
+                                         f"This could indicate overtrading.",
+                            "confidence": 0.8,
+                            "timeframe": "next_week",
+                            "suggested_actions": [
+                                "Set a daily trade limit",
+                                "Take a trading break",
+                                "Review your trading strategy"
+                            ],
+                            "trigger_conditions": {
+                                "pattern": "increased_frequency",
+                                "increase_percent": float((recent_avg/earlier_avg - 1) * 100),
+                                "recent_avg": float(recent_avg),
+                                "previous_avg": float(earlier_avg)
+                            }
+                        })
             
             # Behavioral: Stop-loss discipline
             if 'stop_loss' in self.df.columns:
                 sl_missing = self.df['stop_loss'].isna() | (self.df['stop_loss'] == 0)
-                sl_missing_rate = sl_missing.mean()
+                sl_missing_rate = float(sl_missing.mean())
                 
                 if sl_missing_rate > 0.3:  # More than 30% missing stop-loss
                     alerts.append({
@@ -205,43 +226,40 @@ class PredictionEngine:
                         "trigger_conditions": {
                             "pattern": "missing_stop_loss",
                             "missing_rate": sl_missing_rate,
-                            "trades_without_sl": sl_missing.sum()
+                            "trades_without_sl": int(sl_missing.sum())
                         }
                     })
             
             # Behavioral: Time since last loss reaction
-            if 'profit_loss' in self.df.columns and 'entry_time' in self.df.columns:
-                loss_indices = self.df[self.df['profit_loss'] < 0].index
-                if len(loss_indices) >= 2:
-                    # Check time between loss and next trade
-                    for i in range(len(loss_indices) - 1):
-                        loss_time = self.df.loc[loss_indices[i], 'entry_time']
-                        next_trade_time = self.df.loc[loss_indices[i] + 1, 'entry_time'] if loss_indices[i] + 1 < len(self.df) else None
-                        
-                        if next_trade_time:
-                            time_diff = (next_trade_time - loss_time).total_seconds() / 3600  # hours
-                            if time_diff < 2:  # Trade within 2 hours of a loss
-                                alerts.append({
-                                    "alert_type": "behavioral",
-                                    "severity": "high",
-                                    "title": "Quick Trade After Loss",
-                                    "description": f"You traded within {time_diff:.1f} hours of a loss. "
-                                                 f"This could be revenge trading.",
-                                    "confidence": 0.7,
-                                    "timeframe": "next_trade",
-                                    "suggested_actions": [
-                                        "Wait at least 4 hours after a loss",
-                                        "Review your emotional state before trading",
-                                        "Stick to your trading schedule"
-                                    ],
-                                    "trigger_conditions": {
-                                        "pattern": "quick_trade_after_loss",
-                                        "hours_after_loss": time_diff,
-                                        "loss_amount": self.df.loc[loss_indices[i], 'profit_loss']
-                                    }
-                                })
-                                break
-            
+            if 'profit_loss' in self.df.columns and self.times is not None:
+                profits = self.df['profit_loss'].to_numpy()
+                losses = np.flatnonzero(profits < 0)
+                if len(losses) >= 2:
+                    # Hours from each loss but the last to the trade after it
+                    gaps = (self.times.diff().shift(-1).dt.total_seconds() / 3600).to_numpy()[losses[:-1]]
+                    quick = np.flatnonzero(gaps < 2)  # Trade within 2 hours of a loss
+                    if len(quick):
+                        time_diff = float(gaps[quick[0]])
+                        alerts.append({
+                            "alert_type": "behavioral",
+                            "severity": "high",
+                            "title": "Quick Trade After Loss",
+                            "description": f"You traded within {time_diff:.1f} hours of a loss. "
+                                         f"This could be revenge trading.",
+                            "confidence": 0.7,
+                            "timeframe": "next_trade",
+                            "suggested_actions": [
+                                "Wait at least 4 hours after a loss",
+                                "Review your emotional state before trading",
+                                "Stick to your trading schedule"
+                            ],
+                            "trigger_conditions": {
+                                "pattern": "quick_trade_after_loss",
+                                "hours_after_loss": time_diff,
+                                "loss_amount": float(profits[losses[quick[0]]])
+                            }
+                        })
+        
         except Exception as e:
             print(f"Error in behavioral detection: {e}")
         
@@ -250,124 +268,106 @@ class PredictionEngine:
     def _detect_time_based_alerts(self, timeframe: str) -> List[Dict[str, Any]]:
         """Detect time-based pattern alerts"""
         alerts = []
+        self._prepare()
         
-        if self.df.empty or len(self.df) < 15:
+        if self.df.empty or len(self.df) < 15 or self._time_error is not None:
             return alerts
         
         try:
-            # Time of day analysis
-            if 'entry_time' in self.df.columns:
-                self.df['entry_time'] = pd.to_datetime(self.df['entry_time'])
-                self.df['hour'] = self.df['entry_time'].dt.hour
+            if self.times is not None and 'profit_loss' in self.df.columns:
+                timed = self.times.notna().to_numpy()
+                wins = (self.df['profit_loss'].to_numpy() > 0)[timed]
                 
-                # Group by hour and calculate win rate
-                if 'profit_loss' in self.df.columns:
-                    hourly_stats = []
-                    for hour in range(24):
-                        hour_trades = self.df[self.df['hour'] == hour]
-                        if len(hour_trades) >= 3:
-                            win_rate = (hour_trades['profit_loss'] > 0).mean()
-                            avg_profit = hour_trades['profit_loss'].mean()
-                            hourly_stats.append({
-                                'hour': hour,
-                                'trades': len(hour_trades),
-                                'win_rate': win_rate,
-                                'avg_profit': avg_profit
-                            })
+                # Time of day analysis: worst hour among those with 3+ trades
+                hours = self.times.dt.hour.to_numpy()[timed].astype(np.intp)
+                hour_trades, hour_win_rates = self._win_rates_by(hours, wins, 24)
+                hourly = np.flatnonzero(hour_trades >= 3)
+                
+                if len(hourly):
+                    worst_hour = int(hourly[np.argmin(hour_win_rates[hourly])])
+                    worst_win_rate = hour_win_rates[worst_hour]
                     
-                    if hourly_stats:
-                        # Find worst performing hour
-                        worst_hour = min(hourly_stats, key=lambda x: x['win_rate'])
-                        best_hour = max(hourly_stats, key=lambda x: x['win_rate'])
-                        
-                        if worst_hour['trades'] >= 5 and worst_hour['win_rate'] < 0.3:
-                            alerts.append({
-                                "alert_type": "time_based",
-                                "severity": "medium",
-                                "title": f"Weak Trading Hour ({worst_hour['hour']}:00)",
-                                "description": f"Your win rate is only {worst_hour['win_rate']*100:.0f}% "
-                                             f"during {worst_hour['hour']}:00 hour. Consider avoiding "
-                                             f"trading during this time.",
-                                "confidence": 0.65,
-                                "timeframe": "next_day",
-                                "suggested_actions": [
-                                    f"Avoid trading at {worst_hour['hour']}:00",
-                                    "Analyze why this hour performs poorly",
-                                    "Focus on your best hours instead"
-                                ],
-                                "trigger_conditions": {
-                                    "pattern": "weak_trading_hour",
-                                    "hour": worst_hour['hour'],
-                                    "win_rate": worst_hour['win_rate'],
-                                    "trade_count": worst_hour['trades']
-                                }
-                            })
-            
-            # Day of week analysis
-            if 'entry_time' in self.df.columns:
-                self.df['day_of_week'] = self.df['entry_time'].dt.day_name()
+                    if hour_trades[worst_hour] >= 5 and worst_win_rate < 0.3:
+                        alerts.append({
+                            "alert_type": "time_based",
+                            "severity": "medium",
+                            "title": f"Weak Trading Hour ({worst_hour}:00)",
+                            "description": f"Your win rate is only {worst_win_rate*100:.0f}% "
+                                         f"during {worst_hour}:00 hour. Consider avoiding "
+                                         f"trading during this time.",
+                            "confidence": 0.65,
+                            "timeframe": "next_day",
+                            "suggested_actions": [
+                                f"Avoid trading at {worst_hour}:00",
+                                "Analyze why this hour performs poorly",
+                                "Focus on your best hours instead"
+                            ],
+                            "trigger_conditions": {
+                                "pattern": "weak_trading_hour",
+                                "hour": worst_hour,
+                                "win_rate": float(worst_win_rate),
+                                "trade_count": int(hour_trades[worst_hour])
+                            }
+                        })
                 
-                if 'profit_loss' in self.df.columns:
-                    day_stats = []
-                    for day in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']:
-                        day_trades = self.df[self.df['day_of_week'] == day]
-                        if len(day_trades) >= 3:
-                            win_rate = (day_trades['profit_loss'] > 0).mean()
-                            day_stats.append({
-                                'day': day,
-                                'trades': len(day_trades),
-                                'win_rate': win_rate
-                            })
+                # Day of week analysis: worst weekday among those with 3+ trades
+                days = self.times.dt.dayofweek.to_numpy()[timed].astype(np.intp)
+                day_trades, day_win_rates = self._win_rates_by(days, wins, 7)
+                weekdays = np.flatnonzero(day_trades[:len(WEEKDAYS)] >= 3)
+                
+                if len(weekdays) >= 3:
+                    worst = weekdays[np.argmin(day_win_rates[weekdays])]
+                    worst_day, worst_win_rate = WEEKDAYS[worst], day_win_rates[worst]
                     
-                    if len(day_stats) >= 3:
-                        worst_day = min(day_stats, key=lambda x: x['win_rate'])
-                        if worst_day['trades'] >= 5 and worst_day['win_rate'] < 0.35:
-                            alerts.append({
-                                "alert_type": "time_based",
-                                "severity": "medium",
-                                "title": f"Weak Trading Day ({worst_day['day']})",
-                                "description": f"Your win rate is only {worst_day['win_rate']*100:.0f}% "
-                                             f"on {worst_day['day']}s. Consider adjusting your "
-                                             f"trading schedule.",
-                                "confidence": 0.6,
-                                "timeframe": "next_week",
-                                "suggested_actions": [
-                                    f"Reduce trading on {worst_day['day']}s",
-                                    "Analyze market conditions on this day",
-                                    "Focus on preparation instead of trading"
-                                ],
-                                "trigger_conditions": {
-                                    "pattern": "weak_trading_day",
-                                    "day": worst_day['day'],
-                                    "win_rate": worst_day['win_rate'],
-                                    "trade_count": worst_day['trades']
-                                }
-                            })
-            
+                    if day_trades[worst] >= 5 and worst_win_rate < 0.35:
+                        alerts.append({
+                            "alert_type": "time_based",
+                            "severity": "medium",
+                            "title": f"Weak Trading Day ({worst_day})",
+                            "description": f"Your win rate is only {worst_win_rate*100:.0f}% "
+                                         f"on {worst_day}s. Consider adjusting your "
+                                         f"trading schedule.",
+                            "confidence": 0.6,
+                            "timeframe": "next_week",
+                            "suggested_actions": [
+                                f"Reduce trading on {worst_day}s",
+                                "Analyze market conditions on this day",
+                                "Focus on preparation instead of trading"
+                            ],
+                            "trigger_conditions": {
+                                "pattern": "weak_trading_day",
+                                "day": worst_day,
+                                "win_rate": float(worst_win_rate),
+                                "trade_count": int(day_trades[worst])
+                            }
+                        })
+        
         except Exception as e:
             print(f"Error in time-based detection: {e}")
         
         return alerts
     
+    @staticmethod
+    def _win_rates_by(buckets: np.ndarray, wins: np.ndarray, size: int):
+        """Trade count and win rate for each bucket (hour, weekday) 0..size-1"""
+        trades = np.bincount(buckets, minlength=size)
+        won = np.bincount(buckets, weights=wins, minlength=size)
+        with np.errstate(invalid='ignore'):
+            return trades, won / trades
+    
+    @staticmethod
+    def _trailing_run(flags: np.ndarray) -> int:
+        """Length of the last run of the run-length encoding of ``flags`` if it is a run of True"""
+        breaks = np.flatnonzero(~flags)
+        return int(len(flags) - breaks[-1] - 1) if len(breaks) else len(flags)
+    
     def _count_consecutive_losses(self, profit_series: pd.Series) -> int:
         """Count consecutive losses at the end of the series"""
-        count = 0
-        for profit in reversed(profit_series):
-            if profit < 0:
-                count += 1
-            else:
-                break
-        return count
+        return self._trailing_run(profit_series.to_numpy() < 0)
     
     def _count_consecutive_wins(self, profit_series: pd.Series) -> int:
         """Count consecutive wins at the end of the series"""
-        count = 0
-        for profit in reversed(profit_series):
-            if profit > 0:
-                count += 1
-            else:
-                break
-        return count
+        return self._trailing_run(profit_series.to_numpy() > 0)
     
     def _calculate_alert_severity(self, probability: float, impact: float) -> str:
         """Calculate alert severity based on probability and impact"""
@@ -380,4 +380,4 @@ class PredictionEngine:
         elif risk_score >= 0.4:
             return "medium"
         else:
-            return "low"
\ No newline at end of file
+            return "low"
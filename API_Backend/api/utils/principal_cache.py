@@ -0,0 +1,228 @@
+"""
+In-process cache of authenticated principals.
+
+A principal is a read-only snapshot of a User row and its UserSettings,
+so authenticated routes get both without a database round trip. Entries
+are keyed by user id and token ``jti`` and live for a short TTL (never
+past the token's own expiry).
+
+Entries are dropped when a transaction that changed the user or their
+settings commits (settings updates, deactivation). ``invalidate_user``
+can also be called directly. Every API process has its own cache, so
+other processes may serve a change up to one TTL late.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import Session
+
+from api import models
+from api.config import settings
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """Read-only copy of a UserSettings row"""
+    user_id: str
+    max_position_size_pct: Optional[float]
+    min_win_rate: Optional[float]
+    max_drawdown_pct: Optional[float]
+    min_rr_ratio: Optional[float]
+    min_sl_usage_rate: Optional[float]
+    ai_enabled: Optional[bool]
+    preferred_model: Optional[str]
+    openai_api_key_encrypted: Optional[str]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Read-only copy of a User row, with their settings"""
+    id: str
+    email: str
+    username: str
+    is_active: bool
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    settings: Optional[SettingsSnapshot] = None
+
+    @classmethod
+    def from_models(cls, user: models.User, user_settings: Optional[models.UserSettings]) -> "Principal":
+        snapshot = None
+        if user_settings is not None:
+            snapshot = SettingsSnapshot(**{
+                f.name: getattr(user_settings, f.name) for f in fields(SettingsSnapshot)
+            })
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            is_active=bool(user.is_active),
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+            settings=snapshot
+        )
+
+
+class PrincipalCache:
+    """TTL + LRU cache of principals keyed by (user id, token jti)"""
+
+    def __init__(self, ttl_seconds: float = 60, max_entries: int = 10000, enabled: bool = True):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled and ttl_seconds > 0 and max_entries > 0
+        self._entries: "OrderedDict[Tuple[str, Optional[str]], Tuple[float, Principal]]" = OrderedDict()
+        self._by_user: Dict[str, Set[Tuple[str, Optional[str]]]] = {}
+        # Bumped on invalidation so loads that raced a change aren't cached
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, user_id: str, jti: Optional[str] = None) -> Optional[Principal]:
+        if not self.enabled:
+            return None
+        key = (user_id, jti)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+            if entry is not None:
+                self._remove(key)
+            self._stats["misses"] += 1
+            return None
+
+    def get_user(self, user_id: str) -> Optional[Principal]:
+        """Any fresh principal of ``user_id``, whichever token it came with"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            for key in self._by_user.get(user_id, ()):
+                expires, principal = self._entries[key]
+                if expires > now:
+                    self._stats["hits"] += 1
+                    return principal
+            self._stats["misses"] += 1
+            return None
+
+    def generation(self, user_id: str) -> int:
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, principal: Principal, jti: Optional[str] = None,
+            token_expires_at: Optional[float] = None, generation: Optional[int] = None):
+        """
+        Cache ``principal`` for the token ``jti``. ``token_expires_at`` is
+        the token's ``exp`` (epoch seconds); ``generation`` is the value of
+        ``generation(user_id)`` read before the principal was loaded.
+        """
+        if not self.enabled:
+            return
+        ttl = self.ttl_seconds
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+        key = (principal.id, jti)
+        with self._lock:
+            if generation is not None and generation != self._generations.get(principal.id, 0):
+                return
+            self._entries[key] = (time.monotonic() + ttl, principal)
+            self._entries.move_to_end(key)
+            self._by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: str):
+        """Forget every cached principal of ``user_id``"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in self._by_user.pop(user_id, set()):
+                self._entries.pop(key, None)
+            self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            for user_id in self._by_user:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+
+# Singleton instance shared by the auth dependencies and the users router
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES
+)
+
+
+async def load_principal(
+    db: AsyncSession,
+    user_id: str,
+    jti: Optional[str] = None,
+    token_expires_at: Optional[float] = None
+) -> Optional[Principal]:
+    """Principal of ``user_id`` from the cache, or from one User + UserSettings query"""
+    principal = principal_cache.get(user_id, jti) if jti is not None else principal_cache.get_user(user_id)
+    if principal is not None:
+        return principal
+
+    generation = principal_cache.generation(user_id)
+    result = await db.execute(
+        select(models.User, models.UserSettings)
+        .outerjoin(models.UserSettings, models.UserSettings.user_id == models.User.id)
+        .where(models.User.id == user_id)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    principal = Principal.from_models(row[0], row[1])
+    principal_cache.put(principal, jti, token_expires_at=token_expires_at, generation=generation)
+    return principal
+
+
+# Users whose rows changed are invalidated once the transaction commits
+_PENDING_KEY = "principal_cache_invalidations"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault(_PENDING_KEY, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.User) and obj.id:
+            changed.add(obj.id)
+        elif isinstance(obj, models.UserSettings) and obj.user_id:
+            changed.add(obj.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop(_PENDING_KEY, ()):
+        principal_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,357 @@
+"""
+In-process scheduler for automatic Deriv trade syncs.
+
+Connections with ``auto_sync`` are kept in a priority queue ordered by
+their next due time: ``sync_frequency`` after the last attempt, pushed
+out by exponential backoff while ``error_count`` is non-zero and never
+before ``disabled_until``. Each connection gets a stable jitter of up to
+``jitter_fraction`` of its interval, so syncs spread out instead of all
+landing at the top of the hour.
+
+Every API process runs the loop, but only the holder of the
+``scheduler_leases`` row starts scheduled syncs. The lease is renewed
+every third of its TTL and taken over by another process once it
+expires. Scheduled and manual syncs share the same global and per-app_id
+concurrency limits, and syncs for an app_id the rate governor is holding
+back wait until it expects capacity again.
+"""
+import asyncio
+import hashlib
+import heapq
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from api.config import settings
+from api.database import AsyncSessionLocal
+from api.models.integration_models import DerivConnection, SchedulerLease
+from api.utils.deriv_governor import deriv_governor
+from api.utils.encryption import encryption_service
+
+SYNC_INTERVALS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+
+
+def jitter_fraction(connection_id: str) -> float:
+    """Stable value in [0, 1) per connection, so its slot doesn't move between refreshes"""
+    digest = hashlib.sha256(connection_id.encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+class SyncScheduler:
+    """Due-time queue of auto-sync connections, run by the lease holder"""
+
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        max_concurrent_per_app: int = 2,
+        jitter_fraction: float = 0.1,
+        backoff_base_seconds: float = 300,
+        backoff_max_seconds: float = 86400,
+        lease_ttl_seconds: float = 60,
+        refresh_seconds: float = 60,
+        enabled: bool = True,
+        lease_name: str = "deriv_auto_sync",
+        session_factory=None,
+        governor=None
+    ):
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_concurrent_per_app = max(max_concurrent_per_app, 1)
+        self.jitter_fraction = jitter_fraction
+        self.backoff_base = timedelta(seconds=backoff_base_seconds)
+        self.backoff_max = timedelta(seconds=backoff_max_seconds)
+        self.lease_ttl = timedelta(seconds=lease_ttl_seconds)
+        self.refresh_interval = timedelta(seconds=refresh_seconds)
+        self.enabled = enabled
+        self.lease_name = lease_name
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.governor = governor or deriv_governor
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+        self._handler: Optional[Callable[..., Awaitable[Any]]] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._global: Optional[asyncio.Semaphore] = None
+        self._per_app: Dict[str, asyncio.Semaphore] = {}
+        # (due time, connection id) heap; details hold (app_id, sync_days_back)
+        self._queue: List[Tuple[datetime, str]] = []
+        self._details: Dict[str, Tuple[str, int]] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._next_refresh = datetime.min
+        self._counts = {"started": 0, "completed": 0, "failed": 0, "skipped": 0}
+
+    # -- Due times -----------------------------------------------------------
+
+    def next_sync_at(self, connection, now: Optional[datetime] = None) -> Optional[datetime]:
+        """
+        When ``connection`` (a DerivConnection or a row with the same
+        fields) is next due, or None without auto_sync
+        """
+        if not connection.auto_sync:
+            return None
+        now = now or datetime.utcnow()
+        spread = 1 + self.jitter_fraction * jitter_fraction(connection.id)
+        if connection.error_count:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** min(connection.error_count - 1, 20))
+        else:
+            delay = SYNC_INTERVALS.get(connection.sync_frequency, SYNC_INTERVALS["daily"])
+
+        if connection.last_sync_at is None:
+            # Never synced: due now, spread over the jitter window
+            due = now + (spread - 1) * delay
+        else:
+            due = connection.last_sync_at + spread * delay
+        if connection.disabled_until and connection.disabled_until > due:
+            due = connection.disabled_until
+        return due
+
+    def is_syncing(self, connection_id: str) -> bool:
+        return connection_id in self._running
+
+    # -- Lifecycle -----------------------------------------------------------
+
+    def start(self, handler: Callable[..., Awaitable[Any]]):
+        """
+        Use ``handler(connection_id, days_back=, force_full_sync=,
+        analyze_after_sync=)`` for syncs and start the scheduling loop
+        """
+        self._handler = handler
+        self._wakeup = asyncio.Event()
+        self._global = asyncio.Semaphore(self.max_concurrent)
+        self._per_app = {}
+        if self.enabled and self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run(), name="deriv-sync-scheduler")
+
+    async def shutdown(self):
+        """Stop scheduling, cancel running syncs and hand the lease over"""
+        task, self._loop_task = self._loop_task, None
+        running = list(self._running.values())
+        for pending in ([task] if task else []) + running:
+            pending.cancel()
+        await asyncio.gather(*([task] if task else []), *running, return_exceptions=True)
+        if self.is_leader:
+            try:
+                await self._release_lease()
+            except Exception as e:
+                print(f"Sync scheduler: could not release lease: {e}")
+        self.is_leader = False
+        self._queue, self._details = [], {}
+
+    # -- Running syncs -------------------------------------------------------
+
+    async def run_sync(self, connection_id: str, app_id: Optional[str] = None, **kwargs) -> bool:
+        """
+        Run one sync within the concurrency limits (waiting for a slot).
+        Returns False without syncing if the connection is already syncing.
+        """
+        if self._handler is None:
+            raise RuntimeError("Sync scheduler is not running")
+        task = asyncio.current_task()
+        if self._running.get(connection_id, task) is not task:
+            self._counts["skipped"] += 1
+            return False
+        self._running[connection_id] = task
+        try:
+            async with self._app_slot(app_id), self._global:
+                self._counts["started"] += 1
+                try:
+                    await self._handler(connection_id, **kwargs)
+                    self._counts["completed"] += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # The handler records sync failures itself; this only guards the scheduler
+                    self._counts["failed"] += 1
+                    print(f"Sync of connection {connection_id} crashed: {e}")
+            return True
+        finally:
+            if self._running.get(connection_id) is task:
+                del self._running[connection_id]
+            if self.is_leader and self._loop_task is not None:
+                # Queue the next run from the outcome of this one
+                asyncio.ensure_future(self._reschedule(connection_id))
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _app_slot(self, app_id: Optional[str]) -> asyncio.Semaphore:
+        if app_id not in self._per_app:
+            self._per_app[app_id] = asyncio.Semaphore(self.max_concurrent_per_app)
+        return self._per_app[app_id]
+
+    async def _reschedule(self, connection_id: str):
+        try:
+            await self._refresh([connection_id])
+        except Exception as e:
+            print(f"Sync scheduler: could not reschedule {connection_id}: {e}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # -- Scheduling loop -----------------------------------------------------
+
+    async def _run(self):
+        while True:
+            try:
+                leader = await self._acquire_lease()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Sync scheduler: lease check failed: {e}")
+                leader = False
+            if leader != self.is_leader:
+                print(f"Sync scheduler {self.worker_id}: {'acquired' if leader else 'lost'} the lease")
+                self.is_leader = leader
+                self._next_refresh = datetime.min
+
+            if leader:
+                try:
+                    if datetime.utcnow() >= self._next_refresh:
+                        await self._refresh()
+                    self._launch_due()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Sync scheduler error: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._sleep_seconds())
+            except asyncio.TimeoutError:
+                pass
+
+    def _sleep_seconds(self) -> float:
+        now = datetime.utcnow()
+        wake = now + self.lease_ttl / 3
+        if self.is_leader:
+            wake = min(wake, self._next_refresh)
+            if self._queue:
+                wake = min(wake, self._queue[0][0])
+        return max((wake - now).total_seconds(), 0.01)
+
+    async def _refresh(self, connection_ids: Optional[List[str]] = None):
+        """Reload due times from the database (all connections, or just ``connection_ids``)"""
+        query = select(
+            DerivConnection.id, DerivConnection.app_id, DerivConnection.auto_sync,
+            DerivConnection.sync_frequency, DerivConnection.sync_days_back,
+            DerivConnection.last_sync_at, DerivConnection.error_count,
+            DerivConnection.disabled_until, DerivConnection.api_token_encrypted
+        ).where(DerivConnection.auto_sync.is_(True))
+        if connection_ids is not None:
+            query = query.where(DerivConnection.id.in_(connection_ids))
+        async with self.session_factory() as db:
+            rows = (await db.execute(query)).all()
+
+        now = datetime.utcnow()
+        if connection_ids is None:
+            self._queue, self._details = [], {}
+            self._next_refresh = now + self.refresh_interval
+        else:
+            self._queue = [entry for entry in self._queue if entry[1] not in connection_ids]
+            for connection_id in connection_ids:
+                self._details.pop(connection_id, None)
+
+        due_soon = []
+        for row in rows:
+            due = self.next_sync_at(row, now)
+            self._queue.append((due, row.id))
+            self._details[row.id] = (row.app_id, row.sync_days_back or 90)
+            if due <= self._next_refresh:
+                due_soon.append(row.api_token_encrypted)
+        heapq.heapify(self._queue)
+
+        # Warm the secret cache so each sync's token decrypt is a cache hit
+        if due_soon:
+            encryption_service.decrypt_many(due_soon)
+
+    def _launch_due(self):
+        now = datetime.utcnow()
+        deferred = []
+        while self._queue and self._queue[0][0] <= now and not self._global.locked():
+            due, connection_id = heapq.heappop(self._queue)
+            details = self._details.get(connection_id)
+            if details is None or connection_id in self._running:
+                continue  # Removed, or a manual sync is running; rescheduled when it ends
+            app_id, days_back = details
+            if self._app_slot(app_id).locked():
+                deferred.append((due, connection_id))
+                continue
+            # Don't start syncs the rate governor would only hold back
+            wait = self.governor.wait_time(app_id)
+            if wait > 0:
+                deferred.append((now + timedelta(seconds=wait), connection_id))
+                continue
+            # Registered as running right away so the next pass doesn't start it twice
+            self._running[connection_id] = asyncio.create_task(
+                self.run_sync(connection_id, app_id, days_back=days_back,
+                              force_full_sync=False, analyze_after_sync=True),
+                name=f"deriv-sync-{connection_id}"
+            )
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+
+    # -- Leader lease --------------------------------------------------------
+
+    async def _acquire_lease(self) -> bool:
+        """Take or renew the scheduler lease; True while this process holds it"""
+        table = SchedulerLease.__table__
+        now = datetime.utcnow()
+        values = {"holder": self.worker_id, "expires_at": now + self.lease_ttl, "updated_at": now}
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(table)
+                .where(table.c.name == self.lease_name,
+                       or_(table.c.holder == self.worker_id, table.c.expires_at < now))
+                .values(**values)
+            )
+            if result.rowcount:
+                await db.commit()
+                return True
+            try:
+                await db.execute(table.insert().values(name=self.lease_name, **values))
+                await db.commit()
+                return True
+            except IntegrityError:
+                # Someone else holds it
+                await db.rollback()
+                return False
+
+    async def _release_lease(self):
+        table = SchedulerLease.__table__
+        async with self.session_factory() as db:
+            await db.execute(
+                update(table)
+                .where(table.c.name == self.lease_name, table.c.holder == self.worker_id)
+                .values(expires_at=datetime.utcnow())
+            )
+            await db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "leader": self.is_leader,
+            "worker_id": self.worker_id,
+            "scheduled": len(self._queue),
+            "running": len(self._running),
+            **self._counts
+        }
+
+
+# Singleton instance, started from the app lifespan
+sync_scheduler = SyncScheduler(
+    max_concurrent=settings.SYNC_MAX_CONCURRENT,
+    max_concurrent_per_app=settings.SYNC_MAX_CONCURRENT_PER_APP,
+    jitter_fraction=settings.SYNC_JITTER_FRACTION,
+    backoff_base_seconds=settings.SYNC_BACKOFF_BASE_SECONDS,
+    backoff_max_seconds=settings.SYNC_BACKOFF_MAX_SECONDS,
+    lease_ttl_seconds=settings.SYNC_LEASE_TTL_SECONDS,
+    refresh_seconds=settings.SYNC_REFRESH_SECONDS,
+    enabled=settings.SYNC_SCHEDULER_ENABLED
+)
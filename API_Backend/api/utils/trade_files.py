@@ -0,0 +1,179 @@
+"""
+Parsing and storage of uploaded trade files (CSV / MT5 HTML reports)
+"""
+import os
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+from fastapi import UploadFile
+
+from api.config import settings
+from api.utils.mt5_parser import parse_mt5_html
+from api.utils.trade_store import normalize_trade_frame
+from core.metrics_accumulator import TradeMetricsAccumulator
+
+SUPPORTED_EXTENSIONS = (".csv", ".html", ".htm")
+
+# Bytes read from the upload per iteration while spooling it to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Columns the analysis pipeline reads, with the dtype each is parsed as.
+# Anything else in an uploaded CSV is never materialized.
+TRADE_CSV_DTYPES = {
+    "symbol": "category",
+    "profit_loss": "float64",
+    "lot_size": "float64",
+    "stake": "float64",
+    "account_balance_before": "float64",
+    "stop_loss": "float64",
+    "duration": "float64",
+    "entry_time": "object",
+    "exit_time": "object",
+}
+TRADE_CSV_TIME_COLUMNS = ("entry_time", "exit_time")
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds its upload_size_limit"""
+
+
+def is_supported_file(filename: str) -> bool:
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def upload_size_limit(filename: str) -> int:
+    """Largest accepted upload in bytes: CSVs are parsed in bounded chunks, HTML reports are not"""
+    if filename.lower().endswith(".csv"):
+        return settings.MAX_CSV_UPLOAD_SIZE
+    return settings.MAX_UPLOAD_SIZE
+
+
+def _new_upload_path(filename: str) -> str:
+    os.makedirs(settings.ANALYSIS_UPLOAD_DIR, exist_ok=True)
+    extension = os.path.splitext(filename)[1].lower()
+    return os.path.join(settings.ANALYSIS_UPLOAD_DIR, f"{uuid.uuid4()}{extension}")
+
+
+async def spool_upload(file: UploadFile) -> Tuple[str, int]:
+    """
+    Copy an UploadFile to the upload directory in fixed-size chunks.
+
+    Returns the stored path and the size in bytes. Raises UploadTooLarge
+    (and removes the partial file) once the size passes the upload_size_limit
+    of the file's type.
+    """
+    path = _new_upload_path(file.filename)
+    limit = upload_size_limit(file.filename)
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(
+                        f"File exceeds the {limit // (1024 * 1024)}MB upload limit"
+                    )
+                out.write(chunk)
+    except BaseException:
+        remove_stored_upload(path)
+        raise
+    return path, size
+
+
+def store_upload(contents: bytes, filename: str) -> str:
+    """Write in-memory upload bytes to the upload directory and return the path"""
+    path = _new_upload_path(filename)
+    with open(path, "wb") as f:
+        f.write(contents)
+    return path
+
+
+def _parse_time_column(values: pd.Series) -> pd.Series:
+    """Parse timestamps up front; leave the strings for the pipeline if they don't parse"""
+    try:
+        return pd.to_datetime(values)
+    except (ValueError, TypeError):
+        return values
+
+
+def _read_trade_csv(source, chunk_rows: Optional[int], fold: bool):
+    chunk_rows = chunk_rows or settings.CSV_CHUNK_ROWS
+    reader = pd.read_csv(
+        source,
+        usecols=lambda column: column in TRADE_CSV_DTYPES,
+        dtype=TRADE_CSV_DTYPES,
+        chunksize=chunk_rows,
+        encoding="utf-8-sig"
+    )
+
+    accumulator = TradeMetricsAccumulator() if fold else None
+    chunks = []
+    with reader:
+        for chunk in reader:
+            for column in TRADE_CSV_TIME_COLUMNS:
+                if column in chunk.columns:
+                    chunk[column] = _parse_time_column(chunk[column])
+            if accumulator is not None:
+                try:
+                    accumulator.update(chunk)
+                except (ValueError, TypeError, KeyError):
+                    # Rows out of entry order (or unparseable times): the
+                    # pipeline computes the metrics from the whole frame
+                    accumulator = None
+            chunks.append(normalize_trade_frame(chunk))
+
+    if not chunks:
+        return pd.DataFrame(columns=list(TRADE_CSV_DTYPES)), None
+
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    # Chunks with different symbol sets concatenate to object; restore the categorical
+    if "symbol" in df.columns and df["symbol"].dtype != "category":
+        df["symbol"] = df["symbol"].astype("category")
+    return df, accumulator
+
+
+def read_trade_csv(source, chunk_rows: int = None) -> pd.DataFrame:
+    """
+    Read a trade CSV in chunks, keeping only the pipeline's columns.
+
+    Numeric columns are parsed as float64, ``symbol`` as a categorical and
+    the time columns are converted to datetime64 per chunk, so the raw text
+    of a large file is never held in memory as Python strings all at once.
+    Each chunk is then compacted with normalize_trade_frame (float32 where
+    lossless) before it is kept.
+    """
+    return _read_trade_csv(source, chunk_rows, fold=False)[0]
+
+
+def read_trade_csv_with_metrics(source, chunk_rows: int = None) -> Tuple[pd.DataFrame, Optional[Dict[str, Any]]]:
+    """
+    read_trade_csv that also folds each chunk into a TradeMetricsAccumulator
+    as it is parsed, at full precision. Returns the frame and its metrics,
+    or None for the metrics when the rows are not in entry order.
+    """
+    df, accumulator = _read_trade_csv(source, chunk_rows, fold=True)
+    if accumulator is None or accumulator.n_trades == 0:
+        return df, None
+    return df, accumulator.metrics()
+
+
+def load_stored_upload(path: str) -> Tuple[pd.DataFrame, Optional[Dict[str, Any]]]:
+    """
+    Parse a file written by spool_upload / store_upload. Returns the trades
+    and, for CSVs, the metrics folded while reading them (else None).
+    """
+    if path.lower().endswith(".csv"):
+        return read_trade_csv_with_metrics(path)
+    # MT5 HTML reports are streamed from the file
+    return parse_mt5_html(path), None
+
+
+def remove_stored_upload(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,130 @@
+"""
+Columnar storage of the normalized trade frame behind each analysis.
+
+Uploaded trades used to be thrown away once the pipeline had run, so
+alerts had nothing to work from and an analysis could not be re-scored
+without the user uploading the file again. Each analysis now keeps its
+frame as an Arrow IPC file in ``TRADE_STORE_DIR``, named after the
+analysis and referenced by ``Analysis.trades_path``.
+
+Frames are normalized before they are written: floats are stored as
+float32 where no value moves by more than ``FLOAT32_MAX_ERROR`` and as
+float64 otherwise, integers as int64, time columns as timestamps and text as
+dictionary-encoded categoricals. Files are read through a memory map;
+with ``TRADE_STORE_COMPRESSION`` unset the buffers are used in place,
+with zstd (the default) they are decompressed column by column, and
+only the columns asked for are read either way.
+"""
+import os
+from typing import Iterable, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from api.config import settings
+
+# Columns parsed as timestamps when they arrive as text
+TRADE_TIME_COLUMNS = ("entry_time", "exit_time")
+
+# Float columns go to float32 only if no value moves by more than this:
+# lot sizes and prices usually qualify, balances and P/L in cents don't
+FLOAT32_MAX_ERROR = 1e-6
+
+# Text columns with more distinct values than this share of rows (ids,
+# comments) are stored as plain strings rather than categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def _normalize_column(name: str, values: pd.Series) -> pd.Series:
+    if isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(values):
+        return values
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    if pd.api.types.is_integer_dtype(values):
+        return values.astype("int64")
+    if pd.api.types.is_float_dtype(values):
+        narrow = values.astype("float32")
+        error = (narrow.astype("float64") - values).abs().max()
+        return narrow if not error > FLOAT32_MAX_ERROR else values.astype("float64")
+    if name in TRADE_TIME_COLUMNS:
+        try:
+            return pd.to_datetime(values)
+        except (ValueError, TypeError):
+            pass
+    # Text, or mixed Python objects: strings, keeping missing values missing
+    text = values.where(values.isna(), values.astype(str))
+    if text.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(text):
+        return text.astype("category")
+    return text.astype("string")
+
+
+def normalize_trade_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Compact, Arrow-friendly copy of a trade frame (see the module docstring)"""
+    # Built on df's own index (a RangeIndex would realign the values of a
+    # frame indexed otherwise, e.g. a later CSV chunk) and then renumbered
+    normalized = pd.DataFrame(
+        {name: _normalize_column(str(name), df[name]) for name in df.columns},
+        index=df.index
+    )
+    return normalized.reset_index(drop=True)
+
+
+def trade_frame_path(name: str) -> str:
+    return os.path.join(settings.TRADE_STORE_DIR, os.path.basename(name))
+
+
+def save_trade_frame(analysis_id: str, df: pd.DataFrame) -> Optional[str]:
+    """
+    Write the normalized ``df`` of an analysis, replacing any earlier copy.
+    Returns the name to keep in ``Analysis.trades_path``, or None if the
+    frame could not be stored (the analysis itself doesn't depend on it).
+    """
+    name = f"{analysis_id}.arrow"
+    path = trade_frame_path(name)
+    partial = f"{path}.partial"
+    try:
+        os.makedirs(settings.TRADE_STORE_DIR, exist_ok=True)
+        table = pa.Table.from_pandas(normalize_trade_frame(df), preserve_index=False)
+        options = pa.ipc.IpcWriteOptions(compression=settings.TRADE_STORE_COMPRESSION or None)
+        with pa.OSFile(partial, "wb") as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        # Readers see either the old file or the complete new one
+        os.replace(partial, path)
+        return name
+    except Exception as e:
+        print(f"Could not store trades of analysis {analysis_id}: {e}")
+        remove_trade_frame(partial)
+        return None
+
+
+def load_trade_frame(name: Optional[str], columns: Optional[Iterable[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    Memory-map a stored trade frame, reading only ``columns`` if given.
+    Returns None when there is no stored frame.
+    """
+    if not name:
+        return None
+    path = trade_frame_path(name)
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path, "r") as source:
+        options = None
+        if columns is not None:
+            schema = pa.ipc.open_file(source).schema
+            wanted = set(columns)
+            included = [i for i, field in enumerate(schema) if field.name in wanted]
+            if not included:
+                return pd.DataFrame()
+            options = pa.ipc.IpcReadOptions(included_fields=included)
+        table = pa.ipc.open_file(source, options=options).read_all()
+    # Numeric columns without nulls stay views of the mapped buffers
+    return table.to_pandas(split_blocks=True)
+
+
+def remove_trade_frame(name: Optional[str]):
+    if not name:
+        return
+    try:
+        os.remove(trade_frame_path(name))
+    except OSError:
+        pass
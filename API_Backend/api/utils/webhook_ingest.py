@@ -0,0 +1,97 @@
+"""
+Batched ingestion of Deriv webhook events.
+
+The webhook endpoint stores each event and enqueues its id. One worker
+takes the first waiting id, keeps collecting for ``window_seconds`` (or
+until ``max_batch`` ids) and hands the whole batch to the handler, so a
+burst of trade events costs one upsert and one analysis refresh per
+connection instead of one per event. A single worker also means batches
+for the same connection never fold into its metrics concurrently.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from api.config import settings
+
+
+class WebhookIngestQueue:
+    """Coalesces webhook event ids over short windows and processes them in batches"""
+
+    def __init__(self, window_seconds: float = 0.5, max_batch: int = 500):
+        self.window_seconds = max(window_seconds, 0.0)
+        self.max_batch = max(max_batch, 1)
+        self._handler: Optional[Callable[[List[str]], Awaitable[Any]]] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._counts = {"events": 0, "batches": 0, "failed_batches": 0, "largest_batch": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None
+
+    def start(self, handler: Callable[[List[str]], Awaitable[Any]]):
+        """Start the batching worker on the running event loop"""
+        if self._worker is not None:
+            return
+        self._handler = handler
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run(), name="webhook-ingest")
+
+    async def shutdown(self):
+        """Stop the worker; events not yet processed stay unprocessed in the database"""
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+        self._queue = None
+
+    def enqueue(self, event_id: str):
+        if self._queue is None:
+            raise RuntimeError("Webhook ingest queue is not running")
+        self._queue.put_nowait(event_id)
+
+    async def _next_batch(self) -> List[str]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window_seconds
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Whatever else is already waiting rides along
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            self._counts["events"] += len(batch)
+            self._counts["batches"] += 1
+            self._counts["largest_batch"] = max(self._counts["largest_batch"], len(batch))
+            try:
+                await self._handler(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The handler records failures on the events; this only guards the worker
+                self._counts["failed_batches"] += 1
+                print(f"Webhook batch of {len(batch)} events crashed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_seconds": self.window_seconds,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            **self._counts
+        }
+
+
+# Singleton instance, started from the app lifespan
+webhook_ingest_queue = WebhookIngestQueue(
+    window_seconds=settings.WEBHOOK_BATCH_WINDOW_SECONDS,
+    max_batch=settings.WEBHOOK_MAX_BATCH
+)
@@ -2,6 +2,22 @@ import sqlite3
 import os
 import sys
 
+# Latest synced trade of each connection (by sell time, then transaction id)
+SYNC_CURSOR_BACKFILL = """
+UPDATE deriv_connections SET
+    last_trade_sell_time = (
+        SELECT sell_time FROM deriv_trades t WHERE t.connection_id = deriv_connections.id
+        ORDER BY t.sell_time DESC, CAST(t.transaction_id AS BIGINT) DESC LIMIT 1
+    ),
+    last_trade_transaction_id = (
+        SELECT transaction_id FROM deriv_trades t WHERE t.connection_id = deriv_connections.id
+        ORDER BY t.sell_time DESC, CAST(t.transaction_id AS BIGINT) DESC LIMIT 1
+    )
+WHERE last_trade_sell_time IS NULL
+  AND EXISTS (SELECT 1 FROM deriv_trades t WHERE t.connection_id = deriv_connections.id
+              AND t.sell_time IS NOT NULL)
+"""
+
 def apply_migrations():
     """
     Apply missing database columns to the SQLite database.
@@ -24,29 +40,138 @@ def apply_migrations():
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
-        # Check if user_settings table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='user_settings'")
-        if not cursor.fetchone():
-            print("Migration skipped: user_settings table does not exist yet.")
-            conn.close()
-            return
+        # Columns to add if missing, per table
+        missing_columns = {
+            "user_settings": [
+                ("openai_api_key_encrypted", "TEXT")
+            ],
+            "analyses": [
+                ("progress", "JSON"),
+                ("started_at", "DATETIME"),
+                ("score", "FLOAT"),
+                ("grade", "VARCHAR"),
+                ("total_risks", "INTEGER"),
+                ("win_rate", "FLOAT"),
+                ("net_profit", "FLOAT"),
+                ("trades_path", "VARCHAR")
+            ],
+            "deriv_connections": [
+                ("metrics_state", "JSON"),
+                ("last_trade_sell_time", "DATETIME"),
+                ("last_trade_transaction_id", "VARCHAR")
+            ]
+        }
+
+        for table, table_columns in missing_columns.items():
+            # Check if table exists
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
+            if not cursor.fetchone():
+                print(f"Migration skipped: {table} table does not exist yet.")
+                continue
+
+            # Get existing columns
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = [row[1] for row in cursor.fetchall()]
 
-        # Get existing columns in user_settings
-        cursor.execute("PRAGMA table_info(user_settings)")
-        columns = [row[1] for row in cursor.fetchall()]
+            for col_name, col_type in table_columns:
+                if col_name not in columns:
+                    print(f"🔧 Adding missing column '{col_name}' to '{table}' table...")
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_type}")
+                    print(f"✅ Column '{col_name}' added successfully.")
+                else:
+                    print(f"ℹ️ Column '{col_name}' already exists in '{table}'.")
 
-        # Columns to add if missing
-        missing_columns = [
-            ("openai_api_key_encrypted", "TEXT")
+        # Indexes to create if missing (table, name, columns)
+        missing_indexes = [
+            ("analyses", "ix_analyses_score", "score"),
+            ("analyses", "ix_analyses_grade", "grade"),
+            ("analyses", "ix_analyses_user_created_id", "user_id, created_at, id")
         ]
+        for table, index_name, index_columns in missing_indexes:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
+            if cursor.fetchone():
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({index_columns})")
+
+        # One row per trade per connection (the sync upsert's conflict target).
+        # Duplicates from earlier syncs are dropped first, keeping the oldest row.
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='uq_deriv_trades_connection_trade'")
+        if not cursor.fetchone():
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='deriv_trades'")
+            if cursor.fetchone():
+                cursor.execute(
+                    "DELETE FROM deriv_trades WHERE rowid NOT IN"
+                    " (SELECT min(rowid) FROM deriv_trades GROUP BY connection_id, deriv_trade_id)"
+                )
+                if cursor.rowcount > 0:
+                    print(f"🔧 Removed {cursor.rowcount} duplicate synced trades.")
+                cursor.execute(
+                    "CREATE UNIQUE INDEX uq_deriv_trades_connection_trade"
+                    " ON deriv_trades (connection_id, deriv_trade_id)"
+                )
+                print("✅ Unique index on deriv_trades (connection_id, deriv_trade_id) created.")
+
+        # Start incremental syncs from the trades already stored
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type='table'"
+            " AND name IN ('deriv_connections', 'deriv_trades')"
+        )
+        if cursor.fetchone()[0] == 2:
+            cursor.execute(SYNC_CURSOR_BACKFILL)
+            if cursor.rowcount > 0:
+                print(f"✅ Backfilled sync cursors for {cursor.rowcount} connections.")
+
+        # Backfill the analysis summary columns from the JSON results
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='analyses'")
+        if cursor.fetchone():
+            # Metrics may hold NaN/Infinity, which SQLite's JSON functions reject
+            cursor.execute(
+                "UPDATE analyses SET"
+                " score = json_extract(score_result, '$.score'),"
+                " grade = json_extract(score_result, '$.grade'),"
+                " total_risks = json_extract(score_result, '$.total_risks'),"
+                " win_rate = CASE WHEN json_valid(metrics) THEN json_extract(metrics, '$.win_rate') END,"
+                " net_profit = CASE WHEN json_valid(metrics) THEN json_extract(metrics, '$.net_profit') END"
+                " WHERE score IS NULL AND json_valid(score_result)"
+            )
+            if cursor.rowcount > 0:
+                print(f"✅ Backfilled summary columns for {cursor.rowcount} analyses.")
 
-        for col_name, col_type in missing_columns:
-            if col_name not in columns:
-                print(f"🔧 Adding missing column '{col_name}' to 'user_settings' table...")
-                cursor.execute(f"ALTER TABLE user_settings ADD COLUMN {col_name} {col_type}")
-                print(f"✅ Column '{col_name}' added successfully.")
-            else:
-                print(f"ℹ️ Column '{col_name}' already exists in 'user_settings'.")
+        # Build the dashboard rollups once for databases that predate them
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type='table'"
+            " AND name IN ('analyses', 'user_dashboard_rollups')"
+        )
+        if cursor.fetchone()[0] == 2:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM user_dashboard_rollups)")
+            if not cursor.fetchone()[0]:
+                scored = "CASE WHEN score IS NOT NULL THEN {} END"
+                breakdown = scored.format(
+                    "CASE WHEN json_valid(score_result)"
+                    " THEN json_extract(score_result, '$.risk_breakdown.{}') END"
+                )
+                for period, bucket in (
+                    ("day", "date(created_at)"),
+                    ("week", "date(created_at, '-6 days', 'weekday 1')")  # Monday
+                ):
+                    cursor.execute(
+                        "INSERT INTO user_dashboard_rollups (id, user_id, period, bucket_start,"
+                        " analysis_count, score_count, score_sum, score_min, score_max,"
+                        " win_rate_count, win_rate_sum, trade_count_sum, total_risks_sum,"
+                        " risk_low, risk_medium, risk_high, updated_at)"
+                        f" SELECT lower(hex(randomblob(16))), user_id, '{period}', {bucket},"
+                        " count(*), count(score), coalesce(sum(score), 0), min(score), max(score),"
+                        f" count({scored.format('win_rate')}), coalesce(sum({scored.format('win_rate')}), 0),"
+                        f" coalesce(sum({scored.format('trade_count')}), 0),"
+                        f" coalesce(sum({scored.format('total_risks')}), 0),"
+                        f" coalesce(sum({breakdown.format('low')}), 0),"
+                        f" coalesce(sum({breakdown.format('medium')}), 0),"
+                        f" coalesce(sum({breakdown.format('high')}), 0),"
+                        " CURRENT_TIMESTAMP"
+                        " FROM analyses WHERE user_id IS NOT NULL AND created_at IS NOT NULL"
+                        f" GROUP BY user_id, {bucket}"
+                    )
+                    if cursor.rowcount > 0:
+                        print(f"✅ Built {cursor.rowcount} {period} dashboard rollups.")
 
         conn.commit()
         conn.close()
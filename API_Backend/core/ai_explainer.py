@@ -18,6 +18,17 @@ from pydantic import BaseModel, Field
 from core.risk_rules import RiskRuleEngine
 from core.risk_scorer import RiskScorer
 
+# Model used for AI explanations
+OPENAI_MODEL = "gpt-4o-mini"
+OFFLINE_MODEL = "offline_fallback"
+
+
+def resolve_explainer_model(openai_api_key: Optional[str] = None) -> str:
+    """Model an AIRiskExplainer with this key would report in its output"""
+    if openai_api_key or os.getenv("OPENAI_API_KEY"):
+        return OPENAI_MODEL
+    return OFFLINE_MODEL
+
 
 @dataclass
 class RiskExplanation:
@@ -51,7 +62,7 @@ class AIRiskExplainer:
             self.mock_mode = False
             os.environ["OPENAI_API_KEY"] = self.api_key
             self.llm = ChatOpenAI(
-                model="gpt-4o-mini",
+                model=OPENAI_MODEL,
                 temperature=0.3,
                 max_tokens=1000
             )
@@ -112,7 +123,7 @@ class AIRiskExplainer:
             parsed = self.output_parser.parse(response.content)
             parsed = parsed.model_dump()
 
-            parsed["ai_model"] = "gpt-4o-mini"
+            parsed["ai_model"] = OPENAI_MODEL
             parsed["timestamp"] = self._get_timestamp()
 
             return parsed
@@ -391,7 +402,7 @@ class AIRiskExplainer:
             **response,
             'risk_explanations': risk_explanations,
             'full_response': "Mock explanation generated - AI currently unavailable",
-            'ai_model': 'offline_fallback',
+            'ai_model': OFFLINE_MODEL,
             'timestamp': self._get_timestamp()
         }
     
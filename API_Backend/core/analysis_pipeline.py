@@ -0,0 +1,222 @@
+"""
+End-to-end analysis pipeline for a normalized trade DataFrame.
+Kept free of API/database imports so it can run inside worker processes.
+"""
+import time
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.metrics_accumulator import TradeMetricsAccumulator
+from core.metrics_calculator import TradeMetricsCalculator
+from core.risk_rules import RiskRuleEngine
+from core.risk_scorer import RiskScorer
+from core.ai_explainer import AIRiskExplainer
+from core.pattern_recognition import PatternDetector
+from core.news_service import NewsService
+
+
+def count_event_trades(news_service: NewsService, df: pd.DataFrame) -> int:
+    """Trades of ``df`` entered during a high-impact news event"""
+    if 'entry_time' not in df.columns:
+        return 0
+    symbols = df['symbol'] if 'symbol' in df.columns else None
+    return news_service.check_event_trading_risk_batch(df['entry_time'], symbols)["count"]
+
+
+def detect_patterns(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """PatternDetector's findings for ``df``, or none if detection fails"""
+    try:
+        return PatternDetector(df).detect_all_patterns()
+    except Exception as e:
+        print(f"Pattern detection failed: {e}")
+        return []
+
+
+def _stage_clock(timings: Optional[Dict[str, float]]):
+    """``mark(stage)`` records the wall time since the previous mark in ``timings``"""
+    clock = time.perf_counter()
+
+    def mark(stage):
+        nonlocal clock
+        if timings is not None:
+            now = time.perf_counter()
+            timings[stage] = round(now - clock, 4)
+            clock = now
+
+    return mark
+
+
+def _finish_analysis(metrics, risk_results, event_count, patterns, openai_api_key, mark):
+    """News event risk, patterns, score and explanations on top of the rule results"""
+    if event_count:
+        # Add to risk_details
+        if "risk_details" not in risk_results:
+            risk_results["risk_details"] = {}
+            
+        risk_results["risk_details"]["event_trading"] = {
+            "name": "News Event Trading",
+            "severity": 85,
+            "description": f"Detected {event_count} trades executed during high-impact news events (e.g. FOMC, NFP).",
+            "occurrences": event_count
+        }
+
+    # Merge patterns into risk_results so they are persisted in the same JSON column
+    risk_results["patterns"] = patterns
+
+    # Calculate score
+    scorer = RiskScorer()
+    score_result = scorer.calculate_score(risk_results["risk_details"])
+    mark("scoring")
+
+    # Generate AI explanations using User's Key if provided
+    ai_explainer = AIRiskExplainer(openai_api_key=openai_api_key)
+    ai_explanations = ai_explainer.generate_explanation(
+        metrics,
+        risk_results,
+        score_result
+    )
+    mark("ai_explanations")
+
+    return {
+        "metrics": metrics,
+        "risk_results": risk_results,
+        "score_result": score_result,
+        "ai_explanations": ai_explanations
+    }
+
+
+def process_trade_data(
+    df: pd.DataFrame,
+    openai_api_key: Optional[str] = None,
+    timings: Optional[Dict[str, float]] = None,
+    metrics: Optional[dict] = None,
+    calendar_path: Optional[str] = None
+):
+    """
+    Process trade data and return analysis results (CPU Bound).
+    
+    If ``timings`` is given, the wall time of each stage is recorded in it
+    (seconds, keyed by stage name). ``metrics`` may carry the output of
+    TradeMetricsCalculator computed elsewhere (e.g. by an incremental
+    TradeMetricsAccumulator), in which case it is not recomputed.
+    ``calendar_path`` is the economic calendar used for news event checks.
+    """
+    mark = _stage_clock(timings)
+
+    # Calculate metrics
+    if metrics is None:
+        calculator = TradeMetricsCalculator(df)
+        metrics = calculator.compute_all_metrics()
+
+    # Detect risks (Rules)
+    risk_engine = RiskRuleEngine(metrics, df)
+    risk_results = risk_engine.detect_all_risks()
+    mark("metrics_and_rules")
+    
+    # Detect Event Trading Risks (Phase 3)
+    event_count = 0
+    try:
+        event_count = count_event_trades(NewsService(calendar_path=calendar_path), df)
+    except Exception as e:
+        print(f"News risk detection failed: {e}")
+    mark("news_events")
+            
+    # Detect patterns (ML + Heuristics)
+    patterns = detect_patterns(df)
+    mark("patterns")
+
+    return _finish_analysis(metrics, risk_results, event_count, patterns, openai_api_key, mark)
+
+
+class TradeAnalysisAccumulator:
+    """
+    What the pipeline reads from the trades themselves, folded batch by batch:
+    a TradeMetricsAccumulator (metrics and per-symbol counts) and the number of
+    trades entered during news events. process_folded_trades() runs the
+    rules, scoring and explanations from it, so trades appended to a history
+    cost O(new trades). Pattern detection needs the trades and is left to
+    the caller.
+    """
+
+    def __init__(self, calendar_path: Optional[str] = None):
+        self.metrics = TradeMetricsAccumulator()
+        self.news_service = NewsService(calendar_path=calendar_path)
+        self.event_count = 0
+
+    @property
+    def calendar_fingerprint(self) -> Optional[str]:
+        calendar = self.news_service.calendar
+        return calendar.fingerprint if calendar is not None else None
+
+    def update(self, df: pd.DataFrame) -> "TradeAnalysisAccumulator":
+        """Fold a batch appended after the trades already seen (see TradeMetricsAccumulator.update)"""
+        self.metrics.update(df)
+        try:
+            self.event_count += count_event_trades(self.news_service, df)
+        except Exception as e:
+            print(f"News risk detection failed: {e}")
+        return self
+
+    @property
+    def symbol_counts(self) -> Optional[Dict[str, int]]:
+        """Trades per symbol, or None when the trades carry no symbol"""
+        return self.metrics.symbol_counts if (self.metrics.columns or {}).get('symbol') else None
+
+    def to_state(self) -> Dict[str, Any]:
+        """JSON-serializable snapshot"""
+        return {
+            "metrics": self.metrics.to_state(),
+            "calendar": self.calendar_fingerprint,
+            "event_count": self.event_count
+        }
+
+    @classmethod
+    def from_state(cls, state: Optional[Dict[str, Any]],
+                   calendar_path: Optional[str] = None) -> Optional["TradeAnalysisAccumulator"]:
+        """
+        Restore a snapshot; None if missing, written by an incompatible
+        version or folded against a different economic calendar
+        """
+        state = state or {}
+        metrics = TradeMetricsAccumulator.from_state(state.get("metrics"))
+        if metrics is None:
+            return None
+        accumulator = cls(calendar_path)
+        if state.get("calendar") != accumulator.calendar_fingerprint:
+            return None
+        accumulator.metrics = metrics
+        accumulator.event_count = int(state.get("event_count", 0))
+        return accumulator
+
+
+def process_folded_trades(
+    folded: TradeAnalysisAccumulator,
+    patterns: List[Dict[str, Any]],
+    openai_api_key: Optional[str] = None,
+    timings: Optional[Dict[str, float]] = None
+):
+    """
+    process_trade_data() for trades folded into ``folded``, reporting the
+    given ``patterns`` (detected on the trades earlier). Costs O(1) in the
+    number of trades.
+    """
+    mark = _stage_clock(timings)
+
+    metrics = folded.metrics.metrics()
+    risk_engine = RiskRuleEngine(metrics, symbol_counts=folded.symbol_counts)
+    risk_results = risk_engine.detect_all_risks()
+    mark("metrics_and_rules")
+
+    return _finish_analysis(metrics, risk_results, folded.event_count, patterns, openai_api_key, mark)
+
+
+def process_trade_data_timed(
+    df: pd.DataFrame,
+    openai_api_key: Optional[str] = None,
+    metrics: Optional[dict] = None,
+    calendar_path: Optional[str] = None
+) -> Tuple[dict, Dict[str, float]]:
+    """Run process_trade_data and also return its per-stage timings"""
+    timings: Dict[str, float] = {}
+    results = process_trade_data(df, openai_api_key, timings, metrics, calendar_path)
+    return results, timings
@@ -0,0 +1,231 @@
+"""
+Economic calendar of scheduled news events, indexed for matching trades.
+
+Events are loaded from a local CSV or JSON file with at least ``time``
+(UTC), ``currency`` and ``impact`` columns, plus optional ``title``,
+``window_before`` and ``window_after`` (minutes around the release that
+count as trading the event). Per currency the event windows are kept as
+sorted start times with a running maximum of end times, so each trade is
+matched with one ``np.searchsorted`` lookup: O(n log m) for n trades and
+m events.
+"""
+import hashlib
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_WINDOW_BEFORE_MINUTES = 5
+DEFAULT_WINDOW_AFTER_MINUTES = 5
+
+IMPACT_LEVELS = {"low": 1, "medium": 2, "high": 3}
+
+# Events that move every market (e.g. currency "ALL" or left empty)
+GLOBAL_CURRENCIES = {"", "ALL", "*"}
+
+_SYMBOL_PAIR = re.compile(r"^(?:FRX)?([A-Z]{3})([A-Z]{3})")
+
+_MINUTE_NS = 60_000_000_000
+
+
+def symbol_currencies(symbol) -> Optional[Tuple[str, str]]:
+    """
+    Base and quote currency of an FX-style symbol ("EURUSD", "frxGBPJPY",
+    "XAUUSD.m"), or None when the symbol isn't a currency pair.
+    """
+    if symbol is None or (isinstance(symbol, float) and np.isnan(symbol)):
+        return None
+    match = _SYMBOL_PAIR.match(str(symbol).strip().upper())
+    return (match.group(1), match.group(2)) if match else None
+
+
+def _utc_ns(times) -> np.ndarray:
+    """Int64 UTC nanoseconds of ``times`` (naive times are taken as UTC; NaT stays NaT)"""
+    times = pd.to_datetime(pd.Series(times), errors='coerce')
+    if times.dt.tz is not None:
+        times = times.dt.tz_convert('UTC').dt.tz_localize(None)
+    return pd.DatetimeIndex(times).as_unit('ns').asi8
+
+
+class EconomicCalendar:
+    """Sorted, per-currency interval index over a table of calendar events"""
+
+    def __init__(self, events: pd.DataFrame, min_impact: str = "high"):
+        events = self._normalize(events)
+        threshold = IMPACT_LEVELS.get(str(min_impact).lower(), 0)
+        events = events[events['impact_level'] >= threshold]
+        self.events = events.sort_values(['start_ns', 'end_ns'], kind='stable').reset_index(drop=True)
+        self.min_impact = min_impact
+        self._index = {
+            currency: self._build_index(group)
+            for currency, group in self.events.groupby('currency', sort=True)
+        }
+        self._fingerprint = None
+
+    @classmethod
+    def from_file(cls, path: str, min_impact: str = "high") -> "EconomicCalendar":
+        """Load events from a ``.csv`` or ``.json`` file"""
+        if path.lower().endswith(".json"):
+            events = pd.read_json(path, orient='records', convert_dates=False)
+        else:
+            events = pd.read_csv(path)
+        return cls(events, min_impact=min_impact)
+
+    @staticmethod
+    def _normalize(events: pd.DataFrame) -> pd.DataFrame:
+        missing = {'time', 'currency', 'impact'} - set(events.columns)
+        if missing:
+            raise ValueError(f"Calendar events are missing columns: {sorted(missing)}")
+
+        times = _utc_ns(events['time'])
+        valid = times != np.iinfo(np.int64).min
+        before = (events['window_before'] if 'window_before' in events.columns
+                  else pd.Series(DEFAULT_WINDOW_BEFORE_MINUTES, index=events.index))
+        after = (events['window_after'] if 'window_after' in events.columns
+                 else pd.Series(DEFAULT_WINDOW_AFTER_MINUTES, index=events.index))
+        before = before.fillna(DEFAULT_WINDOW_BEFORE_MINUTES).to_numpy(dtype=np.int64)
+        after = after.fillna(DEFAULT_WINDOW_AFTER_MINUTES).to_numpy(dtype=np.int64)
+
+        normalized = pd.DataFrame({
+            'time_ns': times,
+            'start_ns': times - before * _MINUTE_NS,
+            'end_ns': times + after * _MINUTE_NS,
+            'currency': events['currency'].fillna("").astype(str).str.strip().str.upper(),
+            'impact': events['impact'].fillna("").astype(str).str.strip(),
+            'title': (events['title'].fillna("").astype(str) if 'title' in events.columns
+                      else pd.Series("", index=events.index)),
+        })
+        normalized['impact_level'] = normalized['impact'].str.lower().map(IMPACT_LEVELS).fillna(0)
+        return normalized[valid].reset_index(drop=True)
+
+    @staticmethod
+    def _build_index(group: pd.DataFrame) -> Dict[str, np.ndarray]:
+        # ``group`` is sorted by start. A time is inside some window iff the
+        # latest end among windows started at or before it is not behind it.
+        ends = group['end_ns'].to_numpy()
+        running_end = np.maximum.accumulate(ends)
+        positions = np.arange(len(ends))
+        running_pos = np.maximum.accumulate(np.where(ends == running_end, positions, 0))
+        return {
+            'starts': group['start_ns'].to_numpy(),
+            'running_end': running_end,
+            'event_rows': group.index.to_numpy()[running_pos],
+        }
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    @property
+    def currencies(self) -> List[str]:
+        return list(self._index)
+
+    @property
+    def fingerprint(self) -> str:
+        """Content hash of the indexed events (part of analysis cache keys)"""
+        if self._fingerprint is None:
+            columns = self.events[['start_ns', 'end_ns', 'currency', 'title']]
+            hashed = pd.util.hash_pandas_object(columns, index=False).to_numpy()
+            self._fingerprint = hashlib.sha256(hashed.tobytes()).hexdigest()
+        return self._fingerprint
+
+    def match(self, times, symbols: Optional[Iterable] = None) -> Dict[str, Any]:
+        """
+        Match trade times against the event windows.
+
+        A trade is checked against events of its symbol's two currencies and
+        global events. Trades without a symbol, or whose symbol isn't a
+        currency pair, are checked against every event. Unparseable times
+        never match.
+
+        Returns:
+            Dictionary with ``flags`` (bool array aligned with ``times``),
+            ``event_rows`` (row in ``events`` of a matching event, -1 if
+            none), ``count`` and ``event_counts`` (matches per event title).
+        """
+        times_ns = _utc_ns(times)
+        n = len(times_ns)
+        valid = times_ns != np.iinfo(np.int64).min
+        event_rows = np.full(n, -1, dtype=np.int64)
+
+        # Currencies per distinct symbol rather than per trade
+        if symbols is None:
+            codes = np.zeros(n, dtype=np.int64)
+            pairs = [None]
+        else:
+            codes, uniques = pd.factorize(pd.Series(symbols), use_na_sentinel=False)
+            pairs = [symbol_currencies(symbol) for symbol in uniques]
+        unknown = np.array([pair is None for pair in pairs], dtype=bool)
+
+        for currency, index in self._index.items():
+            if currency in GLOBAL_CURRENCIES:
+                relevant = np.ones(len(pairs), dtype=bool)
+            else:
+                relevant = unknown | np.array([pair is not None and currency in pair for pair in pairs])
+            candidates = np.flatnonzero(relevant[codes] & valid & (event_rows < 0))
+            if len(candidates) == 0:
+                continue
+            t = times_ns[candidates]
+            pos = np.searchsorted(index['starts'], t, side='right') - 1
+            inside = pos >= 0
+            inside[inside] = index['running_end'][pos[inside]] >= t[inside]
+            event_rows[candidates[inside]] = index['event_rows'][pos[inside]]
+
+        flags = event_rows >= 0
+        titles = self.events['title'].to_numpy()[event_rows[flags]]
+        event_counts = pd.Series(titles).value_counts(sort=False).to_dict() if len(titles) else {}
+        return {
+            "flags": flags,
+            "event_rows": event_rows,
+            "count": int(np.count_nonzero(flags)),
+            "event_counts": {str(title): int(count) for title, count in event_counts.items()}
+        }
+
+    def events_on(self, date) -> List[Dict[str, Any]]:
+        """Events released on ``date`` (UTC), in time order"""
+        day_start = pd.Timestamp(date).normalize()
+        if day_start.tzinfo is not None:
+            day_start = day_start.tz_convert('UTC').tz_localize(None)
+        start_ns = day_start.as_unit('ns').value
+        times = self.events['time_ns'].to_numpy()
+        rows = self.events[(times >= start_ns) & (times < start_ns + 1440 * _MINUTE_NS)]
+        rows = rows.sort_values('time_ns', kind='stable')
+        return [
+            {
+                "title": row.title,
+                "impact": row.impact,
+                "time": pd.Timestamp(row.time_ns).strftime("%H:%M"),
+                "currency": row.currency
+            }
+            for row in rows.itertuples()
+        ]
+
+
+_loaded: Dict[str, Tuple[Tuple[int, int], EconomicCalendar]] = {}
+# Missing paths already reported, so each is warned about once
+_missing: Set[str] = set()
+
+
+def load_calendar(path: Optional[str] = None) -> Optional[EconomicCalendar]:
+    """
+    Calendar at ``path``, reloaded only when the file changes. None when no
+    path is given or the file is not found.
+    """
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        if path not in _missing:
+            _missing.add(path)
+            print(f"Economic calendar not found at {path}")
+        return None
+    _missing.discard(path)
+
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _loaded.get(path)
+    if cached is None or cached[0] != version:
+        cached = (version, EconomicCalendar.from_file(path))
+        _loaded[path] = cached
+    return cached[1]
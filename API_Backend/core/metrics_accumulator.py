@@ -0,0 +1,442 @@
+"""
+Incremental counterpart of TradeMetricsCalculator.
+
+A TradeMetricsAccumulator keeps the running state the metrics are derived
+from (counts and sums, the running peak and deepest drawdown, the current
+underwater run, the last trade for revenge detection, win/loss streaks,
+per-hour buckets and per-symbol counts) so trades appended to an account can be folded in at
+O(new trades) instead of recomputing the whole history. The state is plain
+JSON and can be persisted between syncs.
+
+Batches must arrive in trade order: every batch is appended after the
+trades already folded in, and entry times may not go backwards. A batch
+that would reorder history raises ``OutOfOrderTrades``; the caller then
+rebuilds from the full history.
+"""
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Bump when the persisted state layout changes
+STATE_VERSION = 2
+
+_NAT = np.iinfo(np.int64).min
+
+
+class OutOfOrderTrades(ValueError):
+    """Raised when a batch cannot be appended to the folded history"""
+
+
+def _hours_between(end_ns: int, start_ns: int) -> float:
+    # int64 arithmetic like the calculator's array maths (NaT wraps the same way)
+    delta = np.subtract(np.array([end_ns], dtype=np.int64), np.array([start_ns], dtype=np.int64))
+    return float(delta[0] / 3.6e12)
+
+
+def _dump_float(value: float):
+    """JSON-safe float: non-finite values are stored as strings"""
+    value = float(value)
+    return value if np.isfinite(value) else str(value)
+
+
+class TradeMetricsAccumulator:
+    """Fold trades into the running state behind TradeMetricsCalculator's metrics"""
+
+    def __init__(self):
+        # Which optional columns the folded trades carry; fixed by the first batch
+        self.columns: Optional[Dict[str, bool]] = None
+
+        # Counts and sums
+        self.n_trades = 0
+        self.n_wins = 0
+        self.n_losses = 0
+        self.sum_wins = 0.0
+        self.sum_losses = 0.0
+        self.net_profit = 0.0
+        self.position_sum = 0.0
+        self.position_count = 0
+        self.position_max = float('nan')
+        self.sl_missing = 0
+
+        # Equity curve and deepest drawdown
+        self.cum_pl = 0.0
+        self.peak = float('nan')
+        self.last_at_peak = 0
+        self.max_depth = 0.0
+        self.trough: Optional[int] = None
+        self.trough_pct = 0.0
+        self.trough_amount = 0.0
+        self.trough_peak = float('nan')
+        self.trough_time = _NAT
+        self.drawdown_start: Optional[int] = None
+        self.recovery: Optional[int] = None
+        self.recovery_time = _NAT
+
+        # Underwater runs: the open one (if any) and the longest closed one
+        self.run_start: Optional[int] = None
+        self.run_start_time = _NAT
+        self.best_run_length = 0
+        self.best_run_start_time = _NAT
+        self.best_run_end_time = _NAT
+        self.last_time = _NAT
+
+        # Pattern state
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.last_entry_ns: Optional[int] = None
+        self.last_entry_loss = False
+        self.revenge_count = 0
+        self.hour_counts = [0] * 24
+
+        # Trades per symbol (for the concentration rule), in first-seen order
+        self.symbol_counts: Dict[str, int] = {}
+
+        # Streaks: signed length of the current run (+ wins, - losses)
+        self.current_streak = 0
+        self.max_win_streak = 0
+        self.max_loss_streak = 0
+
+    # -------------------------------------------------
+    # Folding
+    # -------------------------------------------------
+
+    def update(self, df: pd.DataFrame) -> "TradeMetricsAccumulator":
+        """Fold a batch of trades appended after those already seen"""
+        if len(df) == 0:
+            return self
+
+        df_columns = df.columns
+        columns = {
+            'position': 'lot_size' in df_columns and 'account_balance_before' in df_columns,
+            'balance': 'account_balance_before' in df_columns,
+            'stop_loss': 'stop_loss' in df_columns,
+            'entry_time': 'entry_time' in df_columns,
+            'exit_time': 'entry_time' in df_columns and 'exit_time' in df_columns,
+            'symbol': 'symbol' in df_columns,
+        }
+        if self.columns is None:
+            self.columns = columns
+        elif columns != self.columns:
+            raise OutOfOrderTrades("Batch columns differ from the folded trades")
+
+        pl = df['profit_loss'].to_numpy(dtype=np.float64)
+        balance = (df['account_balance_before'].to_numpy(dtype=np.float64)
+                   if columns['balance'] else None)
+
+        entry_time = exit_time = None
+        times_ns = None
+        if columns['entry_time']:
+            entry_time = pd.DatetimeIndex(pd.to_datetime(df['entry_time'])).as_unit('ns')
+            times_ns = entry_time.asi8
+            if columns['exit_time']:
+                exit_time = pd.DatetimeIndex(pd.to_datetime(df['exit_time'])).as_unit('ns')
+
+            # Validate ordering before any state is touched
+            entry_valid = ~entry_time.isna()
+            if self.last_entry_ns is not None and entry_valid.any():
+                if times_ns[entry_valid].min() < self.last_entry_ns:
+                    raise OutOfOrderTrades("Batch has trades entered before the folded ones")
+
+        self._fold_basic(pl)
+        if columns['position']:
+            self._fold_position(df['lot_size'].to_numpy(dtype=np.float64), balance)
+        if columns['stop_loss']:
+            stop_loss = df['stop_loss'].to_numpy(dtype=np.float64)
+            self.sl_missing += int(np.count_nonzero(np.isnan(stop_loss) | (stop_loss == 0)))
+        self._fold_streaks(pl)
+
+        if balance is not None:
+            self._fold_drawdown(balance, relative=True, times_ns=times_ns)
+        else:
+            if self.n_trades == 0:
+                # The P/L curve starts from 0 before the first trade (index -1)
+                self.peak, self.last_at_peak = 0.0, -1
+            equity = np.nancumsum(np.concatenate(([self.cum_pl], pl)))[1:]
+            self.cum_pl = float(equity[-1])
+            self._fold_drawdown(equity, relative=False, times_ns=times_ns)
+
+        if entry_time is not None:
+            self._fold_patterns(pl, entry_time, exit_time)
+        if columns['symbol']:
+            self._fold_symbols(df['symbol'])
+
+        self.n_trades += len(pl)
+        return self
+
+    def _fold_basic(self, pl: np.ndarray):
+        win_mask = pl > 0
+        loss_mask = pl < 0
+        self.n_wins += int(np.count_nonzero(win_mask))
+        self.n_losses += int(np.count_nonzero(loss_mask))
+        self.sum_wins += float(pl[win_mask].sum())
+        self.sum_losses += float(pl[loss_mask].sum())
+        self.net_profit += float(np.nansum(pl))
+
+    def _fold_position(self, lot_size: np.ndarray, balance: np.ndarray):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            position_size_pct = (lot_size * 100000) / balance * 100
+        valid = position_size_pct[~np.isnan(position_size_pct)]
+        if len(valid) > 0:
+            self.position_sum += float(valid.sum())
+            self.position_count += len(valid)
+            self.position_max = float(np.fmax(self.position_max, valid.max()))
+
+    def _fold_streaks(self, pl: np.ndarray):
+        signs = np.sign(np.nan_to_num(pl, nan=0.0)).astype(np.int8)
+        # Run-length encode the batch, then splice the first run onto the open streak
+        boundaries = np.flatnonzero(np.diff(signs)) + 1
+        starts = np.concatenate(([0], boundaries))
+        lengths = np.diff(np.concatenate((starts, [len(signs)])))
+        for sign, length in zip(signs[starts].tolist(), lengths.tolist()):
+            if sign == 0:
+                self.current_streak = 0
+                continue
+            if (sign > 0) == (self.current_streak > 0) and self.current_streak != 0:
+                self.current_streak += sign * length
+            else:
+                self.current_streak = sign * length
+            if self.current_streak > 0:
+                self.max_win_streak = max(self.max_win_streak, self.current_streak)
+            else:
+                self.max_loss_streak = max(self.max_loss_streak, -self.current_streak)
+
+    def _fold_drawdown(self, equity: np.ndarray, relative: bool, times_ns: Optional[np.ndarray]):
+        """Same running-maximum maths as compute_drawdown, continued from the saved state"""
+        n0 = self.n_trades
+        m = len(equity)
+        index = n0 + np.arange(m)
+        if times_ns is None:
+            times_ns = np.full(m, _NAT, dtype=np.int64)
+        if n0 == 0:
+            # A starting point before the first trade shares its time
+            self.last_time = int(times_ns[0])
+        valid = ~np.isnan(equity)
+
+        peaks = np.fmax.accumulate(np.concatenate(([self.peak], equity)))[1:]
+        amounts = np.where(valid, peaks - equity, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pcts = np.where(valid & (peaks > 0), amounts / peaks * 100, 0.0)
+        at_peak = valid & (equity >= peaks)
+        last_peak = np.maximum(np.maximum.accumulate(np.where(at_peak, index, -1)), self.last_at_peak)
+
+        # Deepest drawdown (the earliest one wins ties, like argmax)
+        depth = pcts if relative else amounts
+        k = int(depth.argmax())
+        search_from = 0
+        if depth[k] > self.max_depth:
+            self.max_depth = float(depth[k])
+            self.trough = n0 + k
+            self.trough_pct = float(pcts[k])
+            self.trough_amount = float(amounts[k])
+            self.trough_peak = float(peaks[k])
+            self.trough_time = int(times_ns[k])
+            self.drawdown_start = int(last_peak[k])
+            self.recovery = None
+            search_from = k + 1
+        if self.trough is not None and self.recovery is None:
+            regained = np.flatnonzero(valid[search_from:] & (equity[search_from:] >= self.trough_peak))
+            if len(regained) > 0:
+                position = search_from + int(regained[0])
+                self.recovery = n0 + position
+                self.recovery_time = int(times_ns[position])
+
+        # Underwater runs; a run closes on the first point back at the peak (or NaN)
+        underwater = (valid & ~at_peak).tolist()
+        for position, below in enumerate(underwater):
+            if below:
+                if self.run_start is None:
+                    self.run_start = n0 + position
+                    self.run_start_time = (int(times_ns[position - 1]) if position > 0
+                                           else self.last_time)
+            elif self.run_start is not None:
+                length = n0 + position - self.run_start
+                if length > self.best_run_length:
+                    self.best_run_length = length
+                    self.best_run_start_time = self.run_start_time
+                    self.best_run_end_time = int(times_ns[position])
+                self.run_start = None
+
+        self.peak = float(peaks[-1])
+        self.last_at_peak = int(last_peak[-1])
+        self.last_time = int(times_ns[-1])
+
+    def _fold_patterns(self, pl: np.ndarray, entry_time: pd.DatetimeIndex,
+                       exit_time: Optional[pd.DatetimeIndex]):
+        entry_ns = entry_time.asi8
+        entry_valid = ~entry_time.isna()
+
+        if exit_time is not None:
+            duration_valid = entry_valid & ~exit_time.isna()
+            durations = (exit_time.asi8[duration_valid] - entry_ns[duration_valid]) / 3.6e12
+            self.duration_sum += float(durations.sum())
+            self.duration_count += len(durations)
+
+        if not entry_valid.any():
+            return
+
+        # Revenge trading over the valid entries in time order, continuing
+        # from the last trade already folded in
+        order = np.argsort(entry_ns[entry_valid], kind='stable')
+        sorted_ns = entry_ns[entry_valid][order]
+        sorted_loss = (pl[entry_valid] < 0)[order]
+        if self.last_entry_ns is not None:
+            sorted_ns = np.concatenate(([self.last_entry_ns], sorted_ns))
+            sorted_loss = np.concatenate(([self.last_entry_loss], sorted_loss))
+        gap_minutes = (sorted_ns[1:] - sorted_ns[:-1]) / 6e10
+        self.revenge_count += int(np.count_nonzero(sorted_loss[:-1] & (gap_minutes < 30)))
+        self.last_entry_ns = int(sorted_ns[-1])
+        self.last_entry_loss = bool(sorted_loss[-1])
+
+        hours = np.asarray(entry_time.hour)[entry_valid].astype(np.int64)
+        buckets = np.bincount(hours, minlength=24)
+        self.hour_counts = [a + int(b) for a, b in zip(self.hour_counts, buckets)]
+
+    def _fold_symbols(self, symbols: pd.Series):
+        counts = symbols.value_counts(sort=False)
+        for symbol, count in zip(counts.index.tolist(), counts.tolist()):
+            if count:
+                self.symbol_counts[str(symbol)] = self.symbol_counts.get(str(symbol), 0) + int(count)
+
+    # -------------------------------------------------
+    # Outputs
+    # -------------------------------------------------
+
+    def metrics(self) -> Dict[str, Any]:
+        """The dictionary TradeMetricsCalculator.compute_all_metrics() returns for the folded trades"""
+        columns = self.columns or {}
+        total = self.n_trades
+        metrics: Dict[str, Any] = {}
+
+        metrics['total_trades'] = total
+        metrics['winning_trades'] = self.n_wins
+        metrics['losing_trades'] = self.n_losses
+        metrics['win_rate'] = (self.n_wins / total * 100 if total > 0 else 0)
+        metrics['total_profit'] = self.sum_wins
+        metrics['total_loss'] = abs(self.sum_losses)
+        metrics['net_profit'] = self.net_profit
+        metrics['avg_win'] = (self.sum_wins / self.n_wins if self.n_wins > 0 else 0)
+        metrics['avg_loss'] = (abs(self.sum_losses / self.n_losses) if self.n_losses > 0 else 0)
+        if metrics['total_loss'] != 0:
+            metrics['profit_factor'] = metrics['total_profit'] / metrics['total_loss']
+        else:
+            metrics['profit_factor'] = float('inf') if metrics['total_profit'] > 0 else 0
+
+        if columns.get('position'):
+            metrics['avg_position_size_pct'] = (self.position_sum / self.position_count
+                                                if self.position_count > 0 else float('nan'))
+            metrics['max_position_size_pct'] = self.position_max
+        if columns.get('stop_loss'):
+            metrics['sl_usage_rate'] = ((1 - self.sl_missing / total) * 100 if total > 0 else 0)
+        if self.n_losses > 0 and self.n_wins > 0:
+            avg_risk = abs(self.sum_losses) / self.n_losses
+            avg_reward = self.sum_wins / self.n_wins
+            metrics['risk_reward_ratio'] = avg_reward / avg_risk if avg_risk != 0 else 0
+        else:
+            metrics['risk_reward_ratio'] = 0
+
+        if total > 0:
+            drawdown = self.drawdown()
+            if not columns.get('balance'):
+                drawdown.pop('max_drawdown_pct')
+            metrics.update(drawdown)
+
+        if columns.get('entry_time'):
+            metrics['avg_trade_duration_hours'] = (self.duration_sum / self.duration_count
+                                                   if self.duration_count > 0 else float('nan'))
+            metrics['revenge_trades_count'] = self.revenge_count
+            metrics['revenge_trading_pct'] = (self.revenge_count / total * 100 if total > 0 else 0)
+            if any(self.hour_counts):
+                metrics['most_active_hour'] = int(np.argmax(self.hour_counts))
+            else:
+                metrics['most_active_hour'] = None
+
+        return metrics
+
+    def drawdown(self) -> Dict[str, Any]:
+        """compute_drawdown() of the folded equity curve"""
+        stats = {
+            'max_drawdown_pct': 0,
+            'max_drawdown_amount': 0.0,
+            'drawdown_start_index': None,
+            'drawdown_trough_index': None,
+            'drawdown_recovery_index': None,
+            'drawdown_recovery_trades': None,
+            'time_to_recovery_hours': None,
+            'longest_underwater_trades': 0,
+            'longest_underwater_hours': None,
+        }
+        if self.trough is None:
+            return stats
+
+        stats['max_drawdown_pct'] = self.trough_pct
+        stats['max_drawdown_amount'] = self.trough_amount
+        stats['drawdown_start_index'] = self.drawdown_start
+        stats['drawdown_trough_index'] = self.trough
+        stats['drawdown_recovery_index'] = self.recovery
+
+        # An open run is the last one, so it only wins if strictly longer
+        length = self.best_run_length
+        start_time, end_time = self.best_run_start_time, self.best_run_end_time
+        if self.run_start is not None and self.n_trades - self.run_start > length:
+            length = self.n_trades - self.run_start
+            start_time, end_time = self.run_start_time, self.last_time
+        stats['longest_underwater_trades'] = length
+
+        if self.recovery is not None:
+            stats['drawdown_recovery_trades'] = self.recovery - self.trough
+
+        if (self.columns or {}).get('entry_time'):
+            if self.recovery is not None:
+                stats['time_to_recovery_hours'] = _hours_between(self.recovery_time, self.trough_time)
+            stats['longest_underwater_hours'] = _hours_between(end_time, start_time)
+
+        return stats
+
+    def streaks(self) -> Dict[str, int]:
+        """Current and longest win/loss streaks (break-even trades end a streak)"""
+        return {
+            'current_win_streak': max(self.current_streak, 0),
+            'current_loss_streak': max(-self.current_streak, 0),
+            'max_win_streak': self.max_win_streak,
+            'max_loss_streak': self.max_loss_streak,
+        }
+
+    # -------------------------------------------------
+    # Persistence
+    # -------------------------------------------------
+
+    _FLOAT_FIELDS = (
+        'sum_wins', 'sum_losses', 'net_profit', 'position_sum', 'position_max',
+        'cum_pl', 'peak', 'max_depth', 'trough_pct', 'trough_amount', 'trough_peak',
+        'duration_sum',
+    )
+    _PLAIN_FIELDS = (
+        'columns', 'n_trades', 'n_wins', 'n_losses', 'position_count', 'sl_missing',
+        'last_at_peak', 'trough', 'trough_time', 'drawdown_start', 'recovery', 'recovery_time',
+        'run_start', 'run_start_time', 'best_run_length', 'best_run_start_time',
+        'best_run_end_time', 'last_time', 'duration_count', 'last_entry_ns',
+        'last_entry_loss', 'revenge_count', 'hour_counts', 'current_streak',
+        'max_win_streak', 'max_loss_streak', 'symbol_counts',
+    )
+
+    def to_state(self) -> Dict[str, Any]:
+        """JSON-serializable snapshot of the accumulator"""
+        state: Dict[str, Any] = {'version': STATE_VERSION}
+        for field in self._FLOAT_FIELDS:
+            state[field] = _dump_float(getattr(self, field))
+        for field in self._PLAIN_FIELDS:
+            state[field] = getattr(self, field)
+        return state
+
+    @classmethod
+    def from_state(cls, state: Optional[Dict[str, Any]]) -> Optional["TradeMetricsAccumulator"]:
+        """Restore a snapshot; None if missing or written by an incompatible version"""
+        if not state or state.get('version') != STATE_VERSION:
+            return None
+        accumulator = cls()
+        for field in cls._FLOAT_FIELDS:
+            setattr(accumulator, field, float(state[field]))
+        for field in cls._PLAIN_FIELDS:
+            setattr(accumulator, field, state[field])
+        return accumulator
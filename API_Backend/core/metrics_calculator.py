@@ -4,11 +4,49 @@ import numpy as np
 from datetime import datetime
 
 class TradeMetricsCalculator:
-    """Calculate trading metrics from trade data"""
+    """Calculate trading metrics from trade data.
+
+    The columns the metrics depend on are pulled out of the frame once into
+    contiguous NumPy arrays, and the win/loss masks and their sums are built a
+    single time. Every ``compute_*`` step then works off those arrays, so the
+    input frame is neither copied nor mutated.
+    """
     
     def __init__(self, df):
-        self.df = df.copy()
+        self.df = df
         self.metrics = {}
+        self._extract_arrays()
+        
+    def _extract_arrays(self):
+        """Pull the columns used by the metrics into arrays (single pass)"""
+        df = self.df
+        columns = df.columns
+        
+        self.n_trades = len(df)
+        self.profit_loss = df['profit_loss'].to_numpy(dtype=np.float64)
+        self.lot_size = (df['lot_size'].to_numpy(dtype=np.float64)
+                         if 'lot_size' in columns else None)
+        self.balance = (df['account_balance_before'].to_numpy(dtype=np.float64)
+                        if 'account_balance_before' in columns else None)
+        self.stop_loss = (df['stop_loss'].to_numpy(dtype=np.float64)
+                          if 'stop_loss' in columns else None)
+        
+        # Datetimes are parsed once; the pattern metrics work on their int64 nanoseconds
+        self.entry_time = None
+        self.exit_time = None
+        if 'entry_time' in columns:
+            self.entry_time = pd.DatetimeIndex(pd.to_datetime(df['entry_time'])).as_unit('ns')
+            if 'exit_time' in columns:
+                self.exit_time = pd.DatetimeIndex(pd.to_datetime(df['exit_time'])).as_unit('ns')
+        
+        # Win/loss masks and aggregates shared by several metrics
+        pl = self.profit_loss
+        self.win_mask = pl > 0
+        self.loss_mask = pl < 0
+        self.n_wins = int(np.count_nonzero(self.win_mask))
+        self.n_losses = int(np.count_nonzero(self.loss_mask))
+        self.sum_wins = float(pl[self.win_mask].sum())
+        self.sum_losses = float(pl[self.loss_mask].sum())
         
     def compute_all_metrics(self):
         """Compute all trading metrics"""
@@ -20,22 +58,19 @@ class TradeMetricsCalculator:
     
     def compute_basic_metrics(self):
         """Compute basic trading statistics"""
-        df = self.df
+        total = self.n_trades
         
-        self.metrics['total_trades'] = len(df)
-        self.metrics['winning_trades'] = len(df[df['profit_loss'] > 0])
-        self.metrics['losing_trades'] = len(df[df['profit_loss'] < 0])
-        self.metrics['win_rate'] = (self.metrics['winning_trades'] / self.metrics['total_trades'] * 100 
-                                   if self.metrics['total_trades'] > 0 else 0)
+        self.metrics['total_trades'] = total
+        self.metrics['winning_trades'] = self.n_wins
+        self.metrics['losing_trades'] = self.n_losses
+        self.metrics['win_rate'] = (self.n_wins / total * 100 if total > 0 else 0)
         
         # Profit metrics
-        self.metrics['total_profit'] = df[df['profit_loss'] > 0]['profit_loss'].sum()
-        self.metrics['total_loss'] = abs(df[df['profit_loss'] < 0]['profit_loss'].sum())
-        self.metrics['net_profit'] = df['profit_loss'].sum()
-        self.metrics['avg_win'] = (df[df['profit_loss'] > 0]['profit_loss'].mean() 
-                                  if self.metrics['winning_trades'] > 0 else 0)
-        self.metrics['avg_loss'] = (abs(df[df['profit_loss'] < 0]['profit_loss'].mean()) 
-                                   if self.metrics['losing_trades'] > 0 else 0)
+        self.metrics['total_profit'] = self.sum_wins
+        self.metrics['total_loss'] = abs(self.sum_losses)
+        self.metrics['net_profit'] = float(np.nansum(self.profit_loss))
+        self.metrics['avg_win'] = (self.sum_wins / self.n_wins if self.n_wins > 0 else 0)
+        self.metrics['avg_loss'] = (abs(self.sum_losses / self.n_losses) if self.n_losses > 0 else 0)
         
         # Profit factor
         if self.metrics['total_loss'] != 0:
@@ -45,81 +80,187 @@ class TradeMetricsCalculator:
     
     def compute_risk_metrics(self):
         """Compute risk-related metrics"""
-        df = self.df
+        total = self.n_trades
         
         # Position sizing
-        if 'lot_size' in df.columns and 'account_balance_before' in df.columns:
-            df['position_size_pct'] = (df['lot_size'] * 100000) / df['account_balance_before'] * 100
-            self.metrics['avg_position_size_pct'] = df['position_size_pct'].mean()
-            self.metrics['max_position_size_pct'] = df['position_size_pct'].max()
+        if self.lot_size is not None and self.balance is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                position_size_pct = (self.lot_size * 100000) / self.balance * 100
+            self.metrics['avg_position_size_pct'] = _nanmean(position_size_pct)
+            self.metrics['max_position_size_pct'] = _nanmax(position_size_pct)
         
         # Stop loss usage
-        if 'stop_loss' in df.columns:
-            sl_missing = df['stop_loss'].isna() | (df['stop_loss'] == 0)
-            self.metrics['sl_usage_rate'] = (1 - sl_missing.sum() / len(df)) * 100
+        if self.stop_loss is not None:
+            sl_missing = int(np.count_nonzero(np.isnan(self.stop_loss) | (self.stop_loss == 0)))
+            self.metrics['sl_usage_rate'] = ((1 - sl_missing / total) * 100 if total > 0 else 0)
         
         # Risk-reward ratio
-        winning_trades = df[df['profit_loss'] > 0]
-        losing_trades = df[df['profit_loss'] < 0]
-        
-        if len(losing_trades) > 0 and len(winning_trades) > 0:
-            avg_risk = abs(losing_trades['profit_loss']).mean()
-            avg_reward = winning_trades['profit_loss'].mean()
+        if self.n_losses > 0 and self.n_wins > 0:
+            avg_risk = abs(self.sum_losses) / self.n_losses
+            avg_reward = self.sum_wins / self.n_wins
             self.metrics['risk_reward_ratio'] = avg_reward / avg_risk if avg_risk != 0 else 0
         else:
             self.metrics['risk_reward_ratio'] = 0
     
     def compute_performance_metrics(self):
         """Compute performance metrics"""
-        df = self.df
+        # Drawdown calculation. With a balance column the curve is the account
+        # balance; otherwise it is the cumulative profit/loss starting from 0,
+        # which has no meaningful base for a percentage so only absolute stats
+        # are reported.
+        if self.balance is not None and len(self.balance) > 0:
+            equity, relative, start = self.balance, True, None
+        elif self.n_trades > 0:
+            equity, relative, start = np.nancumsum(self.profit_loss), False, 0.0
+        else:
+            return
         
-        # Drawdown calculation
-        if 'account_balance_before' in df.columns:
-            # Simple drawdown calculation
-            balances = df['account_balance_before'].tolist()
-            running_max = balances[0]
-            max_drawdown_pct = 0
-            
-            for balance in balances:
-                if balance > running_max:
-                    running_max = balance
-                drawdown_pct = (running_max - balance) / running_max * 100
-                if drawdown_pct > max_drawdown_pct:
-                    max_drawdown_pct = drawdown_pct
-            
-            self.metrics['max_drawdown_pct'] = max_drawdown_pct
+        times_ns = self.entry_time.asi8 if self.entry_time is not None else None
+        drawdown = compute_drawdown(equity, relative=relative, times_ns=times_ns, start=start)
+        if not relative:
+            drawdown.pop('max_drawdown_pct')
+        self.metrics.update(drawdown)
     
     def compute_pattern_metrics(self):
         """Detect trading patterns"""
-        df = self.df
+        if self.entry_time is None:
+            return
         
-        # Convert to datetime if not already
-        if 'entry_time' in df.columns:
-            df['entry_time_dt'] = pd.to_datetime(df['entry_time'])
-            df['exit_time_dt'] = pd.to_datetime(df['exit_time'])
-            
-            # Trading frequency
-            df['trade_duration'] = (df['exit_time_dt'] - df['entry_time_dt']).dt.total_seconds() / 3600  # hours
-            self.metrics['avg_trade_duration_hours'] = df['trade_duration'].mean()
-            
-            # Sort by time and check for revenge trading
-            df_sorted = df.sort_values('entry_time_dt')
-            df_sorted['prev_result'] = df_sorted['profit_loss'].shift(1)
-            df_sorted['time_since_last'] = df_sorted['entry_time_dt'].diff().dt.total_seconds() / 60  # minutes
-            
-            # Revenge trading: trade within 30 minutes of a loss
-            revenge_trades = df_sorted[
-                (df_sorted['prev_result'] < 0) & 
-                (df_sorted['time_since_last'] < 30)
-            ]
-            
-            self.metrics['revenge_trades_count'] = len(revenge_trades)
-            self.metrics['revenge_trading_pct'] = (len(revenge_trades) / len(df) * 100 
-                                                  if len(df) > 0 else 0)
+        total = self.n_trades
+        entry_ns = self.entry_time.asi8
+        entry_valid = ~self.entry_time.isna()
+        
+        # Trading frequency (hours)
+        if self.exit_time is not None:
+            exit_ns = self.exit_time.asi8
+            duration_valid = entry_valid & ~self.exit_time.isna()
+            durations = (exit_ns[duration_valid] - entry_ns[duration_valid]) / 3.6e12
+            self.metrics['avg_trade_duration_hours'] = _nanmean(durations)
+        else:
+            self.metrics['avg_trade_duration_hours'] = float('nan')
+        
+        # Order by entry time (unparseable times last) and check for revenge trading:
+        # a trade entered within 30 minutes of a losing trade
+        order = np.argsort(np.where(entry_valid, entry_ns, np.iinfo(np.int64).max), kind='stable')
+        sorted_pl = self.profit_loss[order]
+        sorted_ns = entry_ns[order]
+        sorted_valid = entry_valid[order]
+        
+        gap_minutes = (sorted_ns[1:] - sorted_ns[:-1]) / 6e10
+        revenge_mask = ((sorted_pl[:-1] < 0) & (gap_minutes < 30)
+                        & sorted_valid[1:] & sorted_valid[:-1])
+        revenge_count = int(np.count_nonzero(revenge_mask))
+        
+        self.metrics['revenge_trades_count'] = revenge_count
+        self.metrics['revenge_trading_pct'] = (revenge_count / total * 100 if total > 0 else 0)
+        
+        # Time of day analysis (lowest hour wins ties, like Series.mode)
+        hours = np.asarray(self.entry_time.hour)[entry_valid].astype(np.int64)
+        if len(hours) > 0:
+            self.metrics['most_active_hour'] = int(np.bincount(hours, minlength=24).argmax())
+        else:
+            self.metrics['most_active_hour'] = None
+
+
+def compute_drawdown(equity: np.ndarray, relative: bool = True, times_ns: np.ndarray = None,
+                     start: float = None) -> dict:
+    """
+    Drawdown statistics of an equity curve using a running maximum.
+    
+    Args:
+        equity: Equity (or balance) values in trade order. NaN entries are ignored.
+        relative: Locate the deepest drawdown by percentage of the peak
+            (True) or by absolute amount (False).
+        times_ns: Optional int64 nanosecond timestamps aligned with ``equity``
+            used to express durations in hours.
+        start: Optional equity before the first point (0 for a cumulative
+            P/L curve), so a drawdown can begin before the first trade. It
+            is index -1, at the time of the first point.
             
-            # Time of day analysis
-            df_sorted['entry_hour'] = df_sorted['entry_time_dt'].dt.hour
-            self.metrics['most_active_hour'] = df_sorted['entry_hour'].mode()[0] if len(df_sorted) > 0 else None
+    Returns:
+        Dictionary with the max drawdown (pct and amount), the start (peak),
+        trough and recovery indices of the deepest drawdown, the trades/hours
+        it took to recover, and the longest underwater period.
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    offset = 0
+    if start is not None and len(equity) > 0:
+        equity = np.concatenate(([start], equity))
+        if times_ns is not None and len(times_ns) == len(equity) - 1:
+            times_ns = np.concatenate((np.asarray(times_ns, dtype=np.int64)[:1], times_ns))
+        offset = 1
+    n = len(equity)
+    index = np.arange(n)
+    valid = ~np.isnan(equity)
+    
+    peaks = np.fmax.accumulate(equity)
+    amounts = np.where(valid, peaks - equity, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pcts = np.where(valid & (peaks > 0), amounts / peaks * 100, 0.0)
+    
+    stats = {
+        'max_drawdown_pct': 0,
+        'max_drawdown_amount': 0.0,
+        'drawdown_start_index': None,
+        'drawdown_trough_index': None,
+        'drawdown_recovery_index': None,
+        'drawdown_recovery_trades': None,
+        'time_to_recovery_hours': None,
+        'longest_underwater_trades': 0,
+        'longest_underwater_hours': None,
+    }
+    
+    depth = pcts if relative else amounts
+    if n == 0 or depth.max() <= 0:
+        return stats
+    
+    # Deepest drawdown: the peak is the last new high at or before the trough,
+    # recovery is the first point afterwards that regains that peak
+    trough = int(depth.argmax())
+    at_peak = valid & (equity >= peaks)
+    peak = int(np.maximum.accumulate(np.where(at_peak, index, 0))[trough])
+    regained = np.flatnonzero(valid[trough + 1:] & (equity[trough + 1:] >= peaks[trough]))
+    recovery = int(trough + 1 + regained[0]) if len(regained) > 0 else None
+    
+    stats['max_drawdown_pct'] = float(pcts[trough])
+    stats['max_drawdown_amount'] = float(amounts[trough])
+    stats['drawdown_start_index'] = peak - offset
+    stats['drawdown_trough_index'] = trough - offset
+    stats['drawdown_recovery_index'] = recovery - offset if recovery is not None else None
+    
+    # Longest run of consecutive points below the running peak
+    underwater = (valid & ~at_peak).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], underwater, [0]))))
+    run_starts, run_ends = edges[0::2], edges[1::2]
+    longest = int(np.argmax(run_ends - run_starts))
+    stats['longest_underwater_trades'] = int(run_ends[longest] - run_starts[longest])
+    
+    if recovery is not None:
+        stats['drawdown_recovery_trades'] = recovery - trough
+    
+    if times_ns is not None and len(times_ns) == n:
+        times_ns = np.asarray(times_ns, dtype=np.int64)
+        if recovery is not None:
+            stats['time_to_recovery_hours'] = float((times_ns[recovery] - times_ns[trough]) / 3.6e12)
+        # The underwater period runs from the preceding peak until the curve
+        # is back at the peak (or the last observation if it never is)
+        run_start = max(int(run_starts[longest]) - 1, 0)
+        run_end = min(int(run_ends[longest]), n - 1)
+        stats['longest_underwater_hours'] = float((times_ns[run_end] - times_ns[run_start]) / 3.6e12)
+    
+    return stats
+
+
+def _nanmean(values: np.ndarray) -> float:
+    """Mean ignoring NaN (NaN when nothing is left), matching Series.mean"""
+    valid = values[~np.isnan(values)]
+    return float(valid.mean()) if len(valid) > 0 else float('nan')
+
+
+def _nanmax(values: np.ndarray) -> float:
+    """Max ignoring NaN (NaN when nothing is left), matching Series.max"""
+    valid = values[~np.isnan(values)]
+    return float(valid.max()) if len(valid) > 0 else float('nan')
 
 # Test function
 def test_metrics():
@@ -1,26 +1,45 @@
 """
 News Service for Sentiment Analysis and Economic Calendar Integration.
-Currently uses a Mock implementation for demonstration.
+
+Event checks use the economic calendar file passed as ``calendar_path``
+(see core.economic_calendar; the API passes ECONOMIC_CALENDAR_PATH from
+its settings). Without one, the recurring US data (13:30 UTC) and FOMC
+(19:00 UTC) windows are used.
 """
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-import random
+from typing import Any, List, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.economic_calendar import EconomicCalendar, load_calendar
+
+# Recurring high impact windows (UTC) used without a calendar: hour, first
+# and last minute, event name
+EVENT_WINDOWS = [
+    (13, 25, 35, "US High Impact Data (CPI/NFP/PPI)"),  # Classic US News times: 13:30 UTC
+    (19, 0, 10, "FOMC / Fed Interest Rate Decision"),   # FOMC: 19:00 UTC
+]
 
 class NewsService:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, calendar: Optional[EconomicCalendar] = None,
+                 calendar_path: Optional[str] = None):
         self.api_key = api_key
-        # Common high impact event times (UTC) for simulation
-        # 13:30 (US Data), 19:00 (FOMC), 12:45 (ECB)
-        self.risky_hours = [13, 19, 12] 
+        # Calendar of scheduled events; None falls back to EVENT_WINDOWS
+        self.calendar = calendar if calendar is not None else load_calendar(calendar_path)
     
     def get_calendar_events(self, date: datetime) -> List[Dict]:
         """
         Fetch high impact events for a given date.
-        Mock implementation: Returns events if the date matches specific conditions.
+        Without a calendar file only the NFP release (first Friday of the
+        month) is known.
         """
+        if self.calendar is not None:
+            return self.calendar.events_on(date)
+        
         events = []
         
-        # Simulate NFP (First Friday of month) - Simplified check
+        # NFP (First Friday of month)
         if date.day <= 7 and date.weekday() == 4:
             events.append({
                 "title": "Non-Farm Payrolls (NFP)",
@@ -29,27 +48,9 @@ class NewsService:
                 "currency": "USD"
             })
             
-        # Simulate FOMC (Randomly on Wednesdays)
-        if date.weekday() == 2 and random.random() < 0.3:
-            events.append({
-                "title": "FOMC Meeting Minutes",
-                "impact": "High",
-                "time": "19:00",
-                "currency": "USD"
-            })
-            
-        # General fake events for demo purposes
-        if random.random() < 0.2:
-            events.append({
-                "title": "CPI Data Release",
-                "impact": "High",
-                "time": "13:30",
-                "currency": "USD"
-            })
-            
         return events
 
-    def check_event_trading_risk(self, trade_time: datetime) -> Optional[Dict]:
+    def check_event_trading_risk(self, trade_time: datetime, symbol: Optional[str] = None) -> Optional[Dict]:
         """
         Check if a trade was taken too close to a high impact event.
         Returns a risk dictionary if detected.
@@ -66,15 +67,16 @@ class NewsService:
         is_news_time = False
         event_name = "Unknown Event"
         
-        # Classic US News times: 13:30 UTC
-        if hour == 13 and 25 <= minute <= 35:
-            is_news_time = True
-            event_name = "US High Impact Data (CPI/NFP/PPI)"
-            
-        # FOMC: 19:00 UTC
-        if hour == 19 and 0 <= minute <= 10:
-            is_news_time = True
-            event_name = "FOMC / Fed Interest Rate Decision"
+        if self.calendar is not None:
+            match = self.calendar.match([trade_time], None if symbol is None else [symbol])
+            is_news_time = bool(match["count"])
+            if is_news_time:
+                event_name = self.calendar.events['title'].iloc[match["event_rows"][0]] or event_name
+        else:
+            for window_hour, first_minute, last_minute, window_event in EVENT_WINDOWS:
+                if hour == window_hour and first_minute <= minute <= last_minute:
+                    is_news_time = True
+                    event_name = window_event
             
         if is_news_time:
             return {
@@ -88,3 +90,46 @@ class NewsService:
             }
             
         return None
+
+    def check_event_trading_risk_batch(self, times, symbols=None) -> Dict[str, Any]:
+        """
+        Vectorized check_event_trading_risk over many trade times.
+        
+        With a calendar, trades are matched against its interval index
+        (filtered by the currencies of ``symbols`` when given). Otherwise
+        times are reduced to minute-of-day with integer arithmetic and
+        compared against every recurring window at once. Unparseable times
+        are never flagged.
+        
+        Returns:
+            Dictionary with ``flags`` (bool array aligned with ``times``),
+            ``count`` (flagged trades) and ``event_counts`` (flagged trades
+            per event name).
+        """
+        if self.calendar is not None:
+            match = self.calendar.match(times, symbols)
+            return {key: match[key] for key in ("flags", "count", "event_counts")}
+        
+        times = pd.to_datetime(pd.Series(times), errors='coerce')
+        if times.dt.tz is not None:
+            # Match the scalar check, which reads the wall-clock hour and minute
+            times = times.dt.tz_localize(None)
+        ns = pd.DatetimeIndex(times).as_unit('ns').asi8
+        valid = ~np.asarray(times.isna())
+        minute_of_day = np.where(valid, (ns // 60_000_000_000) % 1440, -1)
+        
+        flags = np.zeros(len(ns), dtype=bool)
+        event_counts = {}
+        for window_hour, first_minute, last_minute, window_event in EVENT_WINDOWS:
+            in_window = ((minute_of_day >= window_hour * 60 + first_minute)
+                         & (minute_of_day <= window_hour * 60 + last_minute))
+            hits = int(np.count_nonzero(in_window))
+            if hits:
+                event_counts[window_event] = event_counts.get(window_event, 0) + hits
+            flags |= in_window
+        
+        return {
+            "flags": flags,
+            "count": int(np.count_nonzero(flags)),
+            "event_counts": event_counts
+        }
@@ -1,14 +1,17 @@
 # core/risk_rules.py
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any
 
 class RiskRuleEngine:
     """Rule-based engine to detect trading risks"""
     
-    def __init__(self, metrics: Dict[str, Any], df: pd.DataFrame = None):
+    def __init__(self, metrics: Dict[str, Any], df: pd.DataFrame = None,
+                 symbol_counts: Optional[Dict[str, int]] = None):
         self.metrics = metrics
         self.df = df
+        # Trades per symbol, when the trades were folded in batches instead of passed as df
+        self.symbol_counts = symbol_counts
         self.detected_risks = []
         self.risk_details = {}
         
@@ -89,6 +92,14 @@ class RiskRuleEngine:
                     'threshold': threshold,
                     'message': f"Maximum drawdown ({drawdown:.1f}%) exceeds safe limit ({threshold}%)"
                 }
+                
+                # Duration/recovery context from the equity-curve engine
+                if 'longest_underwater_trades' in self.metrics:
+                    self.risk_details['high_drawdown'].update({
+                        'longest_underwater_trades': self.metrics['longest_underwater_trades'],
+                        'recovered': self.metrics.get('drawdown_recovery_index') is not None,
+                        'recovery_trades': self.metrics.get('drawdown_recovery_trades')
+                    })
     
     def detect_revenge_trading_risk(self):
         """Detect revenge trading patterns"""
@@ -138,22 +149,27 @@ class RiskRuleEngine:
     
     def detect_concentration_risk(self):
         """Check if trading is concentrated in few symbols"""
-        if self.df is not None and 'symbol' in self.df.columns:
+        if self.symbol_counts is not None:
+            symbol_counts = pd.Series(self.symbol_counts, dtype='int64').sort_values(ascending=False, kind='stable')
+            total_trades = self.metrics.get('total_trades', 0)
+        elif self.df is not None and 'symbol' in self.df.columns:
             symbol_counts = self.df['symbol'].value_counts()
             total_trades = len(self.df)
+        else:
+            return
+        
+        if len(symbol_counts) > 0:
+            top_symbol_pct = (symbol_counts.iloc[0] / total_trades) * 100
             
-            if len(symbol_counts) > 0:
-                top_symbol_pct = (symbol_counts.iloc[0] / total_trades) * 100
-                
-                if top_symbol_pct > 50:  # More than 50% in one symbol
-                    self.detected_risks.append('concentration_risk')
-                    self.risk_details['concentration_risk'] = {
-                        'severity': self._calculate_severity(top_symbol_pct, 50.0, 80.0),
-                        'top_symbol': symbol_counts.index[0],
-                        'concentration_pct': round(top_symbol_pct, 2),
-                        'unique_symbols': len(symbol_counts),
-                        'message': f"High concentration: {top_symbol_pct:.1f}% of trades in {symbol_counts.index[0]}"
-                    }
+            if top_symbol_pct > 50:  # More than 50% in one symbol
+                self.detected_risks.append('concentration_risk')
+                self.risk_details['concentration_risk'] = {
+                    'severity': self._calculate_severity(top_symbol_pct, 50.0, 80.0),
+                    'top_symbol': symbol_counts.index[0],
+                    'concentration_pct': round(top_symbol_pct, 2),
+                    'unique_symbols': len(symbol_counts),
+                    'message': f"High concentration: {top_symbol_pct:.1f}% of trades in {symbol_counts.index[0]}"
+                }
     
     def detect_overtrading_risk(self):
         """Check for overtrading patterns"""
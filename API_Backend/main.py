@@ -21,6 +21,13 @@ from api import models  # This imports all models
 
 # Import routers
 from api.routers import analyze, risk, reports, users, dashboard, alerts, integrations
+from api.utils.analysis_executor import analysis_executor
+from api.utils.analysis_jobs import analysis_job_queue
+from api.utils.analysis_cache import analysis_cache
+from api.utils.deriv_pool import deriv_pool
+from api.utils.deriv_governor import deriv_governor
+from api.utils.sync_scheduler import sync_scheduler
+from api.utils.webhook_ingest import webhook_ingest_queue
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -37,10 +44,30 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"❌ Error running migrations: {e}")
     
+    # Spin up the analysis worker pool so the first upload doesn't pay for it
+    analysis_executor.start()
+    
+    # Start the async analysis job workers and pick up jobs left from the last run
+    analysis_job_queue.start(analyze.run_analysis_job)
+    await analyze.resume_analysis_jobs()
+    
+    # Run syncs through the shared limits; schedules auto-syncs while this
+    # process holds the scheduler lease
+    sync_scheduler.start(integrations.sync_trades_background_task)
+    
+    # Batch webhook trade events and pick up the ones the last run left behind
+    webhook_ingest_queue.start(integrations.ingest_webhook_events)
+    await integrations.resume_webhook_events()
+    
     yield
     
     # Shutdown
     print("Shutting down TradeGuard API")
+    await webhook_ingest_queue.shutdown()
+    await sync_scheduler.shutdown()
+    await analysis_job_queue.shutdown()
+    analysis_executor.shutdown()
+    await deriv_pool.close_all()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -87,7 +114,11 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "analysis_cache": analysis_cache.stats(),
+        "sync_scheduler": sync_scheduler.stats(),
+        "deriv_governor": deriv_governor.stats(),
+        "webhook_ingest": webhook_ingest_queue.stats()
     }
 
 
@@ -0,0 +1,100 @@
+"""
+Benchmark paged profit_table fetching against a local mock Deriv server
+
+The mock holds 100,000 closed contracts and answers each request after a
+simulated network round trip. Every run fetches the full history with
+DerivAPIClient.iter_trade_pages and "persists" each page (a short sleep)
+before asking for the next one, like the sync task does.
+
+    python scripts/benchmark_profit_table.py --transactions 100000 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from websockets.asyncio.server import serve
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.utils.deriv_client import DerivAPIClient
+from api.utils.deriv_governor import DerivRateGovernor
+from api.utils.deriv_pool import DerivConnectionPool
+
+
+class MockDeriv:
+    """authorize + profit_table over ``count`` transactions, with fixed latency"""
+
+    def __init__(self, count: int, latency: float):
+        self.latency = latency
+        self.requests = 0
+        self.transactions = [
+            {"transaction_id": 10_000_000 + i, "contract_id": 20_000_000 + i,
+             "purchase_time": 1700000000 + 10 * i, "sell_time": 1700000005 + 10 * i,
+             "buy_price": 10.0, "sell_price": 19.5 if i % 2 else 0.0,
+             "profit": 9.5 if i % 2 else -10.0,
+             "shortcode": f"CALL_R_100_{19.5}_{1700000000 + 10 * i}_5T_S0P_0",
+             "display_name": "Volatility 100 Index"}
+            for i in range(count)
+        ]
+
+    async def handler(self, ws):
+        async for raw in ws:
+            request = json.loads(raw)
+            self.requests += 1
+            reply = {"req_id": request.get("req_id"), "echo_req": request}
+            if "authorize" in request:
+                reply["authorize"] = {"loginid": "CR1", "currency": "USD", "balance": 0}
+            elif "profit_table" in request:
+                rows = self.transactions
+                if request.get("sort") == "DESC":
+                    rows = rows[::-1]
+                offset = request.get("offset", 0)
+                page = rows[offset:offset + request.get("limit", 50)]
+                reply["profit_table"] = {"count": len(page), "transactions": page}
+            # Replies go out independently, as they would over a real link
+            asyncio.get_running_loop().call_later(
+                self.latency, lambda r=reply: asyncio.ensure_future(ws.send(json.dumps(r)))
+            )
+
+
+async def run(url: str, page_size: int, max_in_flight: int, persist_seconds: float):
+    pool = DerivConnectionPool()
+    # The mock has no call limits, so neither does the governor
+    unlimited = DerivRateGovernor(app_rate=1e9, app_burst=1e9, account_rate=1e9, account_burst=1e9)
+    client = DerivAPIClient("benchmark-token", websocket_url=url, pool=pool, governor=unlimited)
+    await pool.authorize(url, "benchmark-token")
+    started = time.perf_counter()
+    fetched = 0
+    try:
+        async for page in client.iter_trade_pages(3650, page_size=page_size, max_in_flight=max_in_flight):
+            fetched += len(page)
+            await asyncio.sleep(persist_seconds)
+    finally:
+        await pool.close_all()
+    return fetched, time.perf_counter() - started
+
+
+async def main(args):
+    mock = MockDeriv(args.transactions, args.latency)
+    async with serve(mock.handler, "127.0.0.1", 0, max_size=None) as server:
+        url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        print(f"📊 {args.transactions:,} transactions, {args.latency * 1000:.0f} ms round trip, "
+              f"{args.persist * 1000:.0f} ms to persist a page")
+        baseline = None
+        for page_size, in_flight in ((500, 1), (500, 2), (500, 4), (500, 8), (100, 8)):
+            fetched, elapsed = await run(url, page_size, in_flight, args.persist)
+            baseline = baseline or elapsed
+            print(f"➡ limit={page_size:<4} in flight={in_flight}: {fetched:,} trades in {elapsed:.2f}s "
+                  f"({fetched / elapsed:,.0f} trades/s, {baseline / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated round trip in seconds")
+    parser.add_argument("--persist", type=float, default=0.02, help="Simulated DB time per page in seconds")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,101 @@
+"""
+Unit tests for the content-addressed analysis cache
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.utils.analysis_cache import AnalysisCache, analysis_cache_key
+
+
+def trades(**overrides):
+    data = {
+        "trade_id": [1, 2, 3],
+        "profit_loss": [50, -30, 75],
+        "lot_size": [0.1, 0.2, 0.15],
+        "entry_time": ["2024-01-01 10:00:00", "2024-01-01 11:00:00", "2024-01-01 12:00:00"],
+        "exit_time": ["2024-01-01 11:00:00", "2024-01-01 11:30:00", "2024-01-01 13:00:00"],
+    }
+    data.update(overrides)
+    return pd.DataFrame(data)
+
+
+def test_key_ignores_parsing_differences_but_not_content(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    raw = trades()
+    parsed = raw.assign(
+        entry_time=pd.to_datetime(raw["entry_time"]),
+        exit_time=pd.to_datetime(raw["exit_time"]),
+        profit_loss=raw["profit_loss"].astype(float),
+        trade_id=["a", "b", "c"]  # not read by the pipeline
+    )
+    assert analysis_cache_key(raw) == analysis_cache_key(parsed)
+
+    assert analysis_cache_key(raw) != analysis_cache_key(trades(profit_loss=[50, -30, 76]))
+    assert analysis_cache_key(raw) != analysis_cache_key(raw.iloc[::-1].reset_index(drop=True))
+    # A different explainer model means a different key
+    assert analysis_cache_key(raw) != analysis_cache_key(raw, openai_api_key="sk-test")
+
+
+def test_memory_lru_falls_back_to_sqlite(tmp_path):
+    cache = AnalysisCache(db_path=str(tmp_path / "cache.db"), memory_entries=1)
+    cache.put("a", {"score_result": {"score": 70}})
+    cache.put("b", {"score_result": {"score": 80}})
+
+    assert cache.get("b") == {"score_result": {"score": 80}}
+    assert cache.get("a") == {"score_result": {"score": 70}}  # evicted from memory
+    assert cache.get("missing") is None
+
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["sqlite_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["sqlite_entries"] == 2
+
+
+def test_ttl_and_byte_limit(tmp_path):
+    cache = AnalysisCache(db_path=str(tmp_path / "cache.db"), ttl_seconds=60, max_bytes=100)
+    cache.put("old", {"value": "x" * 30})
+    cache.put("new", {"value": "y" * 30})
+    cache.put("newest", {"value": "z" * 30})
+    # Least recently used entry was evicted to stay under 100 bytes
+    assert cache.stats()["sqlite_entries"] == 2
+    assert cache.stats()["evictions"] == 1
+
+    cache._memory.clear()
+    assert cache.get("old") is None
+    assert cache.get("newest") == {"value": "z" * 30}
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert cache.get("newest") is None
+    assert cache.stats()["expired"] >= 1
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = AnalysisCache(db_path=str(tmp_path / "cache.db"), enabled=False)
+    cache.put("a", {"x": 1})
+    assert cache.get("a") is None
+
+
+def test_repeat_upload_is_served_from_cache(token):
+    """Requires the API running on localhost:8000"""
+    headers = {"Authorization": f"Bearer {token}"}
+    # Unique content so earlier runs can't have cached it
+    csv = trades(profit_loss=[50, -30, time.time() % 1000]).to_csv(index=False)
+
+    responses = [
+        requests.post(
+            "http://localhost:8000/api/analyze/trades",
+            files={"file": ("trades.csv", csv, "text/csv")},
+            headers=headers
+        ).json()["data"]
+        for _ in range(2)
+    ]
+    assert [r["cache_hit"] for r in responses] == [False, True]
+    assert responses[0]["analysis_id"] != responses[1]["analysis_id"]
+    assert responses[0]["score_result"] == responses[1]["score_result"]
+    assert responses[0]["metrics"] == responses[1]["metrics"]
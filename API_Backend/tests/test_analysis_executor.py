@@ -0,0 +1,71 @@
+"""
+Unit tests for the bounded analysis executor
+"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.utils.analysis_executor import AnalysisExecutor, AnalysisQueueFull, AnalysisTimeout
+
+
+def _slow(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_rejects_when_full():
+    async def scenario():
+        executor = AnalysisExecutor(max_workers=0, max_queue=1, job_timeout=5)
+        jobs = [asyncio.ensure_future(executor.submit(_slow, 0.2)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(AnalysisQueueFull):
+            await executor.submit(_slow, 0.0)
+        assert await asyncio.gather(*jobs) == [0.2, 0.2]
+        # Slots are released once jobs finish
+        assert await executor.submit(_slow, 0.0) == 0.0
+        return executor.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 3
+    assert stats["in_flight"] == 0
+
+
+def test_job_timeout():
+    async def scenario():
+        executor = AnalysisExecutor(max_workers=0, max_queue=0, job_timeout=0.05)
+        with pytest.raises(AnalysisTimeout):
+            await executor.submit(_slow, 0.3)
+        return executor.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["timed_out"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_running_job_timeout_frees_its_slot():
+    async def scenario():
+        executor = AnalysisExecutor(max_workers=1, max_queue=0, job_timeout=8)
+        try:
+            started = time.monotonic()
+            with pytest.raises(AnalysisTimeout):
+                await executor.submit(time.sleep, 60)
+            # The worker is killed rather than left sleeping in the slot
+            while executor.stats()["in_flight"] and time.monotonic() - started < 20:
+                await asyncio.sleep(0.05)
+            assert executor.stats()["in_flight"] == 0
+            pid = await executor.submit(os.getpid)
+            assert time.monotonic() - started < 40
+            return pid, executor.stats()
+        finally:
+            executor.shutdown()
+
+    pid, stats = asyncio.run(scenario())
+    assert pid != os.getpid()
+    assert stats["timed_out"] == 1
+    assert stats["completed"] == 1
@@ -0,0 +1,101 @@
+"""
+Tests for asynchronous analysis jobs (requires the API running on localhost:8000)
+"""
+import time
+import uuid
+
+import pytest
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+@pytest.fixture
+def fresh_trades_csv():
+    """Trades no earlier run can have cached, since the cache lives in the server"""
+    profit = uuid.uuid4().int % 100_000 / 100
+    return (
+        "trade_id,profit_loss,lot_size,entry_time,exit_time\n"
+        "1,50,0.1,2024-01-01 10:00:00,2024-01-01 11:00:00\n"
+        "2,-30,0.2,2024-01-01 11:00:00,2024-01-01 11:30:00\n"
+        f"3,{profit},0.15,2024-01-01 12:00:00,2024-01-01 13:00:00\n"
+    )
+
+
+def submit_csv_job(csv, headers):
+    response = requests.post(
+        f"{BASE_URL}/api/analyze/trades",
+        params={"async_mode": True},
+        files={"file": ("trades.csv", csv, "text/csv")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    return wait_for_job(response.json()["data"]["analysis_id"], headers)
+
+
+def wait_for_job(analysis_id, headers, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        response = requests.get(f"{BASE_URL}/api/analyze/{analysis_id}", headers=headers)
+        assert response.status_code == 200
+        data = response.json()["data"]
+        if data["status"] in ("completed", "failed"):
+            return data
+        time.sleep(0.2)
+    raise AssertionError(f"Job {analysis_id} did not finish within {timeout}s")
+
+
+def test_async_sample_job_completes(token):
+    headers = {"Authorization": f"Bearer {token}"}
+    response = requests.post(
+        f"{BASE_URL}/api/analyze/trades",
+        params={"use_sample": True, "async_mode": True},
+        headers=headers
+    )
+    assert response.status_code == 200
+    queued = response.json()["data"]
+    assert queued["status"] == "pending"
+    assert queued["progress"]["stage"] == "queued"
+
+    data = wait_for_job(queued["analysis_id"], headers)
+    assert data["status"] == "completed"
+    assert data["trade_count"] == 4
+    assert data["score_result"]["score"] is not None
+    assert data["progress"]["percent"] == 100
+    for stage in ("queued", "parsing", "analyzing", "saving"):
+        assert stage in data["progress"]["stage_timings"]
+
+
+def test_async_job_records_pipeline_timings(token, fresh_trades_csv):
+    headers = {"Authorization": f"Bearer {token}"}
+    data = submit_csv_job(fresh_trades_csv, headers)
+    assert data["status"] == "completed"
+    assert data["trade_count"] == 3
+    assert data["progress"]["cache_hit"] is False
+    assert "metrics_and_rules" in data["progress"]["pipeline_timings"]
+
+
+def test_identical_async_job_is_a_cache_hit(token, fresh_trades_csv):
+    headers = {"Authorization": f"Bearer {token}"}
+    first = submit_csv_job(fresh_trades_csv, headers)
+    second = submit_csv_job(fresh_trades_csv, headers)
+    assert [first["progress"]["cache_hit"], second["progress"]["cache_hit"]] == [False, True]
+    assert second["status"] == "completed"
+    assert second["score_result"] == first["score_result"]
+
+
+def test_async_csv_job_failure_is_recorded(token):
+    headers = {"Authorization": f"Bearer {token}"}
+    files = {"file": ("broken.csv", "symbol,lot_size\nEURUSD,0.1\n", "text/csv")}
+    response = requests.post(
+        f"{BASE_URL}/api/analyze/trades",
+        params={"async_mode": True},
+        files=files,
+        headers=headers
+    )
+    assert response.status_code == 200
+
+    data = wait_for_job(response.json()["data"]["analysis_id"], headers)
+    assert data["status"] == "failed"
+    assert data["error_message"]
+    assert data["progress"]["stage"] == "failed"
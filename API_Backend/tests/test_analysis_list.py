@@ -0,0 +1,54 @@
+"""
+Tests for listing analyses with SQL filters and keyset cursors
+(requires the API running on localhost:8000)
+"""
+import requests
+
+BASE_URL = "http://localhost:8000"
+
+
+def test_cursor_pages_cover_the_filtered_history(token):
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(3):
+        response = requests.post(
+            f"{BASE_URL}/api/analyze/trades", params={"use_sample": True}, headers=headers
+        )
+        assert response.status_code == 200
+
+    everything = requests.get(
+        f"{BASE_URL}/api/analyze/", params={"limit": 1000}, headers=headers
+    ).json()["data"]
+    assert everything["total"] == len(everything["analyses"]) >= 3
+    sample = everything["analyses"][0]
+    assert sample["score"] is not None and sample["grade"] is not None
+    assert sample["total_risks"] is not None
+
+    # Walk the same history two rows at a time
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = requests.get(f"{BASE_URL}/api/analyze/", params=params, headers=headers).json()["data"]
+        seen.extend(a["id"] for a in page["analyses"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [a["id"] for a in everything["analyses"]]
+
+    # Filters are applied before counting
+    graded = requests.get(
+        f"{BASE_URL}/api/analyze/",
+        params={"grade": sample["grade"], "min_score": sample["score"], "limit": 1000},
+        headers=headers
+    ).json()["data"]
+    assert graded["total"] == len(graded["analyses"]) >= 1
+    assert all(a["grade"] == sample["grade"] and a["score"] >= sample["score"] for a in graded["analyses"])
+
+
+def test_invalid_cursor_is_rejected(token):
+    response = requests.get(
+        f"{BASE_URL}/api/analyze/", params={"cursor": "not-a-cursor"},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 400
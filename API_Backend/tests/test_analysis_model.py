@@ -0,0 +1,57 @@
+"""
+Unit tests for the Analysis summary columns and deferred JSON results
+"""
+import os
+import sys
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, undefer_group
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.database import Base
+from api import models
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_summary_columns_follow_the_json_results():
+    db = make_session()
+    analysis = models.Analysis(
+        id="a1",
+        metrics={"win_rate": 55.0, "net_profit": -12.5, "profit_factor": float("inf")},
+        score_result={"score": 72.5, "grade": "C", "total_risks": 3},
+        status="completed"
+    )
+    db.add(analysis)
+    db.commit()
+    assert (analysis.score, analysis.grade, analysis.total_risks) == (72.5, "C", 3)
+    assert (analysis.win_rate, analysis.net_profit) == (55.0, -12.5)
+
+    analysis.score_result = {"score": 90, "grade": "A", "total_risks": 0}
+    db.commit()
+    assert (analysis.score, analysis.grade, analysis.total_risks) == (90.0, "A", 0)
+
+
+def test_json_results_are_deferred_until_requested():
+    db = make_session()
+    db.add(models.Analysis(id="a1", metrics={"win_rate": 50.0}, score_result={"score": 60}))
+    db.commit()
+    db.expunge_all()
+
+    listed = db.query(models.Analysis).one()
+    assert listed.score == 60
+    assert "metrics" not in listed.__dict__ and "score_result" not in listed.__dict__
+
+    # A progress-only update doesn't pull the results in
+    listed.progress = {"stage": "saving"}
+    db.commit()
+    assert "score_result" not in listed.__dict__
+    db.expunge_all()
+
+    detail = db.query(models.Analysis).options(undefer_group("results")).one()
+    assert detail.__dict__["metrics"] == {"win_rate": 50.0}
@@ -0,0 +1,120 @@
+"""
+Unit tests for the per-user dashboard rollups kept in step with analyses
+"""
+import os
+import sys
+from datetime import date, datetime
+
+import requests
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.database import Base
+from api import models
+from api.models.dashboard_models import rebuild_user_rollups
+
+COLUMNS = ("analysis_count", "score_count", "score_sum", "score_min", "score_max",
+           "win_rate_count", "win_rate_sum", "trade_count_sum", "total_risks_sum",
+           "risk_low", "risk_medium", "risk_high")
+
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
+
+
+def scored(analysis_id, created_at, score, low=0, medium=0, high=0, user_id="u1"):
+    return models.Analysis(
+        id=analysis_id, user_id=user_id, created_at=created_at, trade_count=10,
+        metrics={"win_rate": score / 2},
+        score_result={"score": score, "grade": "B", "total_risks": low + medium + high,
+                      "risk_breakdown": {"low": low, "medium": medium, "high": high}}
+    )
+
+
+def rollups(db):
+    return {
+        (r.user_id, r.period, r.bucket_start): tuple(getattr(r, c) for c in COLUMNS)
+        for r in db.query(models.UserDashboardRollup)
+    }
+
+
+def test_rollups_track_inserts_and_first_scores():
+    db = make_session()
+    # Tuesday and Wednesday of one week, then the following Monday
+    db.add_all([
+        scored("a", datetime(2024, 5, 7, 9), 60, low=1, high=2),
+        scored("b", datetime(2024, 5, 7, 18), 80, medium=1),
+        scored("c", datetime(2024, 5, 8, 12), 70),
+        scored("d", datetime(2024, 5, 13, 0), 90, user_id="u2"),
+        models.Analysis(id="job", user_id="u1", created_at=datetime(2024, 5, 8, 13), status="pending"),
+    ])
+    db.commit()
+
+    tuesday = rollups(db)[("u1", "day", date(2024, 5, 7))]
+    assert tuesday == (2, 2, 140.0, 60.0, 80.0, 2, 70.0, 20, 4, 1, 1, 2)
+    week = rollups(db)[("u1", "week", date(2024, 5, 6))]
+    assert week[:5] == (4, 3, 210.0, 60.0, 80.0)
+    assert rollups(db)[("u2", "week", date(2024, 5, 13))][:2] == (1, 1)
+
+    # A finished job adds its results to the buckets it was counted in
+    job = db.get(models.Analysis, "job")
+    job.trade_count = 5
+    job.metrics = {"win_rate": 50.0}
+    job.score_result = {"score": 40, "total_risks": 1, "risk_breakdown": {"low": 0, "medium": 0, "high": 1}}
+    job.status = "completed"
+    db.commit()
+    assert rollups(db)[("u1", "week", date(2024, 5, 6))][:5] == (4, 4, 250.0, 40.0, 80.0)
+
+    expected = rollups(db)
+    rebuild_user_rollups(db.connection())
+    assert rollups(db) == expected
+
+
+def test_rescored_and_deleted_analyses_recompute_their_buckets():
+    db = make_session()
+    db.add_all([
+        scored("a", datetime(2024, 5, 7, 9), 60, low=1),
+        scored("b", datetime(2024, 5, 7, 18), 80, high=1),
+        scored("c", datetime(2024, 5, 9, 12), 70),
+    ])
+    db.commit()
+
+    db.get(models.Analysis, "a").score_result = {"score": 95, "risk_breakdown": {"low": 3}}
+    db.commit()
+    assert rollups(db)[("u1", "day", date(2024, 5, 7))][2:5] == (175.0, 80.0, 95.0)
+    assert rollups(db)[("u1", "day", date(2024, 5, 7))][-3:] == (3, 0, 1)
+
+    db.delete(db.get(models.Analysis, "c"))
+    db.commit()
+    assert ("u1", "day", date(2024, 5, 9)) not in rollups(db)
+    assert rollups(db)[("u1", "week", date(2024, 5, 6))][:5] == (2, 2, 175.0, 80.0, 95.0)
+
+    expected = rollups(db)
+    rebuild_user_rollups(db.connection(), user_id="u1")
+    assert rollups(db) == expected
+
+
+def test_rolled_back_analysis_leaves_no_rollup():
+    db = make_session()
+    db.add(scored("a", datetime(2024, 5, 7, 9), 60))
+    db.flush()
+    assert rollups(db)
+    db.rollback()
+    assert rollups(db) == {}
+
+
+def test_dashboard_reads_rollups(token):
+    """Requires the API running on localhost:8000"""
+    headers = {"Authorization": f"Bearer {token}"}
+    summary = requests.get("http://localhost:8000/api/dashboard/summary", headers=headers).json()["data"]
+    metrics = requests.get("http://localhost:8000/api/dashboard/metrics?period=year", headers=headers).json()["data"]
+    trends = requests.get("http://localhost:8000/api/analyze/history/trends?days=3650", headers=headers).json()["data"]
+
+    assert summary["total_analyses"] >= metrics["analyses_count"]
+    assert trends["analysis_count"] >= metrics["analyses_count"]
+    for point in trends["trends"]:
+        assert point["worst_score"] <= point["score"] <= point["best_score"]
@@ -0,0 +1,65 @@
+"""
+Unit tests for the Deriv call rate governor
+"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.utils.deriv_client import DerivAPIClient
+from api.utils.deriv_governor import DerivRateGovernor, TokenBucket
+from api.utils.deriv_pool import DerivAPIError
+from test_deriv_pool import run_with_stub
+
+
+def test_calls_past_the_burst_are_paced_per_app_and_account():
+    async def timed(governor, accounts):
+        started = time.monotonic()
+        await asyncio.gather(*(governor.acquire("app", account) for account in accounts))
+        return time.monotonic() - started
+
+    per_account = DerivRateGovernor(app_rate=1000, app_burst=1000, account_rate=50, account_burst=5)
+    per_app = DerivRateGovernor(app_rate=50, app_burst=5, account_rate=1000, account_burst=1000)
+    # 10 calls past a burst of 5 at 50/s take 0.2s, whichever bucket is the bottleneck
+    assert 0.18 <= asyncio.run(timed(per_account, ["acct"] * 15)) < 0.4
+    assert 0.18 <= asyncio.run(timed(per_app, [f"acct{n}" for n in range(15)])) < 0.4
+    stats = per_account.stats()
+    assert stats["calls"] == 15 and stats["delayed"] == 10 and stats["queued"] == 0
+    assert stats["max_wait_seconds"] == pytest.approx(0.2, abs=0.01)
+
+
+def test_rate_limit_errors_halve_the_rate_then_it_recovers():
+    bucket = TokenBucket(rate=10, burst=10, min_rate=1, recovery_seconds=5)
+    now = bucket.updated
+    bucket.throttle(now, cooldown=2)
+    assert bucket.rate == 5 and bucket.wait_time(now) == pytest.approx(2.2)
+    bucket.throttle(now, cooldown=2)
+    assert bucket.rate == 2.5
+    assert bucket.wait_time(now + 12) == 0 and bucket.rate == 4.5
+    bucket.wait_time(now + 60)
+    assert bucket.rate == 10
+
+
+def test_client_retries_rate_limited_calls_after_the_cooldown():
+    async def scenario(stub, pool, url):
+        governor = DerivRateGovernor(min_rate=5, cooldown_seconds=0.1)
+        client = DerivAPIClient("good-token", websocket_url=url, pool=pool, governor=governor)
+        stub.rate_limited_replies = 2
+        started = time.monotonic()
+        accounts = await client.get_mt5_accounts()
+        elapsed = time.monotonic() - started
+
+        stub.rate_limited_replies = 10
+        with pytest.raises(DerivAPIError) as error:
+            await client._request({"mt5_login_list": 1})
+        return accounts, elapsed, error.value, governor.stats()
+
+    accounts, elapsed, error, stats = run_with_stub(scenario)
+    assert accounts[0]["login"] == "MT1" and elapsed >= 0.2
+    assert error.code == "RateLimit"
+    # Four attempts of the second call: the first plus RATE_LIMIT_RETRIES
+    assert stats["rate_limited"] == 6 and stats["throttled_rates"]["app:1089"] == 5
@@ -0,0 +1,235 @@
+"""
+Unit tests for the pooled Deriv WebSocket client, against a local stub server
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+import pytest
+from websockets.asyncio.server import serve
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.utils.deriv_client import DerivAPIClient
+from api.utils.deriv_pool import DerivAPIError, DerivConnectionLost, DerivConnectionPool
+
+
+# A few days ago, inside every sync window
+RECENT = int(time.time()) - 5 * 86400
+
+
+class StubDeriv:
+    """Minimal Deriv API: authorize, ping, mt5_login_list and profit_table"""
+
+    def __init__(self, transactions=None):
+        self.connections = []
+        self.messages = []
+        self.rate_limited_replies = 0  # Answer this many calls with a RateLimit error
+        self.transactions = transactions if transactions is not None else [
+            {"transaction_id": 1, "contract_id": 2, "purchase_time": RECENT,
+             "sell_time": RECENT + 60, "buy_price": 10, "sell_price": 12, "profit": 2,
+             "shortcode": "CALL_R_100_12"}
+        ]
+
+    async def handler(self, ws):
+        self.connections.append(ws)
+        authorized = False
+        async for raw in ws:
+            request = json.loads(raw)
+            self.messages.append(request)
+            reply = {"req_id": request.get("req_id"), "echo_req": request}
+            if "authorize" in request:
+                if request["authorize"] == "good-token":
+                    authorized = True
+                    reply["authorize"] = {"loginid": "CR1", "currency": "USD", "balance": 10, "is_virtual": 1}
+                else:
+                    reply["error"] = {"code": "InvalidToken", "message": "The token is invalid."}
+            elif "ping" in request:
+                reply["ping"] = "pong"
+            elif not authorized:
+                reply["error"] = {"code": "AuthorizationRequired", "message": "Please log in."}
+            elif self.rate_limited_replies:
+                self.rate_limited_replies -= 1
+                reply["error"] = {"code": "RateLimit", "message": "You have reached the rate limit."}
+            elif "mt5_login_list" in request:
+                reply["mt5_login_list"] = [{"login": "MT1", "balance": 5}]
+            elif "profit_table" in request:
+                rows = [
+                    tx for tx in self.transactions
+                    if request.get("date_from", 0) <= tx["sell_time"] <= request.get("date_to", tx["sell_time"])
+                ]
+                if request.get("sort") == "DESC":
+                    rows = rows[::-1]
+                offset = request.get("offset", 0)
+                page = rows[offset:offset + request.get("limit", 50)]
+                reply["profit_table"] = {"count": len(page), "transactions": page}
+            reply["passthrough"] = request.get("passthrough")
+            # Answer out of order when asked to
+            delay = (request.get("passthrough") or {}).get("delay", 0)
+            asyncio.get_running_loop().call_later(
+                delay, lambda r=reply: asyncio.ensure_future(self._reply(ws, r))
+            )
+
+    async def _reply(self, ws, reply):
+        try:
+            await ws.send(json.dumps(reply))
+        except Exception:
+            pass
+
+    def count(self, key):
+        return sum(1 for m in self.messages if key in m)
+
+
+def run_with_stub(scenario, transactions=None, **pool_options):
+    async def main():
+        stub = StubDeriv(transactions)
+        async with serve(stub.handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            pool = DerivConnectionPool(**pool_options)
+            try:
+                return await scenario(stub, pool, f"ws://127.0.0.1:{port}")
+            finally:
+                await pool.close_all()
+    return asyncio.run(main())
+
+
+def test_sync_calls_share_one_authorized_socket():
+    async def scenario(stub, pool, url):
+        client = DerivAPIClient("good-token", websocket_url=url, pool=pool)
+        connected = await client.test_connection()
+        trades = await client.get_trades(30)
+        # Another client with the same token reuses the socket
+        other = await DerivAPIClient("good-token", websocket_url=url, pool=pool).get_mt5_accounts()
+        return stub, connected, trades, other
+
+    stub, connected, trades, other = run_with_stub(scenario)
+    assert connected["success"] and connected["account_info"]["loginid"] == "CR1"
+    assert connected["mt5_accounts"][0]["login"] == "MT1"
+    assert trades[0]["profit"] == 2.0 and other[0]["login"] == "MT1"
+    assert len(stub.connections) == 1 and stub.count("authorize") == 1
+
+
+def test_concurrent_requests_are_routed_by_req_id():
+    async def scenario(stub, pool, url):
+        requests = [
+            pool.request(url, "good-token", {"ping": 1, "passthrough": {"n": n, "delay": (20 - n) * 0.005}})
+            for n in range(20)
+        ]
+        return stub, await asyncio.gather(*requests)
+
+    stub, responses = run_with_stub(scenario)
+    assert [r["passthrough"]["n"] for r in responses] == list(range(20))
+    assert len(stub.connections) == 1
+
+
+def test_invalid_token_is_reported():
+    async def scenario(stub, pool, url):
+        client = DerivAPIClient("bad-token", websocket_url=url, pool=pool)
+        with pytest.raises(DerivAPIError) as error:
+            await pool.request(url, "bad-token", {"mt5_login_list": 1})
+        return error.value, await client.test_connection(), await client.get_trades()
+
+    error, connected, trades = run_with_stub(scenario)
+    assert error.code == "InvalidToken"
+    assert not connected["success"] and "The token is invalid." in connected["error"]
+    assert trades == []
+
+
+def test_dropped_socket_reconnects_and_retries_in_flight_requests():
+    async def scenario(stub, pool, url):
+        await pool.request(url, "good-token", {"ping": 1})
+        in_flight = asyncio.ensure_future(
+            pool.request(url, "good-token", {"mt5_login_list": 1, "passthrough": {"delay": 0.2}})
+        )
+        await asyncio.sleep(0.05)
+        await stub.connections[0].close()
+        response = await in_flight
+        return stub, pool, response
+
+    stub, pool, response = run_with_stub(scenario)
+    assert response["mt5_login_list"][0]["login"] == "MT1"
+    assert len(stub.connections) == 2 and stub.count("authorize") == 2
+    assert pool.stats["connects"] == 2
+
+
+def test_keepalive_pings_and_idle_eviction():
+    async def scenario(stub, pool, url):
+        await pool.request(url, "good-token", {"mt5_login_list": 1})
+        await asyncio.sleep(0.25)
+        pings, pooled = stub.count("ping"), len(pool)
+        await asyncio.sleep(0.5)
+        return stub, pool, pings, pooled
+
+    stub, pool, pings, pooled = run_with_stub(scenario, keepalive_interval=0.05, idle_timeout=0.4)
+    assert pings >= 2 and pooled == 1
+    assert len(pool) == 0 and pool.stats["idle_evictions"] == 1
+    assert stub.connections[0].state.name == "CLOSED"
+
+
+def test_unreachable_endpoint_backs_off_then_fails():
+    async def scenario():
+        pool = DerivConnectionPool(max_retries=2, backoff_base=0.01, connect_timeout=1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with pytest.raises(DerivConnectionLost):
+            await pool.request("ws://127.0.0.1:9", "good-token", {"ping": 1})
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) < 1
+
+
+def transactions(n, first=0):
+    return [
+        {"transaction_id": 1000 + i, "contract_id": i, "purchase_time": RECENT + 60 * i,
+         "sell_time": RECENT + 30 + 60 * i, "buy_price": 10, "sell_price": 10 + i % 3,
+         "profit": i % 3 - 1, "shortcode": f"CALL_R_100_{i}"}
+        for i in range(first, first + n)
+    ]
+
+
+def test_profit_table_is_paged_with_several_requests_in_flight():
+    async def scenario(stub, pool, url):
+        client = DerivAPIClient("good-token", websocket_url=url, pool=pool)
+        pages = [page async for page in client.iter_trade_pages(30, page_size=100, max_in_flight=3)]
+        return stub, pages, await client.get_trades(30)
+
+    stub, pages, trades = run_with_stub(scenario, transactions(1234))
+    assert [len(page) for page in pages] == [100] * 12 + [34]
+    ids = [trade["deriv_trade_id"] for page in pages for trade in page]
+    assert ids == [str(1000 + i) for i in range(1234)]
+    assert len(trades) == 1234
+    assert len(stub.connections) == 1
+
+    offsets = [m["offset"] for m in stub.messages if "profit_table" in m]
+    # The first page alone, then three in flight, topped up per page received
+    assert offsets[:3] == [0, 100, 200] and len(offsets) <= 2 * (13 + 2)
+
+
+def test_a_short_first_page_costs_one_request():
+    async def scenario(stub, pool, url):
+        client = DerivAPIClient("good-token", websocket_url=url, pool=pool)
+        issued = []
+        request = client._request
+        client._request = lambda message, token=None: issued.append(message["offset"]) or request(message, token)
+        pages = [page async for page in client.iter_trade_pages(30, page_size=100, max_in_flight=4)]
+        return issued, pages
+
+    issued, pages = run_with_stub(scenario, transactions(7))
+    assert [len(page) for page in pages] == [7]
+    # What an incremental sync with nothing new costs
+    assert issued == [0]
+
+
+def test_closing_the_page_stream_early_abandons_in_flight_pages():
+    async def scenario(stub, pool, url):
+        client = DerivAPIClient("good-token", websocket_url=url, pool=pool)
+        stream = client.iter_trade_pages(30, page_size=10, max_in_flight=4)
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        return first, pool.socket(url, "good-token").in_flight
+
+    first, in_flight = run_with_stub(scenario, transactions(100))
+    assert len(first) == 10 and in_flight == 0
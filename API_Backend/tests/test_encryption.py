@@ -0,0 +1,70 @@
+"""
+Unit tests for EncryptionService: pre-derived keys, batch decrypt and the secret cache
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.utils import encryption
+from api.utils.encryption import EncryptionService, SecretCache, derive_key
+
+
+def test_pre_derived_key_skips_the_kdf(monkeypatch):
+    derived = derive_key("s3cret").decode()
+    ciphertext = EncryptionService(secret_key="s3cret").encrypt("token-1")
+
+    def no_kdf(*args, **kwargs):
+        raise AssertionError("KDF should not run")
+    monkeypatch.setattr(encryption, "derive_key", no_kdf)
+
+    service = EncryptionService(secret_key="ignored", derived_key=derived)
+    assert service.decrypt(ciphertext) == "token-1"
+
+    with pytest.raises(ValueError):
+        EncryptionService(derived_key="not-a-fernet-key")
+
+
+def test_decrypt_many_dedupes_and_tolerates_bad_values():
+    service = EncryptionService(secret_key="s3cret", cache_ttl_seconds=0)
+    a, b = service.encrypt("token-a"), service.encrypt("token-b")
+    assert service.decrypt_many([a, None, b, a, "garbage"]) == ["token-a", None, "token-b", "token-a", None]
+    assert service.decrypt_many([]) == []
+
+
+@pytest.mark.parametrize("cache_ttl_seconds", [0, 300])
+def test_decrypt_of_a_missing_value_is_none(cache_ttl_seconds):
+    # E.g. a user or connection without a stored key
+    service = EncryptionService(secret_key="s3cret", cache_ttl_seconds=cache_ttl_seconds)
+    assert service.decrypt(None) is None and service.decrypt("") is None
+    assert service.decrypt("garbage") is None
+
+
+def test_cache_serves_repeat_decrypts(monkeypatch):
+    service = EncryptionService(secret_key="s3cret")
+    ciphertext = service.encrypt("token-a")
+    assert service.decrypt(ciphertext) == "token-a"
+
+    monkeypatch.setattr(service, "_cipher", None)
+    monkeypatch.setattr(encryption, "derive_key", lambda *a, **k: pytest.fail("cache miss"))
+    assert service.decrypt(ciphertext) == "token-a"
+    assert service.decrypt_many([ciphertext]) == ["token-a"]
+
+
+def test_evicted_and_expired_plaintext_is_zeroized():
+    cache = SecretCache(ttl_seconds=60, max_entries=1)
+    cache.put("c1", "secret-one")
+    held = cache._entries[SecretCache.key("c1")][1]
+    cache.put("c2", "secret-two")
+    assert cache.get("c1") is None
+    assert held == bytearray(len("secret-one"))
+
+    cache.ttl_seconds = 0.01
+    cache.put("c3", "secret-three")
+    held = cache._entries[SecretCache.key("c3")][1]
+    time.sleep(0.02)
+    assert cache.purge_expired() == 1
+    assert held == bytearray(len("secret-three")) and len(cache) == 0
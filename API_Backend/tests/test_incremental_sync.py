@@ -0,0 +1,152 @@
+"""
+Unit tests for incremental trade syncs from the per-connection high-water mark
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+from functools import partial
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import undefer_group
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from websockets.asyncio.server import serve
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.config import settings
+from api.database import Base
+from api import models
+from api.models.integration_models import DerivConnection, DerivTrade, SyncLog
+from api.routers import integrations
+from api.routers.integrations import synced_trade_frame
+from api.utils.deriv_client import DerivAPIClient
+from api.utils.deriv_pool import DerivConnectionPool
+from api.utils.encryption import encryption_service
+from core.analysis_pipeline import process_trade_data_timed
+from test_deriv_pool import StubDeriv, transactions
+
+
+def test_only_trades_past_the_high_water_mark_are_fetched(tmp_path, monkeypatch):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sync.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        monkeypatch.setattr(integrations, "AsyncSessionLocal", sessions)
+        async with sessions() as db:
+            db.add(models.User(id="u1", email="u1@x.com", username="u1", hashed_password="x"))
+            db.add(DerivConnection(id="c1", user_id="u1", app_id="1",
+                                   api_token_encrypted=encryption_service.encrypt("good-token")))
+            await db.commit()
+
+        stub = StubDeriv(transactions(120))
+        async with serve(stub.handler, "127.0.0.1", 0) as server:
+            url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            pool = DerivConnectionPool()
+            monkeypatch.setattr(integrations, "DerivAPIClient",
+                                partial(DerivAPIClient, websocket_url=url, pool=pool))
+            sync = partial(integrations.sync_trades_background_task, "c1", 30, analyze_after_sync=False)
+            try:
+                runs = []
+                for force_full_sync, new in ((False, 0), (False, 7), (False, 0), (True, 0)):
+                    stub.transactions += transactions(new, first=len(stub.transactions))
+                    stub.messages.clear()
+                    await sync(force_full_sync=force_full_sync)
+                    runs.append([m for m in stub.messages if "authorize" not in m])
+            finally:
+                await pool.close_all()
+
+        async with sessions() as db:
+            logs = (await db.execute(select(SyncLog).order_by(SyncLog.started_at))).scalars().all()
+            connection = await db.get(DerivConnection, "c1")
+            stored = await db.scalar(select(func.count()).select_from(DerivTrade))
+        await engine.dispose()
+        return runs, logs, connection, stored
+
+    runs, logs, connection, stored = asyncio.run(scenario())
+    assert stored == 127
+    assert [log.sync_type for log in logs] == ["initial", "incremental", "incremental", "manual"]
+    assert [(log.trades_new, log.trades_updated) for log in logs] == [(120, 0), (7, 0), (0, 0), (0, 127)]
+    assert connection.last_trade_transaction_id == str(1000 + 126)
+
+    # Full syncs check the account first; incremental ones go straight to
+    # profit_table and only re-read the few trades inside the overlap
+    assert any("mt5_login_list" in m for m in runs[0] + runs[3])
+    assert all("profit_table" in m for m in runs[1] + runs[2])
+    assert logs[1].trades_fetched == logs[1].trades_skipped + 7 and logs[1].trades_skipped <= 6
+
+
+def test_analysis_after_an_incremental_sync_loads_only_the_new_trades(tmp_path, monkeypatch):
+    loaded = []
+    analysed = []
+
+    def recording_frame(trades):
+        loaded.append(len(trades))
+        return synced_trade_frame(trades)
+
+    async def inline_analysis(df, openai_api_key=None, reject_when_full=True, metrics=None):
+        analysed.append(len(df))
+        results, timings = process_trade_data_timed(df, openai_api_key, metrics)
+        return results, timings, False
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sync.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        monkeypatch.setattr(integrations, "AsyncSessionLocal", sessions)
+        monkeypatch.setattr(integrations, "synced_trade_frame", recording_frame)
+        monkeypatch.setattr(integrations, "cached_analysis", inline_analysis)
+        monkeypatch.setattr(settings, "TRADE_STORE_DIR", str(tmp_path / "trades"))
+        async with sessions() as db:
+            db.add(models.User(id="u1", email="u1@x.com", username="u1", hashed_password="x"))
+            db.add(DerivConnection(id="c1", user_id="u1", app_id="1",
+                                   api_token_encrypted=encryption_service.encrypt("good-token")))
+            await db.commit()
+
+        stub = StubDeriv(transactions(120))
+        async with serve(stub.handler, "127.0.0.1", 0) as server:
+            url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            pool = DerivConnectionPool()
+            monkeypatch.setattr(integrations, "DerivAPIClient",
+                                partial(DerivAPIClient, websocket_url=url, pool=pool))
+            sync = partial(integrations.sync_trades_background_task, "c1", 30, analyze_after_sync=True)
+            try:
+                for force_full_sync, new in ((False, 0), (False, 7), (True, 0)):
+                    stub.transactions += transactions(new, first=len(stub.transactions))
+                    await sync(force_full_sync=force_full_sync)
+            finally:
+                await pool.close_all()
+                monkeypatch.setattr(integrations, "DerivAPIClient", DerivAPIClient)
+
+        async with sessions() as db:
+            analyses = (await db.execute(
+                select(models.Analysis).options(undefer_group("results")).order_by(models.Analysis.created_at)
+            )).scalars().all()
+            connection = await db.get(DerivConnection, "c1")
+            state = dict(connection.metrics_state)
+
+            # A trade stored before the folded ones (say from a late webhook) forces a full analysis
+            late = DerivAPIClient.transform_transaction_to_trade(transactions(1, first=900)[0])
+            late["purchase_time"] = datetime(2000, 1, 1)
+            await integrations.upsert_deriv_trades(db, connection, [late])
+            await db.commit()
+            backfilled = await integrations.analyze_synced_trades(db, connection)
+        await engine.dispose()
+        return analyses, state, backfilled
+
+    analyses, state, backfilled = asyncio.run(scenario())
+    initial, incremental, full = analyses
+    # The incremental analysis loaded and folded just the 7 new trades
+    assert loaded == [120, 7, 127, 128]
+    assert analysed == [120, 127, 128]
+    assert state["trade_count"] == 127 and backfilled["trade_count"] == 128
+
+    # ... and matches a full analysis of all 127, but for the patterns it carries over
+    assert incremental.trade_count == full.trade_count == 127
+    assert incremental.metrics == full.metrics
+    assert incremental.score_result == full.score_result
+    assert incremental.risk_results["patterns"] == initial.risk_results["patterns"]
+    assert {**incremental.risk_results, "patterns": None} == {**full.risk_results, "patterns": None}
+    assert incremental.trades_path == initial.trades_path != full.trades_path
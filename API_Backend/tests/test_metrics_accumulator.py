@@ -0,0 +1,112 @@
+"""
+Unit tests for the incremental TradeMetricsAccumulator
+"""
+import json
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.metrics_accumulator import TradeMetricsAccumulator, OutOfOrderTrades
+from core.metrics_calculator import TradeMetricsCalculator
+from core.analysis_pipeline import TradeAnalysisAccumulator, process_folded_trades, process_trade_data
+
+
+def random_df(n=400, seed=3):
+    rng = np.random.default_rng(seed)
+    entry = pd.Timestamp("2024-01-01") + pd.to_timedelta(np.cumsum(rng.integers(0, 90, n)), unit="m")
+    profit = np.round(rng.normal(0, 40, n), 2)
+    profit[::25] = 0
+    profit[7::50] = np.nan
+    return pd.DataFrame({
+        "profit_loss": profit,
+        "lot_size": rng.uniform(0.01, 1, n),
+        "account_balance_before": 10000 + np.nancumsum(profit),
+        "stop_loss": np.where(rng.random(n) < 0.3, np.nan, 1.2),
+        "entry_time": entry,
+        "exit_time": entry + pd.to_timedelta(rng.integers(1, 300, n), unit="m"),
+    })
+
+
+def assert_same_metrics(expected, actual):
+    assert list(expected) == list(actual)
+    for key, value in expected.items():
+        if isinstance(value, float) and math.isnan(value):
+            assert math.isnan(actual[key]), key
+        elif isinstance(value, float):
+            assert actual[key] == pytest.approx(value, rel=1e-9, abs=1e-9), key
+        else:
+            assert actual[key] == value, key
+
+
+def fold_in_batches(df, cuts):
+    accumulator = TradeMetricsAccumulator()
+    bounds = [0] + cuts + [len(df)]
+    for start, end in zip(bounds, bounds[1:]):
+        accumulator.update(df.iloc[start:end])
+        # Round-trip through JSON like the persisted column
+        accumulator = TradeMetricsAccumulator.from_state(json.loads(json.dumps(accumulator.to_state())))
+    return accumulator
+
+
+@pytest.mark.parametrize("drop", [[], ["account_balance_before"], ["exit_time", "stop_loss"],
+                                  ["entry_time", "exit_time"]])
+def test_batches_match_full_recompute(drop):
+    df = random_df().drop(columns=drop)
+    expected = TradeMetricsCalculator(df).compute_all_metrics()
+    for cuts in ([], [1], [50, 51, 200], list(range(10, 400, 37))):
+        assert_same_metrics(expected, fold_in_batches(df, cuts).metrics())
+
+
+def test_drawdown_from_the_first_trade():
+    df = random_df(60).drop(columns=["account_balance_before"])
+    df.loc[0, "profit_loss"] = -500
+    expected = TradeMetricsCalculator(df).compute_all_metrics()
+    assert expected["drawdown_start_index"] == -1
+    for cuts in ([], [1], [20, 40]):
+        assert_same_metrics(expected, fold_in_batches(df, cuts).metrics())
+
+
+def test_out_of_order_batch_is_rejected_without_changing_state():
+    df = random_df(50)
+    accumulator = TradeMetricsAccumulator().update(df.iloc[25:])
+    before = accumulator.to_state()
+    with pytest.raises(OutOfOrderTrades):
+        accumulator.update(df.iloc[:25])
+    with pytest.raises(OutOfOrderTrades):
+        accumulator.update(df.iloc[:25].drop(columns=["stop_loss"]))
+    assert accumulator.to_state() == before
+
+
+def test_streaks():
+    df = pd.DataFrame({"profit_loss": [5, 3, -1, -2, -4, 0, 2, -1, -1]})
+    accumulator = TradeMetricsAccumulator().update(df.iloc[:4]).update(df.iloc[4:])
+    assert accumulator.streaks() == {
+        "current_win_streak": 0, "current_loss_streak": 2,
+        "max_win_streak": 2, "max_loss_streak": 3
+    }
+
+
+def test_folded_analysis_matches_the_full_pipeline(tmp_path):
+    df = random_df(300).assign(symbol=np.where(np.arange(300) % 3, "EURUSD", "R_100"))
+    folded = TradeAnalysisAccumulator()
+    for start, end in ((0, 120), (120, 121), (121, 300)):
+        folded.update(df.iloc[start:end])
+        folded = TradeAnalysisAccumulator.from_state(json.loads(json.dumps(folded.to_state())))
+
+    expected = process_trade_data(df.copy())
+    actual = process_folded_trades(folded, expected["risk_results"]["patterns"])
+    assert {"concentration_risk", "event_trading"} <= set(expected["risk_results"]["risk_details"])
+    assert_same_metrics(expected["metrics"], actual["metrics"])
+    assert actual["risk_results"] == expected["risk_results"]
+    assert actual["score_result"] == expected["score_result"]
+
+    # News flags folded against another calendar are not reused
+    calendar = tmp_path / "calendar.csv"
+    calendar.write_text("time,currency,impact\n2024-01-02 13:30:00,USD,High\n")
+    assert TradeAnalysisAccumulator.from_state(folded.to_state(), str(calendar)) is None
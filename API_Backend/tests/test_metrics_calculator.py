@@ -0,0 +1,142 @@
+"""
+Unit tests for the vectorized TradeMetricsCalculator
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.metrics_calculator import TradeMetricsCalculator
+
+
+def sample_df():
+    return pd.DataFrame({
+        "trade_id": [1, 2, 3, 4],
+        "profit_loss": [50, -30, 75, -20],
+        "lot_size": [0.1, 0.2, 0.15, 0.1],
+        "account_balance_before": [10000, 10050, 10020, 10095],
+        "stop_loss": [1.1, 1.2, 1.15, 1.3],
+        "entry_time": ["2024-01-01 10:00:00", "2024-01-01 11:00:00",
+                       "2024-01-01 12:00:00", "2024-01-01 12:15:00"],
+        "exit_time": ["2024-01-01 11:00:00", "2024-01-01 11:30:00",
+                      "2024-01-01 13:00:00", "2024-01-01 12:45:00"]
+    })
+
+
+def random_df(n=500, seed=7):
+    rng = np.random.default_rng(seed)
+    entry = pd.Timestamp("2024-01-01") + pd.to_timedelta(np.cumsum(rng.integers(1, 90, n)), unit="m")
+    entry = entry[rng.permutation(n)]
+    profit = np.round(rng.normal(0, 40, n), 2)
+    profit[::25] = 0
+    return pd.DataFrame({
+        "profit_loss": profit,
+        "lot_size": rng.uniform(0.01, 1, n),
+        "account_balance_before": 10000 + np.cumsum(profit),
+        "stop_loss": np.where(rng.random(n) < 0.3, np.nan, 1.2),
+        "entry_time": entry,
+        "exit_time": entry + pd.to_timedelta(rng.integers(1, 500, n), unit="m"),
+    })
+
+
+def test_sample_metrics():
+    """Known values for the bundled sample data"""
+    metrics = TradeMetricsCalculator(sample_df()).compute_all_metrics()
+
+    assert metrics["total_trades"] == 4
+    assert metrics["winning_trades"] == 2
+    assert metrics["losing_trades"] == 2
+    assert metrics["win_rate"] == 50.0
+    assert metrics["net_profit"] == 75
+    assert metrics["profit_factor"] == pytest.approx(125 / 50)
+    assert metrics["risk_reward_ratio"] == pytest.approx(62.5 / 25)
+    assert metrics["sl_usage_rate"] == 100.0
+    assert metrics["max_drawdown_pct"] == pytest.approx(30 / 10050 * 100)
+    assert metrics["avg_trade_duration_hours"] == pytest.approx(0.75)
+    assert metrics["revenge_trades_count"] == 0
+    assert metrics["most_active_hour"] == 12
+
+
+def test_matches_pandas_reference():
+    """Array kernel agrees with the straightforward pandas formulation"""
+    df = random_df()
+    metrics = TradeMetricsCalculator(df).compute_all_metrics()
+
+    pl = df["profit_loss"]
+    assert metrics["total_profit"] == pytest.approx(pl[pl > 0].sum())
+    assert metrics["avg_loss"] == pytest.approx(abs(pl[pl < 0].mean()))
+    position = df["lot_size"] * 100000 / df["account_balance_before"] * 100
+    assert metrics["avg_position_size_pct"] == pytest.approx(position.mean())
+    assert metrics["max_position_size_pct"] == pytest.approx(position.max())
+    assert metrics["sl_usage_rate"] == pytest.approx((1 - df["stop_loss"].isna().mean()) * 100)
+
+    ordered = df.sort_values("entry_time", kind="stable")
+    gaps = ordered["entry_time"].diff().dt.total_seconds() / 60
+    revenge = ((ordered["profit_loss"].shift(1) < 0) & (gaps < 30)).sum()
+    assert metrics["revenge_trades_count"] == revenge
+    assert metrics["most_active_hour"] == ordered["entry_time"].dt.hour.mode()[0]
+
+
+def test_input_frame_not_mutated():
+    """The calculator no longer copies the frame, so it must not write to it"""
+    df = sample_df()
+    before = df.copy()
+    TradeMetricsCalculator(df).compute_all_metrics()
+    pd.testing.assert_frame_equal(df, before)
+
+
+def test_drawdown_recovery_stats():
+    """Running-max drawdown reports peak, trough and recovery positions"""
+    df = pd.DataFrame({
+        "profit_loss": [10, -11, 6, 16, -31, 5, 40],
+        "account_balance_before": [100, 110, 99, 105, 121, 90, 95],
+    })
+    metrics = TradeMetricsCalculator(df).compute_all_metrics()
+
+    assert metrics["max_drawdown_pct"] == pytest.approx(31 / 121 * 100)
+    assert metrics["max_drawdown_amount"] == 31
+    assert metrics["drawdown_start_index"] == 4
+    assert metrics["drawdown_trough_index"] == 5
+    assert metrics["drawdown_recovery_index"] is None
+    assert metrics["longest_underwater_trades"] == 2
+
+
+def test_drawdown_from_cumulative_profit():
+    """Without a balance column the curve is built from cumulative P/L"""
+    df = pd.DataFrame({
+        "profit_loss": [5, -10, 3, 2, 8, -1],
+        "entry_time": pd.date_range("2024-01-01", periods=6, freq="h"),
+        "exit_time": pd.date_range("2024-01-01 00:30", periods=6, freq="h"),
+    })
+    metrics = TradeMetricsCalculator(df).compute_all_metrics()
+
+    assert "max_drawdown_pct" not in metrics
+    assert metrics["max_drawdown_amount"] == 10
+    assert metrics["drawdown_recovery_index"] == 4
+    assert metrics["drawdown_recovery_trades"] == 3
+    assert metrics["time_to_recovery_hours"] == pytest.approx(3.0)
+
+
+def test_drawdown_from_the_first_trade():
+    """The cumulative P/L curve starts at 0, so a loss on the first trade is a drawdown"""
+    df = pd.DataFrame({
+        "profit_loss": [-100, 50, 60],
+        "entry_time": pd.date_range("2024-01-01", periods=3, freq="h"),
+    })
+    metrics = TradeMetricsCalculator(df.iloc[:2]).compute_all_metrics()
+
+    assert metrics["max_drawdown_amount"] == 100
+    assert metrics["drawdown_start_index"] == -1
+    assert metrics["drawdown_trough_index"] == 0
+    assert metrics["drawdown_recovery_index"] is None
+    assert metrics["longest_underwater_trades"] == 2
+    assert metrics["longest_underwater_hours"] == pytest.approx(1.0)
+
+    metrics = TradeMetricsCalculator(df).compute_all_metrics()
+    assert metrics["drawdown_recovery_index"] == 2
+    assert metrics["drawdown_recovery_trades"] == 2
+    assert metrics["time_to_recovery_hours"] == pytest.approx(2.0)
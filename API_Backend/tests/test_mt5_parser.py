@@ -0,0 +1,71 @@
+"""
+Unit tests for the MT5 HTML report parsers
+"""
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.utils import mt5_parser
+from api.utils.mt5_parser import parse_mt5_html
+
+HEADER = (
+    "<tr><td><b>Time</b></td><td>Position</td><td>Symbol</td><td>Type</td><td>Volume</td>"
+    "<td>Price</td><td>Time</td><td>Price</td><td>Profit</td></tr>"
+)
+
+
+def report(rows, preamble=""):
+    return (
+        "<html><body><table><tr><th colspan='9'>Trade History Report</th></tr>" + preamble +
+        "<tr><th colspan='9'><b>Positions</b></th></tr>" + HEADER + "".join(rows) +
+        "</table></body></html>"
+    ).encode("utf-8")
+
+
+ROWS = [
+    "<tr><td>2025.11.03 09:15:00</td><td>1</td><td>EURUSD</td><td>buy</td><td>0.10</td>"
+    "<td>1.1000</td><td>2025.11.03 10:00:00</td><td>1.1010</td><td>1 250.50</td></tr>",
+    "<tr><td>2025.11.03 11:00:00</td><td>2</td><td>GBP<!-- note -->USD</td><td>sell</td><td>0.20</td>"
+    "<td>1.3000</td><td>2025.11.03 11:45:00</td><td>1.3020</td><td>(40.00)</td></tr>",
+    "<tr><td>2025.11.04 08:00:00</td><td>3</td><td>XAUUSD</td><td>buy</td><td>1.00</td>"
+    "<td>2000.0</td><td>not a date</td><td>2001.0</td><td>$ 12.30</td></tr>",
+    "<tr><td>2025.11.01 00:00:00</td><td>4</td><td>-</td><td>balance</td><td></td>"
+    "<td></td><td></td><td></td><td>10 000.00</td></tr>",
+    "<tr><td colspan='8'>Total:</td><td>1 222.80</td></tr>",
+]
+
+
+def assert_same_trades(fast, soup):
+    assert list(fast.columns) == list(soup.columns)
+    for column in fast.columns:
+        if column.endswith("_time"):
+            assert (pd.to_datetime(fast[column]).values.astype("datetime64[ns]")
+                    == pd.to_datetime(soup[column]).values.astype("datetime64[ns]")).all()
+        else:
+            assert fast[column].tolist() == soup[column].tolist()
+
+
+def test_fast_parser_matches_beautifulsoup():
+    content = report(ROWS)
+    fast = parse_mt5_html(content)
+    soup = mt5_parser._parse_mt5_html_soup(content)
+
+    assert_same_trades(fast, soup)
+    assert fast["symbol"].tolist() == ["EURUSD", "GBPUSD", "XAUUSD"]
+    assert fast["profit_loss"].tolist() == [1250.5, -40.0, 12.3]
+    # Unparseable exit time falls back to the entry time
+    assert fast["exit_time"][2] == fast["entry_time"][2]
+
+
+def test_nested_tables_fall_back_to_beautifulsoup(tmp_path, capsys):
+    nested = report(ROWS, preamble="<tr><td colspan='9'><table><tr><td>Logo</td></tr></table></td></tr>")
+    path = tmp_path / "report.html"
+    path.write_bytes(nested)
+
+    df = parse_mt5_html(str(path))
+    assert "using BeautifulSoup" in capsys.readouterr().out
+    assert_same_trades(df, mt5_parser._parse_mt5_html_soup(nested))
+    assert len(df) == 3
@@ -0,0 +1,108 @@
+"""
+Unit tests for the NewsService event window checks
+"""
+import os
+import sys
+
+import json
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.economic_calendar import EconomicCalendar, load_calendar, symbol_currencies
+from core.news_service import NewsService
+
+EVENTS = [
+    {"time": "2024-03-08 13:30:00", "currency": "USD", "impact": "High", "title": "Non-Farm Payrolls"},
+    {"time": "2024-03-07 13:15:00", "currency": "EUR", "impact": "High", "title": "ECB Rate Decision",
+     "window_before": 0, "window_after": 60},
+    {"time": "2024-03-07 13:30:00", "currency": "USD", "impact": "Medium", "title": "Jobless Claims"},
+    {"time": "2024-03-20 18:00:00", "currency": "USD", "impact": "High", "title": "FOMC",
+     "window_before": 0, "window_after": 120},
+    {"time": "2024-03-20 18:30:00", "currency": "USD", "impact": "High", "title": "FOMC Press Conference"},
+]
+
+
+def test_batch_matches_scalar_check():
+    rng = np.random.default_rng(0)
+    times = pd.Series(pd.Timestamp("2024-03-01") + pd.to_timedelta(rng.integers(0, 30 * 1440, 2000), unit="m"))
+    times = times.astype(str)
+    times[::97] = "not a time"
+
+    service = NewsService()
+    result = service.check_event_trading_risk_batch(times)
+
+    parsed = pd.to_datetime(times, errors="coerce")
+    expected = [t is not pd.NaT and service.check_event_trading_risk(t) is not None for t in parsed]
+    assert result["flags"].tolist() == expected
+    assert result["count"] == sum(expected) > 0
+    assert sum(result["event_counts"].values()) == result["count"]
+
+
+def test_batch_window_edges():
+    times = ["2024-01-05 13:24:59", "2024-01-05 13:25:00", "2024-01-05 13:35:59",
+             "2024-01-05 13:36:00", "2024-01-05 19:10:00", "2024-01-05 18:59:00"]
+    result = NewsService().check_event_trading_risk_batch(times)
+    assert result["flags"].tolist() == [False, True, True, False, True, False]
+    assert result["event_counts"] == {
+        "US High Impact Data (CPI/NFP/PPI)": 2,
+        "FOMC / Fed Interest Rate Decision": 1
+    }
+
+
+def test_symbol_currencies():
+    assert symbol_currencies("EURUSD") == ("EUR", "USD")
+    assert symbol_currencies("frxGBPJPY") == ("GBP", "JPY")
+    assert symbol_currencies("XAUUSD.m") == ("XAU", "USD")
+    assert symbol_currencies("R_100") is None
+    assert symbol_currencies(None) is None
+
+
+def test_calendar_matches_windows_per_currency(tmp_path):
+    path = tmp_path / "calendar.csv"
+    pd.DataFrame(EVENTS).to_csv(path, index=False)
+    calendar = EconomicCalendar.from_file(str(path))
+    assert len(calendar) == 4  # the medium impact event is dropped
+
+    times = ["2024-03-08 13:26:00", "2024-03-08 13:26:00", "2024-03-07 14:10:00",
+             "2024-03-07 14:10:00", "2024-03-07 13:31:00", "2024-03-20 19:59:00",
+             "2024-03-20 20:01:00", "garbage"]
+    symbols = ["EURUSD", "EURGBP", "EURGBP", "GBPJPY", "USDJPY", "R_100", "USDJPY", "EURUSD"]
+    result = calendar.match(times, symbols)
+
+    assert result["flags"].tolist() == [True, False, True, False, False, True, False, False]
+    titles = calendar.events["title"].to_numpy()[result["event_rows"][result["flags"]]]
+    assert titles.tolist() == ["Non-Farm Payrolls", "ECB Rate Decision", "FOMC"]
+    assert result["event_counts"] == {"Non-Farm Payrolls": 1, "ECB Rate Decision": 1, "FOMC": 1}
+    # Without symbols every event applies
+    assert calendar.match(times)["count"] == 6
+
+
+def test_news_service_uses_configured_calendar(tmp_path):
+    path = tmp_path / "calendar.json"
+    path.write_text(json.dumps(EVENTS))
+
+    service = NewsService(calendar_path=str(path))
+    assert service.calendar is load_calendar(str(path))  # loaded once per file version
+    assert [e["title"] for e in service.get_calendar_events(pd.Timestamp("2024-03-20"))] == [
+        "FOMC", "FOMC Press Conference"
+    ]
+    # The recurring 13:30 window no longer applies on days without events
+    assert service.check_event_trading_risk(pd.Timestamp("2024-03-11 13:30:00")) is None
+    risk = service.check_event_trading_risk(pd.Timestamp("2024-03-08 13:33:00"), symbol="EURUSD")
+    assert risk["details"]["event"] == "Non-Farm Payrolls"
+
+    times = ["2024-03-08 13:33:00", "2024-03-11 13:30:00"]
+    first = service.check_event_trading_risk_batch(times, ["EURUSD", "EURUSD"])
+    assert first["count"] == 1
+    assert first["flags"].tolist() == service.check_event_trading_risk_batch(times, ["EURUSD", "EURUSD"])["flags"].tolist()
+
+
+def test_missing_calendar_is_reported_once(tmp_path, capsys):
+    path = str(tmp_path / "missing.csv")
+    assert load_calendar(path) is None
+    assert NewsService(calendar_path=path).calendar is None
+    assert capsys.readouterr().out.count("Economic calendar not found") == 1
+    assert load_calendar(None) is None
@@ -0,0 +1,86 @@
+"""
+Unit tests for the predictive alert detectors
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.utils.prediction_engine import PredictionEngine
+
+
+def alerts_for(trades):
+    return PredictionEngine(metrics={}, trades_data=trades, risk_results={}).generate_all_alerts()
+
+
+def conditions(alerts):
+    return {alert["title"]: alert["trigger_conditions"] for alert in alerts}
+
+
+def test_streaks_and_losses_follow_entry_time_order():
+    times = pd.Timestamp("2024-03-04 08:00") + pd.to_timedelta(np.arange(12) * 4.0, unit="h")
+    times = times.insert(7, times[6] + pd.Timedelta(minutes=30)).delete(8)
+    trades = pd.DataFrame({
+        "profit_loss": [5, -3, 4, 6, -2, 8, -10, 1, 3, -1, -4, -6],
+        "lot_size": np.array([0.1] * 7 + [0.5] * 5, dtype="float32"),
+        "stop_loss": 1.1,
+        "entry_time": times.astype(str),
+    })
+    # Row order doesn't matter, only entry times do
+    shuffled = trades.sample(frac=1, random_state=3).reset_index(drop=True)
+    alerts = alerts_for(shuffled)
+    assert alerts == alerts_for(trades)
+
+    assert [alert["title"] for alert in alerts] == [
+        "Consecutive Losses Pattern", "Position Size Escalation", "Quick Trade After Loss"
+    ]
+    found = conditions(alerts)
+    assert found["Consecutive Losses Pattern"]["count"] == 3 and alerts[0]["confidence"] == 0.75
+    assert round(found["Position Size Escalation"]["increase_percent"]) == 400
+    assert found["Quick Trade After Loss"] == {
+        "pattern": "quick_trade_after_loss", "hours_after_loss": 0.5, "loss_amount": -10.0
+    }
+    # Stored frames carry float32 columns; the alerts are still plain JSON
+    json.dumps(alerts)
+
+
+def test_weakest_hour_and_weekday():
+    days = pd.bdate_range("2024-04-01", periods=20)  # Four weeks, Monday first
+    rows = []
+    for day in days:
+        rows.append({"entry_time": day + pd.Timedelta(hours=10), "profit_loss": -1 if day.dayofweek == 0 else 1})
+        rows.append({"entry_time": day + pd.Timedelta(hours=14), "profit_loss": 1 if day.dayofweek == 4 else -1})
+    alerts = alerts_for(pd.DataFrame(rows))
+
+    found = conditions(alerts)
+    assert set(found) == {"Weak Trading Hour (14:00)", "Weak Trading Day (Monday)"}
+    assert found["Weak Trading Hour (14:00)"]["win_rate"] == 0.2
+    assert found["Weak Trading Hour (14:00)"]["trade_count"] == 20
+    assert found["Weak Trading Day (Monday)"]["win_rate"] == 0.0
+    assert found["Weak Trading Day (Monday)"]["trade_count"] == 8
+
+
+def test_unparseable_entry_times_give_no_alerts():
+    trades = [{"profit_loss": -1, "stop_loss": None, "entry_time": "not a date"}] * 20
+    assert alerts_for(trades) == []
+
+
+def test_large_histories():
+    n = 100_000
+    rng = np.random.default_rng(5)
+    trades = pd.DataFrame({
+        "profit_loss": np.round(rng.normal(0, 20, n), 2),
+        "lot_size": 0.1,
+        "stop_loss": 1.1,
+        # At least two hours apart, so every loss is checked for a quick trade
+        "entry_time": pd.Timestamp("2015-01-01") + pd.to_timedelta(np.cumsum(rng.integers(7300, 20000, n)), unit="s"),
+    })
+    started = time.perf_counter()
+    alerts = alerts_for(trades)
+    assert time.perf_counter() - started < 5
+    assert "Quick Trade After Loss" not in conditions(alerts)
@@ -0,0 +1,91 @@
+"""
+Unit tests for the cache of authenticated user + settings snapshots
+"""
+import os
+import sys
+import time
+
+import requests
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.database import Base
+from api import models
+from api.utils.principal_cache import Principal, PrincipalCache, principal_cache
+
+
+def principal(user_id="u1", **overrides):
+    return Principal(**{"id": user_id, "email": f"{user_id}@x.com", "username": user_id,
+                        "is_active": True, "created_at": None, "updated_at": None, **overrides})
+
+
+def test_entries_are_per_token_and_expire():
+    cache = PrincipalCache(ttl_seconds=60, max_entries=2)
+    cache.put(principal(), "jti-a")
+    assert cache.get("u1", "jti-a") == principal()
+    assert cache.get("u1", "jti-b") is None
+    assert cache.get_user("u1") == principal()
+
+    # Never cached past the token's own expiry
+    cache.put(principal("u2"), "jti-c", token_expires_at=time.time() - 1)
+    assert cache.get("u2", "jti-c") is None
+
+    # Least recently used entry goes first
+    cache.put(principal("u3"), "jti-d")
+    cache.put(principal("u4"), "jti-e")
+    assert cache.get("u1", "jti-a") is None
+    assert cache.stats()["entries"] == 2
+
+    cache.ttl_seconds = 0.01
+    cache.put(principal("u5"), "jti-f")
+    time.sleep(0.02)
+    assert cache.get("u5", "jti-f") is None
+
+
+def test_invalidation_drops_all_tokens_and_stale_loads():
+    cache = PrincipalCache()
+    cache.put(principal(), "jti-a")
+    cache.put(principal(), "jti-b")
+
+    generation = cache.generation("u1")  # a load starts...
+    cache.invalidate_user("u1")          # ...the user changes meanwhile
+    assert cache.get("u1", "jti-a") is None and cache.get("u1", "jti-b") is None
+    cache.put(principal(), "jti-a", generation=generation)
+    assert cache.get("u1", "jti-a") is None
+
+
+def test_committed_user_changes_invalidate_the_shared_cache():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    user = models.User(id="cache-user", email="c@x.com", username="c", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    principal_cache.put(principal("cache-user"), "jti-a")
+    user.is_active = False
+    db.flush()
+    db.rollback()
+    assert principal_cache.get("cache-user", "jti-a") is not None
+
+    user.is_active = False
+    db.commit()
+    assert principal_cache.get("cache-user", "jti-a") is None
+
+    principal_cache.put(principal("cache-user", is_active=False), "jti-a")
+    db.add(models.UserSettings(user_id="cache-user", min_win_rate=55.0))
+    db.commit()
+    assert principal_cache.get("cache-user", "jti-a") is None
+
+
+def test_settings_update_is_visible_on_the_next_request(token):
+    """Requires the API running on localhost:8000"""
+    headers = {"Authorization": f"Bearer {token}"}
+    url = "http://localhost:8000/api/users/settings"
+    requests.get(url, headers=headers)  # caches the principal
+
+    for value in (41.5, 42.5):
+        assert requests.put(url, json={"min_win_rate": value}, headers=headers).status_code == 200
+        assert requests.get(url, headers=headers).json()["data"]["min_win_rate"] == value
@@ -0,0 +1,117 @@
+"""
+Unit tests for the auto-sync scheduler: due times, concurrency limits and the leader lease
+"""
+import asyncio
+import os
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.database import Base
+from api import models
+from api.models.integration_models import DerivConnection
+from api.utils.sync_scheduler import SyncScheduler, jitter_fraction
+
+NOW = datetime(2026, 3, 2, 12, 0)
+
+
+def connection(id="c1", **fields):
+    return SimpleNamespace(**{"id": id, "auto_sync": True, "sync_frequency": "hourly",
+                              "last_sync_at": NOW, "error_count": 0, "disabled_until": None, **fields})
+
+
+def test_due_times_follow_frequency_jitter_backoff_and_disabled_until():
+    scheduler = SyncScheduler(jitter_fraction=0.1, backoff_base_seconds=60, backoff_max_seconds=3600)
+    hourly = scheduler.next_sync_at(connection())
+    assert hourly == NOW + timedelta(hours=1) * (1 + 0.1 * jitter_fraction("c1"))
+
+    # Slots are stable per connection and spread across the jitter window
+    spread = [scheduler.next_sync_at(connection(f"c{n}")) - NOW for n in range(200)]
+    assert min(spread) >= timedelta(hours=1) and max(spread) < timedelta(minutes=66)
+    assert len({delta.seconds // 60 for delta in spread}) == 6
+
+    assert scheduler.next_sync_at(connection(sync_frequency="weekly")) > NOW + timedelta(weeks=1)
+    backoff = [scheduler.next_sync_at(connection("c0", error_count=n)) - NOW for n in (1, 2, 3, 10)]
+    assert [round(delta.total_seconds() / (1 + 0.1 * jitter_fraction("c0"))) for delta in backoff] == [60, 120, 240, 3600]
+
+    disabled = NOW + timedelta(days=2)
+    assert scheduler.next_sync_at(connection(disabled_until=disabled)) == disabled
+    assert scheduler.next_sync_at(connection(auto_sync=False)) is None
+    assert scheduler.next_sync_at(connection(last_sync_at=None), now=NOW) < NOW + timedelta(minutes=6)
+
+
+def with_database(tmp_path, scenario):
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'scheduler.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            return await scenario(async_sessionmaker(engine, expire_on_commit=False))
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
+
+
+def test_only_the_lease_holder_schedules(tmp_path):
+    async def scenario(sessions):
+        first = SyncScheduler(lease_ttl_seconds=0.3, session_factory=sessions)
+        second = SyncScheduler(lease_ttl_seconds=0.3, session_factory=sessions)
+        held = [await first._acquire_lease(), await second._acquire_lease(), await first._acquire_lease()]
+
+        # An expired lease is taken over; a released one right away
+        await asyncio.sleep(0.35)
+        held.append(await second._acquire_lease())
+        second.is_leader = True
+        await second._release_lease()
+        held.append(await first._acquire_lease())
+        return held
+
+    assert with_database(tmp_path, scenario) == [True, False, True, True, True]
+
+
+def test_due_syncs_run_once_within_global_and_per_app_limits(tmp_path):
+    async def scenario(sessions):
+        async with sessions() as db:
+            db.add(models.User(id="u1", email="u1@x.com", username="u1", hashed_password="x"))
+            for n in range(10):
+                db.add(DerivConnection(id=f"c{n}", user_id="u1", app_id=f"app{n % 2}", api_token_encrypted="x",
+                                       last_sync_at=datetime.utcnow() - timedelta(hours=2), sync_frequency="hourly"))
+            db.add(DerivConnection(id="later", user_id="u1", app_id="app0", api_token_encrypted="x",
+                                   last_sync_at=datetime.utcnow(), sync_frequency="hourly"))
+            db.add(DerivConnection(id="off", user_id="u1", app_id="app0", api_token_encrypted="x", auto_sync=False))
+            await db.commit()
+
+        active, peaks, runs = Counter(), Counter(), []
+
+        async def handler(connection_id, **kwargs):
+            app_id = f"app{int(connection_id[1:]) % 2}"
+            for key in ("all", app_id):
+                active[key] += 1
+                peaks[key] = max(peaks[key], active[key])
+            runs.append((connection_id, kwargs))
+            await asyncio.sleep(0.05)
+            for key in ("all", app_id):
+                active[key] -= 1
+            async with sessions() as db:
+                # What the sync task records on success
+                stored = await db.get(DerivConnection, connection_id)
+                stored.last_sync_at = datetime.utcnow()
+                await db.commit()
+
+        scheduler = SyncScheduler(max_concurrent=3, max_concurrent_per_app=2, session_factory=sessions)
+        scheduler.start(handler)
+        await asyncio.sleep(0.6)
+        stats = scheduler.stats()
+        await scheduler.shutdown()
+        return runs, peaks, stats
+
+    runs, peaks, stats = with_database(tmp_path, scenario)
+    assert sorted(connection_id for connection_id, _ in runs) == sorted(f"c{n}" for n in range(10))
+    assert runs[0][1] == {"days_back": 90, "force_full_sync": False, "analyze_after_sync": True}
+    assert peaks["all"] == 3 and peaks["app0"] <= 2 and peaks["app1"] <= 2
+    assert stats["leader"] and stats["completed"] == 10 and stats["scheduled"] == 11
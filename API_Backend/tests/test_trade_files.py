@@ -0,0 +1,115 @@
+"""
+Unit tests for chunked trade file ingestion
+"""
+import asyncio
+import io
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import UploadFile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.config import settings
+from api.utils.trade_files import UploadTooLarge, read_trade_csv, read_trade_csv_with_metrics, spool_upload
+from core.metrics_calculator import TradeMetricsCalculator
+
+CSV = (
+    "trade_id,symbol,profit_loss,lot_size,comment,entry_time,exit_time\n"
+    "1,EURUSD,50,0.1,first,2024-01-01 10:00:00,2024-01-01 11:00:00\n"
+    "2,GBPUSD,-30,0.2,second,2024-01-01 11:00:00,2024-01-01 11:30:00\n"
+    "3,EURUSD,75,0.15,third,2024-01-01 12:00:00,2024-01-01 13:00:00\n"
+    "4,USDJPY,-20,0.1,fourth,2024-01-01 12:15:00,2024-01-01 12:45:00\n"
+)
+
+
+def test_read_trade_csv_prunes_and_types_columns():
+    df = read_trade_csv(io.BytesIO(CSV.encode()))
+    assert set(df.columns) == {"symbol", "profit_loss", "lot_size", "entry_time", "exit_time"}
+    # Compacted like stored trade frames: these values are exact as float32
+    assert df["profit_loss"].dtype == "float32"
+    assert df["symbol"].dtype == "category"
+    assert pd.api.types.is_datetime64_any_dtype(df["entry_time"])
+
+
+def test_read_trade_csv_chunked_matches_single_read():
+    whole = read_trade_csv(io.BytesIO(CSV.encode()))
+    chunked = read_trade_csv(io.BytesIO(CSV.encode()), chunk_rows=1)
+    pd.testing.assert_frame_equal(whole, chunked)
+
+
+def _large_csv(rows: int) -> bytes:
+    rng = np.random.default_rng(0)
+    entry = pd.Timestamp("2024-01-01") + pd.to_timedelta(np.arange(rows) * 600, unit="s")
+    return pd.DataFrame({
+        "trade_id": np.arange(rows),
+        "symbol": rng.choice(["EURUSD", "GBPUSD", "USDJPY"], rows),
+        "profit_loss": rng.normal(0, 50, rows).round(2),
+        "lot_size": rng.choice([0.01, 0.1, 1.0], rows),
+        "account_balance_before": (10000 + rng.normal(0, 500, rows)).round(2),
+        "stop_loss": rng.normal(1.1, 0.01, rows).round(5),
+        "entry_time": entry,
+        "exit_time": entry + pd.Timedelta(minutes=5),
+        "comment": [f"order note {i}" for i in range(rows)],
+    }).to_csv(index=False).encode()
+
+
+def test_read_trade_csv_with_metrics_matches_the_calculator():
+    data = _large_csv(5000)
+    df, metrics = read_trade_csv_with_metrics(io.BytesIO(data), chunk_rows=700)
+    full = pd.read_csv(io.BytesIO(data), parse_dates=["entry_time", "exit_time"])
+    assert len(df) == 5000
+    expected = TradeMetricsCalculator(full).compute_all_metrics()
+    assert metrics.keys() == expected.keys()
+    for key, value in expected.items():
+        # Sums are folded chunk by chunk, so the last bits may differ
+        assert metrics[key] == pytest.approx(value, rel=1e-9, abs=1e-9), key
+
+    # Rows out of entry order can't be folded; the pipeline computes them instead
+    lines = CSV.splitlines(keepends=True)
+    shuffled = "".join([lines[0], lines[3], lines[1], lines[4], lines[2]])
+    _, metrics = read_trade_csv_with_metrics(io.BytesIO(shuffled.encode()), chunk_rows=2)
+    assert metrics is None
+
+
+def test_read_trade_csv_memory_is_bounded_by_the_compact_frame():
+    data = _large_csv(100_000)
+    tracemalloc.start()
+    try:
+        df, metrics = read_trade_csv_with_metrics(io.BytesIO(data), chunk_rows=10_000)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    frame_bytes = df.memory_usage(deep=True).sum()
+    assert metrics is not None
+    # The frame is far smaller than the text, and parsing it holds at most
+    # the kept chunks, their concatenation and one chunk being parsed
+    assert frame_bytes < len(data) / 2
+    assert peak < 3 * frame_bytes + len(data) / 4
+
+
+def test_spool_upload_enforces_size_limit(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "ANALYSIS_UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "MAX_CSV_UPLOAD_SIZE", 64)
+
+    upload = UploadFile(file=io.BytesIO(CSV.encode()), filename="trades.csv")
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool_upload(upload))
+    # The partial file is cleaned up
+    assert os.listdir(tmp_path) == []
+
+    monkeypatch.setattr(settings, "MAX_CSV_UPLOAD_SIZE", 1024)
+    upload = UploadFile(file=io.BytesIO(CSV.encode()), filename="trades.csv")
+    path, size = asyncio.run(spool_upload(upload))
+    assert size == len(CSV.encode())
+    assert path.endswith(".csv") and os.path.getsize(path) == size
+
+    # MT5 HTML reports keep the smaller limit
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 64)
+    upload = UploadFile(file=io.BytesIO(CSV.encode()), filename="report.html")
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool_upload(upload))
@@ -0,0 +1,94 @@
+"""
+Tests for the per-analysis trade store (the last test requires the API running on localhost:8000)
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.config import settings
+from api.utils.trade_store import load_trade_frame, normalize_trade_frame, save_trade_frame
+
+BASE_URL = "http://localhost:8000"
+
+
+def trades(n=1000):
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({
+        "trade_id": np.arange(n),
+        "symbol": rng.choice(["EURUSD", "GBPUSD", "R_100"], n),
+        "profit_loss": np.round(rng.normal(0, 40, n), 2),
+        "lot_size": rng.choice([0.01, 0.1, 0.5], n),
+        "account_balance_before": np.round(10000 + rng.normal(0, 250, n), 2),
+        "stop_loss": np.where(rng.random(n) < 0.3, np.nan, 1.1),
+        "entry_time": pd.date_range("2024-03-01", periods=n, freq="17min").astype(str),
+        "ticket": [f"T{i}" for i in range(n)],
+    })
+
+
+def test_frames_are_stored_compactly_and_read_back_exactly(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TRADE_STORE_DIR", str(tmp_path))
+    df = trades()
+    normalized = normalize_trade_frame(df)
+    assert normalized["trade_id"].dtype == "int64"
+    assert isinstance(normalized["symbol"].dtype, pd.CategoricalDtype)
+    assert normalized["lot_size"].dtype == "float32" and normalized["stop_loss"].dtype == "float32"
+    # Cents on a five-figure balance don't survive float32
+    assert normalized["account_balance_before"].dtype == "float64"
+    assert pd.api.types.is_datetime64_any_dtype(normalized["entry_time"])
+    assert not isinstance(normalized["ticket"].dtype, pd.CategoricalDtype)
+
+    name = save_trade_frame("a1", df)
+    assert name == "a1.arrow" and os.listdir(tmp_path) == ["a1.arrow"]
+    loaded = load_trade_frame(name)
+    pd.testing.assert_frame_equal(loaded, normalized)
+    assert (loaded["profit_loss"] == df["profit_loss"]).all()
+    assert os.path.getsize(tmp_path / name) < len(df.to_json(orient="records")) / 4
+
+    assert list(load_trade_frame(name, ["entry_time", "profit_loss"]).columns) == ["profit_loss", "entry_time"]
+
+    # Saving again replaces the frame; missing frames read as None
+    save_trade_frame("a1", df.head(10))
+    assert len(load_trade_frame(name)) == 10
+    assert load_trade_frame(None) is None and load_trade_frame("gone.arrow") is None
+
+
+def test_stored_trades_feed_alerts_and_rescoring(token):
+    headers = {"Authorization": f"Bearer {token}"}
+    rows = ["symbol,profit_loss,lot_size,account_balance_before,stop_loss,entry_time,exit_time"]
+    for i, profit in enumerate([40, 25, 15, -30, -20, -45, -60]):
+        rows.append(f"EURUSD,{profit},0.1,10000,1.1,2024-05-0{i + 1} 10:00:00,2024-05-0{i + 1} 11:00:00")
+    files = {"file": ("streak.csv", "\n".join(rows), "text/csv")}
+    response = requests.post(f"{BASE_URL}/api/analyze/trades", files=files, headers=headers)
+    assert response.status_code == 200
+    analysed = response.json()["data"]
+
+    # Only the owner may re-score
+    response = requests.post(f"{BASE_URL}/api/analyze/{analysed['analysis_id']}/rescore")
+    assert response.status_code == 401
+    requests.post(f"{BASE_URL}/api/users/register",
+                  json={"email": "other@example.com", "username": "other", "password": "SecurePassword123!"})
+    login = requests.post(f"{BASE_URL}/api/users/login",
+                          json={"email": "other@example.com", "password": "SecurePassword123!"})
+    other = {"Authorization": f"Bearer {login.json()['data']['access_token']}"}
+    response = requests.post(f"{BASE_URL}/api/analyze/{analysed['analysis_id']}/rescore", headers=other)
+    assert response.status_code == 403
+
+    response = requests.post(f"{BASE_URL}/api/analyze/{analysed['analysis_id']}/rescore", headers=headers)
+    assert response.status_code == 200
+    rescored = response.json()["data"]
+    assert rescored["score_result"]["score"] == analysed["score_result"]["score"]
+    assert rescored["metrics"]["total_trades"] == 7
+
+    response = requests.post(
+        f"{BASE_URL}/api/alerts/predictive",
+        json={"analysis_id": analysed["analysis_id"], "force_regenerate": True},
+        headers=headers
+    )
+    assert response.status_code == 200
+    patterns = [alert["trigger_conditions"].get("pattern") for alert in response.json()["data"]["alerts"]]
+    assert "consecutive_losses" in patterns
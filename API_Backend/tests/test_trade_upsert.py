@@ -0,0 +1,80 @@
+"""
+Unit tests for the batched DerivTrade upsert used by the sync task
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.database import Base
+from api import models
+from api.models.integration_models import DerivConnection, DerivTrade
+from api.routers.integrations import upsert_deriv_trades
+
+
+def trade(n, profit=1.0):
+    opened = datetime(2026, 1, 1) + timedelta(minutes=n)
+    return {
+        "deriv_trade_id": str(n), "transaction_id": str(n), "contract_id": str(10 + n),
+        "symbol": "R_100", "contract_type": "CALL", "currency": "USD",
+        "buy_price": 10.0, "sell_price": 10.0 + profit, "stake": 10.0, "profit": profit,
+        "purchase_time": opened, "sell_time": opened + timedelta(seconds=30),
+        "entry_time": opened, "exit_time": opened + timedelta(seconds=30),
+        "status": "won" if profit >= 0 else "lost", "raw_data": {"transaction_id": n}
+    }
+
+
+def run_upserts(scenario):
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            db.add(models.User(id="u1", email="u1@x.com", username="u1", hashed_password="x"))
+            connection = DerivConnection(id="c1", user_id="u1", api_token_encrypted="x", app_id="1",
+                                         metrics_state={"trade_count": 1})
+            db.add(connection)
+            await db.commit()
+            statements.clear()
+            return await scenario(db, connection, statements)
+    return asyncio.run(main())
+
+
+def test_batches_cost_two_statements_each():
+    async def scenario(db, connection, statements):
+        counts = await upsert_deriv_trades(db, connection, [trade(n) for n in range(1200)])
+        round_trips = len([s for s in statements if "deriv_trades" in s])
+        await db.commit()
+        stored = await db.scalar(select(func.count()).select_from(DerivTrade))
+        return counts, stored, round_trips
+
+    counts, stored, round_trips = run_upserts(scenario)
+    assert counts == (1200, 0) and stored == 1200
+    assert round_trips == 6  # 3 batches x (prefetch + upsert)
+
+
+def test_resync_updates_in_place_and_resets_metrics_on_changes():
+    async def scenario(db, connection, statements):
+        await upsert_deriv_trades(db, connection, [trade(n) for n in range(5)])
+        unchanged = await upsert_deriv_trades(db, connection, [trade(n) for n in range(5)])
+        state_after_unchanged = connection.metrics_state
+
+        # A corrected profit, a new trade and a duplicate within the page
+        counts = await upsert_deriv_trades(db, connection, [trade(2, profit=-3.0), trade(5), trade(5)])
+        await db.commit()
+        rows = (await db.execute(select(DerivTrade).order_by(DerivTrade.purchase_time))).scalars().all()
+        return unchanged, state_after_unchanged, counts, connection.metrics_state, rows
+
+    unchanged, state_after_unchanged, counts, state, rows = run_upserts(scenario)
+    assert unchanged == (0, 5) and state_after_unchanged == {"trade_count": 1}
+    assert counts == (1, 1) and state is None
+    assert len(rows) == 6 and rows[2].profit == -3.0 and rows[2].status == "lost"
+    assert rows[5].raw_data == {"transaction_id": 5} and rows[0].commission == 0
@@ -0,0 +1,242 @@
+"""
+Unit tests for batched webhook ingestion into DerivTrade and the connection's latest analysis
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+from functools import partial
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import undefer_group
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from websockets.asyncio.server import serve
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from api.config import settings
+from api.database import Base
+from api import models
+from api.models.integration_models import DerivConnection, DerivTrade, WebhookEvent
+from api.routers import integrations
+from api.schemas.integrations import WebhookEventRequest
+from api.utils.deriv_client import DerivAPIClient
+from api.utils.deriv_pool import DerivConnectionPool
+from api.utils.encryption import encryption_service
+from api.utils.webhook_ingest import WebhookIngestQueue
+from test_deriv_pool import StubDeriv, transactions
+
+SECRET = "webhook-secret"
+
+
+def signed(request, secret=SECRET):
+    request.signature = integrations.webhook_signature(request.dict(), secret)
+    return request
+
+
+def sold(tx, loginid="CR1", with_buy_id=True):
+    """Transaction event Deriv sends when ``tx`` (a profit_table row) is sold"""
+    contract = {key: tx[key] for key in ("contract_id", "purchase_time", "buy_price", "shortcode")}
+    # profit_table rows carry the buy transaction, the event the sell
+    sell_transaction_id = tx["transaction_id"] + 100000
+    if with_buy_id:
+        contract["transaction_ids"] = {"buy": tx["transaction_id"], "sell": sell_transaction_id}
+    transaction = {"action": "sell", "transaction_id": sell_transaction_id, "contract_id": tx["contract_id"],
+                   "transaction_time": tx["sell_time"], "amount": tx["sell_price"]}
+    return signed(WebhookEventRequest(event="transaction", transaction=transaction, contract=contract,
+                                      account={"loginid": loginid}))
+
+
+def test_events_are_batched_deduplicated_and_folded_into_the_latest_analysis(tmp_path, monkeypatch):
+    analysed = []
+
+    async def fake_analysis(df, reject_when_full=True, metrics=None):
+        analysed.append(len(df))
+        return {"metrics": metrics, "risk_results": {}, "score_result": {"score": 70.0, "grade": "B"},
+                "ai_explanations": {}}, {}, False
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'webhook.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        queue = WebhookIngestQueue(window_seconds=0.2)
+        monkeypatch.setattr(integrations, "AsyncSessionLocal", sessions)
+        monkeypatch.setattr(integrations, "cached_analysis", fake_analysis)
+        monkeypatch.setattr(integrations, "webhook_ingest_queue", queue)
+        monkeypatch.setattr(settings, "DERIV_WEBHOOK_SECRET", SECRET)
+
+        history = transactions(30)
+        async with sessions() as db:
+            db.add(models.User(id="u1", email="u1@x.com", username="u1", hashed_password="x"))
+            connection = DerivConnection(id="c1", user_id="u1", app_id="1", api_token_encrypted="x",
+                                         account_info={"loginid": "CR1"}, total_trades_synced=20)
+            db.add(connection)
+            await db.commit()
+            # A synced history of 20 trades with its analysis
+            trades = [DerivAPIClient.transform_transaction_to_trade(tx) for tx in history[:20]]
+            await integrations.upsert_deriv_trades(db, connection, trades)
+            first = await integrations.analyze_synced_trades(db, connection)
+
+        queue.start(integrations.ingest_webhook_events)
+        try:
+            replies = []
+            async with sessions() as db:
+                # 10 new trades, two of them delivered twice, an open contract
+                # and an event for an account nobody connected
+                burst = [sold(tx) for tx in history[20:]] + [sold(history[21]), sold(history[25])]
+                burst.append(signed(WebhookEventRequest(event="transaction", account={"loginid": "CR1"},
+                                                        transaction={"action": "buy", "transaction_id": 99})))
+                burst.append(sold(transactions(1, first=500)[0], loginid="CR9"))
+                for request in burst:
+                    replies.append(await integrations.deriv_webhook(request, connection_id=None, db=db))
+            await asyncio.sleep(0.5)
+            # A redelivery after the batch was ingested changes nothing
+            async with sessions() as db:
+                replies.append(await integrations.deriv_webhook(sold(history[22]), connection_id=None, db=db))
+            await asyncio.sleep(0.5)
+            stats = queue.stats()
+        finally:
+            await queue.shutdown()
+
+        # An unsigned event left over in the database is not ingested
+        forged = sold(transactions(1, first=700)[0]).dict()
+        async with sessions() as db:
+            leftover = WebhookEvent(connection_id="c1", event_type="transaction", event_source="deriv",
+                                    raw_payload=forged, signature=None)
+            db.add(leftover)
+            await db.commit()
+        await integrations.ingest_webhook_events([leftover.id])
+
+        async with sessions() as db:
+            stored = await db.scalar(select(func.count()).select_from(DerivTrade))
+            linked = set((await db.execute(select(DerivTrade.analysis_id))).scalars())
+            events = (await db.execute(select(WebhookEvent).order_by(WebhookEvent.received_at))).scalars().all()
+            leftover = events.pop()
+            analyses = (await db.execute(select(models.Analysis).options(undefer_group("results")))).scalars().all()
+            connection = await db.get(DerivConnection, "c1")
+        await engine.dispose()
+        return first, replies, stats, stored, linked, events, leftover, analyses, connection
+
+    first, replies, stats, stored, linked, events, leftover, analyses, connection = asyncio.run(scenario())
+    assert all(reply.data["queued"] and not reply.data["processed"] for reply in replies)
+    assert stats["batches"] == 2 and stats["events"] == 15 and stats["failed_batches"] == 0
+    assert stored == 30 and connection.total_trades_synced == 30
+    assert linked == {first["analysis_id"]}
+
+    # The existing analysis was updated in place, once for the whole burst
+    assert len(analyses) == 1 and analyses[0].id == first["analysis_id"]
+    assert analyses[0].trade_count == 30 and analyses[0].metrics["total_trades"] == 30
+    # Only the first analysis ran the full pipeline; the burst's 10 trades were folded in
+    assert analysed == [20] and analyses[0].score is not None
+    assert connection.metrics_state["trade_count"] == 30
+
+    assert all(event.processed for event in events)
+    trade_events, redelivered = events[:12], events[-1]
+    assert all(e.analysis_triggered and e.analysis_id == first["analysis_id"] for e in trade_events)
+    assert sorted({e.trade_id for e in trade_events}) == sorted(str(tx["transaction_id"]) for tx in transactions(10, first=20))
+    assert events[12].trade_id is None and events[12].processing_error is None
+    assert events[13].connection_id is None and events[13].processing_error
+    assert redelivered.trade_id == "1022" and not redelivered.analysis_triggered
+    assert leftover.processed and leftover.trade_id is None and leftover.processing_error == "Webhook event is not signed"
+
+
+def test_webhook_trades_and_synced_trades_share_one_row(tmp_path, monkeypatch):
+    history = transactions(4)
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'webhook.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        monkeypatch.setattr(integrations, "AsyncSessionLocal", sessions)
+        monkeypatch.setattr(settings, "DERIV_WEBHOOK_SECRET", SECRET)
+        async with sessions() as db:
+            db.add(models.User(id="u1", email="u1@x.com", username="u1", hashed_password="x"))
+            db.add(DerivConnection(id="c1", user_id="u1", app_id="1", account_info={"loginid": "CR1"},
+                                   api_token_encrypted=encryption_service.encrypt("good-token")))
+            await db.commit()
+
+        async def deliver(request):
+            async with sessions() as db:
+                await integrations.deriv_webhook(request, connection_id=None, db=db)
+
+        async def stored():
+            async with sessions() as db:
+                result = await db.execute(select(DerivTrade.deriv_trade_id, DerivTrade.profit))
+                return dict(result.all())
+
+        # Sold before the sync: with the buy transaction id, and without it
+        await deliver(sold(history[0]))
+        await deliver(sold(history[1], with_buy_id=False))
+        before_sync = await stored()
+
+        async with serve(StubDeriv(history[:3]).handler, "127.0.0.1", 0) as server:
+            url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            pool = DerivConnectionPool()
+            monkeypatch.setattr(integrations, "DerivAPIClient", partial(DerivAPIClient, websocket_url=url, pool=pool))
+            try:
+                await integrations.sync_trades_background_task("c1", 30, force_full_sync=False,
+                                                               analyze_after_sync=False)
+            finally:
+                await pool.close_all()
+                monkeypatch.setattr(integrations, "DerivAPIClient", DerivAPIClient)
+        after_sync = await stored()
+
+        # Sold after the sync, without the buy transaction id
+        await deliver(sold(history[2], with_buy_id=False))
+        await deliver(sold(history[3], with_buy_id=False))
+        after_webhook = await stored()
+        await engine.dispose()
+        return before_sync, after_sync, after_webhook
+
+    before_sync, after_sync, after_webhook = asyncio.run(scenario())
+    # The stub's profit_table profit isn't sell - buy, which shows who wrote each row
+    assert before_sync == {"1000": 0, "contract:1": 1}
+    # The sync updated both rows in place, re-keying the provisional one
+    assert after_sync == {"1000": -1, "1001": 0, "1002": 1}
+    assert after_webhook == {"1000": -1, "1001": 0, "1002": 2, "contract:3": 0}
+
+
+def test_unsigned_events_are_rejected(monkeypatch):
+    event = sold(transactions(1)[0])
+
+    async def deliver(request):
+        # Rejected before the database is touched
+        return await integrations.deriv_webhook(request, connection_id=None, db=None)
+
+    monkeypatch.setattr(settings, "DERIV_WEBHOOK_SECRET", None)
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(deliver(event))
+    assert rejected.value.status_code == 401
+
+    monkeypatch.setattr(settings, "DERIV_WEBHOOK_SECRET", SECRET)
+    for request in (event.copy(update={"signature": None}), signed(event.copy(), secret="guess")):
+        with pytest.raises(HTTPException) as rejected:
+            asyncio.run(deliver(request))
+        assert rejected.value.status_code == 401
+
+
+def test_batches_close_after_the_window_or_at_max_batch():
+    async def scenario():
+        batches = []
+
+        async def handler(event_ids):
+            batches.append(list(event_ids))
+
+        queue = WebhookIngestQueue(window_seconds=0.1, max_batch=4)
+        queue.start(handler)
+        for n in range(6):
+            queue.enqueue(f"e{n}")
+        await asyncio.sleep(0.05)
+        queue.enqueue("late")
+        await asyncio.sleep(0.25)
+        queue.enqueue("next")
+        await asyncio.sleep(0.15)
+        await queue.shutdown()
+        return batches
+
+    batches = asyncio.run(scenario())
+    assert batches == [["e0", "e1", "e2", "e3"], ["e4", "e5", "late"], ["next"]]